@@ -1,14 +1,146 @@
+import numpy as np
+from bisect import bisect_right
+from functools import partial
+
 from .base import *
 from .crd_manager import CrdPtConverter
 
 
+# Sorted keys of an accumulator scratchpad dict, to emit it in coordinate order. Keys are only ever added, so
+# the list is sorted again only after the dict has grown: emitting m coordinates is O(m log m) instead of the
+# O(m^2) of a min() over the keys per coordinate
+class _SortedKeys:
+    def __init__(self, storage):
+        self.storage = storage
+        self.keys = sorted(storage)
+
+    # Smallest key larger than key, None if there is none
+    def after(self, key):
+        if len(self.keys) != len(self.storage):
+            self.keys = sorted(self.storage)
+        pos = bisect_right(self.keys, key)
+        return self.keys[pos] if pos < len(self.keys) else None
+
+
+# Dense accumulation workspace of a point accumulator: one typed value array over the whole dimension and one
+# occupancy bitmap. It holds one row at a time, the first row created while it is free, and accumulating into that
+# row never moves it. Rows created while it is taken (interleaved rows, e.g. the rows of SparseCrdPtAccumulator2
+# under matmul_kij) use the hash workspace, so the memory stays at one maxdim row per accumulator
+class _DenseWorkspace:
+    def __init__(self, maxdim, valtype):
+        self.vals = np.zeros(maxdim, dtype=np.dtype(valtype))
+        self.occupied = np.zeros(maxdim, dtype=bool)
+        self.owner = None
+        self.rows = 0
+
+    # The row of the workspace if it is free, a dict otherwise
+    def new_row(self):
+        if self.owner is not None:
+            return dict()
+        self.owner = _DenseRow(self)
+        self.rows += 1
+        return self.owner
+
+    # Frees the workspace once its row has been emitted: the values of the row move to a dict (in touch order, like
+    # the hash workspace) and only its touched entries are reset
+    def release(self):
+        touched = self.owner.touched
+        values = dict(zip(touched, self.vals[touched].tolist()))
+        self.vals[touched] = 0
+        self.occupied[touched] = False
+        self.owner = None
+        return values
+
+
+# Row of a _DenseWorkspace with the list of its touched coordinates (in touch order). Used like the {crd: val} dict
+# of the hash workspace
+class _DenseRow:
+    def __init__(self, workspace):
+        self.workspace = workspace
+        self.touched = []
+
+    def __contains__(self, crd):
+        return 0 <= crd < len(self.workspace.occupied) and bool(self.workspace.occupied[crd])
+
+    def __getitem__(self, crd):
+        return self.workspace.vals[crd].item()
+
+    def __setitem__(self, crd, val):
+        workspace = self.workspace
+        if not 0 <= crd < len(workspace.vals):
+            raise Exception("Coordinate (" + str(crd) + ") is out of the dense workspace size (" +
+                            str(len(workspace.vals)) + "), please resize maxdim")
+        if not workspace.occupied[crd]:
+            workspace.occupied[crd] = True
+            self.touched.append(crd)
+        workspace.vals[crd] = val
+
+    def __len__(self):
+        return len(self.touched)
+
+    def __iter__(self):
+        return iter(self.touched)
+
+    def keys(self):
+        return self.touched
+
+
+# Scratchpad fiber of a point accumulator, a dict for the 'hash' workspace and the row of its _DenseWorkspace
+# (dense_workspace) for the 'dense' one while that is free
+def _new_row(dense_workspace, crd, val):
+    row = dict() if dense_workspace is None else dense_workspace.new_row()
+    row[crd] = val
+    return row
+
+
+# Hands the dense workspace of a point accumulator back once the row of outer has been emitted
+def _release_row(acc, outer):
+    workspace = acc.dense_workspace
+    if workspace is not None and workspace.owner is not None and acc.storage[outer] is workspace.owner:
+        acc.storage[outer] = workspace.release()
+        if outer in acc.sorted_rows:
+            acc.sorted_rows[outer].storage = acc.storage[outer]
+
+
+# Batch mode of the sparse accumulators: the point accumulator and the point to coordinate converter run one
+# after the other over the complete streams. Streams that go on after a done token restart the sub-blocks in
+# update(), those run cycle by cycle
+def _process_accumulator(acc, in_streams, out_ports, outer_fifo, inner_fifo, outer_ports, inner_ports):
+    outer = list(outer_fifo) + [tkn for port in outer_ports for tkn in batch_stream(in_streams, port)]
+    inner = list(inner_fifo) + [tkn for port in inner_ports for tkn in batch_stream(in_streams, port)]
+    vals = list(acc.in_val) + batch_stream(in_streams, 'set_val')
+    for stream in (outer, inner, vals):
+        if 'D' in stream and stream.index('D') < len(stream) - 1:
+            return Primitive.process_stream(acc, in_streams, out_ports)
+    outer_fifo.clear()
+    inner_fifo.clear()
+    acc.in_val.clear()
+
+    points = acc.crdpt_spacc.process_stream({'set_outer_crdpt': outer, 'set_inner_crdpt': inner, 'set_val': vals})
+    crds = acc.crdpt_converter.process_stream({'set_outer_crdpt': points['out_outer_crdpt'],
+                                               'set_inner_crdpt': points['out_inner_crdpt']})
+    if acc.val_stkn:
+        spacc_vals = iter(points['out_val'])
+        out_val = [next(spacc_vals, crd) if isinstance(crd, int) else crd for crd in crds['out_crd_inner']]
+    else:
+        out_val = points['out_val']
+    acc.done = acc.crdpt_spacc.out_done() and acc.crdpt_converter.out_done()
+    out = {'out_crd_outer': crds['out_crd_outer'], 'out_crd_inner': crds['out_crd_inner'], 'out_val': out_val,
+           'out_outer_crd': crds['out_crd_outer'], 'out_inner_crd': crds['out_crd_inner']}
+    return {port: stream for port, stream in out.items() if hasattr(acc, port)}
+
+
 class Reduce(Primitive):
+    __slots__ = ("in_val", "curr_out", "in_val_size", "sum", "emit_stkn", "curr_in_val", "reduction_count",
+                 "num_inputs", "num_outputs", "stop_token_out", "drop_token_out", "valid_token_out", "zero_out",
+                 "nonzero_out", "data_valid", "depth", "fifo_avail")
+
     def __init__(self, depth=1, **kwargs):
         super().__init__(**kwargs)
 
-        self.in_val = []
+        self.in_val = self.new_channel()
         self.curr_out = ""
-        self.in_val_size = 0
+        self.in_val_size = self.max_gauge("in_val_size")
         self.sum = 0
         self.emit_stkn = False
         self.curr_in_val = None
@@ -72,7 +204,6 @@ class Reduce(Primitive):
             if self.done:
                 self.curr_out = ""
                 # Reset state
-                self.in_val_size = 0
                 self.sum = 0
                 self.emit_stkn = False
                 self.done = False
@@ -80,7 +211,7 @@ class Reduce(Primitive):
                 self.curr_out = decrement_stkn(self.curr_in_val)
                 self.emit_stkn = False
             elif len(self.in_val) > 0:
-                self.curr_in_val = self.in_val.pop(0)
+                self.curr_in_val = self.in_val.popleft()
                 if is_stkn(self.curr_in_val) and stkn_order(self.curr_in_val) == 0:
                     self.curr_out = self.sum
                     self.sum = 0
@@ -114,16 +245,39 @@ class Reduce(Primitive):
             if self.get_stats:
                 self.compute_fifos()
         if self.debug:
-            print("DEBUG: REDUCE:", "\t CurrIn:", self.curr_in_val, "\tCurrOut:", self.curr_out,
-                  "\t Sum:", self.sum)
+            self.log.debug("DEBUG: REDUCE:", "\t CurrIn:", self.curr_in_val, "\tCurrOut:", self.curr_out,
+                           "\t Sum:", self.sum)
+
+    def is_idle(self):
+        # out_val() counts outputs when gathering statistics, so the block has to stay awake then
+        return not (self.debug or self.backpressure_en or self.get_stats) and not self.done and \
+            not self.emit_stkn and len(self.in_val) == 0 and self.curr_out == ""
+
+    def process_stream(self, in_streams, out_ports=()):
+        out = []
+        total = 0
+        for val in batch_stream(in_streams, 'set_in_val'):
+            if val == 'D':
+                out.append('D')
+                # The update after the done token resets the block
+                total = 0
+            elif is_stkn(val):
+                out.append(total)
+                total = 0
+                if stkn_order(val) > 0:
+                    out.append(decrement_stkn(val))
+            else:
+                total += val
+        self.done = len(out) > 0 and out[-1] == 'D'
+        return {'out_val': out}
 
     def set_in_val(self, val, parent=None):
         if val != '' and val is not None:
             if self.get_stats:
                 self.num_inputs += 1
             self.in_val.append(val)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def out_val(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -132,13 +286,13 @@ class Reduce(Primitive):
             return self.curr_out
 
     def compute_fifos(self):
-        self.in_val_size = max(self.in_val_size, len(self.in_val))
+        self.in_val_size.update(len(self.in_val))
 
     def print_fifos(self):
         if self.get_stats:
             print("Reduction counts- total inputs ", self.num_inputs, " total outputs ", self.num_outputs,
                   " reduction values ", self.reduction_count)
-            print("FiFO Val size for Reduce block: ", self.in_val_size)
+            print("FiFO Val size for Reduce block: ", self.in_val_size.value)
 
     def return_statistics(self):
         if self.get_stats:
@@ -153,18 +307,24 @@ class Reduce(Primitive):
 
 
 class SparseCrdPtAccumulator1(Primitive):
-    def __init__(self, maxdim=100, valtype=float, fifos=None, **kwargs):
+    __slots__ = ("outer_crdpt", "inner_crdpt", "in_val", "curr_in_val", "curr_in_inner_crdpt", "curr_in_outer_crdpt",
+                 "emit_output", "curr_inner_crdpt", "curr_outer_crdpt", "curr_val", "maxdim", "order", "seen_done",
+                 "storage", "sorted_rows", "valtype", "workspace", "dense_workspace", "hits_tracker", "stop_token_out",
+                 "drop_token_out", "valid_token_out", "zero_out", "nonzero_out", "out_crd_fifo", "in_crd_fifo",
+                 "in_val_fifo")
+
+    def __init__(self, maxdim=100, valtype=float, workspace='hash', fifos=None, **kwargs):
         super().__init__(**kwargs)
 
-        self.outer_crdpt = []
-        self.inner_crdpt = []
-        self.in_val = []
+        self.outer_crdpt = self.new_channel()
+        self.inner_crdpt = self.new_channel()
+        self.in_val = self.new_channel()
 
         self.curr_in_val = None
         self.curr_in_inner_crdpt = None
         self.curr_in_outer_crdpt = None
 
-        self.emit_output = []
+        self.emit_output = Channel()
         self.curr_inner_crdpt = ''
         self.curr_outer_crdpt = ''
         self.curr_val = ''
@@ -176,12 +336,16 @@ class SparseCrdPtAccumulator1(Primitive):
         self.seen_done = False
         # Accumulation scratchpad storage
         self.storage = dict()
+        self.sorted_rows = dict()
         self.valtype = valtype
+        assert workspace in ('hash', 'dense'), "workspace is 'hash' or 'dense'"
+        self.workspace = workspace
+        self.dense_workspace = _DenseWorkspace(maxdim, valtype) if workspace == 'dense' else None
 
         if fifos is not None and len(fifos) == 3:
-            self.outer_crdpt = fifos[0]
-            self.inner_crdpt = fifos[1]
-            self.in_val = fifos[2]
+            self.outer_crdpt = as_channel(fifos[0])
+            self.inner_crdpt = as_channel(fifos[1])
+            self.in_val = as_channel(fifos[2])
 
         if self.get_stats:
             self.hits_tracker = {}
@@ -190,9 +354,9 @@ class SparseCrdPtAccumulator1(Primitive):
             self.valid_token_out = 0
             self.zero_out = 0
             self.nonzero_out = 0
-            self.out_crd_fifo = 0
-            self.in_crd_fifo = 0
-            self.in_val_fifo = 0
+            self.out_crd_fifo = self.max_gauge("out_crd_fifo")
+            self.in_crd_fifo = self.max_gauge("in_crd_fifo")
+            self.in_val_fifo = self.max_gauge("in_val_fifo")
 
     def return_fifo(self):
         return self.outer_crdpt, self.inner_crdpt, self.in_val
@@ -201,30 +365,30 @@ class SparseCrdPtAccumulator1(Primitive):
         self.update_done()
         if self.debug:
             if self.seen_done or self.done:
-                print(self.seen_done, self.done)
-                print("@@@", self.outer_crdpt, self.inner_crdpt, self.in_val, self.emit_output,
-                      self.curr_in_outer_crdpt, self.curr_in_inner_crdpt, self.curr_val)
+                self.log.debug(self.seen_done, self.done)
+                self.log.debug("@@@", self.outer_crdpt, self.inner_crdpt, self.in_val, self.emit_output,
+                               self.curr_in_outer_crdpt, self.curr_in_inner_crdpt, self.curr_val)
                 self.print_debug()
             if len(self.in_val) > 0 and self.in_val[0] == "D":
-                print("val", self.outer_crdpt, self.inner_crdpt, self.in_val, self.emit_output,
-                      self.curr_in_outer_crdpt, self.curr_in_inner_crdpt, self.curr_val)
+                self.log.debug("val", self.outer_crdpt, self.inner_crdpt, self.in_val, self.emit_output,
+                               self.curr_in_outer_crdpt, self.curr_in_inner_crdpt, self.curr_val)
                 self.print_debug()
             if len(self.inner_crdpt) > 0 and self.inner_crdpt[0] == "D":
-                print("innercrd", self.outer_crdpt, self.inner_crdpt, self.in_val, self.emit_output,
-                      self.curr_in_outer_crdpt, self.curr_in_inner_crdpt, self.curr_val)
+                self.log.debug("innercrd", self.outer_crdpt, self.inner_crdpt, self.in_val, self.emit_output,
+                               self.curr_in_outer_crdpt, self.curr_in_inner_crdpt, self.curr_val)
                 self.print_debug()
             if len(self.outer_crdpt) > 0 and self.outer_crdpt[0] == "D":
-                print("outercrd", self.outer_crdpt, self.inner_crdpt, self.in_val, self.emit_output,
-                      self.curr_in_outer_crdpt, self.curr_in_inner_crdpt, self.curr_val)
+                self.log.debug("outercrd", self.outer_crdpt, self.inner_crdpt, self.in_val, self.emit_output,
+                               self.curr_in_outer_crdpt, self.curr_in_inner_crdpt, self.curr_val)
                 self.print_debug()
 
         if len(self.outer_crdpt) > 0 or len(self.inner_crdpt) > 0:
             self.block_start = False
 
         if self.get_stats:
-            self.out_crd_fifo = max(self.out_crd_fifo, len(self.outer_crdpt))
-            self.in_crd_fifo = max(self.in_crd_fifo, len(self.inner_crdpt))
-            self.in_val_fifo = max(self.in_val_fifo, len(self.in_val))
+            self.out_crd_fifo.update(len(self.outer_crdpt))
+            self.in_crd_fifo.update(len(self.inner_crdpt))
+            self.in_val_fifo.update(len(self.in_val))
 
         if self.done:
             self.curr_outer_crdpt = ''
@@ -235,10 +399,10 @@ class SparseCrdPtAccumulator1(Primitive):
             return
 
         if len(self.in_val) > 0 and len(self.outer_crdpt) > 0 and len(self.inner_crdpt) > 0 and not self.seen_done:
-            self.curr_in_val = self.in_val.pop(0)
-            self.curr_in_inner_crdpt = self.inner_crdpt.pop(0)
+            self.curr_in_val = self.in_val.popleft()
+            self.curr_in_inner_crdpt = self.inner_crdpt.popleft()
 
-            ocrd = self.outer_crdpt.pop(0)
+            ocrd = self.outer_crdpt.popleft()
             # if self.curr_in_val == 'D':
             #     print(self.curr_in_val, self.curr_in_inner_crdpt, ocrd)
             #     assert self.curr_in_val == "D" and self.curr_in_inner_crdpt == "D" and ocrd == "D"
@@ -256,7 +420,7 @@ class SparseCrdPtAccumulator1(Primitive):
                 if self.get_stats:
                     for k in inner_dict.keys():
                         self.hits_tracker[k] = 1
-                if self.curr_in_inner_crdpt in inner_dict.keys():
+                if self.curr_in_inner_crdpt in inner_dict:
                     if self.get_stats:
                         self.hits_tracker[self.curr_in_inner_crdpt] += 1
                     inner_dict[self.curr_in_inner_crdpt] += self.valtype(self.curr_in_val)
@@ -270,7 +434,8 @@ class SparseCrdPtAccumulator1(Primitive):
                     "If one item is a 'D' token, then all inputs must be"
                 self.seen_done = True
             else:
-                self.storage[self.curr_in_outer_crdpt] = {self.curr_in_inner_crdpt: self.valtype(self.curr_in_val)}
+                self.storage[self.curr_in_outer_crdpt] = _new_row(self.dense_workspace, self.curr_in_inner_crdpt,
+                                                                  self.valtype(self.curr_in_val))
         # if self.curr_in_outer_crdpt == "D":
         #     print("__________", self.emit_output, self.seen_done)
 
@@ -278,16 +443,13 @@ class SparseCrdPtAccumulator1(Primitive):
             fiber = self.emit_output[0]
 
             self.curr_outer_crdpt = fiber[0]
-            # print("===, ", self.storage)
-            # print(fiber)
-            # print(self.emit_output)
-            # print(self.storage[self.curr_outer_crdpt].keys(), fiber[1])
-            self.curr_inner_crdpt = min(
-                [item for item in self.storage[self.curr_outer_crdpt].keys() if item > fiber[1]])
+            row = self._sorted_row(fiber[0])
+            self.curr_inner_crdpt = row.after(fiber[1])
             self.curr_val = self.storage[self.curr_outer_crdpt][self.curr_inner_crdpt]
 
-            if not [item for item in self.storage[self.curr_outer_crdpt].keys() if item > self.curr_inner_crdpt]:
-                self.emit_output.pop(0)
+            if row.after(self.curr_inner_crdpt) is None:
+                self.emit_output.popleft()
+                _release_row(self, self.curr_outer_crdpt)
             else:
                 self.emit_output[0][1] = self.curr_inner_crdpt
         elif self.seen_done:
@@ -313,14 +475,80 @@ class SparseCrdPtAccumulator1(Primitive):
                 self.valid_token_out += 1
 
         if self.debug:
-            print("Done ptaccum:", self.out_done(), self.done,
-                  "\n Curr in ocrd: ", self.curr_in_outer_crdpt, "\t Curr in icrd", self.curr_in_inner_crdpt,
-                  "\t Curr in val", self.curr_in_val,
-                  "\n Curr out ocrd: ", self.curr_outer_crdpt, "\t Curr out icrd: ", self.curr_inner_crdpt,
-                  "\t Curr out val: ", self.curr_val,
-                  "\n Emit crds: ", self.emit_output,
-                  "\n Storage: ", self.storage,
-                  "\n f: ", self.outer_crdpt, self.inner_crdpt, self.in_val)
+            self.log.debug("Done ptaccum:", self.out_done(), self.done,
+                           "\n Curr in ocrd: ", self.curr_in_outer_crdpt, "\t Curr in icrd", self.curr_in_inner_crdpt,
+                           "\t Curr in val", self.curr_in_val,
+                           "\n Curr out ocrd: ", self.curr_outer_crdpt, "\t Curr out icrd: ", self.curr_inner_crdpt,
+                           "\t Curr out val: ", self.curr_val,
+                           "\n Emit crds: ", self.emit_output,
+                           "\n Storage: ", self.storage,
+                           "\n f: ", self.outer_crdpt, self.inner_crdpt, self.in_val)
+
+    # Same as update(), one input point and one output point per step
+    def process_stream(self, in_streams, out_ports=()):
+        outer = list(self.outer_crdpt) + batch_stream(in_streams, 'set_outer_crdpt')
+        inner = list(self.inner_crdpt) + batch_stream(in_streams, 'set_inner_crdpt')
+        vals = list(self.in_val) + batch_stream(in_streams, 'set_val')
+        self.outer_crdpt.clear()
+        self.inner_crdpt.clear()
+        self.in_val.clear()
+        num_in = min(len(outer), len(inner), len(vals))
+        storage = self.storage
+        valtype = self.valtype
+        emit_output = self.emit_output
+        out_outer = []
+        out_inner = []
+        out_val = []
+        i = 0
+        while not self.done:
+            if i < num_in and not self.seen_done:
+                val = vals[i]
+                icrd = inner[i]
+                ocrd = outer[i]
+                i += 1
+                if ocrd != self.curr_in_outer_crdpt and self.curr_in_outer_crdpt is not None and \
+                        self.curr_in_outer_crdpt != "D":
+                    emit_output.append([self.curr_in_outer_crdpt, -1])
+                self.curr_in_outer_crdpt = ocrd
+                if ocrd in storage:
+                    inner_dict = storage[ocrd]
+                    if icrd in inner_dict:
+                        inner_dict[icrd] += valtype(val)
+                    else:
+                        inner_dict[icrd] = valtype(val)
+                elif ocrd == 'D':
+                    assert icrd == 'D' and val == 'D', "If one item is a 'D' token, then all inputs must be"
+                    self.seen_done = True
+                else:
+                    storage[ocrd] = _new_row(self.dense_workspace, icrd, valtype(val))
+            elif len(emit_output) == 0 and not self.seen_done:
+                break
+
+            if len(emit_output) > 0:
+                fiber = emit_output[0]
+                row = self._sorted_row(fiber[0])
+                icrd = row.after(fiber[1])
+                out_outer.append(fiber[0])
+                out_inner.append(icrd)
+                out_val.append(storage[fiber[0]][icrd])
+                if row.after(icrd) is None:
+                    emit_output.popleft()
+                    _release_row(self, fiber[0])
+                else:
+                    fiber[1] = icrd
+            elif self.seen_done:
+                self.done = True
+                self.seen_done = False
+                out_outer.append('D')
+                out_inner.append('D')
+                out_val.append('D')
+        return {'out_outer_crdpt': out_outer, 'out_inner_crdpt': out_inner, 'out_val': out_val}
+
+    def _sorted_row(self, outer):
+        row = self.sorted_rows.get(outer)
+        if row is None:
+            row = self.sorted_rows[outer] = _SortedKeys(self.storage[outer])
+        return row
 
     def print_debug(self):
         print("Crdptaccum_debug Done:", self.out_done(), self.done,
@@ -358,9 +586,11 @@ class SparseCrdPtAccumulator1(Primitive):
 
     def return_statistics(self):
         if self.get_stats:
-            stats_dict = {"stkn_outs": self.stop_token_out,
+            stats_dict = {"workspace": self.workspace, "stkn_outs": self.stop_token_out,
                           "drop_outs": self.drop_token_out, "valid_outs": self.valid_token_out,
                           "zero_outs": self.zero_out, "nonzero_outs": self.nonzero_out}
+            if self.dense_workspace is not None:
+                stats_dict["dense_rows"] = self.dense_workspace.rows
             stats_dict.update(super().return_statistics())
         else:
             stats_dict = {}
@@ -384,31 +614,39 @@ class SparseCrdPtAccumulator1(Primitive):
 
 # Accumulation into a vector
 class SparseAccumulator1(Primitive):
-    def __init__(self, maxdim=100, valtype=float, last_level=True, val_stkn=False, depth=1, **kwargs):
+    __slots__ = ("in_outer_crdpt", "in_inner_crdpt", "in_val", "crdpt_spacc", "crdpt_converter", "crdpt_spacc_out_val",
+                 "curr_outer_crd", "curr_inner_crd", "curr_val", "outer_crdpt", "inner_crdpt", "val_stkn",
+                 "temp_maxdim", "temp_valtype", "temp_last_level", "in_outer_crd_pt_fifo", "in_inner_crd_pt_fifo",
+                 "in_val_fifo", "data_valid", "depth", "fifo_avail_inner", "fifo_avail_outer", "fifo_avail_val",
+                 "data_ready")
+
+    def __init__(self, maxdim=100, valtype=float, last_level=True, val_stkn=False, depth=1, workspace='hash',
+                 **kwargs):
         super().__init__(**kwargs)
-        self.in_outer_crdpt = []
-        self.in_inner_crdpt = []
-        self.in_val = []
-        self.crdpt_spacc = SparseCrdPtAccumulator1(maxdim=maxdim, valtype=valtype, debug=self.debug,
-                                                   statisics=self.get_stats, name="", back_en=False)
+        self.in_outer_crdpt = self.new_channel()
+        self.in_inner_crdpt = self.new_channel()
+        self.in_val = self.new_channel()
+        self.crdpt_spacc = SparseCrdPtAccumulator1(maxdim=maxdim, valtype=valtype, workspace=workspace,
+                                                   debug=self.debug, statistics=self.get_stats, name="",
+                                                   back_en=False)
         self.crdpt_converter = CrdPtConverter(last_level=last_level, debug=self.debug,
-                                              statisics=self.get_stats, name="", back_en=False)
+                                              statistics=self.get_stats, name="", back_en=False)
 
-        self.crdpt_spacc_out_val = []
+        self.crdpt_spacc_out_val = Channel()
 
         self.curr_outer_crd = None
         self.curr_inner_crd = None
         self.curr_val = None
 
-        self.outer_crdpt = []
-        self.inner_crdpt = []
+        self.outer_crdpt = self.new_channel()
+        self.inner_crdpt = self.new_channel()
 
         self.val_stkn = val_stkn
 
         if self.get_stats:
-            self.in_outer_crd_pt_fifo = 0
-            self.in_inner_crd_pt_fifo = 0
-            self.in_val_fifo = 0
+            self.in_outer_crd_pt_fifo = self.max_gauge("in_outer_fifo")
+            self.in_inner_crd_pt_fifo = self.max_gauge("in_inner_fifo")
+            self.in_val_fifo = self.max_gauge("in_val_fifo")
 
         if self.backpressure_en:
             self.ready_backpressure = True
@@ -477,15 +715,19 @@ class SparseAccumulator1(Primitive):
             if self.backpressure_en:
                 self.data_valid = True
             if self.debug:
-                print(self.in_outer_crdpt, self.in_inner_crdpt, self.in_val)
-                print(self.crdpt_spacc.print_debug())
-                print(self.crdpt_converter.print_debug())
+                self.log.debug(self.in_outer_crdpt, self.in_inner_crdpt, self.in_val)
+                self.crdpt_spacc.print_debug()
+                self.crdpt_converter.print_debug()
             if self.done:
                 f1, f2, f3 = self.crdpt_spacc.return_fifo()
                 f4, f5 = self.crdpt_converter.return_fifo()
-                self.crdpt_spacc = SparseCrdPtAccumulator1(maxdim=self.temp_maxdim,
-                                                           valtype=self.temp_valtype, fifos=[f1, f2, f3])
-                self.crdpt_converter = CrdPtConverter(last_level=self.temp_last_level, fifos=[f4, f5])
+                self.crdpt_spacc = SparseCrdPtAccumulator1(maxdim=self.temp_maxdim, valtype=self.temp_valtype,
+                                                           workspace=self.crdpt_spacc.workspace, fifos=[f1, f2, f3],
+                                                           debug=self.debug, statistics=self.get_stats, name="",
+                                                           back_en=False)
+                self.crdpt_converter = CrdPtConverter(last_level=self.temp_last_level, fifos=[f4, f5],
+                                                      debug=self.debug, statistics=self.get_stats, name="",
+                                                      back_en=False)
 
             # FIXME: (owhsu) self.data_ready not defined in init
             if self.backpressure_en:
@@ -495,21 +737,23 @@ class SparseAccumulator1(Primitive):
 
             # What to do for drop tokens?
             if self.get_stats:
-                self.in_outer_crd_pt_fifo = max(self.in_outer_crd_pt_fifo, len(self.in_outer_crdpt))
-                self.in_inner_crd_pt_fifo = max(self.in_inner_crd_pt_fifo, len(self.in_inner_crdpt))
-                self.in_val_fifo = max(self.in_val_fifo, len(self.in_val))
+                self.in_outer_crd_pt_fifo.update(len(self.in_outer_crdpt))
+                self.in_inner_crd_pt_fifo.update(len(self.in_inner_crdpt))
+                self.in_val_fifo.update(len(self.in_val))
 
             if len(self.in_outer_crdpt) > 0:
-                self.crdpt_spacc.set_outer_crdpt(self.in_outer_crdpt.pop(0))
+                self.crdpt_spacc.set_outer_crdpt(self.in_outer_crdpt.popleft())
 
             if len(self.in_inner_crdpt) > 0:
-                self.crdpt_spacc.set_inner_crdpt(self.in_inner_crdpt.pop(0))
+                self.crdpt_spacc.set_inner_crdpt(self.in_inner_crdpt.popleft())
 
             if len(self.in_val) > 0:
-                self.crdpt_spacc.set_val(self.in_val.pop(0))
+                self.crdpt_spacc.set_val(self.in_val.popleft())
 
             self.crdpt_spacc.update()
-            print(">>>>>>>>>>>>SPACC:", self.crdpt_spacc.out_outer_crdpt(), self.crdpt_spacc.out_inner_crdpt())
+            if self.debug:
+                self.log.debug(">>>>>>>>>>>>SPACC:", self.crdpt_spacc.out_outer_crdpt(),
+                               self.crdpt_spacc.out_inner_crdpt())
             self.crdpt_converter.set_outer_crdpt(self.crdpt_spacc.out_outer_crdpt())
             self.crdpt_converter.set_inner_crdpt(self.crdpt_spacc.out_inner_crdpt())
 
@@ -521,70 +765,75 @@ class SparseAccumulator1(Primitive):
             self.curr_inner_crd = self.crdpt_converter.out_crd_inner()
 
             if self.val_stkn:
-                self.curr_val = self.crdpt_spacc_out_val.pop(0) if isinstance(self.curr_inner_crd, int) and \
+                self.curr_val = self.crdpt_spacc_out_val.popleft() if isinstance(self.curr_inner_crd, int) and \
                     len(self.crdpt_spacc_out_val) > 0 else self.curr_inner_crd
             else:
-                self.curr_val = self.crdpt_spacc_out_val.pop(0) if len(self.crdpt_spacc_out_val) > 0 else ''
+                self.curr_val = self.crdpt_spacc_out_val.popleft() if len(self.crdpt_spacc_out_val) > 0 else ''
 
             if self.debug:
-                print(self.in_val)
+                self.log.debug(self.in_val)
 
             self.done = self.crdpt_spacc.out_done() and self.crdpt_converter.out_done()
 
         if self.debug:
-            print("Vals: ", self.in_val, "\n Done:", self.done,
-                  "\n SpCrdPt Accum Done:", self.crdpt_spacc.out_done(),
-                  "\t CrdPtConverter Done:", self.crdpt_converter.out_done()
-                  )
+            self.log.debug("Vals: ", self.in_val, "\n Done:", self.done,
+                           "\n SpCrdPt Accum Done:", self.crdpt_spacc.out_done(),
+                           "\t CrdPtConverter Done:", self.crdpt_converter.out_done()
+                           )
+
+    def process_stream(self, in_streams, out_ports=()):
+        return _process_accumulator(self, in_streams, out_ports, self.in_outer_crdpt, self.in_inner_crdpt,
+                                    ('set_outer_crdpt', 'crd_in_outer', 'set_crd_outer'),
+                                    ('set_inner_crdpt', 'crd_in_inner', 'set_crd_inner'))
 
     def set_inner_crdpt(self, crdpt, parent=None):
         assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
         if crdpt != '' and crdpt is not None:
             self.in_inner_crdpt.append(crdpt)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_inner)
+        if self.backpressure_en and not self.fifo_avail_inner:
+            parent.set_backpressure(False)
 
     def set_outer_crdpt(self, crdpt, parent=None):
         assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
         if crdpt != '' and crdpt is not None:
             self.in_outer_crdpt.append(crdpt)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_outer)
+        if self.backpressure_en and not self.fifo_avail_outer:
+            parent.set_backpressure(False)
 
     def crd_in_inner(self, crdpt, parent=None):
         assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
         if crdpt != '' and crdpt is not None:
             self.in_inner_crdpt.append(crdpt)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_inner)
+        if self.backpressure_en and not self.fifo_avail_inner:
+            parent.set_backpressure(False)
 
     def crd_in_outer(self, crdpt, parent=None):
         assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
         if crdpt != '' and crdpt is not None:
             self.in_outer_crdpt.append(crdpt)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_outer)
+        if self.backpressure_en and not self.fifo_avail_outer:
+            parent.set_backpressure(False)
 
     def set_crd_inner(self, crdpt, parent=None):
         assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
         if crdpt != '' and crdpt is not None:
             self.in_inner_crdpt.append(crdpt)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_inner)
+        if self.backpressure_en and not self.fifo_avail_inner:
+            parent.set_backpressure(False)
 
     def set_crd_outer(self, crdpt, parent=None):
         assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
         if crdpt != '' and crdpt is not None:
             self.in_outer_crdpt.append(crdpt)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_outer)
+        if self.backpressure_en and not self.fifo_avail_outer:
+            parent.set_backpressure(False)
 
     def set_val(self, val, parent=None):
         assert not is_stkn(val), 'Values associated with points should not have stop tokens'
         if val != '' and val is not None:
             self.in_val.append(val)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_val)
+        if self.backpressure_en and not self.fifo_avail_val:
+            parent.set_backpressure(False)
 
     def out_outer_crd(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -609,9 +858,6 @@ class SparseAccumulator1(Primitive):
     def return_statistics(self):
         if self.get_stats:
             stats_dict = {}
-            stats_dict["in_outer_fifo"] = self.in_outer_crd_pt_fifo
-            stats_dict["in_inner_fifo"] = self.in_inner_crd_pt_fifo
-            stats_dict["in_val_fifo"] = self.in_val_fifo
             hits_info = self.crdpt_spacc.return_hits()
             stats_dict["max_hits"] = hits_info[0]
             stats_dict["hits_gt_one"] = hits_info[1]
@@ -628,17 +874,22 @@ class SparseAccumulator1(Primitive):
 
 
 class SparseCrdPtAccumulator2(Primitive):
-    def __init__(self, maxdim=100, valtype=float, **kwargs):
+    __slots__ = ("in_crdpt0", "in_crdpt1", "in_val", "curr_in_val", "curr_in0_crdpt", "curr_in1_crdpt", "emit_output",
+                 "curr_crdpt0", "curr_crdpt1", "curr_val", "maxdim", "order", "seen_done", "storage", "sorted_outer",
+                 "sorted_rows", "valtype", "workspace", "dense_workspace", "hits_tracker", "stop_token_out",
+                 "drop_token_out", "valid_token_out", "zero_out", "nonzero_out")
+
+    def __init__(self, maxdim=100, valtype=float, workspace='hash', **kwargs):
         super().__init__(**kwargs)
-        self.in_crdpt0 = []
-        self.in_crdpt1 = []
-        self.in_val = []
+        self.in_crdpt0 = self.new_channel()
+        self.in_crdpt1 = self.new_channel()
+        self.in_val = self.new_channel()
 
         self.curr_in_val = None
         self.curr_in0_crdpt = None
         self.curr_in1_crdpt = None
 
-        self.emit_output = []
+        self.emit_output = Channel()
         self.curr_crdpt0 = ''
         self.curr_crdpt1 = ''
         self.curr_val = ''
@@ -650,7 +901,12 @@ class SparseCrdPtAccumulator2(Primitive):
         self.seen_done = False
         # Accumulation scratchpad storage
         self.storage = dict()
+        self.sorted_outer = _SortedKeys(self.storage)
+        self.sorted_rows = dict()
         self.valtype = valtype
+        assert workspace in ('hash', 'dense'), "workspace is 'hash' or 'dense'"
+        self.workspace = workspace
+        self.dense_workspace = _DenseWorkspace(maxdim, valtype) if workspace == 'dense' else None
 
         if self.get_stats:
             self.hits_tracker = {}
@@ -677,9 +933,9 @@ class SparseCrdPtAccumulator2(Primitive):
             return
 
         if len(self.in_val) > 0 and len(self.in_crdpt1) > 0 and len(self.in_crdpt0) > 0:
-            self.curr_in_val = self.in_val.pop(0)
-            self.curr_in0_crdpt = self.in_crdpt0.pop(0)
-            self.curr_in1_crdpt = self.in_crdpt1.pop(0)
+            self.curr_in_val = self.in_val.popleft()
+            self.curr_in0_crdpt = self.in_crdpt0.popleft()
+            self.curr_in1_crdpt = self.in_crdpt1.popleft()
 
             emit_output = self.curr_in1_crdpt == 'D'
             if emit_output:
@@ -693,7 +949,7 @@ class SparseCrdPtAccumulator2(Primitive):
                     if self.get_stats:
                         for k in inner_dict.keys():
                             self.hits_tracker[k] = 1
-                    if self.curr_in0_crdpt in inner_dict.keys():
+                    if self.curr_in0_crdpt in inner_dict:
                         if self.get_stats:
                             self.hits_tracker[self.curr_in0_crdpt] += 1
                         inner_dict[self.curr_in0_crdpt] += self.valtype(self.curr_in_val)
@@ -702,24 +958,24 @@ class SparseCrdPtAccumulator2(Primitive):
                             self.hits_tracker[self.curr_in0_crdpt] = 1
                         inner_dict[self.curr_in0_crdpt] = self.valtype(self.curr_in_val)
                 else:
-                    self.storage[self.curr_in1_crdpt] = {self.curr_in0_crdpt: self.valtype(self.curr_in_val)}
+                    self.storage[self.curr_in1_crdpt] = _new_row(self.dense_workspace, self.curr_in0_crdpt,
+                                                                 self.valtype(self.curr_in_val))
 
         if len(self.emit_output) > 0:
-            fiber = self.emit_output.pop(0)
-            #
-            key1 = min(
-                [item for item in self.storage.keys() if item > fiber[0]])
-            key0 = min(
-                [item for item in self.storage[key1].keys() if item > fiber[1]])
+            fiber = self.emit_output.popleft()
+            key1 = self.sorted_outer.after(fiber[0])
+            row = self._sorted_row(key1)
+            key0 = row.after(fiber[1])
 
             self.curr_crdpt1 = key1
             self.curr_crdpt0 = key0
             self.curr_val = self.storage[key1][key0]
 
             # Finished inner coordinates, increment outer coordinate
-            if not [item for item in self.storage[key1].keys() if item > key0]:
+            if row.after(key0) is None:
+                _release_row(self, key1)
                 # Do not increment outer coordinate if it's the last one
-                if [item for item in self.storage.keys() if item > key1]:
+                if self.sorted_outer.after(key1) is not None:
                     self.emit_output.append([key1, -1])
             # Do inner coordinates
             else:
@@ -749,15 +1005,91 @@ class SparseCrdPtAccumulator2(Primitive):
                 self.valid_token_out += 1
 
         if self.debug:
-            print("Done:", self.out_done(),
-                  "\n Curr in crd1: ", self.curr_in1_crdpt,
-                  "\t Curr in crd0", self.curr_in0_crdpt,
-                  "\t Curr in val", self.curr_in_val,
-                  "\n Curr out crd1: ", self.curr_crdpt1,
-                  "\t Curr out crd0: ", self.curr_crdpt0,
-                  "\t Curr out val: ", self.curr_val,
-                  "\n Emit crds: ", self.emit_output,
-                  "\n Storage: ", self.storage)
+            self.log.debug("Done:", self.out_done(),
+                           "\n Curr in crd1: ", self.curr_in1_crdpt,
+                           "\t Curr in crd0", self.curr_in0_crdpt,
+                           "\t Curr in val", self.curr_in_val,
+                           "\n Curr out crd1: ", self.curr_crdpt1,
+                           "\t Curr out crd0: ", self.curr_crdpt0,
+                           "\t Curr out val: ", self.curr_val,
+                           "\n Emit crds: ", self.emit_output,
+                           "\n Storage: ", self.storage)
+
+    # Same as update(), one input point and one output point per step
+    def process_stream(self, in_streams, out_ports=()):
+        crdpt1 = list(self.in_crdpt1) + batch_stream(in_streams, 'set_outer_crdpt')
+        crdpt0 = list(self.in_crdpt0) + batch_stream(in_streams, 'set_inner_crdpt')
+        vals = list(self.in_val) + batch_stream(in_streams, 'set_val')
+        self.in_crdpt1.clear()
+        self.in_crdpt0.clear()
+        self.in_val.clear()
+        num_in = min(len(crdpt1), len(crdpt0), len(vals))
+        storage = self.storage
+        valtype = self.valtype
+        emit_output = self.emit_output
+        out_crdpt1 = []
+        out_crdpt0 = []
+        out_val = []
+        i = 0
+        while not self.done:
+            if i < num_in:
+                val = vals[i]
+                crd0 = crdpt0[i]
+                crd1 = crdpt1[i]
+                i += 1
+                if crd1 == 'D':
+                    emit_output.append([-1, -1])
+                    assert crd0 == 'D' and val == 'D', "If one item is a 'D' token, then all inputs must be"
+                    self.seen_done = True
+                elif crd1 in storage:
+                    inner_dict = storage[crd1]
+                    if crd0 in inner_dict:
+                        inner_dict[crd0] += valtype(val)
+                    else:
+                        inner_dict[crd0] = valtype(val)
+                else:
+                    storage[crd1] = _new_row(self.dense_workspace, crd0, valtype(val))
+            elif len(emit_output) == 0 and not self.seen_done:
+                break
+
+            if len(emit_output) > 0:
+                fiber = emit_output.popleft()
+                key1 = self.sorted_outer.after(fiber[0])
+                row = self._sorted_row(key1)
+                key0 = row.after(fiber[1])
+                out_crdpt1.append(key1)
+                out_crdpt0.append(key0)
+                out_val.append(storage[key1][key0])
+                if row.after(key0) is None:
+                    _release_row(self, key1)
+                    if self.sorted_outer.after(key1) is not None:
+                        emit_output.append([key1, -1])
+                else:
+                    emit_output.append([fiber[0], key0])
+            elif self.seen_done:
+                self.done = True
+                self.seen_done = False
+                out_crdpt1.append('D')
+                out_crdpt0.append('D')
+                out_val.append('D')
+        return {'out_outer_crdpt': out_crdpt1, 'out_inner_crdpt': out_crdpt0, 'out_val': out_val}
+
+    def _sorted_row(self, outer):
+        row = self.sorted_rows.get(outer)
+        if row is None:
+            row = self.sorted_rows[outer] = _SortedKeys(self.storage[outer])
+        return row
+
+    def is_idle(self):
+        if self.debug or self.curr_crdpt0 != '' or self.curr_crdpt1 != '' or self.curr_val != '':
+            return False
+        return self.done or (not self.seen_done and len(self.emit_output) == 0 and
+                             not (len(self.in_val) > 0 and len(self.in_crdpt1) > 0 and len(self.in_crdpt0) > 0))
+
+    def add_idle_cycles(self, cycles):
+        super().add_idle_cycles(cycles)
+        if self.get_stats:
+            self.drop_token_out += cycles
 
     def set_inner_crdpt(self, crdpt):
         assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
@@ -797,9 +1129,11 @@ class SparseCrdPtAccumulator2(Primitive):
 
     def return_statistics(self):
         if self.get_stats:
-            stats_dict = {"stkn_outs": self.stop_token_out,
+            stats_dict = {"workspace": self.workspace, "stkn_outs": self.stop_token_out,
                           "drop_outs": self.drop_token_out, "valid_outs": self.valid_token_out,
                           "zero_outs": self.zero_out, "nonzero_outs": self.nonzero_out}
+            if self.dense_workspace is not None:
+                stats_dict["dense_rows"] = self.dense_workspace.rows
             stats_dict.update(super().return_statistics())
         else:
             stats_dict = {}
@@ -808,29 +1142,35 @@ class SparseCrdPtAccumulator2(Primitive):
 
 # Accumulation into a matrix (2D)
 class SparseAccumulator2(Primitive):
-    def __init__(self, maxdim=100, valtype=float, last_level=True, val_stkn=False, depth=1, **kwargs):
+    __slots__ = ("in1_crdpt", "in0_crdpt", "in_val", "crdpt_spacc", "crdpt_converter", "crdpt_spacc_out_val",
+                 "curr_1_crd", "curr_0_crd", "curr_val", "outer_crdpt", "inner_crdpt", "val_stkn", "temp_maxdim",
+                 "temp_valtype", "temp_last_level", "sub_kwargs", "in1_fifo", "in0_fifo", "inval_fifo", "data_valid",
+                 "depth", "fifo_avail_inner", "fifo_avail_outer", "fifo_avail_val")
+
+    def __init__(self, maxdim=100, valtype=float, last_level=True, val_stkn=False, depth=1, workspace='hash',
+                 **kwargs):
         super().__init__(**kwargs)
-        self.in1_crdpt = []
-        self.in0_crdpt = []
-        self.in_val = []
+        self.in1_crdpt = self.new_channel()
+        self.in0_crdpt = self.new_channel()
+        self.in_val = self.new_channel()
 
-        self.crdpt_spacc = SparseCrdPtAccumulator2(maxdim=maxdim, valtype=valtype, **kwargs)
+        self.crdpt_spacc = SparseCrdPtAccumulator2(maxdim=maxdim, valtype=valtype, workspace=workspace, **kwargs)
         self.crdpt_converter = CrdPtConverter(last_level=True, **kwargs)
 
-        self.crdpt_spacc_out_val = []
+        self.crdpt_spacc_out_val = Channel()
 
         self.curr_1_crd = None
         self.curr_0_crd = None
         self.curr_val = None
 
-        self.outer_crdpt = []
-        self.inner_crdpt = []
+        self.outer_crdpt = self.new_channel()
+        self.inner_crdpt = self.new_channel()
 
         self.val_stkn = val_stkn
         if self.get_stats:
-            self.in1_fifo = 0
-            self.in0_fifo = 0
-            self.inval_fifo = 0
+            self.in1_fifo = self.max_gauge("in1_fifo")
+            self.in0_fifo = self.max_gauge("in0_fifo")
+            self.inval_fifo = self.max_gauge("inval_fifo")
 
         if self.backpressure_en:
             self.ready_backpressure = True
@@ -842,6 +1182,8 @@ class SparseAccumulator2(Primitive):
         self.temp_maxdim = maxdim
         self.temp_valtype = valtype
         self.temp_last_level = last_level
+        # The sub-blocks are rebuilt after every done token with the same arguments
+        self.sub_kwargs = kwargs
 
     def check_backpressure(self):
         if self.backpressure_en:
@@ -885,8 +1227,10 @@ class SparseAccumulator2(Primitive):
                 f1, f2, f3 = self.crdpt_spacc.return_fifo()
                 f4, f5 = self.crdpt_converter.return_fifo()
                 self.crdpt_spacc = SparseCrdPtAccumulator2(maxdim=self.temp_maxdim, valtype=self.temp_valtype,
-                                                           fifos=[f1, f2, f3])
-                self.crdpt_converter = CrdPtConverter(last_level=self.temp_last_level, fifos=[f4, f5])
+                                                           workspace=self.crdpt_spacc.workspace, fifos=[f1, f2, f3],
+                                                           **self.sub_kwargs)
+                self.crdpt_converter = CrdPtConverter(last_level=self.temp_last_level, fifos=[f4, f5],
+                                                      **self.sub_kwargs)
             if self.backpressure_en:
                 self.data_valid = True
             if (len(self.in1_crdpt) > 0 or len(self.in0_crdpt) > 0 or len(self.in_val) > 0):
@@ -896,13 +1240,13 @@ class SparseAccumulator2(Primitive):
                 self.compute_fifo()
 
             if len(self.in1_crdpt) > 0:
-                self.crdpt_spacc.set_outer_crdpt(self.in1_crdpt.pop(0))
+                self.crdpt_spacc.set_outer_crdpt(self.in1_crdpt.popleft())
 
             if len(self.in0_crdpt) > 0:
-                self.crdpt_spacc.set_inner_crdpt(self.in0_crdpt.pop(0))
+                self.crdpt_spacc.set_inner_crdpt(self.in0_crdpt.popleft())
 
             if len(self.in_val) > 0:
-                self.crdpt_spacc.set_val(self.in_val.pop(0))
+                self.crdpt_spacc.set_val(self.in_val.popleft())
 
             self.crdpt_spacc.update()
 
@@ -917,47 +1261,62 @@ class SparseAccumulator2(Primitive):
             self.curr_0_crd = self.crdpt_converter.out_crd_inner()
 
             if self.val_stkn:
-                self.curr_val = self.crdpt_spacc_out_val.pop(0) if isinstance(self.curr_0_crd, int) and \
+                self.curr_val = self.crdpt_spacc_out_val.popleft() if isinstance(self.curr_0_crd, int) and \
                     len(self.crdpt_spacc_out_val) > 0 else self.curr_0_crd
             else:
-                self.curr_val = self.crdpt_spacc_out_val.pop(0) if len(self.crdpt_spacc_out_val) > 0 else ''
+                self.curr_val = self.crdpt_spacc_out_val.popleft() if len(self.crdpt_spacc_out_val) > 0 else ''
 
             if self.debug:
-                print(self.in_val)
+                self.log.debug(self.in_val)
 
             self.done = self.crdpt_spacc.out_done() and self.crdpt_converter.out_done()
 
         if self.debug:
-            print("Done:", self.done,
-                  "\n SpCrdPt Accum Done:", self.crdpt_spacc.out_done(),
-                  "\t CrdPtConv 01 Done:", self.crdpt_converter.out_done()
-                  )
+            self.log.debug("Done:", self.done,
+                           "\n SpCrdPt Accum Done:", self.crdpt_spacc.out_done(),
+                           "\t CrdPtConv 01 Done:", self.crdpt_converter.out_done()
+                           )
+
+    def process_stream(self, in_streams, out_ports=()):
+        return _process_accumulator(self, in_streams, out_ports, self.in1_crdpt, self.in0_crdpt, ('set_crd_outer',),
+                                    ('set_crd_inner',))
+
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and not self.done and len(self.in1_crdpt) == 0 and \
+            len(self.in0_crdpt) == 0 and len(self.in_val) == 0 and len(self.crdpt_spacc_out_val) == 0 and \
+            self.curr_1_crd == '' and self.curr_0_crd == '' and self.curr_val == '' and \
+            self.crdpt_spacc.is_idle() and self.crdpt_converter.is_idle()
+
+    def add_idle_cycles(self, cycles):
+        super().add_idle_cycles(cycles)
+        self.crdpt_spacc.add_idle_cycles(cycles)
+        self.crdpt_converter.add_idle_cycles(cycles)
 
     def compute_fifo(self):
-        self.in1_fifo = max(self.in1_fifo, len(self.in1_crdpt))
-        self.in0_fifo = max(self.in0_fifo, len(self.in0_crdpt))
-        self.inval_fifo = max(self.inval_fifo, len(self.in_val))
+        self.in1_fifo.update(len(self.in1_crdpt))
+        self.in0_fifo.update(len(self.in0_crdpt))
+        self.inval_fifo.update(len(self.in_val))
 
     def set_crd_inner(self, crdpt, parent=None):
         assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
         if crdpt != '' and crdpt is not None:
             self.in0_crdpt.append(crdpt)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_inner)
+        if self.backpressure_en and not self.fifo_avail_inner:
+            parent.set_backpressure(False)
 
     def set_crd_outer(self, crdpt, parent=None):
         assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
         if crdpt != '' and crdpt is not None:
             self.in1_crdpt.append(crdpt)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_outer)
+        if self.backpressure_en and not self.fifo_avail_outer:
+            parent.set_backpressure(False)
 
     def set_val(self, val, parent=None):
         assert not is_stkn(val), 'Values associated with points should not have stop tokens'
         if val != '' and val is not None:
             self.in_val.append(val)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_val)
+        if self.backpressure_en and not self.fifo_avail_val:
+            parent.set_backpressure(False)
 
     def out_crd_outer(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -974,11 +1333,223 @@ class SparseAccumulator2(Primitive):
     def return_statistics(self):
         if self.get_stats:
             hits_info = self.crdpt_spacc.return_hits()
-            stats_dict = {"in1_fifo": self.in1_fifo, "in0_fifo": self.in0_fifo,
-                          "inval_fifo": self.inval_fifo, "max_hits": hits_info[0], "gt_one": hits_info[1],
-                          "total_elems": hits_info[2]}
+            stats_dict = {"max_hits": hits_info[0], "gt_one": hits_info[1], "total_elems": hits_info[2]}
             stats_dict.update(self.crdpt_spacc.return_statistics())
             stats_dict.update(super().return_statistics())
         else:
             stats_dict = {}
         return stats_dict
+
+
+# Compressed streams of an accumulated workspace of order levels, keyed by coordinate tuples (outermost level
+# first). Returns the crd stream of every level (index 0 is the innermost level) and the value stream, with
+# the stop tokens of the innermost level when val_stkn is set
+def _emit_points(storage, order, val_stkn):
+    crds = [[] for _ in range(order)]
+    vals = []
+    prev = None
+    for key in sorted(storage):
+        i = 0
+        if prev is not None:
+            while key[i] == prev[i]:
+                i += 1
+            # Close the fibers below the outermost level that changed
+            for level in range(order - 1 - i):
+                crds[level].append('S' + str(order - 2 - i - level))
+            if val_stkn and i < order - 1:
+                vals.append(crds[0][-1])
+        for level in range(order - 1 - i, -1, -1):
+            crds[level].append(key[order - 1 - level])
+        vals.append(storage[key])
+        prev = key
+    for level in range(order):
+        if prev is not None or level == order - 1:
+            crds[level].append('S' + str(order - 1 - level))
+        crds[level].append('D')
+    if val_stkn and prev is not None:
+        vals.append(crds[0][-2])
+    vals.append('D')
+    return crds, vals
+
+
+class SparseAccumulatorN(Primitive):
+    """Sparse accumulator over order coordinate levels.
+
+    Takes coordinate points (no stop tokens) on set_crd<k> and values on set_val, level 0 being the innermost
+    one, and accumulates them in a single workspace keyed by the coordinate tuple. After the done token the
+    workspace is emitted in coordinate order as compressed streams on out_crd<k> and out_val, like
+    SparseAccumulator2 for order=2 but without the chain of point accumulator and point converter blocks.
+    """
+
+    __slots__ = ("order", "valtype", "val_stkn", "in_crdpt", "in_val", "storage", "emit_crd", "emit_val", "curr_crd",
+                 "curr_val", "in_crd_fifo", "in_val_fifo", "hits_tracker", "data_valid", "depth", "fifo_avail_crd",
+                 "fifo_avail_val")
+
+    def __init__(self, order=2, valtype=float, val_stkn=False, depth=1, **kwargs):
+        super().__init__(**kwargs)
+        assert order >= 1, "The accumulator needs at least one level"
+        self.order = order
+        self.valtype = valtype
+        self.val_stkn = val_stkn
+
+        self.in_crdpt = [self.new_channel() for _ in range(order)]
+        self.in_val = self.new_channel()
+
+        self.storage = dict()
+        self.emit_crd = None
+        self.emit_val = None
+
+        self.curr_crd = [''] * order
+        self.curr_val = ''
+
+        if self.get_stats:
+            self.hits_tracker = dict()
+            self.in_crd_fifo = self.max_gauge("in_crd_fifo")
+            self.in_val_fifo = self.max_gauge("in_val_fifo")
+
+        if self.backpressure_en:
+            self.ready_backpressure = True
+            self.data_valid = True
+            self.depth = depth
+            self.fifo_avail_crd = [True] * order
+            self.fifo_avail_val = True
+
+    # Per level ports set_crd<k> and out_crd<k>, so the levels can be wired up like the ports of the other blocks
+    def __getattr__(self, name):
+        port, level = name[:7], name[7:]
+        if port in ("set_crd", "out_crd") and level.isdecimal() and int(level) < self.order:
+            return partial(getattr(self, port), int(level))
+        raise AttributeError(name)
+
+    def check_backpressure(self):
+        if self.backpressure_en:
+            copy_backpressure = self.ready_backpressure
+            self.ready_backpressure = True
+            return copy_backpressure
+        return True
+
+    def set_backpressure(self, backpressure):
+        if not backpressure:
+            self.ready_backpressure = False
+
+    def update_ready(self):
+        if self.backpressure_en:
+            self.fifo_avail_crd = [len(fifo) <= self.depth for fifo in self.in_crdpt]
+            self.fifo_avail_val = len(self.in_val) <= self.depth
+
+    def update(self):
+        self.update_done()
+        self.update_ready()
+        if self.backpressure_en:
+            self.data_valid = False
+        if (self.backpressure_en and self.check_backpressure()) or not self.backpressure_en:
+            if self.backpressure_en:
+                self.data_valid = True
+            # The done token of the last block was emitted in the previous cycle, start the next one
+            self.done = False
+            if any(len(fifo) > 0 for fifo in self.in_crdpt) or len(self.in_val) > 0:
+                self.block_start = False
+
+            if self.get_stats:
+                self.compute_fifo()
+
+            if self.emit_crd is None:
+                self.curr_crd = [''] * self.order
+                self.curr_val = ''
+                # Accumulate one point per cycle, once all of its coordinates and its value are in
+                if len(self.in_val) > 0 and all(len(fifo) > 0 for fifo in self.in_crdpt):
+                    key = tuple(self.in_crdpt[level].popleft() for level in range(self.order - 1, -1, -1))
+                    val = self.in_val.popleft()
+                    if val == 'D':
+                        assert all(crd == 'D' for crd in key), "If one item is a 'D' token, then all inputs must be"
+                        self.emit_crd, self.emit_val = _emit_points(self.storage, self.order, self.val_stkn)
+                        self.emit_crd = [Channel(crds) for crds in self.emit_crd]
+                        self.emit_val = Channel(self.emit_val)
+                        self.storage = dict()
+                    else:
+                        self._accumulate(key, val)
+            else:
+                # Each output stream sends one token per cycle
+                self.curr_crd = [crds.popleft() if len(crds) > 0 else '' for crds in self.emit_crd]
+                self.curr_val = self.emit_val.popleft() if len(self.emit_val) > 0 else ''
+                if len(self.emit_val) == 0 and all(len(crds) == 0 for crds in self.emit_crd):
+                    self.emit_crd = None
+                    self.emit_val = None
+                    self.done = True
+
+        if self.debug:
+            self.log.debug("DEBUG: SPACC N:", "\t Outs:", self.curr_crd, self.curr_val, "\t Done:", self.done)
+
+    def _accumulate(self, key, val):
+        if key in self.storage:
+            self.storage[key] += self.valtype(val)
+        else:
+            self.storage[key] = self.valtype(val)
+        if self.get_stats:
+            self.hits_tracker[key] = self.hits_tracker.get(key, 0) + 1
+
+    def process_stream(self, in_streams, out_ports=()):
+        crds = [list(self.in_crdpt[level]) + batch_stream(in_streams, 'set_crd' + str(level))
+                for level in range(self.order)]
+        vals = list(self.in_val) + batch_stream(in_streams, 'set_val')
+        for stream in crds + [vals]:
+            if len(stream) != len(vals) or 'D' not in stream or stream.index('D') < len(stream) - 1:
+                return Primitive.process_stream(self, in_streams, out_ports)
+        if self.emit_crd is not None:
+            return Primitive.process_stream(self, in_streams, out_ports)
+        for fifo in self.in_crdpt + [self.in_val]:
+            fifo.clear()
+
+        for i in range(len(vals) - 1):
+            self._accumulate(tuple(crds[level][i] for level in range(self.order - 1, -1, -1)), vals[i])
+        out_crd, out_val = _emit_points(self.storage, self.order, self.val_stkn)
+        self.storage = dict()
+        self.done = True
+        out = {'out_crd' + str(level): out_crd[level] for level in range(self.order)}
+        out['out_val'] = out_val
+        return out
+
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and not self.done and self.emit_crd is None and \
+            all(len(fifo) == 0 for fifo in self.in_crdpt) and len(self.in_val) == 0 and \
+            all(crd == '' for crd in self.curr_crd) and self.curr_val == ''
+
+    def compute_fifo(self):
+        self.in_crd_fifo.update(max(len(fifo) for fifo in self.in_crdpt))
+        self.in_val_fifo.update(len(self.in_val))
+
+    def set_crd(self, level, crdpt, parent=None):
+        assert not is_stkn(crdpt), 'Coordinate points should not have stop tokens'
+        if crdpt != '' and crdpt is not None:
+            self.in_crdpt[level].append(crdpt)
+        if self.backpressure_en and not self.fifo_avail_crd[level]:
+            parent.set_backpressure(False)
+
+    def set_val(self, val, parent=None):
+        assert not is_stkn(val), 'Values associated with points should not have stop tokens'
+        if val != '' and val is not None:
+            self.in_val.append(val)
+        if self.backpressure_en and not self.fifo_avail_val:
+            parent.set_backpressure(False)
+
+    def out_crd(self, level):
+        if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
+            return self.curr_crd[level]
+
+    def out_val(self):
+        if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
+            return self.curr_val
+
+    def return_hits(self):
+        hits = list(self.hits_tracker.values()) if self.get_stats else []
+        return max(hits, default=0), sum(hit > 1 for hit in hits), len(hits), sum(hits)
+
+    def return_statistics(self):
+        if self.get_stats:
+            hits_info = self.return_hits()
+            stats_dict = {"order": self.order, "max_hits": hits_info[0], "hits_gt_one": hits_info[1],
+                          "total_elems": hits_info[2], "rmw_ops": hits_info[3]}
+            stats_dict.update(super().return_statistics())
+        else:
+            stats_dict = {}
+        return stats_dict
@@ -1,20 +1,76 @@
+import numpy as np
+
 from .base import *
+from .stats import TouchTracker
+from .stream import TokenStream, batch_tokens
+
+
+_TYPE_NAMES = {'i': "integer", 'u': "unsigned integer", 'f': "float"}
+
+
+# NumPy type of element_size bytes for values of kind ('i', 'u' or 'f'), e.g. int16 for the integers of the
+# memory configs (Bytes_per_element: 2)
+def storage_dtype(kind, element_size):
+    try:
+        dtype = np.dtype(kind + str(element_size))
+    except TypeError:
+        dtype = None
+    if dtype is None or dtype.itemsize != element_size:
+        raise ValueError("No " + _TYPE_NAMES[kind] + " type of " + str(element_size) + " bytes (element_size)")
+    return dtype
+
+
+# NumPy storage for an Array: the type follows the values (bool, integer, float, otherwise Python objects), with
+# element_size (bytes, the Bytes_per_element of the memory config) it is the integer or float type of that width.
+# A str is the path of a .npy file that is memory mapped read-only, so simulations of the same data share it
+# through the page cache
+def as_storage(init_arr, element_size=None):
+    if isinstance(init_arr, str):
+        arr = np.load(init_arr, mmap_mode='r')
+    else:
+        arr = np.asarray(init_arr)
+        if arr.dtype.kind not in 'biuf':
+            return np.asarray(init_arr, dtype=object)
+    if element_size is None or arr.dtype.kind == 'b':
+        return arr
+    dtype = storage_dtype(arr.dtype.kind, element_size)
+    if arr.dtype == dtype:
+        return arr
+    if arr.dtype.kind in 'iu' and len(arr) > 0 and \
+            (arr.min() < np.iinfo(dtype).min or arr.max() > np.iinfo(dtype).max):
+        raise ValueError("Values from " + str(arr.min()) + " to " + str(arr.max()) + " don't fit in " +
+                         str(element_size) + "-byte integers (element_size)")
+    with np.errstate(over='ignore'):
+        stored = arr.astype(dtype)
+    if arr.dtype.kind == 'f' and np.any(np.isinf(stored) & np.isfinite(arr)):
+        raise ValueError("Values up to " + str(np.abs(arr).max()) + " overflow " + str(element_size) +
+                         "-byte floats (element_size)")
+    return stored
 
 
 class Array(Primitive):
-    def __init__(self, name="", init_arr=None, size=1024, fill=0, depth=1, fifo=None, **kwargs):
+    __slots__ = ("fill", "element_size", "load_addrs", "store_vals", "load_en", "store_en", "curr_load", "path", "arr",
+                 "size", "data_ready", "depth", "fifo_avail", "valid_loads", "address_seen", "load_addr_size",
+                 "store_vals_size", "reuse_stats")
+
+    # With statistics, reuse_stats also bins the reuse distance of every load (see TouchTracker), which costs a
+    # dict and a Fenwick tree update per access instead of the bitmap alone
+    def __init__(self, name="", init_arr=None, size=1024, fill=0, depth=1, fifo=None, element_size=None,
+                 reuse_stats=False, **kwargs):
         super().__init__(**kwargs)
         self.name = name
+        self.reuse_stats = reuse_stats
         self.fill = fill
+        self.element_size = element_size
         if init_arr is None:
             self.size = size
-            self.arr = [self.fill] * self.size
+            self.arr = as_storage(np.full(self.size, self.fill), element_size)
         else:
-            assert (isinstance(init_arr, list))
-            self.arr = init_arr
-            self.size = len(init_arr)
-        self.load_addrs = []
-        self.store_vals = []
+            assert (isinstance(init_arr, (list, np.ndarray, str)))
+            self.arr = as_storage(init_arr, element_size)
+            self.size = len(self.arr)
+        self.load_addrs = self.new_channel()
+        self.store_vals = self.new_channel()
         self.load_en = False
         self.store_en = False
         if self.backpressure_en:
@@ -25,9 +81,9 @@ class Array(Primitive):
 
         if self.get_stats:
             self.valid_loads = 0
-            self.address_seen = []
-            self.load_addr_size = 0
-            self.store_vals_size = 0
+            self.address_seen = TouchTracker(self.size, reuse=self.reuse_stats)
+            self.load_addr_size = self.max_gauge("fifo_addr")
+            self.store_vals_size = self.max_gauge("fifo_vals")
 
         self.curr_load = ''
         self.path = None
@@ -54,10 +110,10 @@ class Array(Primitive):
         self.path = path
 
     def reintilialize_arrs(self, load_vals, fifo):
-        self.arr = load_vals
+        self.arr = as_storage(load_vals, self.element_size)
         self.set_fifo(fifo)
         self.done = False
-        self.size = len(path[0])
+        self.size = len(self.arr)
 
     def initialize_array(self, path):
         return
@@ -84,7 +140,7 @@ class Array(Primitive):
             self.data_ready = False
         if (self.backpressure_en and self.check_backpressure()) or not self.backpressure_en:
             if self.debug:
-                print("arr", self.name, self.load_addrs, self.done)
+                self.log.debug("arr", self.name, self.load_addrs, self.done)
             if self.done and self.path is not None:
                 self.initialize_array(self.path)
             if self.backpressure_en:
@@ -98,19 +154,57 @@ class Array(Primitive):
                 else:
                     self.load_en = False
                 if self.get_stats:
-                    self.load_addr_size = max(self.load_addr_size, len(self.load_addrs))
-                self.curr_load = self.load(self.load_addrs.pop(0))
+                    self.load_addr_size.update(len(self.load_addrs))
+                self.curr_load = self.load(self.load_addrs.popleft())
                 self.load_en = False
             else:
                 self.curr_load = ''
 
             if self.store_en and len(self.store_vals) > 0:
                 if self.get_stats:
-                    self.store_vals_size = max(self.store_vals_size, len(self.store_vals))
-                store_tup = self.store_vals.pop(0)
+                    self.store_vals_size.update(len(self.store_vals))
+                store_tup = self.store_vals.popleft()
                 self.store(store_tup[0], store_tup[1])
                 self.store_en = False
 
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and len(self.load_addrs) == 0 and \
+            len(self.store_vals) == 0 and self.curr_load == ''
+
+    # Loads only, interleaved stores depend on the cycle they land in. Addresses are gathered with one indexing
+    # operation, stop tokens pass through, 'N' loads 0 and 'D' ends the stream
+    def process_stream(self, in_streams, out_ports=()):
+        if 'set_store' in in_streams or self.path is not None or len(self.load_addrs) > 0:
+            return super().process_stream(in_streams, out_ports)
+        addrs = batch_tokens(in_streams, 'set_load')
+        dtype = self.arr.dtype
+        # Loads give Python values (see load()), only storage types that keep them in an int64 or float64 payload
+        # and 'N' loads (the int 0) in integer arrays are packed
+        packed = addrs is not None and not self.debug and addrs.dtype.kind in 'iu' and \
+            (dtype.kind in 'if' or (dtype.kind == 'u' and dtype.itemsize < 8)) and \
+            (dtype.kind != 'f' or not np.any(addrs.kind == TKN_ZERO))
+        if not packed:
+            vals = [self.load(addr) for addr in batch_stream(in_streams, 'set_load')]
+            return {'out_val': vals, 'out_load': vals}
+
+        data = addrs.kind == TKN_DATA
+        idx = addrs.payload[data]
+        if len(idx) > 0 and idx.max() >= self.size:
+            self.load(int(idx.max()))
+        payload = addrs.payload.astype(np.float64 if dtype.kind == 'f' else np.int64)
+        payload[data] = self.arr[idx]
+        kind = addrs.kind.copy()
+        zeros = kind == TKN_ZERO
+        kind[zeros] = TKN_DATA
+        payload[zeros] = 0
+        if self.get_stats:
+            self.address_seen.touch_all(idx)
+            self.valid_loads += len(idx)
+        if np.any(kind == TKN_DONE):
+            self.done = True
+        vals = TokenStream(kind, payload)
+        return {'out_val': vals, 'out_load': vals}
+
     def fifo_available(self, br=""):
         if self.backpressure_en:
             if len(self.load_addrs) > 1:
@@ -132,9 +226,9 @@ class Array(Primitive):
             pass
             # self.load_en = False
         # print("111111111")
-        if self.backpressure_en:
+        if self.backpressure_en and not self.fifo_avail:
             # print("0000000000000000")
-            parent.set_backpressure(self.fifo_avail)
+            parent.set_backpressure(False)
 
     def set_store(self, addr, vals, parent=None):
         if addr != '' and vals != '' and addr is not None and vals is not None:
@@ -142,11 +236,11 @@ class Array(Primitive):
             self.store_vals.append((addr, vals))
         else:
             self.store_en = False
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def get_arr(self):
-        return self.arr
+        return self.arr[:self.size].tolist()
 
     def out_load(self):
         if (self.backpressure_en and self.data_ready) or not self.backpressure_en:
@@ -171,14 +265,13 @@ class Array(Primitive):
                             str(self.size) + ") bounds, please resize")
         else:
             if self.get_stats:
-                if addr not in self.address_seen:
-                    self.address_seen.append(addr)
+                self.address_seen.touch(addr)
                 self.valid_loads += 1
 
-            val = self.arr[addr]
+            val = self.arr.item(addr)
 
         if self.debug:
-            print("DEBUG: ARRAY LD:", self.name, "\t Addr:", addr, "\t Val:", val)
+            self.log.debug("DEBUG: ARRAY LD:", self.name, "\t Addr:", addr, "\t Val:", val)
 
         return val
 
@@ -193,42 +286,75 @@ class Array(Primitive):
             self.done = True
             return
         elif addr >= self.size:
-            self.resize(addr * 2)
-            print(addr, self.size)
-            print("0000000000000")
-            self.arr[addr] = val
-            # raise Exception("Address (" + str(addr) + ") is out of array size (" +
-            #                 str(self.size) + ") bounds, please resize")
+            self.resize(max(addr * 2, addr + 1))
+            self._set(addr, val)
         else:
-            self.arr[addr] = val
+            self._set(addr, val)
 
         if self.debug:
-            print("DEBUG: ARRAY ST:", self.name, "\t Addr:", addr, "\t Val:", val)
+            self.log.debug("DEBUG: ARRAY ST:", self.name, "\t Addr:", addr, "\t Val:", val)
 
     def reinit(self, init_arr):
-        self.arr = init_arr
+        self.arr = as_storage(init_arr, self.element_size)
+        self.size = len(self.arr)
+
+    # The storage is a copy-free view while it is only read (e.g. a memory-mapped file), it is copied on the
+    # first write and widened to float (of element_size bytes if set) when a float lands in an integer array
+    def _writable(self, val=None):
+        if isinstance(val, (float, np.floating)) and self.arr.dtype.kind in 'biu':
+            self.arr = self.arr.astype(np.float64 if self.element_size is None else
+                                       storage_dtype('f', self.element_size))
+        elif not self.arr.flags.writeable:
+            self.arr = np.array(self.arr)
+
+    # Integers past the range of the storage (e.g. wide bit vectors) switch it to Python objects, unless the
+    # width is set by element_size
+    def _set(self, addr, val):
+        self._writable(val)
+        try:
+            with np.errstate(over='ignore'):
+                self.arr[addr] = val
+        except OverflowError:
+            if self.element_size is not None:
+                self._overflow(val)
+            self.arr = self.arr.astype(object)
+            self.arr[addr] = val
+        if self.element_size is not None and self.arr.dtype.kind == 'f' and np.isinf(self.arr[addr]) and \
+                not np.isinf(val):
+            self._overflow(val)
 
+    def _overflow(self, val):
+        raise ValueError("Value " + str(val) + " doesn't fit in the " + str(self.arr.dtype) + " storage of " +
+                         self.stats_name() + " (element_size)")
+
+    # The size is the number of addressable elements, the storage grows geometrically past it
     def resize(self, size):
-        if self.size > size:
-            self.arr = self.arr[:size]
-        else:
-            self.arr = self.arr + [self.fill] * (size - self.size)
+        if size > len(self.arr):
+            arr = np.empty(max(size, 2 * len(self.arr)), dtype=self.arr.dtype)
+            arr[:self.size] = self.arr[:self.size]
+            self.arr = arr
+        if size > self.size:
+            self._writable(self.fill)
+            self.arr[self.size:size] = self.fill
         self.size = size
 
     def clear(self, fill=None):
         if fill is None:
             fill = self.fill
-        self.arr = [fill for _ in range(self.size)]
+        self._writable(fill)
+        self.arr[:self.size] = fill
 
     def return_statistics(self):
         if self.get_stats:
-            stats_dict = {"array_size": self.size, "fifo_addr": self.load_addr_size, "fifo_vals": self.store_vals_size,
-                          "elements_touched": len(self.address_seen), "valid_loads": self.valid_loads}
+            stats_dict = {"array_size": self.size, "elements_touched": len(self.address_seen),
+                          "valid_loads": self.valid_loads}
+            if self.reuse_stats:
+                stats_dict["reuse_distance"] = self.address_seen.reuse_histogram()
             stats_dict.update(super().return_statistics())
         else:
             stats_dict = {}
         return stats_dict
 
     def print_fifos(self):
-        print("Arrayvals fifo addresses: ", self.load_addr_size)
-        print("Arrayvals fifo vals: ", self.store_vals_size)
+        print("Arrayvals fifo addresses: ", self.load_addr_size.value)
+        print("Arrayvals fifo vals: ", self.store_vals_size.value)
@@ -1,4 +1,9 @@
 from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from .channel import Channel, TrackedChannel, new_channel, as_channel
+from .stats import StatsRegistry, NULL_METRIC
+from .simlog import get_logger, DEBUG
 
 
 def gen_stkns(dim=10):
@@ -8,25 +13,39 @@ def gen_stkns(dim=10):
 valid_tkns = ['', 'D', 'N']
 valid_tkns += gen_stkns()
 
+# Stop token order cache ('S<k>' -> k). Stop tokens are looked up instead of parsed, and any order is
+# allowed (the first use of a new order parses and adds it)
+_stkn_orders = {stkn: i for i, stkn in enumerate(gen_stkns())}
+
+
+def _parse_stkn(elem):
+    if len(elem) > 1 and elem[0] == 'S' and elem[1:].isdecimal():
+        order = int(elem[1:])
+        _stkn_orders[elem] = order
+        return order
+    return None
+
 
-def is_valid_crd(elem, dim=10):
-    valid_tkns = ['', 'D'] + gen_stkns(dim)
-    return isinstance(elem, int) or elem in valid_tkns
+def is_valid_tkn(elem, dim=None):
+    return elem == '' or elem == 'D' or elem == 'N' or (is_stkn(elem) and (dim is None or stkn_order(elem) < dim))
 
 
-def is_valid_ref(elem, dim=10):
-    valid_tkns = ['', 'D', 'N'] + gen_stkns(dim)
-    return isinstance(elem, int) or elem in valid_tkns
+def is_valid_crd(elem, dim=None):
+    return isinstance(elem, int) or elem == '' or elem == 'D' or \
+        (is_stkn(elem) and (dim is None or stkn_order(elem) < dim))
+
+
+def is_valid_ref(elem, dim=None):
+    return isinstance(elem, int) or is_valid_tkn(elem, dim)
 
 
 def is_valid_crdpt(elem):
-    valid_tkns = ['', 'D']
-    return isinstance(elem, int) or elem in valid_tkns
+    return isinstance(elem, int) or elem == '' or elem == 'D'
 
 
-def is_valid_val(elem, dim=10):
-    valid_tkns = ['', 'D'] + gen_stkns(dim)
-    return isinstance(elem, int) or isinstance(elem, float) or elem in valid_tkns
+def is_valid_val(elem, dim=None):
+    return isinstance(elem, int) or isinstance(elem, float) or elem == '' or elem == 'D' or \
+        (is_stkn(elem) and (dim is None or stkn_order(elem) < dim))
 
 
 def is_0tkn(elem):
@@ -35,13 +54,16 @@ def is_0tkn(elem):
 
 def is_stkn(elem):
     if isinstance(elem, str):
-        return elem.startswith('S') and (len(elem) == 2)
+        return elem in _stkn_orders or _parse_stkn(elem) is not None
     return False
 
 
 def stkn_order(elem):
-    assert is_stkn(elem)
-    return int(elem[1])
+    order = _stkn_orders.get(elem) if isinstance(elem, str) else None
+    if order is None:
+        assert is_stkn(elem)
+        order = _stkn_orders[elem]
+    return order
 
 
 def increment_stkn(elem):
@@ -51,9 +73,10 @@ def increment_stkn(elem):
 
 
 def decrement_stkn(elem):
-    assert (stkn_order(elem) >= 0)
-    if stkn_order(elem) > 0:
-        return 'S' + str(stkn_order(elem) - 1)
+    order = stkn_order(elem)
+    assert (order >= 0)
+    if order > 0:
+        return 'S' + str(order - 1)
     else:
         return ''
 
@@ -66,8 +89,51 @@ def larger_stkn(a, b):
     return a if stkn_order(a) > stkn_order(b) else b
 
 
+# ----------- Integer token encoding ------------------
+# Compact encoding of tokens as (kind, payload) pairs, where payload is the data value for TKN_DATA and the stop
+# token order for TKN_STOP. It backs the packed TokenStream (see stream.py) that batch mode works on, the cycle
+# mode primitives keep the string tokens above.
+TKN_DATA = 0
+TKN_EMPTY = 1
+TKN_DONE = 2
+TKN_ZERO = 3
+TKN_STOP = 4
+
+_tkn_kinds = {'': TKN_EMPTY, 'D': TKN_DONE, 'N': TKN_ZERO}
+
+
+def encode_tkn(elem):
+    if isinstance(elem, str):
+        kind = _tkn_kinds.get(elem)
+        if kind is not None:
+            return kind, 0
+        if not is_stkn(elem):
+            raise ValueError("Not a token: " + repr(elem))
+        return TKN_STOP, stkn_order(elem)
+    return TKN_DATA, elem
+
+
+def decode_tkn(kind, payload=0):
+    if kind == TKN_DATA:
+        return payload
+    elif kind == TKN_STOP:
+        return 'S' + str(payload)
+    elif kind == TKN_EMPTY:
+        return ''
+    elif kind == TKN_DONE:
+        return 'D'
+    elif kind == TKN_ZERO:
+        return 'N'
+    raise ValueError("Unknown token kind " + str(kind))
+
+
 class Primitive(ABC):
-    def __init__(self, debug=False, statistics=False, name="", back_en=False, **kwargs):
+    # Blocks keep their state in slots (faster attribute access and no per-instance dict), every subclass
+    # declares the attributes it adds. Subclasses without __slots__ (e.g. in tests) get a dict as usual
+    __slots__ = ("name", "done", "debug", "done_cycles", "start_cycle", "total_cycles", "block_start", "get_stats",
+                 "stats_registry", "backpressure_en", "ready_backpressure", "log")
+
+    def __init__(self, debug=False, statistics=False, name="", back_en=False, stats_registry=None, **kwargs):
         self.name = name
         self.done = False
         self.debug = debug
@@ -76,8 +142,14 @@ class Primitive(ABC):
         self.total_cycles = 0
         self.block_start = True
         self.get_stats = statistics
+        # Counters, max-gauges and histograms of this block (see stats.StatsRegistry), no-ops without statistics
+        self.stats_registry = None
+        if statistics:
+            self.stats_registry = StatsRegistry() if stats_registry is None else stats_registry
 
         self.backpressure_en = back_en
+        # Debug messages go through the block logger (see simlog), blocks built with debug log at DEBUG level
+        self.log = get_logger(self.stats_name(), DEBUG if debug else None)
 
     def out_done(self):
         return self.done
@@ -105,13 +177,154 @@ class Primitive(ABC):
         if not self.block_start and self.start_cycle == '':
             self.start_cycle = self.total_cycles
 
+    # Idle blocks can be skipped by the scheduler (see graph.py). A block is idle when calling update() without
+    # new inputs would only do the update_done() bookkeeping: no pending inputs or internal state and all outputs ''
+    def is_idle(self):
+        return False
+
+    # Bookkeeping of update_done() for cycles where update() was skipped
+    def add_idle_cycles(self, cycles):
+        if cycles <= 0:
+            return
+        if not self.block_start and self.start_cycle == '':
+            self.start_cycle = self.total_cycles + 1
+        self.total_cycles += cycles
+        if not self.done:
+            self.done_cycles += cycles
+
+    # Credit-based flow control (back_en): each input FIFO grants its producer credit for depth tokens. The
+    # consumer refreshes its fifo_avail flags once per cycle in update_ready() and only signals a producer, with
+    # set_backpressure(False), while the FIFO it feeds is out of credit. The producer then stalls in its next
+    # update (check_backpressure()). Nothing is signalled while credit is left.
+    def set_backpressure(self, backpressure):
+        if not backpressure:
+            self.ready_backpressure = False
+
+    # Input FIFO for a set_* port. With statistics on it records its occupancy, see channel_statistics()
+    def new_channel(self):
+        return new_channel(self.get_stats)
+
+    def channel_statistics(self):
+        fifos = dict()
+        for name in _state_names(type(self)):
+            fifo = getattr(self, name, None)
+            if isinstance(fifo, TrackedChannel):
+                fifos[name] = fifo.occupancy()
+        for name, fifo in getattr(self, "__dict__", {}).items():
+            if isinstance(fifo, TrackedChannel):
+                fifos[name] = fifo.occupancy()
+        return fifos
+
+    # Untimed batch mode: consume complete input streams and return complete output streams.
+    # in_streams maps a set_* port to its token stream, a list or a TokenStream (see stream.py), and a tuple of
+    # streams for ports that take several (e.g. Intersect2.set_in1(ref, crd)). The result maps out_* ports to
+    # their streams with '' and None removed. This default feeds one token per port per cycle and runs update()
+    # until the block is idle, or done and quiet. Blocks that restart after a done token (e.g. the sparse
+    # accumulators) clear done again, they are finished once they have emitted a 'D' for every 'D' of the
+    # longest input, or once nothing moves after a 'D': no token emitted and no token taken from its FIFOs (see
+    # queued_tokens()) for more cycles than the whole input. SparseAccumulator2 stops that way, it merges the
+    # rounds into one and leaves the last 'D' in its value FIFO. That stop is a bound, not an end of stream: a
+    # block that waits longer with nothing moving and then emits again (none of the primitives here, e.g. a
+    # modelled latency longer than the input) would be cut short. test_process_stream.py checks the streams
+    # against SimGraph runs. Blocks override it with whole-stream versions that give the same streams
+    def process_stream(self, in_streams, out_ports=()):
+        feeds = []
+        rounds = 1
+        num_tkns = 0
+        for port, streams in in_streams.items():
+            streams = [list(stream) for stream in (streams if isinstance(streams, tuple) else (streams,))]
+            rounds = max([rounds] + [stream.count('D') for stream in streams])
+            num_tkns += sum(len(stream) for stream in streams)
+            feeds.append((getattr(self, port), [iter(stream) for stream in streams]))
+        getters = [(port, getattr(self, port)) for port in out_ports]
+        out = {port: [] for port in out_ports}
+        done_tkns = {port: 0 for port in out_ports}
+        finished = False
+        quiet = 0
+        queued = queued_tokens(self)
+
+        while True:
+            pending = False
+            for setter, streams in feeds:
+                tkns = [next(stream, '') for stream in streams]
+                pending = pending or any(tkn != '' for tkn in tkns)
+                setter(*tkns)
+            self.update()
+            emitted = False
+            for port, get in getters:
+                tkn = get()
+                if tkn != '' and tkn is not None:
+                    out[port].append(tkn)
+                    emitted = True
+                    if tkn == 'D':
+                        done_tkns[port] += 1
+            finished = finished or self.out_done()
+            if pending:
+                continue
+            if self.is_idle():
+                return out
+            last_queued, queued = queued, queued_tokens(self)
+            quiet = 0 if emitted or queued != last_queued else quiet + 1
+            if not emitted and (self.out_done() or
+                                (finished and (max(done_tkns.values(), default=rounds) >= rounds or quiet > num_tkns))):
+                return out
+
     def return_statistics(self):
-        return {"done_cycles": self.done_cycles, "start_cycle": self.start_cycle, "total_cycle": self.total_cycles}
+        stats_dict = {"done_cycles": self.done_cycles, "start_cycle": self.start_cycle, "total_cycle": self.total_cycles}
+        if self.stats_registry is not None:
+            stats_dict.update(self.stats_registry.block_metrics(self.stats_name()))
+        return stats_dict
+
+    def stats_name(self):
+        return self.name if self.name != "" else type(self).__name__
+
+    def counter(self, name):
+        return NULL_METRIC if self.stats_registry is None else self.stats_registry.counter(self.stats_name(), name)
+
+    def max_gauge(self, name):
+        return NULL_METRIC if self.stats_registry is None else self.stats_registry.max_gauge(self.stats_name(), name)
+
+    def histogram(self, name, edges):
+        if self.stats_registry is None:
+            return NULL_METRIC
+        return self.stats_registry.histogram(self.stats_name(), name, edges)
 
     def return_statistics_base(self):
         return {"done_cycles": self.done_cycles, "start_cycle": self.start_cycle, "total_cycle": self.total_cycles}
 
 
+# Instance attribute names declared in the __slots__ of cls and its bases, in declaration order
+@lru_cache(maxsize=None)
+def _state_names(cls):
+    names = []
+    for owner in reversed(cls.__mro__):
+        names += [name for name in vars(owner).get("__slots__", ()) if name not in names]
+    return names
+
+
+# Tokens waiting in the FIFOs of a block and of the blocks it is built from (e.g. the point accumulator and
+# converter of a SparseAccumulator2)
+def queued_tokens(blk):
+    count = 0
+    for name in _state_names(type(blk)):
+        attr = getattr(blk, name, None)
+        if isinstance(attr, Channel):
+            count += len(attr)
+        elif isinstance(attr, Primitive):
+            count += queued_tokens(attr)
+    return count
+
+
+# Input stream of a set_* port in batch mode, without the '' and None tokens that the setter drops. Ports that
+# take several tokens give a tuple of aligned streams and drop a position if any of its tokens is empty
+def batch_stream(in_streams, port):
+    stream = in_streams.get(port, [])
+    if isinstance(stream, tuple):
+        tkns = [tkn for tkn in zip(*stream) if all(x != '' and x is not None for x in tkn)]
+        return tuple([tkn[k] for tkn in tkns] for k in range(len(stream)))
+    return [x for x in stream if x != '' and x is not None]
+
+
 def remove_emptystr(stream):
     return [x for x in stream if x != '']
 
@@ -8,6 +8,9 @@ from functools import reduce
 
 # Compresses entire fiber with splitting of Bitvectors into "width" widths
 class ChunkBV(Primitive):
+    __slots__ = ("meta_width", "meta_size", "curr_in_bv", "curr_bv", "curr_ref", "ref_sum", "in_bv", "emit_chunk",
+                 "count", "data_valid", "depth", "fifo_avail")
+
     def __init__(self, width=4, size=16, depth=4, **kwargs):
         super().__init__(**kwargs)
 
@@ -18,7 +21,7 @@ class ChunkBV(Primitive):
         self.curr_ref = ''
         self.ref_sum = 0
 
-        self.in_bv = []
+        self.in_bv = self.new_channel()
         self.emit_chunk = False
         self.count = 0
         if self.backpressure_en:
@@ -69,7 +72,7 @@ class ChunkBV(Primitive):
                 self.ref_sum += popcount(self.curr_bv)
 
             elif len(self.in_bv) > 0:
-                self.curr_in_bv = self.in_bv.pop(0)
+                self.curr_in_bv = self.in_bv.popleft()
                 if isinstance(self.curr_in_bv, int):
 
                     mask = (1 << self.meta_width) - 1
@@ -93,14 +96,14 @@ class ChunkBV(Primitive):
                 self.curr_ref = ''
 
             if self.debug:
-                print("Curr OutBV:", self.curr_bv, "\tCurr InBV:", self.curr_in_bv, "\tCount:", self.count,
-                      "\t EmitChunk:", self.emit_chunk)
+                self.log.debug("Curr OutBV:", self.curr_bv, "\tCurr InBV:", self.curr_in_bv, "\tCount:", self.count,
+                               "\t EmitChunk:", self.emit_chunk)
 
     def set_in_bv(self, bv, parent=None):
         if bv != '' and bv is not None:
             self.in_bv.append(bv)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def out_bv_int(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -118,10 +121,12 @@ class ChunkBV(Primitive):
 
 # Always compresses entire fiber with no splitting
 class BV(Primitive):
+    __slots__ = ("in_crd", "crds", "curr_bv", "stkn", "emit_stkn", "data_valid", "depth", "fifo_avail")
+
     def __init__(self, depth=4, **kwargs):
         super().__init__(**kwargs)
 
-        self.in_crd = []
+        self.in_crd = self.new_channel()
         self.crds = []
         self.curr_bv = None
 
@@ -168,7 +173,7 @@ class BV(Primitive):
                 self.curr_bv = self.stkn
                 self.emit_stkn = False
             elif len(self.in_crd) > 0:
-                in_crd = self.in_crd.pop(0)
+                in_crd = self.in_crd.popleft()
                 if isinstance(in_crd, int):
                     self.curr_bv = ''
                     self.crds.append(in_crd)
@@ -186,8 +191,8 @@ class BV(Primitive):
     def set_in_crd(self, crd, parent=None):
         if crd != '' and crd is not None:
             self.in_crd.append(crd)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def out_bv_int(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -200,11 +205,13 @@ class BV(Primitive):
 
 
 class BVDropSuper(Primitive, ABC):
+    __slots__ = ("outer_bv", "inner_bv", "curr_obv", "data_valid", "depth", "fifo_avail_outer", "fifo_avail_inner")
+
     def __init__(self, depth=4, **kwargs):
         super().__init__(**kwargs)
 
-        self.outer_bv = []
-        self.inner_bv = []
+        self.outer_bv = self.new_channel()
+        self.inner_bv = self.new_channel()
 
         self.curr_obv = ''
         if self.backpressure_en:
@@ -239,14 +246,14 @@ class BVDropSuper(Primitive, ABC):
     def set_outer_bv(self, bv, parent=None):
         if bv != '' and bv is not None:
             self.outer_bv.append(bv)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_outer)
+        if self.backpressure_en and not self.fifo_avail_outer:
+            parent.set_backpressure(False)
 
     def set_inner_bv(self, bv, parent=None):
         if bv != '' and bv is not None:
             self.inner_bv.append(bv)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_inner)
+        if self.backpressure_en and not self.fifo_avail_inner:
+            parent.set_backpressure(False)
 
     def out_bv_outer(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -254,6 +261,8 @@ class BVDropSuper(Primitive, ABC):
 
 
 class BVDropOnly(BVDropSuper):
+    __slots__ = ("get_ibv_count", "running_obv", "orig_obv", "curr_ibv", "has_bv", "get_next_ibv", "get_next_obv")
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -282,15 +291,15 @@ class BVDropOnly(BVDropSuper):
 
             ibv = ""
             if self.debug:
-                print("Outer BV:", self.outer_bv)
-                print("Inner BV:", self.inner_bv)
+                self.log.debug("Outer BV:", self.outer_bv)
+                self.log.debug("Inner BV:", self.inner_bv)
 
             if self.done:
                 self.curr_obv = ''
                 return
 
             if len(self.outer_bv) > 0 and self.get_next_obv:
-                obv = self.outer_bv.pop(0)
+                obv = self.outer_bv.popleft()
                 if isinstance(obv, int):
                     self.running_obv = obv
                     self.orig_obv = self.running_obv
@@ -311,10 +320,10 @@ class BVDropOnly(BVDropSuper):
                 self.curr_obv = ''
 
             if self.debug:
-                print("\t before getting ibv: GetNext InnerBV:", self.get_next_ibv)
+                self.log.debug("\t before getting ibv: GetNext InnerBV:", self.get_next_ibv)
 
             if len(self.inner_bv) > 0 and self.get_next_ibv:
-                ibv = self.inner_bv.pop(0)
+                ibv = self.inner_bv.popleft()
                 if isinstance(ibv, int):
                     self.has_bv = True
                     self.curr_obv = ''
@@ -351,12 +360,15 @@ class BVDropOnly(BVDropSuper):
                 self.curr_ibv = ''
 
             if self.debug:
-                print("DEBUG: BVDROP: Curr OuterBV:", self.running_obv, "Orig OuterBV:", self.orig_obv,
-                      "\n Curr Output BV:", self.curr_obv, "\t GetNext OuterBV:", self.get_next_obv,
-                      "\n HasBV", self.has_bv, "\t BitCount", self.get_ibv_count, "\t GetNext InnerBV:", self.get_next_ibv)
+                self.log.debug("DEBUG: BVDROP: Curr OuterBV:", self.running_obv, "Orig OuterBV:", self.orig_obv,
+                               "\n Curr Output BV:", self.curr_obv, "\t GetNext OuterBV:", self.get_next_obv,
+                               "\n HasBV", self.has_bv, "\t BitCount", self.get_ibv_count, "\t GetNext InnerBV:",
+                               self.get_next_ibv)
 
 
 class BVDrop(BVDropSuper):
+    __slots__ = ("bv_drop", "outer_stkn_drop", "inner_stkn_drop", "curr_ibv")
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -378,10 +390,10 @@ class BVDrop(BVDropSuper):
                 self.block_start = False
 
             if len(self.outer_bv) > 0:
-                self.bv_drop.set_outer_bv(self.outer_bv.pop(0))
+                self.bv_drop.set_outer_bv(self.outer_bv.popleft())
 
             if len(self.inner_bv) > 0:
-                ibv = self.inner_bv.pop(0)
+                ibv = self.inner_bv.popleft()
                 self.bv_drop.set_inner_bv(ibv)
                 self.inner_stkn_drop.set_in_stream(ibv)
 
@@ -1,4 +1,58 @@
 import numpy as np
+from collections import deque
+from itertools import islice
+
+from .simlog import get_logger, DEBUG
+
+
+class Channel(deque):
+    """FIFO between blocks: append() to push, popleft() to pop, both O(1)."""
+
+    __slots__ = ()
+
+    def occupancy(self):
+        return {}
+
+
+class TrackedChannel(Channel):
+    """Channel that records the occupancy reached on every push (high-water mark and histogram)."""
+
+    __slots__ = ("high_water", "histogram")
+
+    def __init__(self, iterable=()):
+        super().__init__(iterable)
+        self.high_water = len(self)
+        self.histogram = {}
+
+    def _record(self):
+        n = len(self)
+        if n > self.high_water:
+            self.high_water = n
+        self.histogram[n] = self.histogram.get(n, 0) + 1
+
+    def append(self, item):
+        super().append(item)
+        self._record()
+
+    def appendleft(self, item):
+        super().appendleft(item)
+        self._record()
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def occupancy(self):
+        return {"high_water": self.high_water, "histogram": dict(sorted(self.histogram.items()))}
+
+
+def new_channel(track=False):
+    return TrackedChannel() if track else Channel()
+
+
+# FIFOs handed over from another block are reused as is, plain lists are copied into a Channel
+def as_channel(fifo):
+    return fifo if isinstance(fifo, Channel) else Channel(fifo)
 
 
 def hash_tile(tile_id):
@@ -33,15 +87,16 @@ class output_memory_block():
                  size=1000 * 2, debug=False, latency=2, bandwidth=2, length=1,
                  mode="all_unpacked", loop_order=[2, 2, 2]):
         self.name = name
+        self.log = get_logger(name, DEBUG if debug else None)
         self.level = level
         self.size = size // 2
         self.bandwidth = bandwidth
         self.latency = latency
         self.element_size = element_size
         self.length = length
-        self.tile_ptrs_glb = []
-        self.tile_ptrs_fifo = []  # virtual
-        self.tile_ptrs_size = []
+        self.tile_ptrs_glb = Channel()
+        self.tile_ptrs_fifo = Channel()  # virtual
+        self.tile_ptrs_size = Channel()
         self.mode = mode
         self.timestamp = None
         self.ready = True
@@ -67,7 +122,7 @@ class output_memory_block():
 
     def final_done(self):
         if self.debug:
-            print(self.level, " done check-- ", self.curr_tile, " ", self.loop_order)
+            self.log.debug(self.level, " done check-- ", self.curr_tile, " ", self.loop_order)
         if self.level == "mem2glb" and self.done:
             if get_mem_tile_id(self.curr_tile) == self.loop_order:
                 return True
@@ -114,12 +169,12 @@ class output_memory_block():
             elif self.mode == "all_unpacked":
                 max_levels_size = np.sum(np.asarray(size_levels)) + size_vals
             else:
-                print(self.mode + " not found")
+                self.log.error(self.mode + " not found")
                 assert False
             self.tile_ptrs_size.append(max_levels_size)
             tile_hash, tile_glb = hash_tile(tilecoord)
             if self.debug:
-                print("Tile pointer vales = ", tile_hash, " ", tile_glb)
+                self.log.debug("Tile pointer vales = ", tile_hash, " ", tile_glb)
             # tilecoord
             self.tile_ptrs_fifo.append(tile_hash)
 
@@ -134,8 +189,8 @@ class output_memory_block():
             if self.ready and len(self.tile_ptrs_fifo) > 0:
                 if self.curr_tile is not None:
                     self.old_tile = self.curr_tile
-                self.curr_tile = self.tile_ptrs_fifo.pop(0)
-                self.curr_size = self.tile_ptrs_size.pop(0)
+                self.curr_tile = self.tile_ptrs_fifo.popleft()
+                self.curr_size = self.tile_ptrs_size.popleft()
                 self.loading = True
                 self.ready = False
                 self.done = False
@@ -156,13 +211,13 @@ class output_memory_block():
                 self.done = False
                 self.timestamp = cyclenum
             elif self.ready and len(self.tile_ptrs_fifo) > 0 and (self.curr_tile is None or self.done):
-                self.curr_tile = self.tile_ptrs_fifo.pop(0)
+                self.curr_tile = self.tile_ptrs_fifo.popleft()
                 self.done = False
                 self.ready = True
             elif self.ready and len(self.tile_ptrs_fifo) > 0 and \
                     (get_glb_tile_id(self.curr_tile) == get_glb_tile_id(self.tile_ptrs_fifo[0])):
-                self.curr_tile = self.tile_ptrs_fifo.pop(0)
-                self.curr_size += self.tile_ptrs_size.pop(0)
+                self.curr_tile = self.tile_ptrs_fifo.popleft()
+                self.curr_size += self.tile_ptrs_size.popleft()
                 self.done = False
                 self.ready = True
             elif self.ready and len(self.tile_ptrs_fifo) > 0 and self.curr_tile is not None \
@@ -180,13 +235,13 @@ class output_memory_block():
                     self.curr_tile = self.tile_ptrs_fifo[0]
         if self.debug:
             if self.loading:
-                print(self.level, " loads stuff : ", self.curr_tile, " ", get_glb_tile_id(self.curr_tile),
-                      self.curr_tile // (10000 ** 3), get_mem_tile_id(self.curr_tile))
-            print("Output ", self.level, " valid: ", self.valid, " ready: ", self.ready, " loading: ",
-                  self.loading, " done: ", self.done, " curr tile: ", self.curr_tile, " Done ",
-                  self.done, " valid processed: ", self.valid_processed, " Child ready ",
-                  self.child_ready, " , ", self.curr_size,
-                  "       ", self.tile_ptrs_fifo)
+                self.log.debug(self.level, " loads stuff : ", self.curr_tile, " ", get_glb_tile_id(self.curr_tile),
+                               self.curr_tile // (10000 ** 3), get_mem_tile_id(self.curr_tile))
+            self.log.debug("Output ", self.level, " valid: ", self.valid, " ready: ", self.ready, " loading: ",
+                           self.loading, " done: ", self.done, " curr tile: ", self.curr_tile, " Done ",
+                           self.done, " valid processed: ", self.valid_processed, " Child ready ",
+                           self.child_ready, " , ", self.curr_size,
+                           "       ", self.tile_ptrs_fifo)
 
     def set_child_ready(self, token):
         self.child_ready = token
@@ -208,7 +263,7 @@ class output_memory_block():
         if self.mode == "all_unpacked":
             return self.latency + (self.curr_size * self.element_size) // (self.bandwidth)
         else:
-            print(self.mode, " not found")
+            self.log.error(self.mode, " not found")
             assert False
 
     def input_token(self):
@@ -224,6 +279,7 @@ class memory_block():
                  size=1000 * 2, nbuffer=False, latency=10, debug=False, bandwidth=2,
                  length=1, mode="all_unpacked", pipeline_en=False, statistics=False):
         self.name = name
+        self.log = get_logger(name, DEBUG if debug else None)
         self.skip_blocks = skip_blocks
         self.level = level
         self.size = size // element_size
@@ -231,10 +287,10 @@ class memory_block():
         self.element_size = element_size
         self.bandwidth = bandwidth
         self.length = length
-        self.tile_ptrs = []
+        self.tile_ptrs = new_channel(statistics)
         self.nbuffer = nbuffer
-        self.tile_ptrs_fifo = []  # virtual
-        self.tile_ptrs_size = []
+        self.tile_ptrs_fifo = new_channel(statistics)  # virtual
+        self.tile_ptrs_size = new_channel(statistics)
         self.mode = mode
         self.timestamp = None
         self.ready = True
@@ -260,14 +316,14 @@ class memory_block():
             self.curr_tile = None
             self.next_tile = None
             self.curr_size = 0
-            self.tile_ptrs = []
+            self.tile_ptrs = new_channel(statistics)
             self.repeat_pattern = []
-            self.tile_sizes = []
+            self.tile_sizes = new_channel(statistics)
             self.timestamp = None
             self.loading = False
             self.done_in = False
             self.remove_size = 0
-            self.if_latency_ = []
+            self.if_latency_ = new_channel(statistics)
             self.if_latency = True
             self.pipeline_en = pipeline_en
         self.get_stats = statistics
@@ -341,7 +397,8 @@ class memory_block():
                           self.name + "_ready_cycles": self.not_ready_cycles,
                           self.name + "_max_tile_nums": self.num_tiles, self.name + "_repeat_dist": self.repeat_dist,
                           self.name + "_load_not_valid": self.load_not_valid,
-                          self.name + "_not_load_valid": self.not_load_valid}
+                          self.name + "_not_load_valid": self.not_load_valid,
+                          self.name + "_max_tile_ptrs_fifo": self.tile_ptrs_fifo.high_water}
         else:
             stats_dict = {}
         return stats_dict
@@ -412,11 +469,12 @@ class memory_block():
         return
 
     def print_debug(self):
-        print("evit case", self.done_in, self.curr_size, self.load_size, self.remove_size, ":",
-              self.size, self.name, " valid: ", self.valid, " ready: ", self.ready, " loading: ",
-              self.loading, " done: ", self.done, " downstream token: ", self.downstream_token,
-              " Done received and processed ", self.done_received, " ", self.done_processed, " : current tile: ",
-              self.curr_tile, " full tles ", self.tile_ptrs, self.loading_tile, self.tile_ptrs_fifo, " ", self.tile_sizes)
+        self.log.debug("evit case", self.done_in, self.curr_size, self.load_size, self.remove_size, ":",
+                       self.size, self.name, " valid: ", self.valid, " ready: ", self.ready, " loading: ",
+                       self.loading, " done: ", self.done, " downstream token: ", self.downstream_token,
+                       " Done received and processed ", self.done_received, " ", self.done_processed,
+                       " : current tile: ", self.curr_tile, " full tles ", self.tile_ptrs, self.loading_tile,
+                       self.tile_ptrs_fifo, " ", self.tile_sizes)
 
     def return_next(self, ref_to_crd_map=None):
         if self.nbuffer:
@@ -449,30 +507,30 @@ class memory_block():
                 self.outputed = False
                 self.done_processed = True
                 self.valid = False
-                tile = self.tile_ptrs.pop(0)
+                tile = self.tile_ptrs.popleft()
                 if len(self.tile_ptrs) == 0:
                     self.old_tile = None  # tile
                 else:
                     self.old_tile = None
 
                 if self.tile_sizes[0] > 0:
-                    self.remove_size = self.tile_sizes.pop(0)
+                    self.remove_size = self.tile_sizes.popleft()
                 else:
-                    self.tile_sizes.pop(0)
+                    self.tile_sizes.popleft()
 
                 if len(self.tile_ptrs) > 0:
                     if tile != self.tile_ptrs[0]:
                         self.curr_size -= self.remove_size
                         if self.curr_size != self.load_size + sum(self.tile_sizes) + 0:
-                            print(self.curr_size + self.remove_size, self.load_size, self.tile_sizes,
-                                  self.remove_size, "::", self.tile_ptrs, self.curr_tile, self.tile_ptrs_fifo)
+                            self.log.error(self.curr_size + self.remove_size, self.load_size, self.tile_sizes,
+                                           self.remove_size, "::", self.tile_ptrs, self.curr_tile, self.tile_ptrs_fifo)
                             assert False
                         self.remove_size = 0
                 else:
                     self.curr_size -= self.remove_size
                     if self.curr_size != self.load_size + sum(self.tile_sizes) + 0:
-                        print(self.curr_size + self.remove_size, self.load_size, self.tile_sizes,
-                              self.remove_size, "::", self.tile_ptrs, self.curr_tile, self.tile_ptrs_fifo)
+                        self.log.error(self.curr_size + self.remove_size, self.load_size, self.tile_sizes,
+                                       self.remove_size, "::", self.tile_ptrs, self.curr_tile, self.tile_ptrs_fifo)
                         assert False
                     self.remove_size = 0
 
@@ -497,15 +555,16 @@ class memory_block():
                     self.done_received = False
                     self.done_processed = False
                     if self.debug:
-                        print("Done case:: ", self.name, " valid: ", self.valid, " ready: ", self.ready,
-                              " loading: ", self.loading, " done: ", self.done, " downstream token: ", self.downstream_token,
-                              " Done received and processed ", self.done_received, " ", self.done_processed,
-                              " : current tile: ", self.curr_tile, " full tles ", self.tile_ptrs)
+                        self.log.debug("Done case:: ", self.name, " valid: ", self.valid, " ready: ", self.ready,
+                                       " loading: ", self.loading, " done: ", self.done, " downstream token: ",
+                                       self.downstream_token,
+                                       " Done received and processed ", self.done_received, " ", self.done_processed,
+                                       " : current tile: ", self.curr_tile, " full tles ", self.tile_ptrs)
                 elif self.curr_tile == "D":
                     while len(self.tile_ptrs) > 0 and self.tile_ptrs[0] == "D":
-                        self.tile_ptrs.pop(0)
+                        self.tile_ptrs.popleft()
                         # print("REMOVE DONE ", self.name, self.tile_ptrs_fifo, " ", self.ready)
-                        assert self.tile_sizes.pop(0) == 0
+                        assert self.tile_sizes.popleft() == 0
                         if len(self.tile_ptrs) > 0:
                             self.curr_tile = self.tile_ptrs[0]
                     if len(self.tile_ptrs) == 0:
@@ -532,14 +591,15 @@ class memory_block():
                 self.done_received = False
                 self.done_processed = False
                 if self.debug:
-                    print("Done case:: ", self.name, " valid: ", self.valid, " ready: ", self.ready,
-                          " loading: ", self.loading, " done: ", self.done, " downstream token: ",
-                          self.downstream_token, " Done received and processed ", self.done_received,
-                          " ", self.done_processed, " : current tile: ", self.curr_tile, " full tles ", self.tile_ptrs)
+                    self.log.debug("Done case:: ", self.name, " valid: ", self.valid, " ready: ", self.ready,
+                                   " loading: ", self.loading, " done: ", self.done, " downstream token: ",
+                                   self.downstream_token, " Done received and processed ", self.done_received,
+                                   " ", self.done_processed, " : current tile: ", self.curr_tile, " full tles ",
+                                   self.tile_ptrs)
             # Determines Ready
             if self.curr_size != self.load_size + sum(self.tile_sizes) + self.remove_size:
-                print(self.curr_size, self.load_size, self.tile_sizes, self.remove_size,
-                      "::", self.tile_ptrs, self.curr_tile, self.tile_ptrs_fifo)
+                self.log.error(self.curr_size, self.load_size, self.tile_sizes, self.remove_size,
+                               "::", self.tile_ptrs, self.curr_tile, self.tile_ptrs_fifo)
                 assert False
             if len(self.tile_ptrs_fifo) > 0:
                 if len(self.tile_ptrs) > 0 and self.tile_ptrs_fifo[0] != self.tile_ptrs[-1]:
@@ -552,8 +612,8 @@ class memory_block():
                     self.ready = True
                 if len(self.tile_ptrs) == 0 and self.curr_size < self.size:
                     if self.curr_size != self.load_size + self.remove_size:
-                        print(self.curr_size, self.load_size, self.tile_sizes, self.remove_size,
-                              "::", self.tile_ptrs, self.curr_tile, self.tile_ptrs_fifo)
+                        self.log.error(self.curr_size, self.load_size, self.tile_sizes, self.remove_size,
+                                       "::", self.tile_ptrs, self.curr_tile, self.tile_ptrs_fifo)
                     assert self.curr_size == self.load_size + self.remove_size
                     self.ready = True
             else:
@@ -575,10 +635,10 @@ class memory_block():
                     self.done_in = True
                 if self.get_stats:
                     self.rep_true = True
-                tile = self.tile_ptrs_fifo.pop(0)
+                tile = self.tile_ptrs_fifo.popleft()
                 # Remove the tile's latency record
-                self.if_latency_.pop(0)
-                self.tile_ptrs_size.pop(0)
+                self.if_latency_.popleft()
+                self.tile_ptrs_size.popleft()
                 self.tile_ptrs.append(tile)
                 self.tile_sizes.append(0)
             elif self.ready and len(self.tile_ptrs_fifo) > 0 and \
@@ -586,23 +646,23 @@ class memory_block():
                         self.tile_ptrs[-1] != self.tile_ptrs_fifo[0]) and not self.loading:
                 # print(self.loading)
                 if self.curr_size != self.load_size + sum(self.tile_sizes) + self.remove_size:
-                    print(self.name, " ", self.curr_size, self.load_size, self.tile_sizes,
-                          self.remove_size, "::", self.tile_ptrs, self.curr_tile,
-                          self.loading_tile, self.tile_ptrs_fifo)
+                    self.log.error(self.name, " ", self.curr_size, self.load_size, self.tile_sizes,
+                                   self.remove_size, "::", self.tile_ptrs, self.curr_tile,
+                                   self.loading_tile, self.tile_ptrs_fifo)
                     assert False
                 if self.get_stats:
                     self.rep_true = False
                 self.loading = True
-                tile = self.tile_ptrs_fifo.pop(0)
+                tile = self.tile_ptrs_fifo.popleft()
                 self.load_size = self.tile_ptrs_size[0]
-                self.curr_size += self.tile_ptrs_size.pop(0)
+                self.curr_size += self.tile_ptrs_size.popleft()
                 self.loading_tile = tile
                 self.timestamp = cyclenum
-                self.if_latency = self.if_latency_.pop(0)
+                self.if_latency = self.if_latency_.popleft()
                 if self.curr_size != self.load_size + sum(self.tile_sizes) + self.remove_size:
-                    print(self.name, " ", self.curr_size, self.load_size, self.tile_sizes,
-                          self.remove_size, "::", self.tile_ptrs, self.curr_tile,
-                          self.loading_tile, self.tile_ptrs_fifo)
+                    self.log.error(self.name, " ", self.curr_size, self.load_size, self.tile_sizes,
+                                   self.remove_size, "::", self.tile_ptrs, self.curr_tile,
+                                   self.loading_tile, self.tile_ptrs_fifo)
                     assert False
 
             elif self.loading and cyclenum > self.compute_latency(self.load_size, self.if_latency) + self.timestamp:
@@ -626,14 +686,14 @@ class memory_block():
             if self.ready and len(self.tile_ptrs_fifo) > 0:
                 if self.curr_tile != "D":
                     self.old_tile = self.curr_tile
-                self.curr_tile = self.tile_ptrs_fifo.pop(0)
-                self.curr_size = self.tile_ptrs_size.pop(0)
+                self.curr_tile = self.tile_ptrs_fifo.popleft()
+                self.curr_size = self.tile_ptrs_size.popleft()
                 if self.mode == "all_unpacked":
                     assert self.curr_size < (self.size)
                 elif self.mode == "not_consolidated":
                     assert self.curr_size < self.size
                 else:
-                    print(self.mode + " not found")
+                    self.log.error(self.mode + " not found")
                 if self.curr_tile == "D":
                     self.timestamp = None
                     self.ready = True
@@ -646,10 +706,10 @@ class memory_block():
                     self.done_received = False
                     self.done_processed = False
                     if self.debug:
-                        print(self.name, " valid: ", self.valid, " ready: ", self.ready,
-                              " loading: ", self.loading, " done: ", self.done, " downstream token: ",
-                              self.downstream_token, " Done received and processed ", self.done_received,
-                              " ", self.done_processed, " : current tile: ", self.curr_tile)
+                        self.log.debug(self.name, " valid: ", self.valid, " ready: ", self.ready,
+                                       " loading: ", self.loading, " done: ", self.done, " downstream token: ",
+                                       self.downstream_token, " Done received and processed ", self.done_received,
+                                       " ", self.done_processed, " : current tile: ", self.curr_tile)
                     return
                 self.timestamp = cyclenum
                 self.ready = False
@@ -673,18 +733,18 @@ class memory_block():
                 self.done_processed = False
         if self.debug:
             if self.nbuffer:
-                print(self.name, self.curr_size, self.size, self.old_tile, " done in ", self.done_in,
-                      " valid: ", self.valid, " ready: ", self.ready, " loading: ", self.loading,
-                      " done: ", self.done, " downstream token: ", self.downstream_token,
-                      " Done received and processed ", self.done_received, " ", self.done_processed,
-                      " : current tile: ", self.curr_tile, " ", self.tile_ptrs, " ", self.loading_tile, " ",
-                      self.tile_ptrs_fifo, "----------")
+                self.log.debug(self.name, self.curr_size, self.size, self.old_tile, " done in ", self.done_in,
+                               " valid: ", self.valid, " ready: ", self.ready, " loading: ", self.loading,
+                               " done: ", self.done, " downstream token: ", self.downstream_token,
+                               " Done received and processed ", self.done_received, " ", self.done_processed,
+                               " : current tile: ", self.curr_tile, " ", self.tile_ptrs, " ", self.loading_tile, " ",
+                               self.tile_ptrs_fifo, "----------")
             else:
-                print(self.name, self.old_tile, " valid: ", self.valid, " ready: ", self.ready, " loading: ",
-                      self.loading, " done: ", self.done, " downstream token: ", self.downstream_token,
-                      " Done received and processed ", self.done_received, " ", self.done_processed,
-                      " : current tile: ", self.curr_tile, " ", self.tile_ptrs[0:10], " ",
-                      self.tile_ptrs_fifo[0:10], "----------")
+                self.log.debug(self.name, self.old_tile, " valid: ", self.valid, " ready: ", self.ready, " loading: ",
+                               self.loading, " done: ", self.done, " downstream token: ", self.downstream_token,
+                               " Done received and processed ", self.done_received, " ", self.done_processed,
+                               " : current tile: ", self.curr_tile, " ", list(islice(self.tile_ptrs, 10)), " ",
+                               list(islice(self.tile_ptrs_fifo, 10)), "----------")
 
     def remove_tile(self, tile_ptr=None, tile_id=-1):
         if tile_ptr is not None:
@@ -735,7 +795,7 @@ class memory_block():
             elif self.mode == "not_consolidated":
                 return self.latency + self.curr_size // (self.bandwidth)
             else:
-                print(self.mode + " not found")
+                self.log.error(self.mode + " not found")
                 assert False
 
     def valid_tile(self):
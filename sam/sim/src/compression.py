@@ -2,11 +2,13 @@ from .base import *
 
 
 class Compression(Primitive):
+    __slots__ = ("in_val", "in_crd", "curr_crd", "data_valid", "depth", "fifo_avail_crd", "fifo_avail_val")
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        self.in_val = []
-        self.in_crd = []
+        self.in_val = self.new_channel()
+        self.in_crd = self.new_channel()
 
         self.curr_crd = ''
         if self.backpressure_en:
@@ -58,21 +60,21 @@ class Compression(Primitive):
                 icrd = self
 
             if self.debug:
-                print("Curr OuterCrd:", self.curr_ocrd, "\tCurr InnerCrd:", icrd, "\t Curr OutputCrd:", self.curr_crd,
-                      "\tHasCrd", self.has_crd,
-                      "\t GetNext InnerCrd:", self.get_next_icrd, "\t GetNext OuterCrd:", self.get_next_ocrd)
+                self.log.debug("Curr OuterCrd:", self.curr_ocrd, "\tCurr InnerCrd:", icrd, "\t Curr OutputCrd:", self.curr_crd,
+                               "\tHasCrd", self.has_crd,
+                               "\t GetNext InnerCrd:", self.get_next_icrd, "\t GetNext OuterCrd:", self.get_next_ocrd)
 
     def set_val(self, val, parent=None):
         if val != '' and val is not None:
             self.in_val.append(val)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_val)
+        if self.backpressure_en and not self.fifo_avail_val:
+            parent.set_backpressure(False)
 
     def set_crd(self, crd, parent=None):
         if crd != '' and crd is not None:
             self.in_crd.append(crd)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_crd)
+        if self.backpressure_en and not self.fifo_avail_crd:
+            parent.set_backpressure(False)
 
     def out_crd(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
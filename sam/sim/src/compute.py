@@ -1,16 +1,22 @@
+import numpy as np
+
 from .base import *
+from .stream import TokenStream, batch_tokens
 
 
 class Compute2(Primitive, ABC):
+    __slots__ = ("in1", "in2", "curr_out", "in1_size", "in2_size", "cycles_operated", "data_valid", "depth",
+                 "fifo_avail_in1", "fifo_avail_in2")
+
     def __init__(self, depth=1, **kwargs):
         super().__init__(**kwargs)
 
-        self.in1 = []
-        self.in2 = []
+        self.in1 = self.new_channel()
+        self.in2 = self.new_channel()
 
         if self.get_stats:
-            self.in1_size = 0
-            self.in2_size = 0
+            self.in1_size = self.max_gauge("in1_size")
+            self.in2_size = self.max_gauge("in2_size")
             self.cycles_operated = 0
         self.curr_out = None
 
@@ -46,27 +52,46 @@ class Compute2(Primitive, ABC):
     def set_in1(self, in1, parent=None):
         if in1 != '' and in1 is not None:
             self.in1.append(in1)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_in1)
+        if self.backpressure_en and not self.fifo_avail_in1:
+            parent.set_backpressure(False)
 
     def set_in2(self, in2, parent=None):
         if in2 != '' and in2 is not None:
             self.in2.append(in2)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_in2)
+        if self.backpressure_en and not self.fifo_avail_in2:
+            parent.set_backpressure(False)
 
     def out_val(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
             return self.curr_out
 
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and (len(self.in1) == 0 or len(self.in2) == 0) and \
+            self.curr_out == ''
+
+    # Batch version of update(): inputs with the same control tokens at the same positions (values paired with
+    # values) are combined with one array operation op on the payloads. Others, e.g. the union patch that pairs a
+    # value with a stop token, run cycle by cycle
+    def _process_values(self, in_streams, out_ports, op):
+        in1 = batch_tokens(in_streams, 'set_in1')
+        in2 = batch_tokens(in_streams, 'set_in2')
+        if in1 is None or in2 is None or len(self.in1) > 0 or len(self.in2) > 0 or len(in1) != len(in2) or \
+                not np.array_equal(in1.kind, in2.kind) or np.any(in1.kind == TKN_ZERO):
+            return Primitive.process_stream(self, in_streams, out_ports)
+        data = in1.kind == TKN_DATA
+        if not np.array_equal(in1.payload[~data], in2.payload[~data]):
+            return Primitive.process_stream(self, in_streams, out_ports)
+        self.done = self.done or bool(np.any(in1.kind == TKN_DONE))
+        return {'out_val': TokenStream(in1.kind, np.where(data, op(in1.payload, in2.payload), in1.payload))}
+
     def compute_fifos(self):
         if self.get_stats:
-            self.in1_size = max(self.in1_size, len(self.in1))
-            self.in2_size = max(self.in2_size, len(self.in2))
+            self.in1_size.update(len(self.in1))
+            self.in2_size.update(len(self.in2))
 
     def print_fifos(self):
-        print("Compute block in 1: ", self.in1_size)
-        print("Compute block in 2: ", self.in2_size)
+        print("Compute block in 1: ", self.in1_size.value)
+        print("Compute block in 2: ", self.in2_size.value)
 
     def return_statistics(self):
         if self.get_stats:
@@ -78,6 +103,8 @@ class Compute2(Primitive, ABC):
 
 
 class Add2(Compute2):
+    __slots__ = ("fill_value", "neg1", "neg2", "get1", "get2", "curr_in1", "curr_in2")
+
     def __init__(self, neg1=False, neg2=False, **kwargs):
         super().__init__(**kwargs)
         self.fill_value = 0
@@ -98,9 +125,9 @@ class Add2(Compute2):
 
         if len(self.in1) > 0 and len(self.in2) > 0:
             if self.get1:
-                self.curr_in1 = self.in1.pop(0)
+                self.curr_in1 = self.in1.popleft()
             if self.get2:
-                self.curr_in2 = self.in2.pop(0)
+                self.curr_in2 = self.in2.popleft()
 
             if self.curr_in1 == 'D' or self.curr_in2 == 'D':
                 # Inputs are both the same and done tokens
@@ -135,12 +162,18 @@ class Add2(Compute2):
                 self.get2 = True
             self.compute_fifos()
             if self.debug:
-                print("DEBUG: Curr Out:", self.curr_out, "\t Curr In1:", self.curr_in1, "\t Curr In2:", self.curr_in2)
+                self.log.debug("DEBUG: Curr Out:", self.curr_out, "\t Curr In1:", self.curr_in1, "\t Curr In2:", self.curr_in2)
         else:
             self.curr_out = ''
 
+    def process_stream(self, in_streams, out_ports=()):
+        return self._process_values(in_streams, out_ports,
+                                    lambda in1, in2: (-in1 if self.neg1 else in1) + (-in2 if self.neg2 else in2))
+
 
 class Multiply2(Compute2):
+    __slots__ = ("fill_value", "get1", "get2", "curr_in1", "curr_in2")
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.fill_value = 0
@@ -155,7 +188,7 @@ class Multiply2(Compute2):
         self.update_done()
         self.update_ready()
         if self.backpressure_en and self.debug:
-            print("mul start: ", self.in1, self.in2)
+            self.log.debug("mul start: ", self.in1, self.in2)
         if self.backpressure_en:
             self.data_valid = False
         if (self.backpressure_en and self.check_backpressure()) or not self.backpressure_en:
@@ -167,9 +200,9 @@ class Multiply2(Compute2):
             if len(self.in1) > 0 and len(self.in2) > 0:
                 # print("tokens : ", self.curr_in1, self.curr_in2, " ", self.in1, " ", self.in2)
                 if self.get1:
-                    self.curr_in1 = self.in1.pop(0)
+                    self.curr_in1 = self.in1.popleft()
                 if self.get2:
-                    self.curr_in2 = self.in2.pop(0)
+                    self.curr_in2 = self.in2.popleft()
                 if self.curr_in1 == 'D' or self.curr_in2 == 'D':
                     # Inputs are both the same and done tokens
                     assert self.curr_in1 == self.curr_in2, "Both must be done tokens: " + str(self.curr_in1) + " != " + \
@@ -199,7 +232,7 @@ class Multiply2(Compute2):
                 else:
                     # Both inputs are values
                     if self.debug:
-                        print(self.curr_in1, self.curr_in2)
+                        self.log.debug(self.curr_in1, self.curr_in2)
                     self.curr_out = self.curr_in1 * self.curr_in2
                     if self.get_stats:
                         self.cycles_operated += 1
@@ -209,7 +242,10 @@ class Multiply2(Compute2):
             else:
                 self.curr_out = ''
         if self.debug:
-            print("DEBUG: MULT: \t "
-                  "Curr Out:", self.curr_out, "\t Curr In1:", self.curr_in1, "\t Curr In2:", self.curr_in2, self.done)
+            self.log.debug("DEBUG: MULT: \t "
+                           "Curr Out:", self.curr_out, "\t Curr In1:", self.curr_in1, "\t Curr In2:", self.curr_in2, self.done)
         if self.backpressure_en and self.debug:
-            print("Mult: ", self.in1, self.in2)
+            self.log.debug("Mult: ", self.in1, self.in2)
+
+    def process_stream(self, in_streams, out_ports=()):
+        return self._process_values(in_streams, out_ports, np.multiply)
@@ -1,13 +1,20 @@
+import numpy as np
+
 from .base import *
 from .repeater import RepeatSigGen, Repeat
+from .stream import batch_tokens
 
 
 class CrdDrop(Primitive):
+    __slots__ = ("outer_crd", "inner_crd", "curr_inner_crd", "curr_ocrd", "curr_crd", "has_crd", "prev_ocrd_stkn",
+                 "get_stkn", "get_next_icrd", "get_next_ocrd", "inner_crd_fifo", "outer_crd_fifo", "ocrd_drop_cnt",
+                 "depth", "data_valid", "fifo_avail_inner", "fifo_avail_outer")
+
     def __init__(self, depth=4, **kwargs):
         super().__init__(**kwargs)
 
-        self.outer_crd = []
-        self.inner_crd = []
+        self.outer_crd = self.new_channel()
+        self.inner_crd = self.new_channel()
         self.curr_inner_crd = ''
         self.curr_ocrd = ''
         self.curr_crd = ''
@@ -19,8 +26,8 @@ class CrdDrop(Primitive):
 
         # statistics info
         if self.get_stats:
-            self.inner_crd_fifo = 0
-            self.outer_crd_fifo = 0
+            self.inner_crd_fifo = self.max_gauge("inner_crd_fifo")
+            self.outer_crd_fifo = self.max_gauge("outer_crd_fifo")
             self.ocrd_drop_cnt = 0
 
         if self.backpressure_en:
@@ -65,8 +72,8 @@ class CrdDrop(Primitive):
 
             icrd = ""
             if self.debug:
-                print("OuterCrds:", self.outer_crd)
-                print("InnerCrds:", self.inner_crd)
+                self.log.debug("OuterCrds:", self.outer_crd)
+                self.log.debug("InnerCrds:", self.inner_crd)
 
             if self.done:
                 self.curr_crd = ''
@@ -74,8 +81,8 @@ class CrdDrop(Primitive):
 
             if len(self.outer_crd) > 0 and self.get_next_ocrd:
                 if self.get_stats:
-                    self.outer_crd_fifo = max(self.outer_crd_fifo, len(self.outer_crd))
-                self.curr_ocrd = self.outer_crd.pop(0)
+                    self.outer_crd_fifo.update(len(self.outer_crd))
+                self.curr_ocrd = self.outer_crd.popleft()
                 if isinstance(self.curr_ocrd, int):
                     self.get_next_icrd = True
                     self.get_next_ocrd = False
@@ -103,8 +110,8 @@ class CrdDrop(Primitive):
 
             if len(self.inner_crd) > 0 and self.get_next_icrd:
                 if self.get_stats:
-                    self.inner_crd_fifo = max(self.inner_crd_fifo, len(self.inner_crd))
-                icrd = self.inner_crd.pop(0)
+                    self.inner_crd_fifo.update(len(self.inner_crd))
+                icrd = self.inner_crd.popleft()
                 self.curr_inner_crd = icrd
                 if self.get_stkn:
                     assert is_stkn(icrd) == is_stkn(self.curr_ocrd)
@@ -146,22 +153,69 @@ class CrdDrop(Primitive):
                 self.curr_inner_crd = ''
 
             if self.debug:
-                print("DEBUG: CRDDROP: Curr OuterCrd:", self.curr_ocrd, "\tCurr InnerCrd:", icrd,
-                      "\t Curr OutputCrd:", self.curr_crd, "\tHasCrd", self.has_crd,
-                      "\t GetNext InnerCrd:", self.get_next_icrd, "\t GetNext OuterCrd:", self.get_next_ocrd,
-                      "\n Prev Stkn:", self.prev_ocrd_stkn, "\t Get Stkn:", self.get_stkn)
+                self.log.debug("DEBUG: CRDDROP: Curr OuterCrd:", self.curr_ocrd, "\tCurr InnerCrd:", icrd,
+                               "\t Curr OutputCrd:", self.curr_crd, "\tHasCrd", self.has_crd,
+                               "\t GetNext InnerCrd:", self.get_next_icrd, "\t GetNext OuterCrd:", self.get_next_ocrd,
+                               "\n Prev Stkn:", self.prev_ocrd_stkn, "\t Get Stkn:", self.get_stkn)
+
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and self.curr_crd == '' and self.curr_inner_crd == '' and \
+            not (len(self.outer_crd) > 0 and self.get_next_ocrd) and \
+            not (len(self.inner_crd) > 0 and self.get_next_icrd)
+
+    def add_idle_cycles(self, cycles):
+        super().add_idle_cycles(cycles)
+        if self.get_stats:
+            self.ocrd_drop_cnt += cycles * (int(self.get_next_ocrd) + int(self.get_next_icrd))
+
+    # Whole fibers at a time: every outer coordinate takes the next inner fiber (up to its stop token) and is
+    # dropped if the fiber is empty. An outer stop token that follows a stop token (or starts the stream) takes
+    # the inner stop token of an empty outer fiber, the final 'D' takes the inner 'D'. The inner stream passes
+    # through. Inputs that do not pair up this way run cycle by cycle
+    def process_stream(self, in_streams, out_ports=()):
+        outer = batch_tokens(in_streams, 'set_outer_crd')
+        inner = batch_tokens(in_streams, 'set_inner_crd')
+        fresh = self.get_next_ocrd and not self.get_next_icrd and self.prev_ocrd_stkn and not self.done and \
+            len(self.outer_crd) == 0 and len(self.inner_crd) == 0
+        if not fresh or outer is None or inner is None or len(outer) == 0 or len(inner) == 0:
+            return super().process_stream(in_streams, out_ports)
+        okind = outer.kind
+        ikind = inner.kind
+        if okind[-1] != TKN_DONE or ikind[-1] != TKN_DONE or np.any(okind[:-1] == TKN_DONE) or \
+                np.any(ikind[:-1] == TKN_DONE) or np.any(okind == TKN_ZERO) or np.any(ikind == TKN_ZERO) or \
+                (len(okind) > 1 and okind[-2] != TKN_STOP):
+            return super().process_stream(in_streams, out_ports)
+
+        is_crd = okind[:-1] == TKN_DATA
+        after_stop = np.ones(len(okind) - 1, dtype=bool)
+        after_stop[1:] = ~is_crd[:-1]
+        takes_fiber = is_crd | after_stop
+        fiber_ends = np.flatnonzero(ikind == TKN_STOP)
+        if np.count_nonzero(takes_fiber) != len(fiber_ends):
+            return super().process_stream(in_streams, out_ports)
+        fiber_lens = np.diff(fiber_ends, prepend=-1) - 1
+        takers_crd = is_crd[takes_fiber]
+        if np.any(fiber_lens[~takers_crd] != 0):
+            return super().process_stream(in_streams, out_ports)
+
+        keep = np.ones(len(okind), dtype=bool)
+        keep[np.flatnonzero(is_crd)] = fiber_lens[takers_crd] > 0
+        self.done = True
+        self.get_next_ocrd = False
+        self.get_next_icrd = False
+        return {'out_crd_outer': outer[keep], 'out_crd_inner': inner}
 
     def set_outer_crd(self, crd, parent=None):
         if crd != '' and crd is not None:
             self.outer_crd.append(crd)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_outer)
+        if self.backpressure_en and not self.fifo_avail_outer:
+            parent.set_backpressure(False)
 
     def set_inner_crd(self, crd, parent=None):
         if crd != '' and crd is not None:
             self.inner_crd.append(crd)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_inner)
+        if self.backpressure_en and not self.fifo_avail_inner:
+            parent.set_backpressure(False)
 
     def out_crd_outer(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -172,13 +226,12 @@ class CrdDrop(Primitive):
             return self.curr_inner_crd
 
     def print_fifos(self):
-        print("Crdrop Inner crd fifos size: ", self.inner_crd_fifo)
-        print("CrdDrop Outer crd fifo size: ", self.outer_crd_fifo)
+        print("Crdrop Inner crd fifos size: ", self.inner_crd_fifo.value)
+        print("CrdDrop Outer crd fifo size: ", self.outer_crd_fifo.value)
 
     def return_statistics(self):
         if self.get_stats:
-            stats_dict = {"inner_crd_fifo": self.inner_crd_fifo, "outer_crd_fifo":
-                          self.outer_crd_fifo, "drop_count": self.ocrd_drop_cnt}
+            stats_dict = {"drop_count": self.ocrd_drop_cnt}
             stats_dict.update(super().return_statistics())
         else:
             stats_dict = {}
@@ -187,13 +240,16 @@ class CrdDrop(Primitive):
 
 # Converts coordinate streams to point streams
 class CrdHold(Primitive):
+    __slots__ = ("outer_crd", "inner_crd", "repsig", "curr_crd", "curr_inner_crd", "RSG", "repeat", "depth",
+                 "data_valid", "fifo_avail_inner", "fifo_avail_outer")
+
     def __init__(self, depth=1, **kwargs):
         super().__init__(**kwargs)
 
-        self.outer_crd = []
-        self.inner_crd = []
+        self.outer_crd = self.new_channel()
+        self.inner_crd = self.new_channel()
 
-        self.repsig = []
+        self.repsig = Channel()
         self.curr_crd = ''
         self.curr_inner_crd = ''
 
@@ -268,42 +324,63 @@ class CrdHold(Primitive):
                 # return
 
             if len(self.inner_crd) > 0:
-                icrd = self.inner_crd.pop(0)
+                icrd = self.inner_crd.popleft()
                 self.RSG.set_istream(icrd)
                 self.curr_inner_crd = icrd
             else:
                 self.curr_inner_crd = ''
             if self.debug:
-                print("crdManager:")
+                self.log.debug("crdManager:")
             self.repsig.append(self.RSG.out_repeat())
             if len(self.outer_crd) > 0:
-                ocrd = self.outer_crd.pop(0)
+                ocrd = self.outer_crd.popleft()
                 self.repeat.set_in_ref(ocrd)
             if len(self.repsig) > 0:
-                self.repeat.set_in_repeat(self.repsig.pop(0))
+                self.repeat.set_in_repeat(self.repsig.popleft())
 
             self.RSG.update()
             self.repeat.update()
 
             if self.debug:
-                print("+++++++")
+                self.log.debug("+++++++")
             self.curr_crd = self.repeat.out_ref()
 
             self.done = self.RSG.done and self.repeat.done
         if self.debug:
-            print("Debug crd_manager: input: ", self.inner_crd, self.outer_crd, self.curr_crd, self.done)
+            self.log.debug("Debug crd_manager: input: ", self.inner_crd, self.outer_crd, self.curr_crd, self.done)
+
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and len(self.outer_crd) == 0 and len(self.inner_crd) == 0 and \
+            len(self.repsig) == 0 and self.curr_crd == '' and self.curr_inner_crd == '' and \
+            self.RSG.is_idle() and self.repeat.is_idle()
+
+    def add_idle_cycles(self, cycles):
+        super().add_idle_cycles(cycles)
+        self.RSG.add_idle_cycles(cycles)
+        self.repeat.add_idle_cycles(cycles)
+
+    # The repeat signal generator and repeater over the complete streams, one after the other
+    def process_stream(self, in_streams, out_ports=()):
+        inner = batch_tokens(in_streams, 'set_inner_crd')
+        if inner is None or len(self.inner_crd) > 0 or len(self.outer_crd) > 0:
+            return super().process_stream(in_streams, out_ports)
+        repsig = self.RSG.process_stream({'set_istream': inner}, ['out_repsig'])['out_repsig']
+        out_outer = self.repeat.process_stream({'set_in_ref': in_streams.get('set_outer_crd', []),
+                                                'set_in_repeat': repsig}, ['out_ref'])['out_ref']
+        self.done = self.RSG.done and self.repeat.done
+        return {'out_crd_outer': out_outer, 'out_crd_inner': inner}
 
     def set_outer_crd(self, crd, parent=None):
         if crd != '' and crd is not None:
             self.outer_crd.append(crd)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_outer)
+        if self.backpressure_en and not self.fifo_avail_outer:
+            parent.set_backpressure(False)
 
     def set_inner_crd(self, crd, parent=None):
         if crd != '' and crd is not None:
             self.inner_crd.append(crd)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_inner)
+        if self.backpressure_en and not self.fifo_avail_inner:
+            parent.set_backpressure(False)
 
     def out_crd_outer(self, parent=None):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -317,11 +394,14 @@ class CrdHold(Primitive):
 # Converts point streams back into coordinate streams
 # Helper for the sparse accumulator
 class CrdPtConverter(Primitive):
+    __slots__ = ("outer_crdpt", "inner_crdpt", "curr_ocrd", "curr_icrd", "prev_ocrd", "prev_ocrdpt", "prev_icrdpt",
+                 "emit_stkn", "emit_done", "prev_stkn", "waiting_next", "inner_last_level")
+
     def __init__(self, last_level=False, fifos=None, **kwargs):
         super().__init__(**kwargs)
 
-        self.outer_crdpt = []
-        self.inner_crdpt = []
+        self.outer_crdpt = self.new_channel()
+        self.inner_crdpt = self.new_channel()
 
         self.curr_ocrd = None
         self.curr_icrd = None
@@ -337,8 +417,8 @@ class CrdPtConverter(Primitive):
 
         self.inner_last_level = last_level
         if fifos is not None:
-            self.outer_crdpt = fifos[0]
-            self.inner_crdpt = fifos[1]
+            self.outer_crdpt = as_channel(fifos[0])
+            self.inner_crdpt = as_channel(fifos[1])
 
     def return_fifo(self):
         return self.outer_crdpt, self.inner_crdpt
@@ -374,7 +454,7 @@ class CrdPtConverter(Primitive):
             self.emit_stkn = False
         elif len(self.outer_crdpt) > 0 and is_stkn(self.outer_crdpt[0]):
             # Just forward stop token if self.emit_tkn = False
-            curr_ocrdpt = self.outer_crdpt.pop(0)
+            curr_ocrdpt = self.outer_crdpt.popleft()
 
             if len(self.outer_crdpt) > 0:
                 next_outer = self.outer_crdpt[0]
@@ -403,13 +483,13 @@ class CrdPtConverter(Primitive):
             self.emit_done = False
             if len(self.outer_crdpt) > 0 and len(self.inner_crdpt) > 0 and \
                     self.outer_crdpt[0] == 'D' and self.inner_crdpt[0] == 'D':
-                self.inner_crdpt.pop(0)
-                self.outer_crdpt.pop(0)
+                self.inner_crdpt.popleft()
+                self.outer_crdpt.popleft()
         elif len(self.outer_crdpt) > 0 and len(self.inner_crdpt) > 0 and \
                 isinstance(self.outer_crdpt[0], int) and isinstance(self.inner_crdpt[0], int):
             # Both streams are coordinates
-            curr_ocrdpt = self.outer_crdpt.pop(0)
-            curr_icrdpt = self.inner_crdpt.pop(0)
+            curr_ocrdpt = self.outer_crdpt.popleft()
+            curr_icrdpt = self.inner_crdpt.popleft()
 
             if self.prev_ocrdpt != curr_ocrdpt and self.prev_ocrdpt is not None and not self.prev_stkn:
                 self.curr_ocrd = ''
@@ -438,8 +518,8 @@ class CrdPtConverter(Primitive):
                 # self.inner_crdpt.pop(0)
                 self.emit_done = True
             else:
-                self.outer_crdpt.pop(0)
-                self.inner_crdpt.pop(0)
+                self.outer_crdpt.popleft()
+                self.inner_crdpt.popleft()
                 self.curr_ocrd = 'D'
                 self.curr_icrd = 'D'
                 self.done = True
@@ -453,9 +533,112 @@ class CrdPtConverter(Primitive):
             self.curr_icrd = ''
 
         if self.debug:
-            print("DEBUG: CrdPtConverter \t Done:", self.out_done(),
-                  "\n Curr in ocrd: ", self.inner_crdpt, "\t Curr in icrd", self.outer_crdpt,
-                  "\t Curr in val", self.prev_ocrdpt, "\t Emit Tkn: ", self.emit_stkn)
+            self.log.debug("DEBUG: CrdPtConverter \t Done:", self.out_done(),
+                           "\n Curr in ocrd: ", self.inner_crdpt, "\t Curr in icrd", self.outer_crdpt,
+                           "\t Curr in val", self.prev_ocrdpt, "\t Emit Tkn: ", self.emit_stkn)
+
+    def is_idle(self):
+        return not self.debug and self.curr_ocrd == '' and self.curr_icrd == '' and not self.emit_stkn and \
+            not self.emit_done and (self.done or (len(self.outer_crdpt) == 0 and len(self.inner_crdpt) == 0))
+
+    # Same state machine as update(), run over the complete point streams. Stops at the first update that neither
+    # consumes nor emits anything
+    def process_stream(self, in_streams, out_ports=()):
+        outer = list(self.outer_crdpt) + batch_stream(in_streams, 'set_outer_crdpt')
+        inner = list(self.inner_crdpt) + batch_stream(in_streams, 'set_inner_crdpt')
+        self.outer_crdpt.clear()
+        self.inner_crdpt.clear()
+        num_outer = len(outer)
+        num_inner = len(inner)
+        out_outer = []
+        out_inner = []
+        io = ii = 0
+        while True:
+            start = io + ii
+            if self.curr_ocrd != '':
+                self.prev_ocrd = self.curr_ocrd
+
+            next_outer = outer[io] if io < num_outer else ''
+            next_inner = inner[ii] if ii < num_inner else ''
+            if self.done:
+                self.curr_ocrd = ''
+                self.curr_icrd = ''
+            elif self.waiting_next and io < num_outer:
+                stkn = increment_stkn(self.prev_ocrd)
+                self.curr_ocrd = stkn if next_outer == 'D' else self.prev_ocrd
+                self.curr_icrd = increment_stkn(stkn) if self.inner_last_level and next_outer == 'D' else stkn
+                self.waiting_next = False
+            elif self.emit_stkn:
+                self.curr_ocrd = self.prev_ocrdpt
+                self.curr_icrd = self.prev_icrdpt
+                self.emit_stkn = False
+            elif io < num_outer and is_stkn(next_outer):
+                curr_ocrdpt = next_outer
+                io += 1
+                if io < num_outer:
+                    if outer[io] == 'D':
+                        assert next_inner == 'D', "Done tokens must be aligned"
+                        self.curr_ocrd = increment_stkn(curr_ocrdpt)
+                        self.curr_icrd = increment_stkn(increment_stkn(curr_ocrdpt)) if self.inner_last_level \
+                            else increment_stkn(curr_ocrdpt)
+                    else:
+                        self.curr_ocrd = curr_ocrdpt
+                        self.curr_icrd = increment_stkn(curr_ocrdpt)
+                else:
+                    self.curr_ocrd = ''
+                    self.curr_icrd = ''
+                    self.waiting_next = True
+                    self.prev_ocrd = curr_ocrdpt
+                self.emit_stkn = False
+                self.prev_stkn = True
+            elif self.emit_done:
+                self.curr_ocrd = 'D'
+                self.curr_icrd = 'D'
+                self.done = True
+                self.emit_done = False
+                if next_outer == 'D' and next_inner == 'D':
+                    io += 1
+                    ii += 1
+            elif io < num_outer and ii < num_inner and isinstance(next_outer, int) and isinstance(next_inner, int):
+                io += 1
+                ii += 1
+                if self.prev_ocrdpt != next_outer and self.prev_ocrdpt is not None and not self.prev_stkn:
+                    self.curr_ocrd = ''
+                    self.curr_icrd = 'S0'
+                    self.emit_stkn = True
+                elif self.prev_ocrdpt != next_outer:
+                    self.curr_icrd = next_inner
+                    self.curr_ocrd = next_outer
+                else:
+                    self.curr_icrd = next_inner
+                    self.curr_ocrd = ''
+                self.prev_stkn = False
+                self.prev_icrdpt = next_inner
+                self.prev_ocrdpt = next_outer
+            elif ii < num_inner and is_stkn(next_inner):
+                assert False, "The inner crdpt stream should not have stop tokens"
+            elif next_outer == 'D' and next_inner == 'D':
+                if isinstance(self.prev_ocrd, int):
+                    self.curr_ocrd = 'S0'
+                    self.curr_icrd = increment_stkn('S0') if self.inner_last_level else 'S0'
+                    self.emit_done = True
+                else:
+                    io += 1
+                    ii += 1
+                    self.curr_ocrd = 'D'
+                    self.curr_icrd = 'D'
+                    self.done = True
+            else:
+                self.curr_ocrd = ''
+                self.curr_icrd = ''
+
+            if self.curr_ocrd != '':
+                out_outer.append(self.curr_ocrd)
+            if self.curr_icrd != '':
+                out_inner.append(self.curr_icrd)
+            if io + ii == start and self.curr_ocrd == '' and self.curr_icrd == '':
+                break
+        return {'out_crd_outer': out_outer, 'out_crd_inner': out_inner}
 
     def print_debug(self):
         print("DEBUG: CrdPtConverter \t Done:", self.out_done(),
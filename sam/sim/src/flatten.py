@@ -2,14 +2,18 @@ from .base import *
 
 
 class Flatten(Primitive):
+    __slots__ = ("in_outer_crd", "in_inner_crd", "curr_crd", "curr_ocrd", "get_inner", "get_outer", "split_factor",
+                 "in_inner_crd_size", "in_outer_crd_size", "data_valid", "depth", "fifo_avail_outer",
+                 "fifo_avail_inner")
+
     def __init__(self, split_factor=4, **kwargs):
         super().__init__(**kwargs)
 
-        self.in_outer_crd = []
-        self.in_inner_crd = []
+        self.in_outer_crd = self.new_channel()
+        self.in_inner_crd = self.new_channel()
         if self.get_stats:
-            self.in_inner_crd_size = 0
-            self.in_outer_crd_size = 0
+            self.in_inner_crd_size = self.max_gauge("in_inner_crd_size")
+            self.in_outer_crd_size = self.max_gauge("in_outer_crd_size")
 
         self.curr_crd = None
         self.curr_ocrd = None
@@ -65,14 +69,14 @@ class Flatten(Primitive):
                 self.curr_crd = ''
                 return
 
-            icrd = self.in_inner_crd.pop(0) if len(self.in_inner_crd) > 0 and self.get_inner else None
+            icrd = self.in_inner_crd.popleft() if len(self.in_inner_crd) > 0 and self.get_inner else None
             self.get_outer |= not isinstance(icrd, int)
 
             if self.get_outer and len(self.in_outer_crd) == 0:
                 self.curr_crd = ''
                 return
 
-            self.curr_ocrd = self.in_outer_crd.pop(0) if len(self.in_outer_crd) > 0 and self.get_outer else self.curr_ocrd
+            self.curr_ocrd = self.in_outer_crd.popleft() if len(self.in_outer_crd) > 0 and self.get_outer else self.curr_ocrd
             self.get_outer = False
 
             if isinstance(icrd, int) and isinstance(self.curr_ocrd, int):
@@ -90,23 +94,23 @@ class Flatten(Primitive):
                 self.curr_crd = ''
 
             if self.debug:
-                print("DEBUG: FLATTEN: \n",
-                      "\t Curr Icrd:", icrd, "\t Curr Ocrd", self.curr_ocrd,
-                      "\t Get Icrd:", self.get_inner, "\t Get Ocrd", self.get_outer,
-                      "\n Out Crd:", self.curr_crd
-                      )
+                self.log.debug("DEBUG: FLATTEN: \n",
+                               "\t Curr Icrd:", icrd, "\t Curr Ocrd", self.curr_ocrd,
+                               "\t Get Icrd:", self.get_inner, "\t Get Ocrd", self.get_outer,
+                               "\n Out Crd:", self.curr_crd
+                               )
 
     def set_in_inner_crd(self, crd, parent=None):
         if crd != '' and crd is not None:
             self.in_inner_crd.append(crd)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_inner)
+        if self.backpressure_en and not self.fifo_avail_inner:
+            parent.set_backpressure(False)
 
     def set_in_outer_crd(self, crd, parent=None):
         if crd != '' and crd is not None:
             self.in_outer_crd.append(crd)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_outer)
+        if self.backpressure_en and not self.fifo_avail_outer:
+            parent.set_backpressure(False)
 
     def out_crd(self):
         if (self.backpressure_en and self.data.valid) or not self.backpressure_en:
@@ -114,9 +118,9 @@ class Flatten(Primitive):
 
     def compute_fifos(self):
         if self.get_stats:
-            self.in_inner_crd_size = max(self.in_inner_crd_size, len(self.in_inner_crd))
-            self.in_outer_crd_size = max(self.in_outer_crd_size, len(self.in_outer_crd))
+            self.in_inner_crd_size.update(len(self.in_inner_crd))
+            self.in_outer_crd_size.update(len(self.in_outer_crd))
 
     def print_fifos(self):
-        print("FIFOs size in the inner crd for flatten blocks: ", self.in_inner_crd_size)
-        print("FIFOs size in the outer crd for flatten blocks: ", self.in_outer_crd_size)
+        print("FIFOs size in the inner crd for flatten blocks: ", self.in_inner_crd_size.value)
+        print("FIFOs size in the outer crd for flatten blocks: ", self.in_outer_crd_size.value)
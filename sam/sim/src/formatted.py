@@ -0,0 +1,173 @@
+import glob
+import json
+import os
+import struct
+
+import numpy as np
+
+# Binary container of a formatted tensor: a single file tensor_<name>.sam next to the text files
+# (tensor_<name>_mode_0_seg, ...) that holds the same arrays under the same keys (mode_0_seg, ...).
+# Layout: magic, header length, JSON header (tensor name, format and an index of dtype, offset and length
+# for every array) and the raw arrays, each aligned so they can be memory-mapped
+MAGIC = b"SAMFMT01"
+ALIGN = 64
+_header_len = struct.Struct("<Q")
+
+formatted_dir = os.getenv('SUITESPARSE_FORMATTED_PATH', default=os.path.join(os.getcwd(), 'mode-formats'))
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+class FormattedTensor:
+    """Shape, per level seg/crd arrays and values of a tensor in one format, see load_formatted()."""
+
+    def __init__(self, tensor, fmt, arrays, meta=None):
+        self.tensor = tensor
+        self.fmt = fmt
+        self.arrays = arrays
+        self.meta = meta
+
+    @property
+    def shape(self):
+        return tuple(int(dim) for dim in self.arrays["mode_shape"])
+
+    def seg(self, mode):
+        return self.arrays["mode_" + str(mode) + "_seg"]
+
+    def crd(self, mode):
+        return self.arrays["mode_" + str(mode) + "_crd"]
+
+    @property
+    def vals(self):
+        return self.arrays["mode_vals"]
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def __contains__(self, key):
+        return key in self.arrays
+
+
+def container_path(dirname, tensor):
+    return os.path.join(dirname, "tensor_" + tensor + ".sam")
+
+
+# Header and index of a container with arrays of the given (dtype, length), and the offset of the first array
+def _layout(specs, tensor, fmt, meta):
+    index = dict()
+    offset = 0
+    for key, (dtype, length) in specs.items():
+        dtype = np.dtype(dtype)
+        index[key] = {"dtype": dtype.str, "offset": offset, "length": length}
+        offset = _aligned(offset + dtype.itemsize * length)
+    header = {"tensor": tensor, "format": fmt, "arrays": index}
+    if meta is not None:
+        header["meta"] = meta
+    header = json.dumps(header).encode()
+    start = _aligned(len(MAGIC) + _header_len.size + len(header))
+    return header, index, start, start + offset
+
+
+def write_formatted(filename, arrays, tensor, fmt=None, meta=None):
+    arrays = {key: np.ascontiguousarray(arr) for key, arr in arrays.items()}
+    header, index, start, end = _layout({key: (arr.dtype, len(arr)) for key, arr in arrays.items()}, tensor, fmt, meta)
+
+    with open(filename, "wb") as f:
+        f.write(MAGIC + _header_len.pack(len(header)) + header)
+        for key, arr in arrays.items():
+            f.seek(start + index[key]["offset"])
+            f.write(arr.tobytes())
+        # Pad the file to the end of the last array, so every entry maps
+        f.truncate(end)
+
+
+def create_formatted(filename, specs, tensor, fmt=None, meta=None):
+    """Container with arrays of the given {key: (dtype, length)}, returned as writable memory maps to fill in.
+
+    For arrays too large to hold in memory, the file is complete once the maps are flushed.
+    """
+    header, index, start, end = _layout(specs, tensor, fmt, meta)
+    with open(filename, "wb") as f:
+        f.write(MAGIC + _header_len.pack(len(header)) + header)
+        f.truncate(end)
+
+    arrays = dict()
+    for key, entry in index.items():
+        if entry["length"] == 0:
+            arrays[key] = np.empty(0, dtype=entry["dtype"])
+        else:
+            arrays[key] = np.memmap(filename, dtype=entry["dtype"], mode='r+', offset=start + entry["offset"],
+                                    shape=(entry["length"],))
+    return arrays
+
+
+def open_formatted(filename, mmap=True):
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(filename + " is not a formatted tensor container")
+        (length,) = _header_len.unpack(f.read(_header_len.size))
+        header = json.loads(f.read(length))
+        start = _aligned(len(MAGIC) + _header_len.size + length)
+
+        arrays = dict()
+        for key, entry in header["arrays"].items():
+            dtype = np.dtype(entry["dtype"])
+            if entry["length"] == 0:
+                arrays[key] = np.empty(0, dtype=dtype)
+            elif mmap:
+                arrays[key] = np.memmap(filename, dtype=dtype, mode='r', offset=start + entry["offset"],
+                                        shape=(entry["length"],))
+            else:
+                f.seek(start + entry["offset"])
+                arrays[key] = np.fromfile(f, dtype=dtype, count=entry["length"])
+    return FormattedTensor(header["tensor"], header["format"], arrays, header.get("meta"))
+
+
+def load_formatted(name, bench, fmt, mmap=True, tensor="B", path=None):
+    """Tensor of the dataset name formatted for the benchmark bench, from its binary container.
+
+    The container is looked up in <path>/<name>/<bench> (path defaults to $SUITESPARSE_FORMATTED_PATH like
+    the tests), fmt is checked against the format it was written in. With mmap the arrays are read-only
+    memory maps of the file, so only the parts a simulation touches are read.
+    """
+    dirname = os.path.join(formatted_dir if path is None else path, name, bench)
+    formatted = open_formatted(container_path(dirname, tensor), mmap)
+    if fmt is not None and formatted.fmt is not None and formatted.fmt != fmt:
+        raise ValueError("Tensor " + tensor + " of " + name + " is stored as " + formatted.fmt + ", not " + fmt)
+    return formatted
+
+
+# The array of a text level file (e.g. .../tensor_B_mode_0_seg) from the container of its tensor, None if there
+# is no container or the text file is newer
+def formatted_level(filename):
+    dirname, basename = os.path.split(filename)
+    if not basename.startswith("tensor_") or "_mode_" not in basename:
+        return None
+    tensor, key = basename[len("tensor_"):].split("_mode_", 1)
+    container = container_path(dirname, tensor)
+    if not os.path.exists(container) or \
+            (os.path.exists(filename) and os.path.getmtime(filename) > os.path.getmtime(container)):
+        return None
+    formatted = open_formatted(container)
+    return formatted["mode_" + key] if "mode_" + key in formatted else None
+
+
+def _read_text(filename):
+    with open(filename) as f:
+        tokens = f.read().split()
+    try:
+        return np.array(tokens, dtype=np.int64)
+    except ValueError:
+        return np.array(tokens, dtype=np.float64)
+
+
+def convert_formatted(dirname, tensor, fmt=None):
+    """Write the container of a tensor from its text files (tensor_<tensor>_mode_*) in dirname."""
+    prefix = os.path.join(dirname, "tensor_" + tensor + "_mode_")
+    arrays = {"mode_" + filename[len(prefix):]: _read_text(filename) for filename in sorted(glob.glob(prefix + "*"))}
+    if not arrays:
+        raise FileNotFoundError("No text files of tensor " + tensor + " in " + dirname)
+    write_formatted(container_path(dirname, tensor), arrays, tensor, fmt)
+    return container_path(dirname, tensor)
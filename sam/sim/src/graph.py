@@ -0,0 +1,381 @@
+from collections import deque
+
+from .specialize import make_primitive
+from .stats import StatsRegistry
+
+# Network signal types, matching the edge types emitted in the SAM dot graphs
+EDGE_TYPES = ("crd", "ref", "val", "repsig", "bv")
+
+DEFAULT_TIMEOUT = 10000000000000
+
+
+class Bind:
+    """Placeholder for a node argument that is resolved per dataset.
+
+    Either names a key in the bindings dictionary given to SimGraph.build()
+    or is a function that computes the argument from that dictionary.
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def resolve(self, bindings):
+        if callable(self.key):
+            return self.key(bindings)
+        return bindings[self.key]
+
+
+class Edge:
+    def __init__(self, src, dst, dst_port, src_ports, edge_type):
+        if edge_type not in EDGE_TYPES:
+            raise ValueError("Edge type '" + str(edge_type) + "' must be one of " + str(EDGE_TYPES))
+        self.src = src
+        self.dst = dst
+        self.dst_port = dst_port
+        self.src_ports = tuple(src_ports)
+        self.edge_type = edge_type
+
+    def __repr__(self):
+        return self.src + "." + "/".join(self.src_ports) + " -[" + self.edge_type + "]-> " + \
+            self.dst + "." + self.dst_port
+
+
+class SimGraph:
+    """Declarative simulator graph.
+
+    Holds primitive constructors (with dataset dependent arguments left as
+    Bind placeholders), typed edges and input streams. The update order and
+    the edge dispatch order are worked out once, so the same graph can be
+    built and run for any number of datasets.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.node_specs = {}
+        self.edges = []
+        self.inputs = []
+        self.outputs = []
+        self._order = None
+
+    def add_node(self, name, cls, **kwargs):
+        assert name not in self.node_specs, "Node " + name + " already exists"
+        self.node_specs[name] = (cls, kwargs)
+        self._order = None
+        return name
+
+    def add_edge(self, src, dst, dst_port, src_ports, edge_type):
+        assert src in self.node_specs, "Unknown source node " + str(src)
+        assert dst in self.node_specs, "Unknown destination node " + str(dst)
+        if isinstance(src_ports, str):
+            src_ports = (src_ports,)
+        self.edges.append(Edge(src, dst, dst_port, src_ports, edge_type))
+        self._order = None
+
+    # Streams that are fed into the graph from outside (e.g. root references [0, 'D'])
+    def add_input(self, dst, dst_port, key):
+        assert dst in self.node_specs, "Unknown destination node " + str(dst)
+        self.inputs.append((dst, dst_port, key))
+
+    # The simulation finishes once all output nodes are done
+    def set_outputs(self, *names):
+        for name in names:
+            assert name in self.node_specs, "Unknown output node " + str(name)
+        self.outputs = list(names)
+
+    def _topo_order(self):
+        # Kahn's algorithm, stable in insertion order. Feedback edges (e.g. skip lists going
+        # from a joiner back into a scanner) leave cycles behind, which are broken by taking
+        # the earliest inserted remaining node.
+        names = list(self.node_specs.keys())
+        preds = {n: set() for n in names}
+        for e in self.edges:
+            if e.src != e.dst:
+                preds[e.dst].add(e.src)
+        order = []
+        placed = set()
+        while len(order) < len(names):
+            ready = [n for n in names if n not in placed and preds[n] <= placed]
+            if not ready:
+                ready = [next(n for n in names if n not in placed)]
+            for n in ready:
+                order.append(n)
+                placed.add(n)
+        return order
+
+    def order(self):
+        if self._order is None:
+            self._order = self._topo_order()
+        return self._order
+
+    def build(self, bindings=None, skip_idle=False, specialize=False, **common):
+        """Instantiate all primitives for one dataset.
+
+        bindings resolves the Bind placeholders, common keyword arguments
+        (debug, statistics, back_en, depth, ...) are passed to every node.
+        With skip_idle, primitives are only updated while they have pending
+        work (see Primitive.is_idle()); cycle counts are unchanged. With
+        specialize, the nodes are built by make_primitive(), without the
+        debug, statistics and backpressure branches that are turned off.
+        """
+        bindings = {} if bindings is None else bindings
+        nodes = {}
+        for name in self.order():
+            cls, kwargs = self.node_specs[name]
+            args = dict(common)
+            for k, v in kwargs.items():
+                args[k] = v.resolve(bindings) if isinstance(v, Bind) else v
+            if specialize:
+                nodes[name] = make_primitive(cls, debug=args.pop("debug", False), stats=args.pop("statistics", False),
+                                             back_en=args.pop("back_en", False), name=name, **args)
+            else:
+                nodes[name] = cls(name=name, **args)
+        return SimGraphInstance(self, nodes, bindings, skip_idle)
+
+
+class SimGraphInstance:
+    def __init__(self, graph, nodes, bindings, skip_idle=False):
+        self.graph = graph
+        self.nodes = nodes
+        self.bindings = bindings
+        self.skip_idle = skip_idle
+        self.streams = None
+        self.cycles = 0
+        self.done = False
+
+        order = graph.order()
+        rank = {n: i for i, n in enumerate(order)}
+        edges = sorted(graph.edges, key=lambda e: rank[e.dst])
+
+        # Bound-method dispatch tables, split by the number of source ports so the driver
+        # does not have to build argument lists every cycle
+        self._edges1 = []
+        self._edges2 = []
+        self._edgesn = []
+        for e in edges:
+            src = nodes[e.src]
+            setter = getattr(nodes[e.dst], e.dst_port)
+            getters = tuple(getattr(src, p) for p in e.src_ports)
+            if len(getters) == 1:
+                self._edges1.append((setter, getters[0], src))
+            elif len(getters) == 2:
+                self._edges2.append((setter, getters[0], getters[1], src))
+            else:
+                self._edgesn.append((setter, getters, src))
+
+        self._feeds = [(getattr(nodes[dst], port), deque(bindings[key]))
+                       for dst, port, key in graph.inputs]
+        self._updates = [nodes[n].update for n in order]
+        outputs = graph.outputs if graph.outputs else order[-1:]
+        self._done = [nodes[n].out_done for n in outputs]
+
+        # Same tables for the idle-skipping scheduler, with node indices (in update order) attached
+        self._sleep_edges1 = []
+        self._sleep_edges2 = []
+        self._sleep_edgesn = []
+        for e in edges:
+            src = nodes[e.src]
+            setter = getattr(nodes[e.dst], e.dst_port)
+            getters = tuple(getattr(src, p) for p in e.src_ports)
+            if len(getters) == 1:
+                self._sleep_edges1.append((setter, getters[0], src, rank[e.src], rank[e.dst]))
+            elif len(getters) == 2:
+                self._sleep_edges2.append((setter, getters[0], getters[1], src, rank[e.src], rank[e.dst]))
+            else:
+                self._sleep_edgesn.append((setter, getters, src, rank[e.src], rank[e.dst]))
+        self._sleep_feeds = [(getattr(nodes[dst], port), stream, rank[dst])
+                             for (_, stream), (dst, port, _) in zip(self._feeds, graph.inputs)]
+        self._sleep_nodes = [(i, nodes[n].update, nodes[n].is_idle, nodes[n].add_idle_cycles)
+                             for i, n in enumerate(order)]
+        self._awake = [True] * len(order)
+        self._last_update = [-1] * len(order)
+
+    def __getitem__(self, name):
+        return self.nodes[name]
+
+    def step(self):
+        if self.skip_idle:
+            self.run(self.cycles + 1)
+            return self.done
+        for setter, stream in self._feeds:
+            if stream:
+                setter(stream.popleft(), "")
+        for setter, get, parent in self._edges1:
+            setter(get(), parent)
+        for setter, get1, get2, parent in self._edges2:
+            setter(get1(), get2(), parent)
+        for setter, getters, parent in self._edgesn:
+            setter(*[get() for get in getters], parent)
+        for update in self._updates:
+            update()
+        self.cycles += 1
+        self.done = all(done() for done in self._done)
+        return self.done
+
+    def run(self, timeout=DEFAULT_TIMEOUT):
+        if self.skip_idle:
+            return self._run_skip_idle(timeout)
+        feeds = self._feeds
+        edges1 = self._edges1
+        edges2 = self._edges2
+        edgesn = self._edgesn
+        updates = self._updates
+        done_fns = self._done
+
+        done = self.done
+        time_cnt = self.cycles
+        while not done and time_cnt < timeout:
+            for setter, stream in feeds:
+                if stream:
+                    setter(stream.popleft(), "")
+            for setter, get, parent in edges1:
+                setter(get(), parent)
+            for setter, get1, get2, parent in edges2:
+                setter(get1(), get2(), parent)
+            for setter, getters, parent in edgesn:
+                setter(*[get() for get in getters], parent)
+            for update in updates:
+                update()
+            done = True
+            for done_fn in done_fns:
+                if not done_fn():
+                    done = False
+                    break
+            time_cnt += 1
+
+        self.cycles = time_cnt
+        self.done = done
+        return time_cnt
+
+    # A primitive that is idle after its update goes to sleep: its outputs are all '' so edges between two
+    # sleeping primitives are not evaluated, and it is not updated again until a producer hands it a token.
+    # Skipped cycles are added to its bookkeeping in bulk when it wakes up (or when the run ends).
+    def _run_skip_idle(self, timeout):
+        feeds = self._sleep_feeds
+        edges1 = self._sleep_edges1
+        edges2 = self._sleep_edges2
+        edgesn = self._sleep_edgesn
+        sleep_nodes = self._sleep_nodes
+        awake = self._awake
+        last_update = self._last_update
+        done_fns = self._done
+
+        done = self.done
+        time_cnt = self.cycles
+        while not done and time_cnt < timeout:
+            for setter, stream, dst in feeds:
+                if stream:
+                    setter(stream.popleft(), "")
+                    awake[dst] = True
+            for setter, get, parent, src, dst in edges1:
+                if awake[src]:
+                    val = get()
+                    if val != '' and val is not None:
+                        setter(val, parent)
+                        awake[dst] = True
+                    elif awake[dst]:
+                        setter(val, parent)
+                elif awake[dst]:
+                    setter(get(), parent)
+            for setter, get1, get2, parent, src, dst in edges2:
+                if awake[src] or awake[dst]:
+                    val1 = get1()
+                    val2 = get2()
+                    setter(val1, val2, parent)
+                    if (val1 != '' and val1 is not None) or (val2 != '' and val2 is not None):
+                        awake[dst] = True
+            for setter, getters, parent, src, dst in edgesn:
+                if awake[src] or awake[dst]:
+                    vals = [get() for get in getters]
+                    setter(*vals, parent)
+                    for val in vals:
+                        if val != '' and val is not None:
+                            awake[dst] = True
+            for i, update, is_idle, add_idle_cycles in sleep_nodes:
+                if awake[i]:
+                    skipped = time_cnt - last_update[i] - 1
+                    if skipped:
+                        add_idle_cycles(skipped)
+                    update()
+                    last_update[i] = time_cnt
+                    awake[i] = not is_idle()
+            done = True
+            for done_fn in done_fns:
+                if not done_fn():
+                    done = False
+                    break
+            time_cnt += 1
+
+        for i, _, _, add_idle_cycles in sleep_nodes:
+            if not awake[i]:
+                add_idle_cycles(time_cnt - last_update[i] - 1)
+                last_update[i] = time_cnt - 1
+
+        self.cycles = time_cnt
+        self.done = done
+        return time_cnt
+
+    def run_batch(self):
+        """Untimed (functional) run.
+
+        Every primitive processes its complete input streams once, in update
+        order (see Primitive.process_stream()). The output streams and arrays
+        are the same as with run(), but no cycles are simulated and no cycle
+        statistics are collected. Returns the streams of every node by out_*
+        port. Needs an acyclic graph built without back_en.
+        """
+        graph = self.graph
+        order = graph.order()
+        rank = {n: i for i, n in enumerate(order)}
+        for e in graph.edges:
+            if rank[e.src] >= rank[e.dst]:
+                raise ValueError("Batch mode needs an acyclic graph, " + repr(e) + " is a feedback edge")
+        for name, node in self.nodes.items():
+            if node.backpressure_en:
+                raise ValueError("Batch mode has no backpressure, " + name + " was built with back_en")
+
+        in_streams = {n: dict() for n in order}
+        out_ports = {n: [] for n in order}
+        for dst, port, key in graph.inputs:
+            in_streams[dst][port] = list(self.bindings[key])
+        for e in graph.edges:
+            out_ports[e.src] += [p for p in e.src_ports if p not in out_ports[e.src]]
+
+        streams = dict()
+        for name in order:
+            streams[name] = self.nodes[name].process_stream(in_streams[name], out_ports[name])
+            for e in graph.edges:
+                if e.src == name:
+                    assert e.dst_port not in in_streams[e.dst], "Port " + e.dst + "." + e.dst_port + " driven twice"
+                    edge_streams = tuple(streams[name][p] for p in e.src_ports)
+                    in_streams[e.dst][e.dst_port] = edge_streams if len(edge_streams) > 1 else edge_streams[0]
+        self.streams = streams
+        self.done = True
+        return streams
+
+    def statistics(self):
+        stats = dict()
+        for name, node in self.nodes.items():
+            for k, v in node.return_statistics().items():
+                stats[name + "/" + k] = v
+        return stats
+
+    def stats_registry(self, registry=None):
+        """Statistics of every node in one StatsRegistry (see stats.py).
+
+        Nodes built with stats_registry=registry already have their
+        counters, gauges and histograms in it, the return_statistics()
+        values of all nodes are added. Export it with as_dict(), to_csv()
+        or to_json().
+        """
+        registry = StatsRegistry() if registry is None else registry
+        for name, node in self.nodes.items():
+            registry.record(name, node.return_statistics())
+        return registry
+
+    # FIFO occupancy of every primitive, only recorded when built with statistics=True
+    def channel_statistics(self):
+        stats = dict()
+        for name, node in self.nodes.items():
+            for fifo, occupancy in node.channel_statistics().items():
+                stats[name + "/" + fifo] = occupancy
+        return stats
@@ -1,7 +1,12 @@
+import numpy as np
+
 from .base import *
+from .stream import TokenStream, batch_tokens
 
 
 class Joiner2(Primitive, ABC):
+    __slots__ = ("oref1", "oref2")
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.oref1 = ''
@@ -15,14 +20,17 @@ class Joiner2(Primitive, ABC):
 
 
 class CrdJoiner2(Joiner2, ABC):
+    __slots__ = ("ocrd", "in_ref1", "in_ref2", "in_crd1", "in_crd2", "data_valid", "depth", "fifo_avail_in1",
+                 "fifo_avail_in2")
+
     def __init__(self, depth=1, **kwargs):
         super().__init__(**kwargs)
         self.ocrd = ''
 
-        self.in_ref1 = []
-        self.in_ref2 = []
-        self.in_crd1 = []
-        self.in_crd2 = []
+        self.in_ref1 = self.new_channel()
+        self.in_ref2 = self.new_channel()
+        self.in_crd1 = self.new_channel()
+        self.in_crd2 = self.new_channel()
 
         if self.backpressure_en:
             self.ready_backpressure = True
@@ -67,22 +75,24 @@ class CrdJoiner2(Joiner2, ABC):
             # print(in_ref1, " ", in_crd1)
             self.in_ref1.append(in_ref1)
             self.in_crd1.append(in_crd1)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_in1)
+        if self.backpressure_en and not self.fifo_avail_in1:
+            parent.set_backpressure(False)
 
     def set_in2(self, in_ref2, in_crd2, parent=None):
         if in_ref2 != '' and in_crd2 != '' and in_ref2 is not None and in_crd2 is not None:
             # print(in_ref2, " ", in_crd2)
             self.in_ref2.append(in_ref2)
             self.in_crd2.append(in_crd2)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_in2)
+        if self.backpressure_en and not self.fifo_avail_in2:
+            parent.set_backpressure(False)
 
     def out_crd(self):
         return self.ocrd
 
 
 class BVJoiner2(Joiner2):
+    __slots__ = ()
+
     def __init__(self, depth=4, **kwargs):
         super().__init__(**kwargs)
 
@@ -100,13 +110,18 @@ class BVJoiner2(Joiner2):
 
 
 class Intersect2(CrdJoiner2):
+    __slots__ = ("curr_crd1", "curr_crd2", "curr_ref1", "curr_ref2", "skip", "curr_skip1", "curr_skip2", "change_crd1",
+                 "change_crd2", "size_in_ref1", "size_in_ref2", "size_in_crd1", "size_in_crd2", "difference_in_ref",
+                 "max_diff_in_ref", "zero_token_output", "valid_count", "stop_count", "total_count", "count",
+                 "run_count", "max_run_count")
+
     def __init__(self, skip=True, depth=4, **kwargs):
         super().__init__(**kwargs)
         if self.get_stats:
-            self.size_in_ref1 = 0
-            self.size_in_ref2 = 0
-            self.size_in_crd1 = 0
-            self.size_in_crd2 = 0
+            self.size_in_ref1 = self.max_gauge("fifos_ref_1")
+            self.size_in_ref2 = self.max_gauge("fifos_ref_2")
+            self.size_in_crd1 = self.max_gauge("fifos_crd_1")
+            self.size_in_crd2 = self.max_gauge("fifos_crd_2")
 
             self.difference_in_ref = 0
             self.max_diff_in_ref = 0
@@ -116,7 +131,7 @@ class Intersect2(CrdJoiner2):
             self.total_count = 0
             self.count = 0
             self.run_count = 0
-            self.max_run_count = 0
+            self.max_run_count = self.max_gauge("run_count")
 
         self.ocrd = ''
         self.oref1 = ''
@@ -157,8 +172,8 @@ class Intersect2(CrdJoiner2):
         self.ocrd = ''
         self.oref1 = ''
         self.oref2 = ''
-        self.curr_crd2 = self.in_crd2.pop(0)
-        self.curr_ref2 = self.in_ref2.pop(0)
+        self.curr_crd2 = self.in_crd2.popleft()
+        self.curr_ref2 = self.in_ref2.popleft()
         self.change_crd2 = True
         self.curr_skip2 = self.curr_crd1 if self.change_crd1 else ''  # Skip list
         self.change_crd1 = False
@@ -169,8 +184,8 @@ class Intersect2(CrdJoiner2):
         self.ocrd = ''
         self.oref1 = ''
         self.oref2 = ''
-        self.curr_crd1 = self.in_crd1.pop(0)
-        self.curr_ref1 = self.in_ref1.pop(0)
+        self.curr_crd1 = self.in_crd1.popleft()
+        self.curr_ref1 = self.in_ref1.popleft()
         self.change_crd1 = True
         self.curr_skip1 = self.curr_crd2 if self.change_crd2 else ''  # Skip list
         self.change_crd2 = False
@@ -205,10 +220,10 @@ class Intersect2(CrdJoiner2):
                     self.ocrd = 'N'
                     self.oref1 = 'N'
                     self.oref2 = 'N'
-                    self.curr_crd1 = self.in_crd1.pop(0)
-                    self.curr_crd2 = self.in_crd2.pop(0)
-                    self.curr_ref1 = self.in_ref1.pop(0)
-                    self.curr_ref2 = self.in_ref2.pop(0)
+                    self.curr_crd1 = self.in_crd1.popleft()
+                    self.curr_crd2 = self.in_crd2.popleft()
+                    self.curr_ref1 = self.in_ref1.popleft()
+                    self.curr_ref2 = self.in_ref2.popleft()
                     self.change_crd1 = True
                     self.change_crd2 = True
                     self.done = False
@@ -235,17 +250,17 @@ class Intersect2(CrdJoiner2):
                     self.ocrd = '' if self.curr_crd2 is None else self.curr_crd1
                     self.oref1 = '' if self.curr_ref1 is None else self.curr_ref1
                     self.oref2 = '' if self.curr_ref2 is None else self.curr_ref2
-                    self.curr_crd1 = self.in_crd1.pop(0)
-                    self.curr_crd2 = self.in_crd2.pop(0)
-                    self.curr_ref1 = self.in_ref1.pop(0)
-                    self.curr_ref2 = self.in_ref2.pop(0)
+                    self.curr_crd1 = self.in_crd1.popleft()
+                    self.curr_crd2 = self.in_crd2.popleft()
+                    self.curr_ref1 = self.in_ref1.popleft()
+                    self.curr_ref2 = self.in_ref2.popleft()
                     self.change_crd1 = True
                     self.change_crd2 = True
                     if self.get_stats:
                         self.run_count = 0
                         if self.ocrd != '':
                             self.count += 1
-                        self.max_run_count = max(self.max_run_count, abs(self.run_count))
+                        self.max_run_count.update(abs(self.run_count))
                 elif is_stkn(self.curr_crd1):
                     self._inc2()
                 elif is_stkn(self.curr_crd2):
@@ -255,7 +270,7 @@ class Intersect2(CrdJoiner2):
                     if self.get_stats:
                         if self.run_count >= 0:
                             self.run_count += 1
-                            self.max_run_count = max(self.max_run_count, abs(self.run_count))
+                            self.max_run_count.update(abs(self.run_count))
                         else:
                             self.run_count = 0
                 elif self.curr_crd1 > self.curr_crd2:
@@ -263,7 +278,7 @@ class Intersect2(CrdJoiner2):
                     if self.get_stats:
                         if self.run_count < 0:
                             self.run_count -= 1
-                            self.max_run_count = max(self.max_run_count, abs(self.run_count))
+                            self.max_run_count.update(abs(self.run_count))
                         else:
                             self.run_count = 0
                 else:
@@ -297,15 +312,129 @@ class Intersect2(CrdJoiner2):
 
         if self.debug:
             if self.backpressure_en:
-                print("Intersect:", self.check_backpressure(), " ", self.data_valid, self.fifo_avail_in1, self.fifo_avail_in2)
-            print("DEBUG: INTERSECT: ",
-                  "\n OutCrd:", self.ocrd, "\t Out Ref1:", self.oref1, "\t Out Ref2:", self.oref2,
-                  "\n Crd1:", self.curr_crd1, "\t Ref1:", self.curr_ref1,
-                  "\n Crd2:", self.curr_crd2, "\t Ref2", self.curr_ref2,
-                  "\n Skip1:", self.curr_skip1, "\t Skip2:", self.curr_skip2,
-                  "\t Change1:", self.change_crd1, "\t Change2:", self.change_crd2,
-                  "\n Intersection rate: ",
-                  self.return_intersection_rate(), " ", self.in_ref1, self.in_ref2, self.in_crd1, self.in_crd2, self.done)
+                self.log.debug("Intersect:", self.check_backpressure(), " ", self.data_valid, self.fifo_avail_in1,
+                               self.fifo_avail_in2)
+            self.log.debug("DEBUG: INTERSECT: ",
+                           "\n OutCrd:", self.ocrd, "\t Out Ref1:", self.oref1, "\t Out Ref2:", self.oref2,
+                           "\n Crd1:", self.curr_crd1, "\t Ref1:", self.curr_ref1,
+                           "\n Crd2:", self.curr_crd2, "\t Ref2", self.curr_ref2,
+                           "\n Skip1:", self.curr_skip1, "\t Skip2:", self.curr_skip2,
+                           "\t Change1:", self.change_crd1, "\t Change2:", self.change_crd2,
+                           "\n Intersection rate: ",
+                           self.return_intersection_rate(), " ", self.in_ref1, self.in_ref2, self.in_crd1, self.in_crd2,
+                           self.done)
+
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and (len(self.in_crd1) == 0 or len(self.in_crd2) == 0) and \
+            self.curr_crd1 != 'D' and self.curr_crd2 != 'D' and self.ocrd == '' and self.oref1 == '' and \
+            self.oref2 == '' and self.curr_skip1 == '' and self.curr_skip2 == ''
+
+    def add_idle_cycles(self, cycles):
+        super().add_idle_cycles(cycles)
+        if self.get_stats:
+            self.total_count += cycles
+            self.zero_token_output += cycles
+
+    # Fiber-wise set intersection over the complete input streams, streams that are not plain (see
+    # _join_keys()) go through the same state machine as update(). The skip lists feed back into the scanners,
+    # so they are only produced cycle by cycle. Statistics count tokens, not cycles: drop_count leaves out the
+    # cycles spent waiting on input
+    def process_stream(self, in_streams, out_ports=()):
+        if 'out_crd_skip1' in out_ports or 'out_crd_skip2' in out_ports:
+            return super().process_stream(in_streams, out_ports)
+        out = _vector_join(self, in_streams, union=False)
+        if out is None:
+            out = self._join_loop(*_join_lists(in_streams))
+        if self.get_stats:
+            ocrd = out['out_crd']
+            if isinstance(ocrd, TokenStream):
+                self.valid_count += int(np.count_nonzero(ocrd.kind == TKN_DATA))
+                self.stop_count += int(np.count_nonzero(ocrd.kind == TKN_STOP))
+            else:
+                self.valid_count += sum(1 for c in ocrd if isinstance(c, int))
+                self.stop_count += sum(1 for c in ocrd if is_stkn(c))
+        return out
+
+    def _join_loop(self, ref1, crd1, ref2, crd2):
+        stats = self.get_stats
+        len1 = len(crd1)
+        len2 = len(crd2)
+        ocrd = []
+        oref1 = []
+        oref2 = []
+        curr_crd1 = curr_crd2 = curr_ref1 = curr_ref2 = None
+        done = self.done
+        i1 = i2 = 0
+        while True:
+            if i1 < len1 and i2 < len2:
+                if curr_crd1 == 'N' or curr_crd2 == 'N':
+                    if curr_crd1 == 'N':
+                        assert (isinstance(curr_crd2, int) or is_0tkn(curr_crd2))
+                    else:
+                        assert (isinstance(curr_crd1, int) or is_0tkn(curr_crd1))
+                    ocrd.append('N')
+                    oref1.append('N')
+                    oref2.append('N')
+                    curr_crd1, curr_ref1, curr_crd2, curr_ref2 = crd1[i1], ref1[i1], crd2[i2], ref2[i2]
+                    i1 += 1
+                    i2 += 1
+                    done = False
+                    if stats:
+                        self.zero_token_output += 1
+                elif done and curr_crd1 == 'D' and curr_crd2 == 'D':
+                    done = False
+                    curr_crd1, curr_ref1, curr_crd2, curr_ref2 = crd1[i1], ref1[i1], crd2[i2], ref2[i2]
+                    i1 += 1
+                    i2 += 1
+                    if stats:
+                        self.zero_token_output += 2
+                elif curr_crd1 == 'D' or curr_crd2 == 'D' and not done:
+                    assert curr_crd1 == curr_crd2, "Both coordinates need to be done tokens"
+                    done = True
+                    ocrd.append('D')
+                    oref1.append('D')
+                    oref2.append('D')
+                elif curr_crd2 == curr_crd1:
+                    done = False
+                    if curr_crd2 is not None:
+                        ocrd.append(curr_crd1)
+                        oref1.append(curr_ref1)
+                        oref2.append(curr_ref2)
+                        if stats:
+                            self.count += 1
+                    curr_crd1, curr_ref1, curr_crd2, curr_ref2 = crd1[i1], ref1[i1], crd2[i2], ref2[i2]
+                    i1 += 1
+                    i2 += 1
+                    if stats:
+                        self.run_count = 0
+                else:
+                    stkn1 = is_stkn(curr_crd1)
+                    stkn2 = is_stkn(curr_crd2)
+                    inc2 = stkn1 or (not stkn2 and curr_crd1 > curr_crd2)
+                    if inc2:
+                        curr_crd2 = crd2[i2]
+                        curr_ref2 = ref2[i2]
+                        i2 += 1
+                    else:
+                        curr_crd1 = crd1[i1]
+                        curr_ref1 = ref1[i1]
+                        i1 += 1
+                    if stats:
+                        self.zero_token_output += 1
+                        # Runs of side 1 steps, a side 2 step ends them (see update())
+                        if not stkn1 and not stkn2:
+                            self.run_count = 0 if inc2 else self.run_count + 1
+                            self.max_run_count.update(self.run_count)
+            elif curr_crd1 == 'D' or curr_crd2 == 'D':
+                done = True
+                ocrd.append('D')
+                oref1.append('D')
+                oref2.append('D')
+                curr_crd1 = curr_crd2 = curr_ref1 = curr_ref2 = ''
+            else:
+                break
+        self.done = done
+        return {'out_crd': ocrd, 'out_ref1': oref1, 'out_ref2': oref2}
 
     def out_crd_skip1(self):
         return self.curr_skip1 if self.skip else ''
@@ -314,16 +443,16 @@ class Intersect2(CrdJoiner2):
         return self.curr_skip2 if self.skip else ''
 
     def compute_fifos(self):
-        self.size_in_ref1 = max(self.size_in_ref1, len(self.in_ref1))
-        self.size_in_ref2 = max(self.size_in_ref2, len(self.in_ref2))
-        self.size_in_crd1 = max(self.size_in_crd1, len(self.in_crd1))
-        self.size_in_crd2 = max(self.size_in_crd2, len(self.in_crd2))
+        self.size_in_ref1.update(len(self.in_ref1))
+        self.size_in_ref2.update(len(self.in_ref2))
+        self.size_in_crd1.update(len(self.in_crd1))
+        self.size_in_crd2.update(len(self.in_crd2))
 
     def print_fifos(self):
-        print("FIFO in ref 1: ", self.size_in_ref1)
-        print("FIFO in ref 2: ", self.size_in_ref2)
-        print("FIFO in crd 1: ", self.size_in_crd1)
-        print("FIFO in crd 2: ", self.size_in_crd2)
+        print("FIFO in ref 1: ", self.size_in_ref1.value)
+        print("FIFO in ref 2: ", self.size_in_ref2.value)
+        print("FIFO in crd 1: ", self.size_in_crd1.value)
+        print("FIFO in crd 2: ", self.size_in_crd2.value)
 
     def return_intersection_rate(self):
         if self.get_stats:
@@ -336,11 +465,8 @@ class Intersect2(CrdJoiner2):
 
     def return_statistics(self):
         if self.get_stats:
-            stat_dict = {"fifos_ref_1": self.size_in_ref1, "fifos_ref_2": self.size_in_ref2,
-                         "fifos_crd_1": self.size_in_crd1, "fifos_crd_2": self.size_in_crd2,
-                         "fifo_difference": self.max_run_count, "intersection_rate": self.return_intersection_rate(),
-                         "drop_count": self.zero_token_output, "valid_output": self.valid_count,
-                         "run_count": self.max_run_count}
+            stat_dict = {"fifo_difference": self.max_run_count.value, "intersection_rate": self.return_intersection_rate(),
+                         "drop_count": self.zero_token_output, "valid_output": self.valid_count}
             stat_dict.update(super().return_statistics())
         else:
             stat_dict = {}
@@ -348,6 +474,9 @@ class Intersect2(CrdJoiner2):
 
 
 class Union2(CrdJoiner2):
+    __slots__ = ("curr_crd1", "curr_crd2", "curr_ref1", "curr_ref2", "size_in_ref1", "size_in_ref2", "size_in_crd1",
+                 "size_in_crd2", "total_count", "count", "one_only_count", "two_only_count")
+
     def __init__(self, depth=4, **kwargs):
         super().__init__(**kwargs)
         self.curr_crd1 = None
@@ -356,10 +485,10 @@ class Union2(CrdJoiner2):
         self.curr_ref2 = None
 
         if self.get_stats:
-            self.size_in_ref1 = 0
-            self.size_in_ref2 = 0
-            self.size_in_crd1 = 0
-            self.size_in_crd2 = 0
+            self.size_in_ref1 = self.max_gauge("fifos_ref_1")
+            self.size_in_ref2 = self.max_gauge("fifos_ref_2")
+            self.size_in_crd1 = self.max_gauge("fifos_crd_1")
+            self.size_in_crd2 = self.max_gauge("fifos_crd_2")
             self.total_count = 0
             self.count = 0
             self.one_only_count = 0
@@ -396,17 +525,17 @@ class Union2(CrdJoiner2):
                     self.ocrd = '' if self.curr_crd2 is None else self.curr_crd1
                     self.oref1 = '' if self.curr_ref1 is None else self.curr_ref1
                     self.oref2 = '' if self.curr_ref2 is None else self.curr_ref2
-                    self.curr_crd1 = self.in_crd1.pop(0)
-                    self.curr_crd2 = self.in_crd2.pop(0)
-                    self.curr_ref1 = self.in_ref1.pop(0)
-                    self.curr_ref2 = self.in_ref2.pop(0)
+                    self.curr_crd1 = self.in_crd1.popleft()
+                    self.curr_crd2 = self.in_crd2.popleft()
+                    self.curr_ref1 = self.in_ref1.popleft()
+                    self.curr_ref2 = self.in_ref2.popleft()
                     self.done = False
                 elif is_stkn(self.curr_crd1):
                     self.ocrd = self.curr_crd2
                     self.oref1 = 'N'
                     self.oref2 = self.curr_ref2
-                    self.curr_crd2 = self.in_crd2.pop(0)
-                    self.curr_ref2 = self.in_ref2.pop(0)
+                    self.curr_crd2 = self.in_crd2.popleft()
+                    self.curr_ref2 = self.in_ref2.popleft()
                     if self.get_stats:
                         self.two_only_count += 1
                     self.done = False
@@ -414,8 +543,8 @@ class Union2(CrdJoiner2):
                     self.ocrd = self.curr_crd1
                     self.oref1 = self.curr_ref1
                     self.oref2 = 'N'
-                    self.curr_crd1 = self.in_crd1.pop(0)
-                    self.curr_ref1 = self.in_ref1.pop(0)
+                    self.curr_crd1 = self.in_crd1.popleft()
+                    self.curr_ref1 = self.in_ref1.popleft()
                     if self.get_stats:
                         self.one_only_count += 1
                     self.done = False
@@ -423,8 +552,8 @@ class Union2(CrdJoiner2):
                     self.ocrd = self.curr_crd1
                     self.oref1 = self.curr_ref1
                     self.oref2 = 'N'
-                    self.curr_crd1 = self.in_crd1.pop(0)
-                    self.curr_ref1 = self.in_ref1.pop(0)
+                    self.curr_crd1 = self.in_crd1.popleft()
+                    self.curr_ref1 = self.in_ref1.popleft()
                     if self.get_stats:
                         self.one_only_count += 1
                     self.done = False
@@ -432,8 +561,8 @@ class Union2(CrdJoiner2):
                     self.ocrd = self.curr_crd2
                     self.oref1 = 'N'
                     self.oref2 = self.curr_ref2
-                    self.curr_crd2 = self.in_crd2.pop(0)
-                    self.curr_ref2 = self.in_ref2.pop(0)
+                    self.curr_crd2 = self.in_crd2.popleft()
+                    self.curr_ref2 = self.in_ref2.popleft()
                     if self.get_stats:
                         self.two_only_count += 1
                     self.done = False
@@ -441,8 +570,8 @@ class Union2(CrdJoiner2):
                     self.ocrd = self.curr_crd1
                     self.oref1 = self.curr_ref1
                     self.oref2 = 'N'
-                    self.curr_crd1 = self.in_crd1.pop(0)
-                    self.curr_ref1 = self.in_ref1.pop(0)
+                    self.curr_crd1 = self.in_crd1.popleft()
+                    self.curr_ref1 = self.in_ref1.popleft()
                     if self.get_stats:
                         self.one_only_count += 1
                     self.done = False
@@ -450,8 +579,8 @@ class Union2(CrdJoiner2):
                     self.ocrd = self.curr_crd2
                     self.oref1 = 'N'
                     self.oref2 = self.curr_ref2
-                    self.curr_crd2 = self.in_crd2.pop(0)
-                    self.curr_ref2 = self.in_ref2.pop(0)
+                    self.curr_crd2 = self.in_crd2.popleft()
+                    self.curr_ref2 = self.in_ref2.popleft()
                     if self.get_stats:
                         self.two_only_count += 1
                     self.done = False
@@ -490,38 +619,113 @@ class Union2(CrdJoiner2):
                     self.compute_fifos()
 
                 if self.debug:
-                    print("DEBUG: UNION: \t OutCrd:", self.ocrd, "\t Out Ref1:", self.oref1, "\t Out Ref2:", self.oref2,
-                          "\n Crd1:", self.curr_crd1, "\t Ref1:", self.curr_ref1,
-                          "\t Crd2:", self.curr_crd2, "\t Ref2", self.curr_ref2,
-                          "\n Union rate: ",
-                          self.return_union_rate())
+                    self.log.debug("DEBUG: UNION: \t OutCrd:", self.ocrd, "\t Out Ref1:", self.oref1, "\t Out Ref2:",
+                                   self.oref2,
+                                   "\n Crd1:", self.curr_crd1, "\t Ref1:", self.curr_ref1,
+                                   "\t Crd2:", self.curr_crd2, "\t Ref2", self.curr_ref2,
+                                   "\n Union rate: ",
+                                   self.return_union_rate())
+
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and (len(self.in_crd1) == 0 or len(self.in_crd2) == 0) and \
+            self.curr_crd1 != 'D' and self.curr_crd2 != 'D' and self.ocrd == '' and self.oref1 == '' and \
+            self.oref2 == ''
+
+    def add_idle_cycles(self, cycles):
+        super().add_idle_cycles(cycles)
+        if self.get_stats:
+            self.total_count += cycles
+
+    # Fiber-wise set union over the complete input streams, streams that are not plain (see _join_keys()) go
+    # through the same state machine as update()
+    def process_stream(self, in_streams, out_ports=()):
+        out = _vector_join(self, in_streams, union=True)
+        if out is None:
+            out = self._join_loop(*_join_lists(in_streams))
+        return out
+
+    def _join_loop(self, ref1, crd1, ref2, crd2):
+        len1 = len(crd1)
+        len2 = len(crd2)
+        ocrd = []
+        oref1 = []
+        oref2 = []
+        curr_crd1 = curr_crd2 = curr_ref1 = curr_ref2 = None
+        i1 = i2 = 0
+        while True:
+            if i1 < len1 and i2 < len2:
+                if curr_crd1 == 'D' or curr_crd2 == 'D':
+                    # update() repeats the 'D' for as long as leftover inputs sit in the FIFOs, it is emitted once
+                    assert curr_crd1 == curr_ref1 == curr_crd2 == curr_ref2
+                    self.done = True
+                    ocrd.append('D')
+                    oref1.append('D')
+                    oref2.append('D')
+                    break
+                elif curr_crd2 == curr_crd1:
+                    if curr_crd2 is not None:
+                        ocrd.append(curr_crd1)
+                        oref1.append(curr_ref1)
+                        oref2.append(curr_ref2)
+                    curr_crd1, curr_ref1, curr_crd2, curr_ref2 = crd1[i1], ref1[i1], crd2[i2], ref2[i2]
+                    i1 += 1
+                    i2 += 1
+                elif is_stkn(curr_crd1) or (not is_stkn(curr_crd2) and
+                                            (is_0tkn(curr_crd1) or (not is_0tkn(curr_crd2) and curr_crd1 > curr_crd2))):
+                    ocrd.append(curr_crd2)
+                    oref1.append('N')
+                    oref2.append(curr_ref2)
+                    if self.get_stats:
+                        self.two_only_count += 1
+                    curr_crd2 = crd2[i2]
+                    curr_ref2 = ref2[i2]
+                    i2 += 1
+                else:
+                    ocrd.append(curr_crd1)
+                    oref1.append(curr_ref1)
+                    oref2.append('N')
+                    if self.get_stats:
+                        self.one_only_count += 1
+                    curr_crd1 = crd1[i1]
+                    curr_ref1 = ref1[i1]
+                    i1 += 1
+            elif curr_crd1 == 'D' or curr_crd2 == 'D':
+                assert curr_crd1 == curr_ref1 == curr_crd2 == curr_ref2
+                self.done = True
+                ocrd.append('D')
+                oref1.append('D')
+                oref2.append('D')
+                break
+            else:
+                break
+        return {'out_crd': ocrd, 'out_ref1': oref1, 'out_ref2': oref2}
 
     def set_in1(self, in_ref1, in_crd1, parent=None):
         if in_ref1 != '' and in_crd1 != '' and in_ref1 is not None and in_crd1 is not None:
             self.in_ref1.append(in_ref1)
             self.in_crd1.append(in_crd1)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_in1)
+        if self.backpressure_en and not self.fifo_avail_in1:
+            parent.set_backpressure(False)
 
     def set_in2(self, in_ref2, in_crd2, parent=None):
         if in_ref2 != '' and in_crd2 != '' and in_ref2 is not None and in_crd2 is not None:
             self.in_ref2.append(in_ref2)
             self.in_crd2.append(in_crd2)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_in2)
+        if self.backpressure_en and not self.fifo_avail_in2:
+            parent.set_backpressure(False)
 
     def compute_fifos(self):
         if self.get_stats:
-            self.size_in_ref1 = max(self.size_in_ref1, len(self.in_ref1))
-            self.size_in_ref2 = max(self.size_in_ref2, len(self.in_ref2))
-            self.size_in_crd1 = max(self.size_in_crd1, len(self.in_crd1))
-            self.size_in_crd2 = max(self.size_in_crd2, len(self.in_crd2))
+            self.size_in_ref1.update(len(self.in_ref1))
+            self.size_in_ref2.update(len(self.in_ref2))
+            self.size_in_crd1.update(len(self.in_crd1))
+            self.size_in_crd2.update(len(self.in_crd2))
 
     def print_fifos(self):
-        print("FIFO in ref 1: ", self.size_in_ref1)
-        print("FIFO in ref 2: ", self.size_in_ref2)
-        print("FIFO in crd 1: ", self.size_in_crd1)
-        print("FIFO in crd 2: ", self.size_in_crd2)
+        print("FIFO in ref 1: ", self.size_in_ref1.value)
+        print("FIFO in ref 2: ", self.size_in_ref2.value)
+        print("FIFO in crd 1: ", self.size_in_crd1.value)
+        print("FIFO in crd 2: ", self.size_in_crd2.value)
 
     def out_crd(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -546,9 +750,7 @@ class Union2(CrdJoiner2):
 
     def return_statistics(self):
         if self.get_stats:
-            stat_dict = {"fifos_ref_1": self.size_in_ref1, "fifos_ref_2": self.size_in_ref2,
-                         "fifos_crd_1": self.size_in_crd1, "fifos_crd_2": self.size_in_crd2,
-                         "one_only": self.one_only_count, "two_only": self.two_only_count,
+            stat_dict = {"one_only": self.one_only_count, "two_only": self.two_only_count,
                          "total_count": self.total_count}
             stat_dict.update(super().return_statistics())
         else:
@@ -556,20 +758,136 @@ class Union2(CrdJoiner2):
         return stat_dict
 
 
+# (ref, crd) input lists of both joiner ports for the state machine loops
+def _join_lists(in_streams):
+    ref1, crd1 = batch_stream(in_streams, 'set_in1') if 'set_in1' in in_streams else ([], [])
+    ref2, crd2 = batch_stream(in_streams, 'set_in2') if 'set_in2' in in_streams else ([], [])
+    return ref1, crd1, ref2, crd2
+
+
+# Coordinates of a plain joiner input: non-negative coordinates and stop tokens, ending in a single 'D'. Returns
+# their positions, fiber numbers and values and the stop token positions, None for other inputs
+def _join_keys(crd):
+    kind = crd.kind
+    if len(kind) == 0 or kind[-1] != TKN_DONE or crd.dtype.kind not in 'iu':
+        return None
+    is_crd = kind == TKN_DATA
+    stops = np.flatnonzero(~is_crd)[:-1]
+    if np.any(kind[stops] != TKN_STOP):
+        return None
+    pos = np.flatnonzero(is_crd)
+    fiber = np.cumsum(~is_crd)[pos]
+    vals = crd.payload[pos].astype(np.int64)
+    if len(vals) > 0 and vals.min() < 0:
+        return None
+    return pos, fiber, vals, stops
+
+
+# Tokens of stream at positions idx, in the output slots at
+def _place(kind, payload, at, stream, idx):
+    kind[at] = stream.kind[idx]
+    payload[at] = stream.payload[idx]
+
+
+# Fiber-wise intersection (or union) of two plain joiner inputs with the same stop tokens. Coordinates are
+# keyed by (fiber, crd) in one int64, so all fibers are joined by one np.intersect1d() (np.union1d()). Returns
+# None if the inputs do not qualify
+def _vector_join(joiner, in_streams, union):
+    if joiner.curr_crd1 is not None or joiner.curr_crd2 is not None or 'set_in1' not in in_streams or \
+            'set_in2' not in in_streams:
+        return None
+    in1 = batch_tokens(in_streams, 'set_in1')
+    in2 = batch_tokens(in_streams, 'set_in2')
+    if in1 is None or in2 is None:
+        return None
+    ref1, crd1 = in1
+    ref2, crd2 = in2
+    keys1 = _join_keys(crd1)
+    keys2 = _join_keys(crd2)
+    if keys1 is None or keys2 is None:
+        return None
+    pos1, fiber1, vals1, stops1 = keys1
+    pos2, fiber2, vals2, stops2 = keys2
+    if len(stops1) != len(stops2) or not np.array_equal(crd1.payload[stops1], crd2.payload[stops2]):
+        return None
+    width = max(vals1.max(initial=0), vals2.max(initial=0)) + 2
+    key1 = fiber1 * width + vals1
+    key2 = fiber2 * width + vals2
+    if np.any(np.diff(key1) <= 0) or np.any(np.diff(key2) <= 0):
+        return None
+
+    if union:
+        keys = np.union1d(key1, key2)
+        idx1 = np.minimum(np.searchsorted(key1, keys), max(len(key1) - 1, 0))
+        idx2 = np.minimum(np.searchsorted(key2, keys), max(len(key2) - 1, 0))
+        in1 = key1[idx1] == keys if len(key1) > 0 else np.zeros(len(keys), dtype=bool)
+        in2 = key2[idx2] == keys if len(key2) > 0 else np.zeros(len(keys), dtype=bool)
+        crd_out = keys % width
+    else:
+        keys, idx1, idx2 = np.intersect1d(key1, key2, assume_unique=True, return_indices=True)
+        crd_out = vals1[idx1]
+        in1 = in2 = np.ones(len(keys), dtype=bool)
+
+    # Each stop token follows the coordinates of the fiber it closes, a 'D' ends the streams. Refs of coordinates
+    # that only one side has are 'N'
+    num_stops = len(stops1)
+    stop_at = np.searchsorted(keys, np.arange(num_stops) * width + width - 1) + np.arange(num_stops)
+    out_len = len(keys) + num_stops + 1
+    crd_at = np.ones(out_len, dtype=bool)
+    crd_at[stop_at] = False
+    crd_at[-1] = False
+    crd_at = np.flatnonzero(crd_at)
+    out = []
+    for ref, stops, pos, idx, has in [(crd1, stops1, pos1, idx1, None), (ref1, stops1, pos1, idx1, in1),
+                                      (ref2, stops2, pos2, idx2, in2)]:
+        kind = np.full(out_len, TKN_DONE, dtype=np.int8)
+        payload = np.zeros(out_len, dtype=np.int64)
+        if has is None:
+            kind[crd_at] = TKN_DATA
+            payload[crd_at] = crd_out
+        else:
+            kind[crd_at] = TKN_ZERO
+            _place(kind, payload, crd_at[has], ref, pos[idx[has]])
+        _place(kind, payload, stop_at, ref, stops)
+        out.append(TokenStream(kind, payload))
+
+    if joiner.get_stats and not union:
+        joiner.count += out_len - 1
+        joiner.zero_token_output += len(key1) + len(key2) - 2 * len(keys)
+        # Runs of side 1 coordinates dropped between two side 2 coordinates of the same fiber (see update())
+        drop1 = np.ones(len(key1), dtype=bool)
+        drop1[idx1] = False
+        gap = np.searchsorted(key2, key1[drop1])
+        in_fiber = gap < len(key2)
+        in_fiber[in_fiber] = fiber2[gap[in_fiber]] == fiber1[drop1][in_fiber]
+        gap = gap[in_fiber]
+        if len(gap) > 0:
+            joiner.max_run_count.update(int(np.bincount(gap).max()))
+    elif joiner.get_stats:
+        joiner.one_only_count += int(np.count_nonzero(in1 & ~in2))
+        joiner.two_only_count += int(np.count_nonzero(in2 & ~in1))
+    joiner.done = True
+    return {'out_crd': out[0], 'out_ref1': out[1], 'out_ref2': out[2]}
+
+
 class IntersectBV2(BVJoiner2):
+    __slots__ = ("in_ref1", "in_ref2", "in_bv1", "in_bv2", "obv", "curr_bv1", "curr_bv2", "curr_ref1", "curr_ref2",
+                 "reflist1", "reflist2", "emit_refs", "meta_emit_zeros", "size_in_ref1", "size_in_ref2", "size_in_bv1",
+                 "size_in_bv2", "total_count", "count", "data_valid", "depth", "fifo_avail_in1", "fifo_avail_in2")
+
     def __init__(self, emit_zeros=False, depth=4, **kwargs):
         super().__init__(**kwargs)
 
-        self.in_ref1 = []
-        self.in_ref2 = []
-        self.in_bv1 = []
-        self.in_bv2 = []
+        self.in_ref1 = self.new_channel()
+        self.in_ref2 = self.new_channel()
+        self.in_bv1 = self.new_channel()
+        self.in_bv2 = self.new_channel()
 
         if self.get_stats:
-            self.size_in_ref1 = 0
-            self.size_in_ref2 = 0
-            self.size_in_bv1 = 0
-            self.size_in_bv2 = 0
+            self.size_in_ref1 = self.max_gauge("fifos_ref_1")
+            self.size_in_ref2 = self.max_gauge("fifos_ref_2")
+            self.size_in_bv1 = self.max_gauge("fifos_bv_1")
+            self.size_in_bv2 = self.max_gauge("fifos_bv_2")
             self.total_count = 0
             self.count = 0
 
@@ -582,8 +900,8 @@ class IntersectBV2(BVJoiner2):
         self.curr_ref1 = None
         self.curr_ref2 = None
 
-        self.reflist1 = []
-        self.reflist2 = []
+        self.reflist1 = Channel()
+        self.reflist2 = Channel()
         self.emit_refs = False
 
         self.meta_emit_zeros = emit_zeros
@@ -637,16 +955,16 @@ class IntersectBV2(BVJoiner2):
             if self.emit_refs:
                 assert len(self.reflist1) == len(self.reflist2), "Lengths of refs must match"
                 self.obv = ''
-                self.oref1 = self.reflist1.pop(0)
-                self.oref2 = self.reflist2.pop(0)
+                self.oref1 = self.reflist1.popleft()
+                self.oref2 = self.reflist2.popleft()
 
                 self.emit_refs = len(self.reflist1) > 0
                 return
             if len(self.in_bv1) > 0 and len(self.in_bv2) > 0:
-                self.curr_bv1 = self.in_bv1.pop(0)
-                self.curr_bv2 = self.in_bv2.pop(0)
-                self.curr_ref1 = self.in_ref1.pop(0)
-                self.curr_ref2 = self.in_ref2.pop(0)
+                self.curr_bv1 = self.in_bv1.popleft()
+                self.curr_bv2 = self.in_bv2.popleft()
+                self.curr_ref1 = self.in_ref1.popleft()
+                self.curr_ref2 = self.in_ref2.popleft()
 
                 # FIXME: See when only one 'D' signal is present
                 if self.curr_bv1 == 'D' or self.curr_bv2 == 'D':
@@ -666,8 +984,8 @@ class IntersectBV2(BVJoiner2):
                 elif self.curr_bv1 & self.curr_bv2:
                     obv = self.curr_bv1 & self.curr_bv2
 
-                    reflist1 = []
-                    reflist2 = []
+                    reflist1 = Channel()
+                    reflist2 = Channel()
                     self.obv = obv
                     while obv:
                         rbit = right_bit_set(obv)
@@ -681,8 +999,8 @@ class IntersectBV2(BVJoiner2):
                     self.reflist1 = reflist1
                     self.reflist2 = reflist2
 
-                    self.oref1 = self.reflist1.pop(0)
-                    self.oref2 = self.reflist2.pop(0)
+                    self.oref1 = self.reflist1.popleft()
+                    self.oref2 = self.reflist2.popleft()
 
                     self.emit_refs = len(self.reflist1) > 0
                     if self.get_stats:
@@ -705,37 +1023,37 @@ class IntersectBV2(BVJoiner2):
             self.compute_fifos()
 
             if self.debug:
-                print("DEBUG: INTERSECT: \t Outbv:", self.obv, "\t Out Ref1:", self.oref1, "\t Out Ref2:", self.oref2,
-                      "\t bv1:", self.curr_bv1, "\t Ref1:", self.curr_ref1,
-                      "\t bv2:", self.curr_bv2, "\t Ref2", self.curr_ref2, "\t Intersection rate: ",
-                      self.return_intersection_rate())
+                self.log.debug("DEBUG: INTERSECT: \t Outbv:", self.obv, "\t Out Ref1:", self.oref1, "\t Out Ref2:", self.oref2,
+                               "\t bv1:", self.curr_bv1, "\t Ref1:", self.curr_ref1,
+                               "\t bv2:", self.curr_bv2, "\t Ref2", self.curr_ref2, "\t Intersection rate: ",
+                               self.return_intersection_rate())
 
     def set_in1(self, in_ref1, in_bv1, parent=None):
         if in_ref1 != '' and in_bv1 != '' and in_ref1 is not None and in_bv1 is not None:
             self.in_ref1.append(in_ref1)
             self.in_bv1.append(in_bv1)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_in1)
+        if self.backpressure_en and not self.fifo_avail_in1:
+            parent.set_backpressure(False)
 
     def set_in2(self, in_ref2, in_bv2, parent=None):
         if in_ref2 != '' and in_bv2 != '' and in_ref2 is not None and in_bv2 is not None:
             self.in_ref2.append(in_ref2)
             self.in_bv2.append(in_bv2)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_in2)
+        if self.backpressure_en and not self.fifo_avail_in2:
+            parent.set_backpressure(False)
 
     def compute_fifos(self):
         if self.get_stats:
-            self.size_in_ref1 = max(self.size_in_ref1, len(self.in_ref1))
-            self.size_in_ref2 = max(self.size_in_ref2, len(self.in_ref2))
-            self.size_in_bv1 = max(self.size_in_bv1, len(self.in_bv1))
-            self.size_in_bv2 = max(self.size_in_bv2, len(self.in_bv2))
+            self.size_in_ref1.update(len(self.in_ref1))
+            self.size_in_ref2.update(len(self.in_ref2))
+            self.size_in_bv1.update(len(self.in_bv1))
+            self.size_in_bv2.update(len(self.in_bv2))
 
     def print_fifos(self):
-        print("FIFO in ref 1: ", self.size_in_ref1)
-        print("FIFO in ref 2: ", self.size_in_ref2)
-        print("FIFO in bv 1: ", self.size_in_bv1)
-        print("FIFO in bv 2: ", self.size_in_bv2)
+        print("FIFO in ref 1: ", self.size_in_ref1.value)
+        print("FIFO in ref 2: ", self.size_in_ref2.value)
+        print("FIFO in bv 1: ", self.size_in_bv1.value)
+        print("FIFO in bv 2: ", self.size_in_bv2.value)
 
     def out_bv(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
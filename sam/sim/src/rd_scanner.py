@@ -1,4 +1,9 @@
+import numpy as np
+from bisect import bisect_left
+
 from .base import *
+from .stats import TouchTracker
+from .stream import TokenStream
 
 
 #################
@@ -7,13 +12,15 @@ from .base import *
 
 
 class CrdRdScan(Primitive, ABC):
+    __slots__ = ("curr_ref", "curr_crd", "in_ref", "fifo_avail", "data_valid")
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         self.curr_ref = ''
         self.curr_crd = ''
 
-        self.in_ref = []
+        self.in_ref = self.new_channel()
         if self.backpressure_en:
             self.fifo_avail = True
             self.data_valid = True
@@ -22,8 +29,8 @@ class CrdRdScan(Primitive, ABC):
     def set_in_ref(self, in_ref, parent=None):
         if in_ref != '' and in_ref is not None:
             self.in_ref.append(in_ref)
-        if self.backpressure_en and parent != "":
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and parent != "" and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def set_backpressure(self, backpressure):
         if not backpressure:
@@ -69,6 +76,8 @@ class CrdRdScan(Primitive, ABC):
 
 # TODO: figure out how uncompressed read scans work with 'N' tokens
 class UncompressCrdRdScan(CrdRdScan):
+    __slots__ = ("start_addr", "stop_addr", "curr_in_ref", "meta_dim", "end_fiber", "emit_tkn", "begin", "depth")
+
     def __init__(self, dim=0, depth=4, **kwargs):
         super().__init__(**kwargs)
 
@@ -102,7 +111,7 @@ class UncompressCrdRdScan(CrdRdScan):
             if self.emit_tkn and len(self.in_ref) > 0:
                 next_in = self.in_ref[0]
                 if is_stkn(next_in):
-                    self.in_ref.pop(0)
+                    self.in_ref.popleft()
                     stkn = increment_stkn(next_in)
                 else:
                     stkn = 'S0'
@@ -111,7 +120,7 @@ class UncompressCrdRdScan(CrdRdScan):
                 self.emit_tkn = False
                 return
             elif self.end_fiber and len(self.in_ref) > 0:
-                self.curr_in_ref = self.in_ref.pop(0)
+                self.curr_in_ref = self.in_ref.popleft()
                 if self.curr_in_ref == 'D':
                     self.curr_crd = 'D'
                     self.curr_ref = 'D'
@@ -122,7 +131,7 @@ class UncompressCrdRdScan(CrdRdScan):
                     if len(self.in_ref) > 0:
                         next_in = self.in_ref[0]
                         if is_stkn(next_in):
-                            self.in_ref.pop(0)
+                            self.in_ref.popleft()
                             stkn = increment_stkn(next_in)
                         else:
                             stkn = 'S0'
@@ -145,7 +154,7 @@ class UncompressCrdRdScan(CrdRdScan):
             if is_stkn(self.curr_crd) or self.begin:
                 self.begin = False
                 if len(self.in_ref) > 0:
-                    self.curr_in_ref = self.in_ref.pop(0)
+                    self.curr_in_ref = self.in_ref.popleft()
                     if self.curr_in_ref == 'D':
                         self.curr_crd = 'D'
                         self.curr_ref = 'D'
@@ -166,7 +175,7 @@ class UncompressCrdRdScan(CrdRdScan):
                 if len(self.in_ref) > 0:
                     next_in = self.in_ref[0]
                     if is_stkn(next_in):
-                        self.in_ref.pop(0)
+                        self.in_ref.popleft()
                         stkn = increment_stkn(next_in)
                     else:
                         stkn = 'S0'
@@ -181,21 +190,46 @@ class UncompressCrdRdScan(CrdRdScan):
                 self.curr_ref = self.curr_crd + self.curr_in_ref * self.meta_dim
 
             if self.debug:
-                print("DEBUG: U RD SCAN: \t "
-                      "Curr inref:", self.curr_in_ref, "\tEmit tkn:", self.emit_tkn, "\tEnd Fiber", self.end_fiber,
-                      "\nCurr crd:", self.curr_crd, "\t curr ref:", self.curr_ref)
+                self.log.debug("DEBUG: U RD SCAN: \t "
+                               "Curr inref:", self.curr_in_ref, "\tEmit tkn:", self.emit_tkn, "\tEnd Fiber", self.end_fiber,
+                               "\nCurr crd:", self.curr_crd, "\t curr ref:", self.curr_ref)
+
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and len(self.in_ref) == 0 and not self.begin and \
+            self.curr_crd == '' and self.curr_ref == ''
+
+
+# Index of the first element of the sorted arr[lo:hi] that is not smaller than x (hi if there is none).
+# Searches exponentially from lo, so finding a target d positions ahead takes O(log d) steps
+def gallop_left(arr, x, lo, hi):
+    bound = 1
+    while lo + bound < hi and arr[lo + bound] < x:
+        bound *= 2
+    return bisect_left(arr, x, lo + bound // 2, min(lo + bound + 1, hi))
 
 
 def last_stkn(skiplist):
-    max_ref = None
-    for i, item in enumerate(skiplist):
+    i = len(skiplist)
+    for item in reversed(skiplist):
+        i -= 1
         if is_stkn(item):
-            max_ref = i
-    return max_ref
+            return i
+    return None
+
+
+def _as_list(arr):
+    return arr.tolist() if isinstance(arr, np.ndarray) else arr
 
 
 class CompressedCrdRdScan(CrdRdScan):
-    def __init__(self, crd_arr=[], seg_arr=[], skip=True, depth=1, tile_size=None, fifo=None, **kwargs):
+    __slots__ = ("skip", "skip_rate", "skip_stall", "skip_pending", "in_crd_skip", "curr_skip", "skip_processed",
+                 "prev_crd", "crd_arr", "seg_arr", "start_addr", "stop_addr", "curr_addr", "end_fiber",
+                 "emit_fiber_stkn", "meta_clen", "meta_slen", "skip_stkn_cnt", "out_stkn_cnt", "begin", "unique_refs",
+                 "total_outputs", "elements_skipped", "skip_cnt", "intersection_behind_cnt", "fiber_behind_cnt",
+                 "stop_count", "empty_tkn_cnt", "depth")
+
+    def __init__(self, crd_arr=[], seg_arr=[], skip=True, depth=1, tile_size=None, fifo=None, skip_rate=None,
+                 **kwargs):
         super().__init__(**kwargs)
 
         if tile_size is not None:
@@ -203,12 +237,19 @@ class CompressedCrdRdScan(CrdRdScan):
 
         # Used for skip list
         self.skip = skip
-        self.in_crd_skip = []
+        # Coordinates a skip can advance over per cycle (None for any number in one cycle)
+        assert skip_rate is None or skip_rate > 0
+        self.skip_rate = skip_rate
+        self.skip_stall = 0
+        self.skip_pending = None
+        self.in_crd_skip = self.new_channel()
         self.curr_skip = None
         self.skip_processed = True
         self.prev_crd = 0
         # [Olivia]: I think this is needed to make sure we are looking at the correct fiber
 
+        # NumPy arrays (e.g. from load_formatted) are scanned as lists, the tokens are Python ints
+        crd_arr, seg_arr = _as_list(crd_arr), _as_list(seg_arr)
         self.crd_arr = crd_arr
         self.seg_arr = seg_arr
         self.start_addr = 0
@@ -225,8 +266,7 @@ class CompressedCrdRdScan(CrdRdScan):
 
         # Statistics
         if self.get_stats:
-            self.unique_refs = []
-            # self.unique_crds = []
+            self.unique_refs = TouchTracker(len(crd_arr))
             self.total_outputs = 0
             self.elements_skipped = 0
             self.skip_cnt = 0
@@ -248,6 +288,7 @@ class CompressedCrdRdScan(CrdRdScan):
 
     def reinitialize_arrs(self, seg_arr, crd_arr, fifo):
         # assert False
+        crd_arr, seg_arr = _as_list(crd_arr), _as_list(seg_arr)
         self.start_addr = 0
         self.stop_addr = 0
         self.end_fiber = False
@@ -261,9 +302,9 @@ class CompressedCrdRdScan(CrdRdScan):
         # self.begin = True
         self.seg_arr = seg_arr
         self.crd_arr = crd_arr
-        print(fifo)
+        if self.debug:
+            self.log.debug("RD SCAN: reinitialize", fifo, self.in_ref)
         for a_ in fifo:
-            print(self.in_ref)
             self.in_ref.append(a_)
 
         # if fifo is not None:
@@ -289,8 +330,8 @@ class CompressedCrdRdScan(CrdRdScan):
     def set_in_ref(self, in_ref, parent=None):
         if in_ref != '' and in_ref is not None:
             self.in_ref.append(in_ref)
-        if self.backpressure_en and parent != "":
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and parent != "" and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def out_ref(self, child=None):
         if self.backpressure_en and self.data_valid:
@@ -314,7 +355,7 @@ class CompressedCrdRdScan(CrdRdScan):
         if len(self.in_ref) > 0:
             next_in = self.in_ref[0]
             if is_stkn(next_in):
-                self.in_ref.pop(0)
+                self.in_ref.popleft()
                 stkn = increment_stkn(next_in)
             else:
                 stkn = 'S0'
@@ -332,12 +373,25 @@ class CompressedCrdRdScan(CrdRdScan):
         self.curr_ref = self.curr_addr
         self.curr_crd = self.crd_arr[self.curr_addr]
         if self.get_stats:
-            # if self.curr_ref not in self.unique_refs:
-            #    self.unique_refs.append(self.curr_ref)
-            # if self.curr_crd not in self.unique_crds:
-            #    self.unique_crds.append(self.curr_crd)
+            self.unique_refs.touch(self.curr_ref)
             self.total_outputs += 1
 
+    # Emit the first coordinate of the fiber that is not smaller than the skip coordinate (or end the fiber).
+    # Coordinates from first_unread on have not been emitted yet
+    def _skip_to(self, first_unread):
+        addr = gallop_left(self.crd_arr, self.curr_skip, max(first_unread, self.start_addr), self.stop_addr)
+        if addr == self.stop_addr:
+            self._emit_stkn_code()
+        else:
+            self.curr_addr = addr
+            self._set_curr()
+        if self.get_stats:
+            self.elements_skipped += min(addr + 1, self.stop_addr) - self.start_addr
+            self.skip_cnt += 1
+        if self.skip_rate is not None:
+            # Advancing over n coordinates takes ceil(n / skip_rate) cycles, the last one emits
+            self.skip_stall = max(0, -(-(addr - first_unread) // self.skip_rate) - 1)
+
     def return_statistics(self):
         if self.get_stats:
             dic = {"total_size": len(self.crd_arr), "outputs_by_block": self.total_outputs,
@@ -366,9 +420,16 @@ class CompressedCrdRdScan(CrdRdScan):
         if (self.backpressure_en and self.check_backpressure()) or not self.backpressure_en:
             if self.backpressure_en:
                 self.data_valid = True
+            # A rate limited skip holds back the token it found
+            if self.skip_pending is not None:
+                self.skip_stall -= 1
+                if self.skip_stall == 0:
+                    self.curr_ref, self.curr_crd = self.skip_pending
+                    self.skip_pending = None
+                return
             # Process skip token first and save
             if len(self.in_crd_skip) > 0 and self.skip_processed:
-                self.curr_skip = self.in_crd_skip.pop(0)
+                self.curr_skip = self.in_crd_skip.popleft()
                 if self.skip_stkn_cnt == self.out_stkn_cnt and isinstance(self.curr_skip, int) \
                         and self.curr_skip < self.prev_crd:
                     # ignore the skip if it's too small
@@ -403,7 +464,7 @@ class CompressedCrdRdScan(CrdRdScan):
             elif len(self.in_ref) > 0 and self.emit_fiber_stkn:
                 next_in = self.in_ref[0]
                 if is_stkn(next_in):
-                    self.in_ref.pop(0)
+                    self.in_ref.popleft()
                     stkn = increment_stkn(next_in)
                 else:
                     stkn = 'S0'
@@ -421,11 +482,11 @@ class CompressedCrdRdScan(CrdRdScan):
                 self.begin = False
                 self.end_fiber = False
 
-                curr_in_ref = self.in_ref.pop(0)
+                curr_in_ref = self.in_ref.popleft()
 
                 # Input reference is out of bounds
                 if isinstance(curr_in_ref, int) and curr_in_ref + 1 > self.meta_slen:
-                    print(curr_in_ref, self.meta_slen, self.in_ref)
+                    self.log.error(curr_in_ref, self.meta_slen, self.in_ref)
                     raise Exception('Not enough elements in seg array')
 
                 # Input reference is a done token, so forward that token (and set done if done token)
@@ -473,34 +534,12 @@ class CompressedCrdRdScan(CrdRdScan):
                     else:
                         if self.skip and not self.skip_processed:
                             # assert self.out_stkn_cnt == self.skip_stkn_cnt
-                            curr_range = self.crd_arr[self.start_addr: self.stop_addr]
                             # Skip to next coordinate
                             if isinstance(self.curr_skip, int) \
                                     and self.curr_skip > self.prev_crd:
-                                print("RD SCAN: SKIP HERE")
-                                # If coordinate skipped to exists, emit that
-                                if self.curr_skip in curr_range:
-                                    self.curr_addr = curr_range.index(self.curr_skip) + self.start_addr
-                                    self._set_curr()
-                                    if self.get_stats:
-                                        self.elements_skipped += curr_range.index(self.curr_skip) + 1
-                                        self.skip_cnt += 1
-
-                                # Else emit smallest coordinate larger than the one provided by skip
-                                else:
-                                    larger = [i for i in curr_range if i > self.curr_skip]
-                                    if not larger:
-                                        self._emit_stkn_code()
-                                        if self.get_stats:
-                                            self.elements_skipped += len(curr_range)
-                                            self.skip_cnt += 1
-                                    else:
-                                        val_larger = min(larger)
-                                        self.curr_addr = curr_range.index(val_larger) + self.start_addr
-                                        self._set_curr()
-                                        if self.get_stats:
-                                            self.elements_skipped += curr_range.index(val_larger) + 1
-                                            self.skip_cnt += 1
+                                if self.debug:
+                                    self.log.debug("RD SCAN: SKIP HERE")
+                                self._skip_to(self.start_addr)
 
                             # Early exit from skip
                             elif is_stkn(self.curr_skip):
@@ -521,34 +560,11 @@ class CompressedCrdRdScan(CrdRdScan):
                 default_behavior = True
                 if self.skip and not self.skip_processed:
                     # assert self.out_stkn_cnt == self.skip_stkn_cnt
-                    curr_range = self.crd_arr[self.start_addr: self.stop_addr]
                     if isinstance(self.curr_skip, int) \
                             and self.curr_skip > self.prev_crd:
-                        print("RD SCAN: SKIP HERE")
-                        # If coordinate skipped to exists, emit that
-                        if self.curr_skip in curr_range:
-                            self.curr_addr = curr_range.index(self.curr_skip) + self.start_addr
-                            self._set_curr()
-                            if self.get_stats:
-                                self.elements_skipped += curr_range.index(self.curr_skip) + 1
-                                self.skip_cnt += 1
-
-                        # Else emit smallest coordinate larger than the one provided by skip
-                        else:
-                            larger = [i for i in curr_range if i > self.curr_skip]
-                            if not larger:
-                                self._emit_stkn_code()
-                                if self.get_stats:
-                                    self.elements_skipped += len(curr_range)
-                                    self.skip_cnt += 1
-                            else:
-                                val_larger = min(larger)
-                                self.curr_addr = curr_range.index(val_larger) + self.start_addr
-                                self._set_curr()
-                                if self.get_stats:
-                                    self.elements_skipped += curr_range.index(val_larger) + 1
-                                    self.skip_cnt += 1
-
+                        if self.debug:
+                            self.log.debug("RD SCAN: SKIP HERE")
+                        self._skip_to(self.curr_addr + 1)
                         default_behavior = False
                     elif is_stkn(self.curr_skip):
                         self._emit_stkn_code()
@@ -578,50 +594,61 @@ class CompressedCrdRdScan(CrdRdScan):
             if self.get_stats and is_stkn(self.curr_crd):
                 self.stop_count += 1
 
+            if self.skip_stall > 0 and self.skip_pending is None:
+                self.skip_pending = (self.curr_ref, self.curr_crd)
+                self.curr_ref = ''
+                self.curr_crd = ''
+
             # Debugging print statements
             if self.debug and self.backpressure_en:
-                print("DEBUG: C RD SCAN:"
-                      "\n \t"
-                      "name: ", self.name, "\t ref", len(self.in_ref), " :: ", self.in_ref,
-                      "\t Curr crd:", self.curr_crd, "\t curr ref:", self.curr_ref,
-                      "\n curr addr:", self.curr_addr, "\t start addr:", self.start_addr, "\t stop addr:", self.stop_addr,
-                      "\n end fiber:", self.end_fiber, "\t curr input:", curr_in_ref,
-                      "\n skip in:", self.curr_skip, "\t skip processed", self.skip_processed, "\t prev crd:",
-                      self.prev_crd,
-                      "\n Out stkn cnt:", self.out_stkn_cnt, "\t Skip stkn cnt:", self.skip_stkn_cnt, "\t Bakcpressure: ",
-                      self.check_backpressure(), "\t backpressure_len: ",
-                      self.data_valid, self.done)
+                self.log.debug("DEBUG: C RD SCAN:"
+                               "\n \t"
+                               "name: ", self.name, "\t ref", len(self.in_ref), " :: ", self.in_ref,
+                               "\t Curr crd:", self.curr_crd, "\t curr ref:", self.curr_ref,
+                               "\n curr addr:", self.curr_addr, "\t start addr:", self.start_addr, "\t stop addr:",
+                               self.stop_addr,
+                               "\n end fiber:", self.end_fiber, "\t curr input:", curr_in_ref,
+                               "\n skip in:", self.curr_skip, "\t skip processed", self.skip_processed, "\t prev crd:",
+                               self.prev_crd,
+                               "\n Out stkn cnt:", self.out_stkn_cnt, "\t Skip stkn cnt:", self.skip_stkn_cnt,
+                               "\t Bakcpressure: ",
+                               self.check_backpressure(), "\t backpressure_len: ",
+                               self.data_valid, self.done)
             elif self.debug:
-                print("DEBUG: C RD SCAN:"
-                      "\n \t"
-                      "name: ", self.name, "\t ref", len(self.in_ref), " :: ", self.in_ref,
-                      "\t Curr crd:", self.curr_crd, "\t curr ref:", self.curr_ref,
-                      "\n curr addr:", self.curr_addr, "\t start addr:", self.start_addr, "\t stop addr:", self.stop_addr,
-                      "\n end fiber:", self.end_fiber, "\t curr input:", curr_in_ref,
-                      "\n skip in:", self.curr_skip, "\t skip processed", self.skip_processed, "\t prev crd:",
-                      self.prev_crd,
-                      "\n Out stkn cnt:", self.out_stkn_cnt, "\t Skip stkn cnt:", self.skip_stkn_cnt, self.done)
+                self.log.debug("DEBUG: C RD SCAN:"
+                               "\n \t"
+                               "name: ", self.name, "\t ref", len(self.in_ref), " :: ", self.in_ref,
+                               "\t Curr crd:", self.curr_crd, "\t curr ref:", self.curr_ref,
+                               "\n curr addr:", self.curr_addr, "\t start addr:", self.start_addr, "\t stop addr:",
+                               self.stop_addr,
+                               "\n end fiber:", self.end_fiber, "\t curr input:", curr_in_ref,
+                               "\n skip in:", self.curr_skip, "\t skip processed", self.skip_processed, "\t prev crd:",
+                               self.prev_crd,
+                               "\n Out stkn cnt:", self.out_stkn_cnt, "\t Skip stkn cnt:", self.skip_stkn_cnt, self.done)
         else:
             # Debugging print statements
             if self.debug and self.backpressure_en:
-                print("DEBUG: C RD SCAN:"
-                      "\n \t"
-                      "name: ", self.name, "\t ref", len(self.in_ref), " :: ", self.in_ref,
-                      "\t Curr crd:", self.curr_crd, "\t curr ref:", self.curr_ref,
-                      "\n curr addr:", self.curr_addr, "\t start addr:", self.start_addr, "\t stop addr:", self.stop_addr,
-                      "\n skip in:", self.curr_skip, "\t skip processed", self.skip_processed, "\t prev crd:",
-                      self.prev_crd,
-                      "\n Out stkn cnt:", self.out_stkn_cnt, "\t Skip stkn cnt:", self.skip_stkn_cnt, "\t Bakcpressure: ",
-                      self.data_valid)
+                self.log.debug("DEBUG: C RD SCAN:"
+                               "\n \t"
+                               "name: ", self.name, "\t ref", len(self.in_ref), " :: ", self.in_ref,
+                               "\t Curr crd:", self.curr_crd, "\t curr ref:", self.curr_ref,
+                               "\n curr addr:", self.curr_addr, "\t start addr:", self.start_addr, "\t stop addr:",
+                               self.stop_addr,
+                               "\n skip in:", self.curr_skip, "\t skip processed", self.skip_processed, "\t prev crd:",
+                               self.prev_crd,
+                               "\n Out stkn cnt:", self.out_stkn_cnt, "\t Skip stkn cnt:", self.skip_stkn_cnt,
+                               "\t Bakcpressure: ",
+                               self.data_valid)
             elif self.debug:
-                print("DEBUG: C RD SCAN:"
-                      "\n \t"
-                      "name: ", self.name, "\t ref", len(self.in_ref), " :: ", self.in_ref,
-                      "\t Curr crd:", self.curr_crd, "\t curr ref:", self.curr_ref,
-                      "\n curr addr:", self.curr_addr, "\t start addr:", self.start_addr, "\t stop addr:", self.stop_addr,
-                      "\n skip in:", self.curr_skip, "\t skip processed", self.skip_processed, "\t prev crd:",
-                      self.prev_crd,
-                      "\n Out stkn cnt:", self.out_stkn_cnt, "\t Skip stkn cnt:", self.skip_stkn_cnt, self.done)
+                self.log.debug("DEBUG: C RD SCAN:"
+                               "\n \t"
+                               "name: ", self.name, "\t ref", len(self.in_ref), " :: ", self.in_ref,
+                               "\t Curr crd:", self.curr_crd, "\t curr ref:", self.curr_ref,
+                               "\n curr addr:", self.curr_addr, "\t start addr:", self.start_addr, "\t stop addr:",
+                               self.stop_addr,
+                               "\n skip in:", self.curr_skip, "\t skip processed", self.skip_processed, "\t prev crd:",
+                               self.prev_crd,
+                               "\n Out stkn cnt:", self.out_stkn_cnt, "\t Skip stkn cnt:", self.skip_stkn_cnt, self.done)
             # # Debugging print statements
             # if self.debug:
             #    print("DEBUG: C RD SCAN:"
@@ -635,6 +662,32 @@ class CompressedCrdRdScan(CrdRdScan):
             #          "\n emit_fiber_stkn:", self.emit_fiber_stkn,
             #          "\n Out stkn cnt:", self.out_stkn_cnt, "\t Skip stkn cnt:", self.skip_stkn_cnt)
 
+    def is_idle(self):
+        if self.debug or self.backpressure_en:
+            return False
+        if len(self.in_ref) > 0 or len(self.in_crd_skip) > 0 or self.curr_ref != '' or self.curr_crd != '' or \
+                self.skip_pending is not None:
+            return False
+        if self.done:
+            return self.curr_addr == 0 and self.start_addr == 0 and self.stop_addr == 0
+        return not (self.curr_addr == self.stop_addr - 1 or self.curr_addr == self.meta_clen - 1) and \
+            (self.skip_processed or self.skip_stkn_cnt >= self.out_stkn_cnt)
+
+    # Whole fibers at a time. Skip lists need the cycle-by-cycle interplay with the intersecter
+    def process_stream(self, in_streams, out_ports=()):
+        if 'set_crd_skip' in in_streams:
+            return super().process_stream(in_streams, out_ports)
+        in_ref = list(self.in_ref) + batch_stream(in_streams, 'set_in_ref')
+        self.in_ref.clear()
+        out_ref, out_crd = scan_fibers(self.seg_arr, self.crd_arr, in_ref)
+        if self.get_stats:
+            refs = out_ref.data()
+            self.unique_refs.touch_all(refs)
+            self.total_outputs += len(refs)
+        if len(out_ref) > 0 and out_ref.kind[-1] == TKN_DONE:
+            self.done = True
+        return {'out_ref': out_ref, 'out_crd': out_crd}
+
     def set_crd_skip(self, in_crd, parent=None):
         assert in_crd is None or is_valid_crd(in_crd)
         if in_crd != '' and in_crd is not None:
@@ -642,21 +695,142 @@ class CompressedCrdRdScan(CrdRdScan):
                 idx = last_stkn(self.in_crd_skip)
                 if idx is not None:
                     # Flush coordinates
-                    self.in_crd_skip = self.in_crd_skip[:idx + 1]
+                    while len(self.in_crd_skip) > idx + 1:
+                        self.in_crd_skip.pop()
             self.in_crd_skip.append(in_crd)
-        if self.backpressure_en and parent != "":
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and parent != "" and not self.fifo_avail:
+            parent.set_backpressure(False)
+
+
+def scan_fibers(seg_arr, crd_arr, in_ref):
+    """Output (ref, crd) TokenStreams of a CompressedCrdRdScan without skip lists for the input ref stream.
+
+    Same streams as the cycle-by-cycle scanner, including the stall on the last input reference: until the
+    next reference (or its stop token) arrives, only the first coordinate of its fiber comes out. Without
+    crd_arr only the ref stream is built.
+    """
+    # Pieces of the output: a range of crd_arr positions or a single control token
+    base = []
+    length = []
+    kind = []
+    num_refs = len(in_ref)
+    i = 0
+    while i < num_refs:
+        ref = in_ref[i]
+        i += 1
+        if ref == 'D':
+            base.append(0)
+            length.append(1)
+            kind.append(TKN_DONE)
+            break
+        elif is_stkn(ref):
+            base.append(stkn_order(ref) + 1)
+            length.append(1)
+            kind.append(TKN_STOP)
+            continue
+        elif is_0tkn(ref):
+            base.append(0)
+            length.append(1)
+            kind.append(TKN_ZERO)
+        else:
+            if ref + 1 > len(seg_arr):
+                raise Exception('Not enough elements in seg array')
+            start_addr = seg_arr[ref]
+            stop_addr = seg_arr[ref + 1]
+            if i == num_refs:
+                stop_addr = min(stop_addr, start_addr + 1)
+            if stop_addr > start_addr:
+                base.append(start_addr)
+                length.append(stop_addr - start_addr)
+                kind.append(TKN_DATA)
+
+        # End of fiber, the stop token waits for the next input reference
+        if i == num_refs:
+            break
+        base.append(stkn_order(in_ref[i]) + 1 if is_stkn(in_ref[i]) else 0)
+        length.append(1)
+        kind.append(TKN_STOP)
+        if is_stkn(in_ref[i]):
+            i += 1
+
+    length = np.array(length, dtype=np.int64)
+    offsets = np.cumsum(length) - length
+    kinds = np.repeat(np.array(kind, dtype=np.int8), length)
+    refs = np.repeat(np.array(base, dtype=np.int64) - offsets, length) + np.arange(len(kinds), dtype=np.int64)
+    if crd_arr is None:
+        return TokenStream(kinds, refs), None
+    data = kinds == TKN_DATA
+    crds = refs.copy()
+    crds[data] = np.asarray(crd_arr, dtype=np.int64)[refs[data]]
+    return TokenStream(kinds, refs), TokenStream(kinds, crds)
+
+
+def scan_cycles(seg_arr, in_ref, arrival=None):
+    """Cycle in which a CompressedCrdRdScan without skip lists or backpressure emits 'D' for the input ref
+    stream (None if it never does).
+
+    arrival[k] is the first cycle (counting from 1) in which input reference k is in the scanner's FIFO,
+    by default one reference per cycle as SimGraph feeds its inputs. The scanner emits at most one token per
+    cycle and stalls while the reference that decides the next token has not arrived: the first coordinate
+    of a fiber needs its own reference, the other coordinates and the closing stop token need the next one.
+    """
+    if arrival is None:
+        arrival = range(1, len(in_ref) + 1)
+    num_refs = len(in_ref)
+    t = 0
+    i = 0
+    while i < num_refs:
+        ref = in_ref[i]
+        if ref == 'D':
+            return max(t + 1, arrival[i])
+        elif is_stkn(ref):
+            t = max(t + 1, arrival[i])
+            i += 1
+            continue
+        elif is_0tkn(ref):
+            t = max(t + 1, arrival[i])
+        else:
+            fiber_len = seg_arr[ref + 1] - seg_arr[ref]
+            # An empty fiber pops its reference without emitting anything
+            t = max(t + 1, arrival[i]) - (1 if fiber_len == 0 else 0)
+            if fiber_len > 1:
+                if i + 1 == num_refs:
+                    return None
+                t = max(t + fiber_len - 1, arrival[i + 1] + fiber_len - 2)
+
+        i += 1
+        if i == num_refs:
+            return None
+        t = max(t + 1, arrival[i])
+        if is_stkn(in_ref[i]):
+            i += 1
+    return None
+
+
+def scan_statistics(seg_arr, in_ref):
+    """Stream statistics of a scanner-only run, without simulating it."""
+    out_ref, _ = scan_fibers(seg_arr, None, in_ref)
+    kinds = out_ref.kind
+    fiber_lens = np.diff(out_ref.segments()) - 1
+    return {"outputs_by_block": int(np.count_nonzero(kinds == TKN_DATA)),
+            "stop_tokens": int(np.count_nonzero(kinds == TKN_STOP)),
+            "zero_tokens": int(np.count_nonzero(kinds == TKN_ZERO)),
+            "fibers": len(fiber_lens), "empty_fibers": int(np.count_nonzero(fiber_lens == 0)),
+            "max_fiber_len": int(fiber_lens.max()) if len(fiber_lens) > 0 else 0,
+            "cycles": scan_cycles(seg_arr, in_ref)}
 
 
 # ---------------- BV --------------#
 class BVRdScanSuper(Primitive, ABC):
+    __slots__ = ("curr_ref", "curr_bv", "in_ref", "fifo_avail", "data_valid")
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         self.curr_ref = 'S0'
         self.curr_bv = 'S0'
 
-        self.in_ref = []
+        self.in_ref = self.new_channel()
         if self.backpressure_en:
             self.fifo_avail = True
             self.ready_backpressure = True
@@ -683,8 +857,8 @@ class BVRdScanSuper(Primitive, ABC):
     def set_in_ref(self, in_ref, parent=None):
         if in_ref != '' and in_ref is not None:
             self.in_ref.append(in_ref)
-        if self.backpressure_en and parent != "":
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and parent != "" and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def out_ref(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -696,6 +870,9 @@ class BVRdScanSuper(Primitive, ABC):
 
 
 class BVRdScan(BVRdScanSuper):
+    __slots__ = ("bv_arr", "curr_addr", "end_fiber", "emit_fiber_stkn", "begin", "meta_blen", "meta_nbits", "meta_dim",
+                 "depth")
+
     def __init__(self, bv_arr=None, dim=4, nbits=4, depth=4, **kwargs):
         super().__init__(**kwargs)
 
@@ -744,7 +921,7 @@ class BVRdScan(BVRdScanSuper):
             elif len(self.in_ref) > 0 and self.emit_fiber_stkn:
                 next_in = self.in_ref[0]
                 if is_stkn(next_in):
-                    self.in_ref.pop(0)
+                    self.in_ref.popleft()
                     stkn = increment_stkn(next_in)
                 else:
                     stkn = 'S0'
@@ -758,7 +935,7 @@ class BVRdScan(BVRdScanSuper):
             elif len(self.in_ref) > 0 and (self.end_fiber or self.begin):
                 self.end_fiber = False
                 self.begin = False
-                curr_in_ref = self.in_ref.pop(0)
+                curr_in_ref = self.in_ref.popleft()
                 if isinstance(curr_in_ref, int) and curr_in_ref + 1 > self.meta_blen:
                     raise Exception('Not enough elements in bv array(' + str(self.meta_blen) + ')')
 
@@ -770,7 +947,7 @@ class BVRdScan(BVRdScanSuper):
                     if len(self.in_ref) > 0:
                         next_in = self.in_ref[0]
                         if is_stkn(next_in):
-                            self.in_ref.pop(0)
+                            self.in_ref.popleft()
                             stkn = increment_stkn(next_in)
                         else:
                             stkn = 'S0'
@@ -803,6 +980,6 @@ class BVRdScan(BVRdScanSuper):
                 self.curr_bv = ''
 
             if self.debug:
-                print("DEBUG: C RD SCAN: \t "
-                      "Curr bv:", self.curr_bv, "\t curr ref:", self.curr_ref, "\t curr addr:", self.curr_addr,
-                      "\t end fiber:", self.end_fiber, "\t curr input:", curr_in_ref)
+                self.log.debug("DEBUG: C RD SCAN: \t "
+                               "Curr bv:", self.curr_bv, "\t curr ref:", self.curr_ref, "\t curr addr:", self.curr_addr,
+                               "\t end fiber:", self.end_fiber, "\t curr input:", curr_in_ref)
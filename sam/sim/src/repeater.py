@@ -1,15 +1,23 @@
+import numpy as np
+
 from .base import *
+from .stats import RUN_BUCKETS
+from .stream import TokenStream, batch_tokens
 
 
 class Repeat(Primitive):
+    __slots__ = ("in_ref", "in_repeat", "in_ref_size", "in_repeat_size", "curr_out_ref", "curr_in_ref",
+                 "curr_union_other", "get_next_ref", "get_next_rep", "emit_stkn", "empty_rep_fiber",
+                 "get_next_ref_union", "meta_union_mode", "data_valid", "depth", "fifo_avail_ref", "fifo_avail_repeat")
+
     def __init__(self, union=False, depth=1, **kwargs):
         super().__init__(**kwargs)
 
-        self.in_ref = []
-        self.in_repeat = []
+        self.in_ref = self.new_channel()
+        self.in_repeat = self.new_channel()
 
-        self.in_ref_size = 0
-        self.in_repeat_size = 0
+        self.in_ref_size = self.max_gauge("in_ref_size")
+        self.in_repeat_size = self.max_gauge("in_repeat_size")
         self.curr_out_ref = ''
         self.curr_in_ref = ''
         self.curr_union_other = ''
@@ -91,7 +99,7 @@ class Repeat(Primitive):
                 next_in = self.in_ref[0]
                 if is_stkn(next_in):
                     stkn = increment_stkn(next_in)
-                    self.in_ref.pop(0)
+                    self.in_ref.popleft()
                 else:
                     stkn = 'S0'
                 self.curr_out_ref = stkn
@@ -102,7 +110,7 @@ class Repeat(Primitive):
                 return
 
             if len(self.in_ref) > 0 and self.get_next_ref:
-                self.curr_in_ref = self.in_ref.pop(0)
+                self.curr_in_ref = self.in_ref.popleft()
                 if is_stkn(self.curr_in_ref):
                     self.get_next_rep = True
                     self.get_next_ref = False
@@ -120,15 +128,15 @@ class Repeat(Primitive):
                 self.curr_out_ref = ''
 
             if self.backpressure_en and self.debug:
-                print("DEBUG__Now: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
-                      "\t Get Rep:", self.get_next_rep,
-                      "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn,
-                      "\tStream", self.in_ref, " ", self.in_repeat, " backstream: ",
-                      self.check_backpressure(), " ", self.data_valid)
+                self.log.debug("DEBUG__Now: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
+                               "\t Get Rep:", self.get_next_rep,
+                               "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn,
+                               "\tStream", self.in_ref, " ", self.in_repeat, " backstream: ",
+                               self.check_backpressure(), " ", self.data_valid)
 
             repeat = ''
             if len(self.in_repeat) > 0 and self.get_next_rep:
-                repeat = self.in_repeat.pop(0)
+                repeat = self.in_repeat.popleft()
                 # FIXME: See if self.meta_union_mode is ever needed?
                 if repeat == 'S' and self.empty_rep_fiber and self.meta_union_mode:
                     if isinstance(self.curr_in_ref, int):
@@ -139,7 +147,7 @@ class Repeat(Primitive):
                             next_in = self.in_ref[0]
                             if is_stkn(next_in):
                                 stkn = increment_stkn(next_in)
-                                self.in_ref.pop(0)
+                                self.in_ref.popleft()
                             else:
                                 stkn = 'S0'
                             self.curr_out_ref = stkn
@@ -160,7 +168,7 @@ class Repeat(Primitive):
                             next_in = self.in_ref[0]
                             if is_stkn(next_in):
                                 stkn = increment_stkn(next_in)
-                                self.in_ref.pop(0)
+                                self.in_ref.popleft()
                             else:
                                 stkn = 'S0'
                             self.curr_out_ref = stkn
@@ -176,10 +184,10 @@ class Repeat(Primitive):
                     if self.curr_in_ref == 'D':
                         self.curr_out_ref = 'D'
                     if self.curr_out_ref != 'D':
-                        print("DEBUG: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
-                              "\t Get Rep:", self.get_next_rep, "\t Rep:", repeat,
-                              "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn, "\t Streams", self.in_ref, " ",
-                              self.in_repeat)
+                        self.log.error("DEBUG: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
+                                       "\t Get Rep:", self.get_next_rep, "\t Rep:", repeat,
+                                       "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn, "\t Streams",
+                                       self.in_ref, " ", self.in_repeat)
                         raise Exception("Both repeat and ref signal need to end in 'D'")
                     self.get_next_ref = True
                     self.get_next_rep = False
@@ -196,22 +204,82 @@ class Repeat(Primitive):
             self.compute_fifos()
             if self.debug:
                 if not self.backpressure_en:
-                    print("DEBUG: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
-                          "\t Get Rep:", self.get_next_rep, "\t Rep:", repeat,
-                          "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn, "\t Streams", self.in_ref, " ",
-                          self.in_repeat)
+                    self.log.debug("DEBUG: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
+                                   "\t Get Rep:", self.get_next_rep, "\t Rep:", repeat,
+                                   "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn, "\t Streams",
+                                   self.in_ref, " ",
+                                   self.in_repeat)
                 else:
-                    print("DEBUG: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
-                          "\t Get Rep:", self.get_next_rep, "\t Rep:", repeat,
-                          "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn, "\t Streams", self.in_ref,
-                          " ", self.in_repeat, " backstream: ", self.check_backpressure(), " ", self.data_valid)
+                    self.log.debug("DEBUG: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
+                                   "\t Get Rep:", self.get_next_rep, "\t Rep:", repeat,
+                                   "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn, "\t Streams", self.in_ref,
+                                   " ", self.in_repeat, " backstream: ", self.check_backpressure(), " ", self.data_valid)
         else:
             if self.debug:
-                print("DEBUG: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
-                      "\t Get Rep:", self.get_next_rep,
-                      "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn, "\tStream",
-                      self.in_ref, " ", self.in_repeat, " backstream: ",
-                      self.check_backpressure(), " ", self.data_valid)
+                self.log.debug("DEBUG: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
+                               "\t Get Rep:", self.get_next_rep,
+                               "\t Out Ref:", self.curr_out_ref, "\tEmit Stkn", self.emit_stkn, "\tStream",
+                               self.in_ref, " ", self.in_repeat, " backstream: ",
+                               self.check_backpressure(), " ", self.data_valid)
+
+    def is_idle(self):
+        if self.debug or self.backpressure_en or self.curr_out_ref != '':
+            return False
+        if self.emit_stkn:
+            return len(self.in_ref) == 0
+        return not (len(self.in_ref) > 0 and self.get_next_ref) and \
+            not (len(self.in_repeat) > 0 and self.get_next_rep)
+
+    # Whole fibers at a time: every ref (int or 'N') is repeated for the 'R's of one repeat fiber and followed by
+    # a stop token, S(k+1) for a next ref S(k), which it takes, else S0. A stop ref that does not follow a ref
+    # takes an empty repeat fiber and becomes S(k+1). Other inputs (union mode, a repeat stream that does not
+    # match the refs) run cycle by cycle
+    def process_stream(self, in_streams, out_ports=()):
+        refs = batch_tokens(in_streams, 'set_in_ref')
+        reps = batch_stream(in_streams, 'set_in_repeat') + batch_stream(in_streams, 'set_in_repsig')
+        if self.meta_union_mode or refs is None or len(self.in_ref) > 0 or len(self.in_repeat) > 0 or \
+                not self.get_next_ref or len(refs) == 0 or len(reps) == 0:
+            return super().process_stream(in_streams, out_ports)
+        reps = np.asarray(reps)
+        kind = refs.kind
+        num_refs = len(kind) - 1
+        if reps.dtype.kind != 'U' or reps[-1] != 'D' or kind[-1] != TKN_DONE or \
+                np.any(kind[:-1] == TKN_DONE) or np.any(reps[:-1] == 'D') or \
+                not np.all((reps == 'R') | (reps == 'S') | (reps == 'D')):
+            return super().process_stream(in_streams, out_ports)
+
+        is_ref = (kind[:-1] == TKN_DATA) | (kind[:-1] == TKN_ZERO)
+        is_stop = kind[:-1] == TKN_STOP
+        after_ref = np.zeros(num_refs, dtype=bool)
+        after_ref[1:] = is_ref[:-1]
+        takes_fiber = is_ref | (is_stop & ~after_ref)
+        fiber_ends = np.flatnonzero(reps == 'S')
+        if np.count_nonzero(takes_fiber) != len(fiber_ends):
+            return super().process_stream(in_streams, out_ports)
+        counts = np.diff(fiber_ends, prepend=-1) - 1
+        owners = np.flatnonzero(takes_fiber)
+        if np.any(counts[is_stop[owners]] != 0):
+            return super().process_stream(in_streams, out_ports)
+
+        # Order of the stop token that closes the fiber of every owner
+        stop_order = np.zeros(len(owners), dtype=np.int64)
+        ref_owner = is_ref[owners]
+        nxt = owners + 1
+        next_stop = ref_owner & (nxt < num_refs)
+        next_stop[next_stop] = is_stop[nxt[next_stop]]
+        stop_order[next_stop] = refs.payload[nxt[next_stop]] + 1
+        stop_order[~ref_owner] = refs.payload[owners[~ref_owner]] + 1
+
+        lengths = counts + 1
+        out_kind = np.repeat(kind[owners], lengths)
+        out_payload = np.repeat(refs.payload[owners], lengths)
+        ends = np.cumsum(lengths) - 1
+        out_kind[ends] = TKN_STOP
+        out_payload[ends] = stop_order
+        self.done = True
+        self.get_next_ref = True
+        self.get_next_rep = False
+        return {'out_ref': TokenStream(np.append(out_kind, TKN_DONE), np.append(out_payload, 0))}
 
     def print_debug(self):
         print("DEBUG: REPEAT:", "\t Get Ref:", self.get_next_ref, "\tIn Ref:", self.curr_in_ref,
@@ -222,14 +290,14 @@ class Repeat(Primitive):
     def set_in_ref(self, ref, parent=None):
         if ref != '' and ref is not None:
             self.in_ref.append(ref)
-        if self.backpressure_en and parent != "":
-            parent.set_backpressure(self.fifo_avail_ref)
+        if self.backpressure_en and parent != "" and not self.fifo_avail_ref:
+            parent.set_backpressure(False)
 
     def set_in_repeat(self, repeat, parent=None):
         if repeat != '' and repeat is not None:
             self.in_repeat.append(repeat)
-        if self.backpressure_en and parent != "":
-            parent.set_backpressure(self.fifo_avail_repeat)
+        if self.backpressure_en and parent != "" and not self.fifo_avail_repeat:
+            parent.set_backpressure(False)
 
     # def set_in_union_0tkn(self, union_0tkn):
     #     if union_0tkn != '':
@@ -242,25 +310,24 @@ class Repeat(Primitive):
     def set_in_repsig(self, repeat, parent=None):
         if repeat != '' and repeat is not None:
             self.in_repeat.append(repeat)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail_repeat)
+        if self.backpressure_en and not self.fifo_avail_repeat:
+            parent.set_backpressure(False)
 
     def out_ref(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
             return self.curr_out_ref
 
     def compute_fifos(self):
-        self.in_ref_size = max(self.in_ref_size, len(self.in_ref))
-        self.in_repeat_size = max(self.in_repeat_size, len(self.in_repeat))
+        self.in_ref_size.update(len(self.in_ref))
+        self.in_repeat_size.update(len(self.in_repeat))
 
     def print_fifos(self):
-        print("FIFOs size in the ref for repeat block: ", self.in_ref_size)
-        print("Repeat size for repeat block: ", self.in_repeat_size)
+        print("FIFOs size in the ref for repeat block: ", self.in_ref_size.value)
+        print("Repeat size for repeat block: ", self.in_repeat_size.value)
 
     def return_statistics(self):
         if self.get_stats:
-            stats_dict = {"in_ref_size": self.in_ref_size, "in_repeat_size": self.in_repeat_size}
-            stats_dict.update(super().return_statistics())
+            stats_dict = super().return_statistics()
         else:
             stats_dict = {}
         return stats_dict
@@ -270,11 +337,14 @@ class Repeat(Primitive):
 # or next coordinate, 'S', signals for broadcasting along a non-existent dimension.
 # It essentially snoops on the crd stream
 class RepeatSigGen(Primitive):
+    __slots__ = ("istream", "curr_repeat", "istream_size", "repeat_counts", "curr_repeat_count", "data_valid", "depth",
+                 "fifo_avail", "cycles_curr_total", "cycles_curr_repeat", "cycles_curr_max")
+
     def __init__(self, depth=1, **kwargs):
         super().__init__(**kwargs)
-        self.istream = []
+        self.istream = self.new_channel()
         self.curr_repeat = ''
-        self.istream_size = 0
+        self.istream_size = self.max_gauge("in_repeat_size")
 
         if self.backpressure_en:
             self.ready_backpressure = True
@@ -285,6 +355,9 @@ class RepeatSigGen(Primitive):
             self.cycles_curr_total = 0
             self.cycles_curr_repeat = 0
             self.cycles_curr_max = 0
+        # Number of repeats per fiber
+        self.repeat_counts = self.histogram("repeat_counts", RUN_BUCKETS)
+        self.curr_repeat_count = 0
 
     def set_backpressure(self, backpressure):
         if not backpressure:
@@ -304,29 +377,58 @@ class RepeatSigGen(Primitive):
             istream = ''
 
             if len(self.istream) > 0:
-                istream = self.istream.pop(0)
+                istream = self.istream.popleft()
                 if is_stkn(istream):
                     self.curr_repeat = 'S'
                     self.done = False
+                    self.repeat_counts.observe(self.curr_repeat_count)
+                    self.curr_repeat_count = 0
                 elif istream == 'D':
                     self.curr_repeat = 'D'
                     self.done = True
                 else:
                     self.curr_repeat = 'R'
                     self.done = False
+                    self.curr_repeat_count += 1
             else:
                 self.curr_repeat = ''
             self.compute_fifos()
             if not self.backpressure_en and self.debug:
-                print("DEBUG: REP GEN", "\t In", istream, "\t Out ", self.curr_repeat, "\t INstream", self.istream)
+                self.log.debug("DEBUG: REP GEN", "\t In", istream, "\t Out ", self.curr_repeat, "\t INstream", self.istream)
             elif self.backpressure_en and self.debug:
-                print("DEBUG: REP GEN:", "\t In:", istream, "\t Out:", self.curr_repeat, "\t Instream",
-                      self.istream, " backstream: ", self.check_backpressure(), " ", self.data_valid)
+                self.log.debug("DEBUG: REP GEN:", "\t In:", istream, "\t Out:", self.curr_repeat, "\t Instream",
+                               self.istream, " backstream: ", self.check_backpressure(), " ", self.data_valid)
         else:
             if self.debug:
-                print("DEBUG: REP GEN", "\t In", "", "\t Out ", self.curr_repeat, "\t INstream",
-                      self.istream, " backstream: ", self.check_backpressure(), " ",
-                      self.data_valid)
+                self.log.debug("DEBUG: REP GEN", "\t In", "", "\t Out ", self.curr_repeat, "\t INstream",
+                               self.istream, " backstream: ", self.check_backpressure(), " ",
+                               self.data_valid)
+
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and len(self.istream) == 0 and self.curr_repeat == ''
+
+    def process_stream(self, in_streams, out_ports=()):
+        istream = batch_tokens(in_streams, 'set_istream')
+        if istream is None or len(self.istream) > 0:
+            return super().process_stream(in_streams, out_ports)
+        kind = istream.kind
+        repsig = np.where(kind == TKN_STOP, 'S', np.where(kind == TKN_DONE, 'D', 'R')).tolist()
+        if repsig:
+            self.done = repsig[-1] == 'D'
+        if self.get_stats:
+            # Repeats per fiber: the 'R's since the previous stop token (or the start)
+            repeats = np.cumsum((kind != TKN_STOP) & (kind != TKN_DONE))
+            stops = np.flatnonzero(kind == TKN_STOP)
+            before = np.concatenate(([0], repeats[stops[:-1]])) if len(stops) > 0 else stops
+            counts = repeats[stops] - before
+            if len(counts) > 0:
+                counts[0] += self.curr_repeat_count
+                self.repeat_counts.observe_all(counts)
+            if len(stops) > 0:
+                self.curr_repeat_count = int(repeats[-1] - repeats[stops[-1]])
+            elif len(kind) > 0:
+                self.curr_repeat_count += int(repeats[-1])
+        return {'out_repsig': repsig, 'out_repeat': repsig}
 
     def print_debug(self):
         print("DEBUG: REP GEN", "\t In", "", "\t Out ", self.curr_repeat, "\t INstream",
@@ -368,8 +470,8 @@ class RepeatSigGen(Primitive):
     def set_istream(self, istream, parent=None):
         if istream != '' and istream is not None:
             self.istream.append(istream)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def out_repeat(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -380,15 +482,14 @@ class RepeatSigGen(Primitive):
             return self.curr_repeat
 
     def compute_fifos(self):
-        self.istream_size = max(self.istream_size, len(self.istream))
+        self.istream_size.update(len(self.istream))
 
     def print_fifos(self):
-        print("Repeat sig gen size:", self.istream_size)
+        print("Repeat sig gen size:", self.istream_size.value)
 
     def return_statistics(self):
         if self.get_stats:
-            stats_dict = {"in_repeat_size": self.istream_size}
-            stats_dict.update(super().return_statistics())
+            stats_dict = super().return_statistics()
         else:
             stats_dict = {}
         return stats_dict
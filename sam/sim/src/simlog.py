@@ -0,0 +1,120 @@
+import struct
+import sys
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+
+class PrintSink:
+    """Writes every message to a stream (stdout by default), formatted like print(*args)."""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def emit(self, name, level, args):
+        print(*args, file=sys.stdout if self.stream is None else self.stream)
+
+
+_record = struct.Struct("<BHI")
+
+
+class RingSink:
+    """Keeps the last capacity messages as packed binary records, for post-mortem dumps.
+
+    Each record is a (level, name length, message length) header followed by the UTF-8 block name and
+    message. Messages are formatted when they are recorded, the FIFOs they usually show keep changing.
+    """
+
+    def __init__(self, capacity=4096):
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, name, level, args):
+        name = name.encode()
+        msg = " ".join(str(arg) for arg in args).encode()
+        self.records.append(_record.pack(level, len(name), len(msg)) + name + msg)
+
+    def __len__(self):
+        return len(self.records)
+
+    def dump(self, f):
+        for record in self.records:
+            f.write(record)
+
+    # (block name, level, message) of every record, oldest first
+    def messages(self):
+        return [_unpack(record, 0)[0] for record in self.records]
+
+
+def _unpack(buf, offset):
+    level, name_len, msg_len = _record.unpack_from(buf, offset)
+    start = offset + _record.size
+    name = bytes(buf[start:start + name_len]).decode()
+    msg = bytes(buf[start + name_len:start + name_len + msg_len]).decode()
+    return (name, level, msg), start + name_len + msg_len
+
+
+# (block name, level, message) of every record in a RingSink dump
+def read_dump(f):
+    buf = f.read()
+    offset = 0
+    while offset < len(buf):
+        record, offset = _unpack(buf, offset)
+        yield record
+
+
+class SimLogger:
+    """Logger of one block.
+
+    Messages below the level are dropped before they are formatted, the arguments are only joined into a
+    message by the sink. Simulator hot paths additionally guard their debug messages with the debug flag of
+    the block (if self.debug: self.log.debug(...)), which make_primitive compiles out, so the messages cost
+    nothing when debugging is off.
+    """
+
+    __slots__ = ("name", "level", "sink")
+
+    def __init__(self, name, level, sink):
+        self.name = name
+        self.level = level
+        self.sink = sink
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, *args):
+        if level >= self.level:
+            self.sink.emit(self.name, level, args)
+
+    def debug(self, *args):
+        if DEBUG >= self.level:
+            self.sink.emit(self.name, DEBUG, args)
+
+    def info(self, *args):
+        if INFO >= self.level:
+            self.sink.emit(self.name, INFO, args)
+
+    def warning(self, *args):
+        if WARNING >= self.level:
+            self.sink.emit(self.name, WARNING, args)
+
+    def error(self, *args):
+        if ERROR >= self.level:
+            self.sink.emit(self.name, ERROR, args)
+
+
+_config = {"level": WARNING, "sink": PrintSink()}
+
+
+# Defaults of the loggers created afterwards: the level of blocks built without debug, and the sink of all
+def configure(level=None, sink=None):
+    if level is not None:
+        _config["level"] = level
+    if sink is not None:
+        _config["sink"] = sink
+
+
+def get_logger(name, level=None, sink=None):
+    return SimLogger(name, _config["level"] if level is None else level, _config["sink"] if sink is None else sink)
@@ -0,0 +1,214 @@
+import ast
+import inspect
+import textwrap
+
+from .base import Primitive
+
+# Instance flags that are fixed at construction, by the constructor argument that sets them
+FLAGS = (("debug", "debug"), ("get_stats", "statistics"), ("backpressure_en", "back_en"))
+
+_specialized = dict()
+
+
+def make_primitive(kind, debug=False, stats=False, back_en=False, **kwargs):
+    """Build a primitive whose methods have the debug, statistics and backpressure branches compiled out.
+
+    kind is a Primitive subclass or its name. The instance behaves like kind(debug=debug, statistics=stats,
+    back_en=back_en, **kwargs) as long as those flags are not changed after construction: every method that
+    tests self.debug, self.get_stats or self.backpressure_en is recompiled with the flags as constants and the
+    dead branches removed. Specialized classes are cached per flag combination.
+    """
+    cls = primitive_class(kind) if isinstance(kind, str) else kind
+    prim = specialized_class(cls, (debug, stats, back_en))(debug=debug, statistics=stats, back_en=back_en, **kwargs)
+    # Some blocks override a flag in their constructor (e.g. WrScan turns backpressure off)
+    flags = tuple(bool(getattr(prim, attr)) for attr, _ in FLAGS)
+    if flags != (debug, stats, back_en):
+        prim.__class__ = specialized_class(cls, flags)
+    return prim
+
+
+def primitive_class(name):
+    classes = [Primitive]
+    while classes:
+        cls = classes.pop()
+        if cls.__name__ == name:
+            return cls
+        classes += cls.__subclasses__()
+    raise ValueError("No primitive named " + name)
+
+
+def specialized_class(cls, flags):
+    key = (cls, tuple(bool(flag) for flag in flags))
+    if key not in _specialized:
+        consts = {attr: flag for (attr, _), flag in zip(FLAGS, key[1])}
+        methods = dict()
+        for name, owner, func in _methods(cls):
+            tree = _specialize_tree(func, consts)
+            if tree is not None:
+                methods[name] = (owner, func, tree)
+        # Drop the calls of methods that end up empty, e.g. update_ready() without backpressure
+        empty = {name for name, (_, _, tree) in methods.items() if _is_empty(tree)}
+        body = dict()
+        for name, (owner, func, tree) in methods.items():
+            body[name] = _compile(_DropCalls(empty).visit(tree), owner, func)
+        # No instance dict, the instance class is swapped when a constructor overrides a flag
+        body["__slots__"] = ()
+        body["__module__"] = cls.__module__
+        body["__qualname__"] = cls.__qualname__
+        _specialized[key] = type(cls.__name__, (cls,), body)
+    return _specialized[key]
+
+
+def _methods(cls):
+    seen = set()
+    for owner in cls.__mro__:
+        if owner is object:
+            continue
+        for name, func in vars(owner).items():
+            # Constructors set the flags, some override them, they run as written
+            if name in seen or name == "__init__" or not inspect.isfunction(func):
+                continue
+            seen.add(name)
+            yield name, owner, func
+
+
+# The function definition with the flags replaced by constants and folded, None if it does not use them
+def _specialize_tree(func, consts):
+    # Closures over anything but the class can not be rebuilt from the source
+    if set(func.__code__.co_freevars) - {"__class__"}:
+        return None
+    try:
+        source = textwrap.dedent(inspect.getsource(func))
+    except (OSError, TypeError):
+        return None
+    tree = ast.parse(source)
+    fdef = tree.body[0]
+    if not isinstance(fdef, ast.FunctionDef) or fdef.decorator_list:
+        return None
+    subst = _SubstFlags(consts)
+    tree = subst.visit(tree)
+    if not subst.used:
+        return None
+    tree = _Fold().visit(tree)
+    _strip_pass(tree)
+    ast.increment_lineno(tree, func.__code__.co_firstlineno - 1)
+    return ast.fix_missing_locations(tree)
+
+
+# Compiled in the module of the original method, inside a function that provides the __class__ cell that
+# zero-argument super() calls need
+def _compile(tree, owner, func):
+    fdef = tree.body[0]
+    # Not bound under its own name, the method may call a global of that name (e.g. new_channel)
+    fdef.name = "__specialized__"
+    wrapper = ast.FunctionDef(name="__specialize__", args=ast.arguments(
+        posonlyargs=[], args=[ast.arg(arg="__class__")], vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None,
+        defaults=[]), body=[fdef, ast.Return(value=ast.Name(id=fdef.name, ctx=ast.Load()))], decorator_list=[],
+        returns=None, type_comment=None)
+    module = ast.fix_missing_locations(ast.Module(body=[ast.copy_location(wrapper, fdef)], type_ignores=[]))
+    namespace = dict()
+    exec(compile(module, inspect.getsourcefile(func), "exec"), func.__globals__, namespace)
+    new_func = namespace["__specialize__"](owner)
+    new_func.__defaults__ = func.__defaults__
+    new_func.__kwdefaults__ = func.__kwdefaults__
+    new_func.__name__ = func.__name__
+    new_func.__qualname__ = func.__qualname__
+    new_func.__doc__ = func.__doc__
+    return new_func
+
+
+# Drop the pass statements that the folding left next to other statements
+def _strip_pass(tree):
+    for node in ast.walk(tree):
+        for field in ("body", "orelse", "finalbody"):
+            stmts = getattr(node, field, None)
+            if isinstance(stmts, list) and stmts and isinstance(stmts[0], ast.stmt):
+                kept = [stmt for stmt in stmts if not isinstance(stmt, ast.Pass)]
+                setattr(node, field, kept if kept or field != "body" else [stmts[0]])
+
+
+def _is_empty(tree):
+    body = tree.body[0].body
+    return all(isinstance(stmt, ast.Pass) or (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Constant))
+               for stmt in body)
+
+
+class _SubstFlags(ast.NodeTransformer):
+    def __init__(self, consts):
+        self.consts = consts
+        self.used = False
+
+    def visit_Attribute(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id == "self" and isinstance(node.ctx, ast.Load) and \
+                node.attr in self.consts:
+            self.used = True
+            return ast.copy_location(ast.Constant(value=self.consts[node.attr]), node)
+        return self.generic_visit(node)
+
+
+class _Fold(ast.NodeTransformer):
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not) and isinstance(node.operand, ast.Constant):
+            return ast.copy_location(ast.Constant(value=not node.operand.value), node)
+        return node
+
+    # a and b is a if a is falsy, else b: a falsy constant ends an and (a truthy one an or), the other
+    # constants can be skipped unless they are the value of the whole expression
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        ends = isinstance(node.op, ast.Or)
+        values = []
+        for i, value in enumerate(node.values):
+            if isinstance(value, ast.Constant):
+                if bool(value.value) == ends:
+                    if not values:
+                        return value
+                    return ast.copy_location(ast.BoolOp(op=node.op, values=values + [value]), node)
+                if i < len(node.values) - 1:
+                    continue
+            values.append(value)
+        return values[0] if len(values) == 1 else ast.copy_location(ast.BoolOp(op=node.op, values=values), node)
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        node.test = _truth_test(node.test)
+        if isinstance(node.test, ast.Constant):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_If(self, node):
+        self.generic_visit(node)
+        node.test = _truth_test(node.test)
+        if isinstance(node.test, ast.Constant):
+            return (node.body if node.test.value else node.orelse) or ast.copy_location(ast.Pass(), node)
+        return node
+
+    def visit_While(self, node):
+        self.generic_visit(node)
+        node.test = _truth_test(node.test)
+        if isinstance(node.test, ast.Constant) and not node.test.value:
+            return node.orelse or ast.copy_location(ast.Pass(), node)
+        return node
+
+
+# Only the truth value of a condition matters, a trailing constant that does not decide it can go
+def _truth_test(test):
+    if isinstance(test, ast.BoolOp) and isinstance(test.values[-1], ast.Constant) and \
+            bool(test.values[-1].value) == isinstance(test.op, ast.And):
+        values = test.values[:-1]
+        return values[0] if len(values) == 1 else ast.BoolOp(op=test.op, values=values)
+    return test
+
+
+class _DropCalls(ast.NodeTransformer):
+    def __init__(self, names):
+        self.names = names
+
+    def visit_Expr(self, node):
+        call = node.value
+        if isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and \
+                isinstance(call.func.value, ast.Name) and call.func.value.id == "self" and \
+                call.func.attr in self.names and not call.args and not call.keywords:
+            return ast.copy_location(ast.Pass(), node)
+        return node
@@ -2,11 +2,14 @@ from .base import *
 
 
 class Split(Primitive):
+    __slots__ = ("in_crd", "in_crd_size", "curr_ocrd", "curr_icrd", "prev_ocrd", "prev_icrd", "prev_stkn", "emit_stkn",
+                 "emit_done", "prev_cntr", "cntr", "split_factor", "orig_crd", "data_valid", "depth", "fifo_avail")
+
     def __init__(self, split_factor=4, depth=4, orig_crd=True, **kwargs):
         super().__init__(**kwargs)
 
-        self.in_crd = []
-        self.in_crd_size = 0
+        self.in_crd = self.new_channel()
+        self.in_crd_size = self.max_gauge("in_crd_size")
 
         self.curr_ocrd = None
         self.curr_icrd = None
@@ -69,14 +72,14 @@ class Split(Primitive):
                 self.curr_icrd = self.prev_icrd
                 self.emit_stkn = False
             elif len(self.in_crd) > 0 and is_stkn(self.in_crd[0]):
-                crd = self.in_crd.pop(0)
+                crd = self.in_crd.popleft()
                 assert is_stkn(crd)
                 self.curr_ocrd = crd
                 self.curr_icrd = increment_stkn(crd)
                 self.prev_stkn = True
                 self.emit_stkn = False
             elif len(self.in_crd) > 0 and not is_stkn(self.in_crd[0]):
-                crd = self.in_crd.pop(0)
+                crd = self.in_crd.popleft()
                 if isinstance(crd, int):
                     self.cntr = int(crd / self.split_factor)
 
@@ -109,16 +112,16 @@ class Split(Primitive):
                 self.curr_icrd = ''
 
             if self.debug:
-                print("DEBUG: SPLIT:", "\t InCrd:", self.in_crd,
-                      "\n Curr Ocrd:", self.curr_ocrd, "\t Curr Icrd:", self.curr_icrd,
-                      "\n Prev Cntr", self.prev_cntr, "\t Curr Cntr:", self.cntr,
-                      "\n Emit Stkn:", self.emit_stkn, "\t Prev Stkn:", self.prev_stkn)
+                self.log.debug("DEBUG: SPLIT:", "\t InCrd:", self.in_crd,
+                               "\n Curr Ocrd:", self.curr_ocrd, "\t Curr Icrd:", self.curr_icrd,
+                               "\n Prev Cntr", self.prev_cntr, "\t Curr Cntr:", self.cntr,
+                               "\n Emit Stkn:", self.emit_stkn, "\t Prev Stkn:", self.prev_stkn)
 
     def set_in_crd(self, crd, parent=None):
         if crd != '' and crd is not None:
             self.in_crd.append(crd)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def out_outer_crd(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -129,7 +132,7 @@ class Split(Primitive):
             return self.curr_icrd
 
     def compute_fifos(self):
-        self.in_crd_size = max(self.in_crd_size, len(self.in_crd))
+        self.in_crd_size.update(len(self.in_crd))
 
     def print_fifos(self):
-        print("FIFOs size in the crd for split blocks: ", self.in_crd_size)
+        print("FIFOs size in the crd for split blocks: ", self.in_crd_size.value)
@@ -0,0 +1,234 @@
+import csv
+import json
+import numpy as np
+from bisect import bisect_left
+
+
+class TouchTracker:
+    """Set of the addresses a block has accessed, for the --report-stats counters.
+
+    Integer addresses are kept in a bitmap sized to the array (grown geometrically past it), other keys in a
+    set, so every access is O(1). With reuse, the reuse distance of every access (the number of distinct
+    addresses accessed since the previous access of the same address) is binned into a histogram.
+    """
+
+    def __init__(self, size=0, reuse=False):
+        self.bitmap = np.zeros(max(size, 1), dtype=bool)
+        self.others = set()
+        self.count = 0
+
+        self.reuse = reuse
+        if reuse:
+            self.time = 0
+            self.last_access = {}
+            # Fenwick tree over the access times, time t is marked while it is the last access of its address
+            self.fenwick = [0] * 1024
+            self.histogram = {}
+            self.cold = 0
+
+    def touch(self, addr):
+        if isinstance(addr, (int, np.integer)) and addr >= 0:
+            if addr >= len(self.bitmap):
+                bitmap = np.zeros(max(addr + 1, 2 * len(self.bitmap)), dtype=bool)
+                bitmap[:len(self.bitmap)] = self.bitmap
+                self.bitmap = bitmap
+            if not self.bitmap[addr]:
+                self.bitmap[addr] = True
+                self.count += 1
+        elif addr not in self.others:
+            self.others.add(addr)
+            self.count += 1
+        if self.reuse:
+            self._reuse(addr)
+
+    # Vectorized touch() of an integer address array
+    def touch_all(self, addrs):
+        addrs = np.asarray(addrs, dtype=np.int64)
+        if self.reuse or len(addrs) == 0:
+            for addr in addrs.tolist():
+                self.touch(addr)
+            return
+        if addrs.max() >= len(self.bitmap):
+            bitmap = np.zeros(max(int(addrs.max()) + 1, 2 * len(self.bitmap)), dtype=bool)
+            bitmap[:len(self.bitmap)] = self.bitmap
+            self.bitmap = bitmap
+        self.bitmap[addrs] = True
+        self.count = int(np.count_nonzero(self.bitmap)) + len(self.others)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, addr):
+        if isinstance(addr, (int, np.integer)) and addr >= 0:
+            return addr < len(self.bitmap) and bool(self.bitmap[addr])
+        return addr in self.others
+
+    def _reuse(self, addr):
+        t = self.time
+        self.time += 1
+        if t >= len(self.fenwick):
+            self._grow()
+        prev = self.last_access.get(addr)
+        if prev is None:
+            self.cold += 1
+        else:
+            distance = self._prefix(t) - self._prefix(prev + 1)
+            self._add(prev, -1)
+            # Power of two bins: bin b holds the distances in [b, 2b), bin 0 the immediate reuses
+            b = 1 << (distance.bit_length() - 1) if distance > 0 else 0
+            self.histogram[b] = self.histogram.get(b, 0) + 1
+        self._add(t, 1)
+        self.last_access[addr] = t
+
+    # Sum of the marks at times [0, t)
+    def _prefix(self, t):
+        total = 0
+        fenwick = self.fenwick
+        while t > 0:
+            total += fenwick[t - 1]
+            t &= t - 1
+        return total
+
+    def _add(self, t, delta):
+        fenwick = self.fenwick
+        n = len(fenwick)
+        t += 1
+        while t <= n:
+            fenwick[t - 1] += delta
+            t += t & -t
+
+    def _grow(self):
+        marks = [0] * (2 * len(self.fenwick))
+        for t in self.last_access.values():
+            marks[t] = 1
+        self.fenwick = [0] * len(marks)
+        for t, mark in enumerate(marks):
+            if mark:
+                self._add(t, 1)
+
+    def reuse_histogram(self):
+        if not self.reuse:
+            return {}
+        return {"cold": self.cold, "histogram": dict(sorted(self.histogram.items()))}
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class MaxGauge:
+    def __init__(self):
+        self.value = 0
+
+    def update(self, value):
+        if value > self.value:
+            self.value = value
+
+
+# Fixed buckets: bucket i counts the values in (edges[i - 1], edges[i]], the last one the values above edges[-1]
+class Histogram:
+    def __init__(self, edges):
+        self.edges = tuple(edges)
+        self.counts = [0] * (len(self.edges) + 1)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.edges, value)] += 1
+
+    def observe_all(self, values):
+        counts = np.bincount(np.searchsorted(self.edges, values, side='left'), minlength=len(self.counts))
+        self.counts = [c + int(n) for c, n in zip(self.counts, counts)]
+
+    @property
+    def value(self):
+        labels = ["<=" + str(edge) for edge in self.edges] + [">" + str(self.edges[-1])]
+        return dict(zip(labels, self.counts))
+
+
+# Stand-in for every metric of a block built without statistics, updates are no-ops
+class NullMetric:
+    value = None
+
+    def inc(self, n=1):
+        pass
+
+    def update(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def observe_all(self, values):
+        pass
+
+
+NULL_METRIC = NullMetric()
+
+FIFO_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+RUN_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024)
+
+
+class StatsRegistry:
+    """Metrics of a set of blocks, keyed by block name and metric name.
+
+    Blocks built with statistics=True and a shared registry (stats_registry=, see Primitive) create their
+    counters, max-gauges and histograms here, blocks sharing a registry need unique names. record() adds the
+    plain return_statistics() dicts. The whole registry exports as a flat dict, CSV or JSON.
+    """
+
+    def __init__(self):
+        self.metrics = dict()
+
+    def _metric(self, block, name, cls, *args):
+        metric = self.metrics.get((block, name))
+        if metric is None:
+            metric = self.metrics[(block, name)] = cls(*args)
+        return metric
+
+    def counter(self, block, name):
+        return self._metric(block, name, Counter)
+
+    def max_gauge(self, block, name):
+        return self._metric(block, name, MaxGauge)
+
+    def histogram(self, block, name, edges):
+        return self._metric(block, name, Histogram, edges)
+
+    # Plain values are replaced by the latest record(), live metrics keep their own value
+    def record(self, block, stats):
+        for name, value in stats.items():
+            if not isinstance(self.metrics.get((block, name)), (Counter, MaxGauge, Histogram)):
+                self.metrics[(block, name)] = value
+
+    def block_metrics(self, block):
+        return {name: metric.value for (owner, name), metric in self.metrics.items()
+                if owner == block and isinstance(metric, (Counter, MaxGauge, Histogram))}
+
+    def as_dict(self):
+        flat = dict()
+        for (block, name), metric in self.metrics.items():
+            value = metric.value if isinstance(metric, (Counter, MaxGauge, Histogram)) else metric
+            _flatten(block + "/" + name, value, flat)
+        return flat
+
+    def to_csv(self, f):
+        writer = csv.writer(f)
+        writer.writerow(["metric", "value"])
+        for key, value in self.as_dict().items():
+            writer.writerow([key, value])
+
+    def to_json(self, f=None):
+        if f is None:
+            return json.dumps(self.as_dict(), default=str)
+        json.dump(self.as_dict(), f, default=str)
+
+
+def _flatten(key, value, flat):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(key + "/" + str(k), v, flat)
+    else:
+        flat[key] = value.item() if isinstance(value, np.generic) else value
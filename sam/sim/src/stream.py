@@ -0,0 +1,119 @@
+import numpy as np
+
+from .base import encode_tkn, batch_stream, TKN_DATA, TKN_EMPTY, TKN_DONE, TKN_ZERO, TKN_STOP
+
+
+class TokenStream:
+    """Token stream packed into two parallel NumPy arrays.
+
+    kind is an int8 array of TKN_* codes (see base.py), payload holds the data value of TKN_DATA tokens
+    (int64 for crd/ref streams, float64 for val streams) and the order of TKN_STOP tokens. Slicing returns
+    a view that shares both arrays. A stream has one payload type, so streams that mix int and float values
+    have no packed form (see from_list()).
+    """
+
+    def __init__(self, kind, payload):
+        assert len(kind) == len(payload), "kind and payload need the same length"
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.payload = np.asarray(payload)
+
+    @classmethod
+    def from_list(cls, tokens, dtype=None):
+        """Packs a token list. Without dtype, the payload type follows the first value (float64 for floats,
+        int64 otherwise) and a value of the other type raises ValueError, to_list() gives the tokens back."""
+        kind = np.empty(len(tokens), dtype=np.int8)
+        payload = [0] * len(tokens)
+        is_float = None
+        for i, tkn in enumerate(tokens):
+            tkn_kind, payload[i] = encode_tkn(tkn)
+            kind[i] = tkn_kind
+            if tkn_kind == TKN_DATA and dtype is None:
+                tkn_float = isinstance(tkn, (float, np.floating))
+                if is_float is None:
+                    is_float = tkn_float
+                elif tkn_float != is_float:
+                    raise ValueError("Stream mixes int and float values, e.g. " + repr(tkn) + " at " + str(i))
+        if dtype is None:
+            dtype = np.float64 if is_float else np.int64
+        return cls(kind, np.array(payload, dtype=dtype))
+
+    def to_list(self):
+        tokens = self.payload.tolist()
+        for i in np.flatnonzero(self.kind != TKN_DATA).tolist():
+            kind = self.kind[i]
+            if kind == TKN_STOP:
+                tokens[i] = 'S' + str(int(tokens[i]))
+            elif kind == TKN_DONE:
+                tokens[i] = 'D'
+            elif kind == TKN_EMPTY:
+                tokens[i] = ''
+            else:
+                tokens[i] = 'N'
+        return tokens
+
+    def __len__(self):
+        return len(self.kind)
+
+    # Slices are views, index and boolean mask arrays give a copy
+    def __getitem__(self, key):
+        if isinstance(key, (slice, np.ndarray)):
+            return TokenStream(self.kind[key], self.payload[key])
+        key = range(len(self))[key]
+        return TokenStream(self.kind[key:key + 1], self.payload[key:key + 1]).to_list()[0]
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __eq__(self, other):
+        if isinstance(other, TokenStream):
+            return np.array_equal(self.kind, other.kind) and np.array_equal(self.payload, other.payload)
+        return self.to_list() == list(other)
+
+    def __repr__(self):
+        return "TokenStream(" + repr(self.to_list()) + ")"
+
+    @property
+    def dtype(self):
+        return self.payload.dtype
+
+    def data(self):
+        return self.payload[self.kind == TKN_DATA]
+
+    def stop_positions(self, level=0):
+        return np.flatnonzero((self.kind == TKN_STOP) & (self.payload >= level))
+
+    # Fiber i holds the tokens in [segments[i], segments[i + 1] - 1), the last token being the stop that
+    # closes it. Fibers are closed by any stop token of at least the given level
+    def segments(self, level=0):
+        return np.concatenate(([0], self.stop_positions(level) + 1))
+
+    def fibers(self, level=0):
+        seg = self.segments(level)
+        return [self[seg[i]:seg[i + 1] - 1] for i in range(len(seg) - 1)]
+
+
+def as_token_stream(stream):
+    """stream as a TokenStream (TokenStreams are returned as they are), None if a token list has no packed form,
+    e.g. a val stream that mixes int and float values."""
+    if isinstance(stream, TokenStream):
+        return stream
+    try:
+        return TokenStream.from_list(stream)
+    except (ValueError, TypeError):
+        return None
+
+
+def batch_tokens(in_streams, port):
+    """TokenStream version of base.batch_stream(): the input stream of a set_* port in batch mode without its
+    empty tokens, a tuple of aligned streams for ports that take several. None if a stream has no packed form."""
+    stream = in_streams.get(port, [])
+    streams = stream if isinstance(stream, tuple) else (stream,)
+    if all(isinstance(s, TokenStream) for s in streams) and len({len(s) for s in streams}) == 1:
+        keep = np.logical_and.reduce([s.kind != TKN_EMPTY for s in streams])
+        packed = tuple(s if keep.all() else s[keep] for s in streams)
+    else:
+        lists = batch_stream(in_streams, port)
+        packed = tuple(as_token_stream(s) for s in (lists if isinstance(stream, tuple) else (lists,)))
+        if any(s is None for s in packed):
+            return None
+    return packed if isinstance(stream, tuple) else packed[0]
@@ -0,0 +1,92 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+# Input tensors shared by the tests, gold checks and scripts of a process, kept up to a byte budget (defaults to
+# $SAM_INPUT_CACHE_BYTES, else 2 GiB) and evicted least recently used first. Derived tensors are cached next to
+# their source under (name, transforms), where transforms is a sequence of the names below that is applied in order,
+# e.g. (path, ("shift", "transpose")) for the transposed shifted matrix of the matmul benchmarks. Cached tensors are
+# shared, callers must not modify them.
+
+DEFAULT_BUDGET = int(os.getenv('SAM_INPUT_CACHE_BYTES', default=2 << 30))
+
+transforms = {
+    "transpose": lambda tensor: tensor.transpose(),
+    "csr": lambda tensor: tensor.tocsr(),
+    "csc": lambda tensor: tensor.tocsc(),
+    "coo": lambda tensor: tensor.tocoo(),
+}
+
+
+# Transforms that need more than the tensor types, e.g. "shift" and "cast" of sam.util
+def add_transform(name, fn):
+    transforms[name] = fn
+
+
+def tensor_nbytes(tensor):
+    if isinstance(tensor, np.ndarray):
+        return tensor.nbytes
+    nbytes = 0
+    for attr in ["data", "row", "col", "indices", "indptr", "coords"]:
+        arr = getattr(tensor, attr, None)
+        if isinstance(arr, np.ndarray):
+            nbytes += arr.nbytes
+    return nbytes
+
+
+class TensorCache:
+    def __init__(self, budget=DEFAULT_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, name, load, transform=()):
+        """Tensor name with the transforms applied, load() loads the tensor itself on a miss."""
+        key = (name, tuple(transform))
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        self.misses += 1
+        if len(key[1]) == 0:
+            tensor = load()
+        else:
+            tensor = transforms[key[1][-1]](self.get(name, load, key[1][:-1]))
+        self.put(key, tensor)
+        return tensor
+
+    def put(self, key, tensor):
+        nbytes = tensor_nbytes(tensor)
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key)[1]
+        # Tensors over the whole budget are returned without being kept
+        if nbytes > self.budget:
+            return
+        while self.entries and self.nbytes + nbytes > self.budget:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.nbytes -= evicted
+            self.evictions += 1
+        self.entries[key] = (tensor, nbytes)
+        self.nbytes += nbytes
+
+    def __contains__(self, key):
+        return (key[0], tuple(key[1])) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self.entries),
+                "nbytes": self.nbytes, "budget": self.budget}
+
+
+input_cache = TensorCache()
@@ -0,0 +1,153 @@
+import hashlib
+import os
+
+import numpy as np
+import scipy.io
+import scipy.sparse
+
+from sam.sim.src.formatted import create_formatted, open_formatted, write_formatted
+
+# Readers of the source tensors (.mtx Matrix Market and 1-based .tns coordinate files) that keep a binary COO copy of
+# every file they parse in a cache container next to it (<file>.sam, see sam.sim.src.formatted), or in the directory
+# named by $SAM_TENSOR_CACHE when it is set. The cache records the size and modification time of its source and is
+# rebuilt once they change, so a tensor is parsed once per machine instead of once per test, gold check and script.
+# Sources whose cache can't be written are parsed every time.
+
+CHUNK_LINES = 1 << 20
+
+
+# Files in $SAM_TENSOR_CACHE are named by the source file and a hash of its absolute path, sources with the same
+# name in different directories don't share a cache
+def cache_path(path):
+    cache_dir = os.getenv("SAM_TENSOR_CACHE")
+    if not cache_dir:
+        return path + ".sam"
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, os.path.basename(path) + "." + digest + ".sam")
+
+
+def _source_meta(path):
+    stat = os.stat(path)
+    return {"source_size": stat.st_size, "source_mtime": stat.st_mtime_ns}
+
+
+def _open_cache(path, mmap):
+    filename = cache_path(path)
+    if not os.path.exists(filename):
+        return None
+    try:
+        cached = open_formatted(filename, mmap)
+    except (OSError, ValueError):
+        return None
+    return cached if cached.meta == _source_meta(path) else None
+
+
+# Writes the cache under a temporary name first, concurrent readers of the same source never see a partial file
+def _write_cache(path, write):
+    filename = cache_path(path)
+    tmp = filename + ".tmp" + str(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        write(tmp)
+        os.replace(tmp, filename)
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def read_mtx(path, cache=True):
+    """Matrix Market file as returned by scipy.io.mmread(), a coo_matrix for sparse (coordinate) files."""
+    if cache:
+        cached = _open_cache(path, mmap=False)
+        if cached is not None:
+            return scipy.sparse.coo_matrix((cached["vals"], (cached["crd_0"], cached["crd_1"])),
+                                           shape=tuple(cached["shape"].tolist()))
+
+    matrix = scipy.io.mmread(path)
+    if cache and scipy.sparse.isspmatrix_coo(matrix):
+        arrays = {"crd_0": matrix.row, "crd_1": matrix.col, "vals": matrix.data, "shape": list(matrix.shape)}
+        _write_cache(path, lambda filename: write_formatted(filename, arrays, os.path.basename(path), "coo",
+                                                            _source_meta(path)))
+    return matrix
+
+
+def iter_tns(path, chunk_lines=CHUNK_LINES):
+    """Coordinates (0-based, one column per mode) and values of a .tns file in chunks of at most chunk_lines points,
+    for files that don't fit in memory."""
+    with open(path) as f:
+        while True:
+            lines = f.readlines(chunk_lines * 16)
+            if not lines:
+                break
+            for start in range(0, len(lines), chunk_lines):
+                points = np.loadtxt(lines[start:start + chunk_lines], dtype=np.float64, ndmin=2)
+                if len(points) > 0:
+                    yield points[:, :-1].astype(np.int64) - 1, points[:, -1]
+
+
+def _tns_dims(dims, crds):
+    if len(crds) == 0:
+        return dims
+    maxes = crds.max(axis=0) + 1
+    return maxes if dims is None else np.maximum(dims, maxes)
+
+
+# Streams the points into per-mode scratch files, the container needs their number up front
+def _write_tns_cache(path, filename, chunk_lines):
+    scratch = [filename + ".part" + str(i) for i in range(2)]
+    try:
+        dims = None
+        count = 0
+        with open(scratch[0], "wb") as crd_file, open(scratch[1], "wb") as val_file:
+            for crds, vals in iter_tns(path, chunk_lines):
+                crd_file.write(crds.tobytes())
+                val_file.write(vals.tobytes())
+                dims = _tns_dims(dims, crds)
+                count += len(vals)
+        order = 0 if dims is None else len(dims)
+
+        specs = {"crd_" + str(i): (np.int64, count) for i in range(order)}
+        specs["vals"] = (np.float64, count)
+        specs["shape"] = (np.int64, order)
+        arrays = create_formatted(filename, specs, os.path.basename(path), "coo", _source_meta(path))
+        crds = np.memmap(scratch[0], dtype=np.int64, mode='r', shape=(count, order)) if count > 0 else None
+        for start in range(0, count, chunk_lines):
+            stop = min(start + chunk_lines, count)
+            for i in range(order):
+                arrays["crd_" + str(i)][start:stop] = crds[start:stop, i]
+        if count > 0:
+            arrays["vals"][:] = np.memmap(scratch[1], dtype=np.float64, mode='r', shape=(count,))
+            arrays["shape"][:] = dims
+        for arr in arrays.values():
+            if isinstance(arr, np.memmap):
+                arr.flush()
+    finally:
+        for part in scratch:
+            if os.path.exists(part):
+                os.remove(part)
+
+
+def read_tns(path, cache=True, mmap=False, chunk_lines=CHUNK_LINES):
+    """Dimensions, per mode coordinate arrays (0-based) and values of a .tns file.
+
+    Dimensions are one past the largest coordinate of every mode. The file is parsed in chunks of chunk_lines points
+    and, with the cache, streamed into it, so with mmap the arrays are read-only memory maps of the cache and files
+    larger than memory can be read.
+    """
+    if cache:
+        cached = _open_cache(path, mmap)
+        if cached is None:
+            _write_cache(path, lambda filename: _write_tns_cache(path, filename, chunk_lines))
+            cached = _open_cache(path, mmap)
+        if cached is not None:
+            order = len(cached["shape"])
+            return cached["shape"].tolist(), [cached["crd_" + str(i)] for i in range(order)], cached["vals"]
+
+    chunks = list(iter_tns(path, chunk_lines))
+    if len(chunks) == 0:
+        return [], [], np.empty(0)
+    crds = np.concatenate([crds for crds, _ in chunks])
+    vals = np.concatenate([vals for _, vals in chunks])
+    return _tns_dims(None, crds).tolist(), [crds[:, i].copy() for i in range(crds.shape[1])], vals
@@ -10,6 +10,7 @@ import pickle
 from itertools import compress
 from pathlib import Path
 from sam.util import SuiteSparseTensor, InputCacheSuiteSparse, ScipyTensorShifter
+from sam.sim.src.tensor_io import read_mtx
 from sam.sim.src.tiling.process_expr import parse_all, update_dict
 
 SAM_STRS = {"matmul_ikj": "X(i,j)=B(i,k)*C(k,j) -f=X:ss -f=B:ss:1,0 -f=C:ss -s=reorder(k,i,j)"}
@@ -289,7 +290,7 @@ if __name__ == "__main__":
     if args.gen_tensor:
         tensor = scipy.sparse.random(16, 16)
     elif args.extensor:
-        tensor = scipy.io.mmread(args.input_path)
+        tensor = read_mtx(args.input_path)
     else:
         assert args.input_tensor is not None
         SS_PATH = os.getenv('SUITESPARSE_PATH', default=os.path.join(cwd, 'suitesparse'))
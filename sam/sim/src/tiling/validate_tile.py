@@ -4,6 +4,7 @@ import argparse
 import os
 
 from sam.util import ScipyTensorShifter
+from sam.sim.src.tensor_io import read_mtx
 
 
 def validate_simple(args):
@@ -12,7 +13,7 @@ def validate_simple(args):
     SS_PATH = os.getenv('SUITESPARSE_PATH', default=os.path.join(cwd, 'suitesparse'))
     print("PATH:", SS_PATH)
     tensor_path = os.path.join(SS_PATH, args.input_tensor + ".mtx")
-    tensor = scipy.io.mmread(tensor_path).toarray()
+    tensor = read_mtx(tensor_path).toarray()
 
     tensor_shifted = ScipyTensorShifter().shiftLastMode(tensor).toarray()
     tensor_shifted = tensor_shifted.transpose()
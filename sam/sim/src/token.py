@@ -1,12 +1,15 @@
 from .base import *
+from .stream import batch_tokens
 
 
 # Drops tokens
 class StknDrop(Primitive):
+    __slots__ = ("in_stream", "curr_out", "data_valid", "depth", "fifo_avail")
+
     def __init__(self, depth=1, **kwargs):
         super().__init__(**kwargs)
 
-        self.in_stream = []
+        self.in_stream = self.new_channel()
 
         self.curr_out = ''
         if self.backpressure_en:
@@ -50,7 +53,7 @@ class StknDrop(Primitive):
                 # return
 
             if len(self.in_stream) > 0:
-                ival = self.in_stream.pop(0)
+                ival = self.in_stream.popleft()
                 if ival == 'D':
                     self.done = True
                     self.curr_out = 'D'
@@ -60,13 +63,26 @@ class StknDrop(Primitive):
 
             self.curr_out = '' if is_stkn(ival) else ival
         if self.debug:
-            print("Curr InnerCrd:", ival, "\t Curr OutputCrd:", self.curr_out)
+            self.log.debug("Curr InnerCrd:", ival, "\t Curr OutputCrd:", self.curr_out)
+
+    def is_idle(self):
+        return not (self.debug or self.backpressure_en) and len(self.in_stream) == 0 and self.curr_out == ''
+
+    def process_stream(self, in_streams, out_ports=()):
+        stream = batch_tokens(in_streams, 'set_in_stream')
+        if stream is None:
+            out = [val for val in batch_stream(in_streams, 'set_in_stream') if not is_stkn(val)]
+        else:
+            out = stream[stream.kind != TKN_STOP]
+        if len(out) > 0:
+            self.done = out[-1] == 'D'
+        return {'out_val': out}
 
     def set_in_stream(self, val, parent=None):
         if val != '' and val is not None:
             self.in_stream.append(val)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def out_val(self):
         if (self.backpressure_en and self.data_valid) or not self.backpressure_en:
@@ -74,10 +90,13 @@ class StknDrop(Primitive):
 
 
 class EmptyFiberStknDrop(Primitive):
+    __slots__ = ("in_stream", "largest_stkn", "prev_stkn", "leading_stkn", "emit_ival", "prev_ival", "curr_out",
+                 "data_valid", "fifo_avail", "depth")
+
     def __init__(self, depth=4, **kwargs):
         super().__init__(**kwargs)
 
-        self.in_stream = []
+        self.in_stream = self.new_channel()
 
         self.largest_stkn = None
         self.prev_stkn = False
@@ -139,7 +158,7 @@ class EmptyFiberStknDrop(Primitive):
                 return
 
             if len(self.in_stream) > 0:
-                ival = self.in_stream.pop(0)
+                ival = self.in_stream.popleft()
                 if is_stkn(ival) and not self.leading_stkn:
                     self.largest_stkn = ival if self.largest_stkn is None else larger_stkn(self.largest_stkn, ival)
                     self.curr_out = ''
@@ -166,14 +185,14 @@ class EmptyFiberStknDrop(Primitive):
                 self.curr_out = ''
 
             if self.debug:
-                print("Curr InnerCrd:", ival, "\t Curr OutputCrd:", self.curr_out)
+                self.log.debug("Curr InnerCrd:", ival, "\t Curr OutputCrd:", self.curr_out)
 
     # This can be both val or crd
     def set_in_stream(self, val, parent=None):
         if val != '' and val is not None:
             self.in_stream.append(val)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def out_val(self):
         return self.curr_out
@@ -5,6 +5,9 @@ from sam.sim.src.array import Array
 
 
 class WrScan(Primitive, ABC):
+    __slots__ = ("size", "fill", "size_init", "fill_init", "input", "arr", "blk_start_", "depth", "fifo_avail",
+                 "data_valid")
+
     def __init__(self, size=1024, fill=0, backpressure_en=False, depth=1, **kwargs):
         super().__init__(**kwargs)
         self.size = size
@@ -13,7 +16,7 @@ class WrScan(Primitive, ABC):
         self.size_init = size
         self.fill_init = fill
 
-        self.input = []
+        self.input = self.new_channel()
         self.arr = Array(size=size, fill=self.fill, debug=self.debug)
         self.blk_start_ = False
         self.backpressure_en = False
@@ -45,14 +48,14 @@ class WrScan(Primitive, ABC):
 
     def set_input(self, val, parent=None):
         # Make sure streams have correct token type
-        assert (isinstance(val, int) or isinstance(val, float) or val in valid_tkns or val is None)
+        assert (isinstance(val, int) or isinstance(val, float) or val is None or is_valid_tkn(val))
 
         if val != '' and val is not None:
             # print("Add input:", self.name, val)
             self.blk_start_ = True
             self.input.append(val)
-        if self.backpressure_en:
-            parent.set_backpressure(self.fifo_avail)
+        if self.backpressure_en and not self.fifo_avail:
+            parent.set_backpressure(False)
 
     def return_block_start(self):
         return self.blk_start_
@@ -71,7 +74,7 @@ class WrScan(Primitive, ABC):
         return self.input
 
     def set_fifo(self, fifo):
-        self.input = fifo
+        self.input = as_channel(fifo)
 
     @abstractmethod
     def reset(self):
@@ -79,6 +82,8 @@ class WrScan(Primitive, ABC):
 
 
 class ValsWrScan(WrScan):
+    __slots__ = ("curr_addr")
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
@@ -90,9 +95,9 @@ class ValsWrScan(WrScan):
         if self.done:
             return
             if self.debug:
-                print("RESET FOR VALS", self.input)
+                self.log.debug("RESET FOR VALS", self.input)
             if self.debug:
-                print("post reset: ", self.arr.out_done())
+                self.log.debug("post reset: ", self.arr.out_done())
 
         if (len(self.input) > 0):
             self.block_start = False
@@ -107,7 +112,7 @@ class ValsWrScan(WrScan):
                 self.block_start = False
 
             if len(self.input) > 0:
-                val = self.input.pop(0)
+                val = self.input.popleft()
 
                 if not is_stkn(val) and val != 'D':
                     self.arr.set_store(self.curr_addr, val)
@@ -118,7 +123,24 @@ class ValsWrScan(WrScan):
                 self.arr.update()
                 self.done = self.arr.out_done()
             if self.debug:
-                print("Vals Wr scanner print ", self.done, self.curr_addr)
+                self.log.debug("Vals Wr scanner print ", self.done, self.curr_addr)
+
+    def is_idle(self):
+        return not self.debug and (self.done or len(self.input) == 0)
+
+    def process_stream(self, in_streams, out_ports=()):
+        vals = list(self.input) + batch_stream(in_streams, 'set_input')
+        self.input.clear()
+        for val in vals:
+            if self.done:
+                break
+            if not is_stkn(val) and val != 'D':
+                self.arr.store(self.curr_addr, val)
+                self.curr_addr += 1
+            else:
+                self.arr.store(val, val)
+            self.done = self.arr.out_done()
+        return {}
 
     def reset(self):
         # print("reset vals")
@@ -144,6 +166,9 @@ class ValsWrScan(WrScan):
 
 # Unique compressed (not from points)
 class CompressWrScan(WrScan):
+    __slots__ = ("level", "curr_addr", "curr_seg_addr", "curr_crd_cnt", "end_fiber", "seg_size", "seg_size_init",
+                 "seg_arr")
+
     def __init__(self, seg_size=0, level=0, **kwargs):
         super().__init__(**kwargs)
         # FIXME: Either use this later or remove
@@ -167,11 +192,11 @@ class CompressWrScan(WrScan):
             # self.arr.print_debug(name="vals")
             # self.seg_arr.print_debug(name="seg")
             if self.debug:
-                print("RESET WR SCAN ", self.input)
+                self.log.debug("RESET WR SCAN ", self.input)
             # self.reset()
             # self.done = False
             if self.debug:
-                print("post reset: ", self.arr.out_done())
+                self.log.debug("post reset: ", self.arr.out_done())
 
         if len(self.input) > 0:
             self.block_start = False
@@ -182,7 +207,7 @@ class CompressWrScan(WrScan):
             if self.backpressure_en:
                 self.data_valid = True
         if len(self.input) > 0:
-            in_crd = self.input.pop(0)
+            in_crd = self.input.popleft()
             if not is_stkn(in_crd) and in_crd != 'D':
                 self.arr.set_store(self.curr_addr, in_crd)
                 self.curr_addr += 1
@@ -201,11 +226,35 @@ class CompressWrScan(WrScan):
             self.done = self.arr.out_done()
 
         if self.debug:
-            print("DEBUG: WR SCAN: \t "
-                  "name: ", self.name, self.done,
-                  "\t Curr crd addr:", self.curr_addr, "\t curr crd cnt:", self.curr_crd_cnt, "\t curr seg addr:",
-                  self.curr_seg_addr,
-                  "\t end fiber:", self.end_fiber, "\t", self.input)
+            self.log.debug("DEBUG: WR SCAN: \t "
+                           "name: ", self.name, self.done,
+                           "\t Curr crd addr:", self.curr_addr, "\t curr crd cnt:", self.curr_crd_cnt, "\t curr seg addr:",
+                           self.curr_seg_addr,
+                           "\t end fiber:", self.end_fiber, "\t", self.input)
+
+    def is_idle(self):
+        return not self.debug and (self.done or len(self.input) == 0)
+
+    def process_stream(self, in_streams, out_ports=()):
+        crds = list(self.input) + batch_stream(in_streams, 'set_input')
+        self.input.clear()
+        for in_crd in crds:
+            if self.done:
+                break
+            if not is_stkn(in_crd) and in_crd != 'D':
+                self.arr.store(self.curr_addr, in_crd)
+                self.curr_addr += 1
+                self.curr_crd_cnt += 1
+                self.end_fiber = False
+            elif is_stkn(in_crd) and not self.end_fiber:
+                self.seg_arr.store(self.curr_seg_addr, self.curr_crd_cnt)
+                self.curr_seg_addr += 1
+                self.end_fiber = True
+                self.arr.store(in_crd, in_crd)
+            else:
+                self.arr.store(in_crd, in_crd)
+            self.done = self.arr.out_done()
+        return {}
 
     def reset(self):
         # print("reset crd arr")
@@ -248,6 +297,8 @@ class CompressWrScan(WrScan):
 
 # Unique compressed (not from points)
 class UncompressWrScan(WrScan, ABC):
+    __slots__ = ("dim")
+
     def __init__(self, seg_size=0, level=0, **kwargs):
         super().__init__(**kwargs)
 
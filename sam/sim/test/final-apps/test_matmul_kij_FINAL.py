@@ -10,6 +10,7 @@ from sam.sim.src.repeater import Repeat, RepeatSigGen
 from sam.sim.src.accumulator import Reduce
 from sam.sim.src.accumulator import SparseAccumulator1, SparseAccumulator2
 from sam.sim.src.token import *
+from sam.sim.src.graph import SimGraph, Bind
 from sam.sim.test.test import *
 from sam.sim.test.gold import *
 import os
@@ -18,6 +19,61 @@ import csv
 cwd = os.getcwd()
 formatted_dir = os.getenv('SUITESPARSE_FORMATTED_PATH', default=os.path.join(cwd, 'mode-formats'))
 
+# The graph is built once and instantiated per dataset
+matmul_kij = SimGraph("matmul_kij")
+matmul_kij.add_node("fiberlookup_Bk_17", CompressedCrdRdScan, crd_arr=Bind("B_crd1"), seg_arr=Bind("B_seg1"))
+matmul_kij.add_node("fiberlookup_Ck_18", CompressedCrdRdScan, crd_arr=Bind("C_crd0"), seg_arr=Bind("C_seg0"))
+matmul_kij.add_node("intersectk_16", Intersect2)
+matmul_kij.add_node("fiberlookup_Bi_15", CompressedCrdRdScan, crd_arr=Bind("B_crd0"), seg_arr=Bind("B_seg0"))
+matmul_kij.add_node("repsiggen_i_13", RepeatSigGen)
+matmul_kij.add_node("repeat_Ci_12", Repeat)
+matmul_kij.add_node("fiberlookup_Cj_11", CompressedCrdRdScan, crd_arr=Bind("C_crd1"), seg_arr=Bind("C_seg1"))
+matmul_kij.add_node("arrayvals_C_7", Array, init_arr=Bind("C_vals"))
+matmul_kij.add_node("crdhold_4", CrdHold)
+matmul_kij.add_node("repsiggen_j_9", RepeatSigGen)
+matmul_kij.add_node("repeat_Bj_8", Repeat)
+matmul_kij.add_node("arrayvals_B_6", Array, init_arr=Bind("B_vals"))
+matmul_kij.add_node("mul_5", Multiply2)
+matmul_kij.add_node("spaccumulator2_3_drop_crd_outer", StknDrop)
+matmul_kij.add_node("spaccumulator2_3_drop_crd_inner", StknDrop)
+matmul_kij.add_node("spaccumulator2_3_drop_val", StknDrop)
+matmul_kij.add_node("spaccumulator2_3", SparseAccumulator2)
+matmul_kij.add_node("fiberwrite_Xvals_0", ValsWrScan, size=Bind(lambda b: 1 * b["Bs_seg"][-1] * b["Bs_seg"][-1]),
+                    fill=Bind("fill"))
+matmul_kij.add_node("fiberwrite_X1_1", CompressWrScan, seg_size=Bind(lambda b: b["Bs_seg"][-1] + 1),
+                    size=Bind(lambda b: b["Bs_seg"][-1] * b["Bs_seg"][-1]), fill=Bind("fill"))
+matmul_kij.add_node("fiberwrite_X0_2", CompressWrScan, seg_size=2, size=Bind(lambda b: b["Bs_seg"][-1]),
+                    fill=Bind("fill"))
+
+matmul_kij.add_input("fiberlookup_Bk_17", "set_in_ref", "in_ref_B")
+matmul_kij.add_input("fiberlookup_Ck_18", "set_in_ref", "in_ref_C")
+matmul_kij.add_edge("fiberlookup_Bk_17", "intersectk_16", "set_in1", ("out_ref", "out_crd"), "crd")
+matmul_kij.add_edge("fiberlookup_Ck_18", "intersectk_16", "set_in2", ("out_ref", "out_crd"), "crd")
+matmul_kij.add_edge("intersectk_16", "fiberlookup_Bi_15", "set_in_ref", "out_ref1", "ref")
+matmul_kij.add_edge("fiberlookup_Bi_15", "repsiggen_i_13", "set_istream", "out_crd", "crd")
+matmul_kij.add_edge("intersectk_16", "repeat_Ci_12", "set_in_ref", "out_ref2", "ref")
+matmul_kij.add_edge("repsiggen_i_13", "repeat_Ci_12", "set_in_repsig", "out_repsig", "repsig")
+matmul_kij.add_edge("repeat_Ci_12", "fiberlookup_Cj_11", "set_in_ref", "out_ref", "ref")
+matmul_kij.add_edge("fiberlookup_Cj_11", "arrayvals_C_7", "set_load", "out_ref", "ref")
+matmul_kij.add_edge("fiberlookup_Bi_15", "crdhold_4", "set_outer_crd", "out_crd", "crd")
+matmul_kij.add_edge("fiberlookup_Cj_11", "crdhold_4", "set_inner_crd", "out_crd", "crd")
+matmul_kij.add_edge("fiberlookup_Cj_11", "repsiggen_j_9", "set_istream", "out_crd", "crd")
+matmul_kij.add_edge("fiberlookup_Bi_15", "repeat_Bj_8", "set_in_ref", "out_ref", "ref")
+matmul_kij.add_edge("repsiggen_j_9", "repeat_Bj_8", "set_in_repsig", "out_repsig", "repsig")
+matmul_kij.add_edge("repeat_Bj_8", "arrayvals_B_6", "set_load", "out_ref", "ref")
+matmul_kij.add_edge("arrayvals_B_6", "mul_5", "set_in1", "out_val", "val")
+matmul_kij.add_edge("arrayvals_C_7", "mul_5", "set_in2", "out_val", "val")
+matmul_kij.add_edge("crdhold_4", "spaccumulator2_3_drop_crd_outer", "set_in_stream", "out_crd_outer", "crd")
+matmul_kij.add_edge("crdhold_4", "spaccumulator2_3_drop_crd_inner", "set_in_stream", "out_crd_inner", "crd")
+matmul_kij.add_edge("mul_5", "spaccumulator2_3_drop_val", "set_in_stream", "out_val", "val")
+matmul_kij.add_edge("spaccumulator2_3_drop_crd_outer", "spaccumulator2_3", "set_crd_outer", "out_val", "crd")
+matmul_kij.add_edge("spaccumulator2_3_drop_crd_inner", "spaccumulator2_3", "set_crd_inner", "out_val", "crd")
+matmul_kij.add_edge("spaccumulator2_3_drop_val", "spaccumulator2_3", "set_val", "out_val", "val")
+matmul_kij.add_edge("spaccumulator2_3", "fiberwrite_Xvals_0", "set_input", "out_val", "val")
+matmul_kij.add_edge("spaccumulator2_3", "fiberwrite_X1_1", "set_input", "out_crd_inner", "crd")
+matmul_kij.add_edge("spaccumulator2_3", "fiberwrite_X0_2", "set_input", "out_crd_outer", "crd")
+matmul_kij.set_outputs("fiberwrite_X0_2", "fiberwrite_X1_1", "fiberwrite_Xvals_0")
+
 
 @pytest.mark.suitesparse
 def test_matmul_kij_FINAL(samBench, ssname, check_gold, report_stats, debug_sim, cast, backpressure, depth, fill=0):
@@ -59,109 +115,16 @@ def test_matmul_kij_FINAL(samBench, ssname, check_gold, report_stats, debug_sim,
     Bs_dirname = B_dirname
     Bs_seg = read_inputs(os.path.join(Bs_dirname, "tensor_B_mode_0_seg"))
 
-    fiberlookup_Bk_17 = CompressedCrdRdScan(crd_arr=B_crd1, seg_arr=B_seg1, debug=debug_sim, statistics=report_stats,
-                                            back_en=backpressure, depth=int(depth))
-    fiberlookup_Ck_18 = CompressedCrdRdScan(crd_arr=C_crd0, seg_arr=C_seg0, debug=debug_sim, statistics=report_stats,
-                                            back_en=backpressure, depth=int(depth))
-    intersectk_16 = Intersect2(debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    fiberlookup_Bi_15 = CompressedCrdRdScan(crd_arr=B_crd0, seg_arr=B_seg0, debug=debug_sim, statistics=report_stats,
-                                            back_en=backpressure, depth=int(depth))
-    repsiggen_i_13 = RepeatSigGen(debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    repeat_Ci_12 = Repeat(debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    fiberlookup_Cj_11 = CompressedCrdRdScan(crd_arr=C_crd1, seg_arr=C_seg1, debug=debug_sim, statistics=report_stats,
-                                            back_en=backpressure, depth=int(depth))
-    arrayvals_C_7 = Array(init_arr=C_vals, debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    crdhold_4 = CrdHold(debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    repsiggen_j_9 = RepeatSigGen(debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    repeat_Bj_8 = Repeat(debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    arrayvals_B_6 = Array(init_arr=B_vals, debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    mul_5 = Multiply2(debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    spaccumulator2_3 = SparseAccumulator2(debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    spaccumulator2_3_drop_crd_inner = StknDrop(debug=debug_sim, statistics=report_stats,
-                                               back_en=backpressure, depth=int(depth))
-    spaccumulator2_3_drop_crd_outer = StknDrop(debug=debug_sim, statistics=report_stats,
-                                               back_en=backpressure, depth=int(depth))
-    spaccumulator2_3_drop_val = StknDrop(debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    fiberwrite_Xvals_0 = ValsWrScan(size=1 * Bs_seg[-1] * Bs_seg[-1], fill=fill, debug=debug_sim, statistics=report_stats,
-                                    back_en=backpressure, depth=int(depth))
-    fiberwrite_X1_1 = CompressWrScan(seg_size=Bs_seg[-1] + 1, size=Bs_seg[-1] * Bs_seg[-1], fill=fill,
-                                     debug=debug_sim, statistics=report_stats, back_en=backpressure, depth=int(depth))
-    fiberwrite_X0_2 = CompressWrScan(seg_size=2, size=Bs_seg[-1], fill=fill, debug=debug_sim, statistics=report_stats,
-                                     back_en=backpressure, depth=int(depth))
-    in_ref_B = [0, 'D']
-    in_ref_C = [0, 'D']
-    done = False
-    time_cnt = 0
-    while not done and time_cnt < TIMEOUT:
-        if len(in_ref_B) > 0:
-            fiberlookup_Bk_17.set_in_ref(in_ref_B.pop(0), "")
-
-        if len(in_ref_C) > 0:
-            fiberlookup_Ck_18.set_in_ref(in_ref_C.pop(0), "")
-
-        intersectk_16.set_in1(fiberlookup_Bk_17.out_ref(), fiberlookup_Bk_17.out_crd(), fiberlookup_Bk_17)
-        intersectk_16.set_in2(fiberlookup_Ck_18.out_ref(), fiberlookup_Ck_18.out_crd(), fiberlookup_Ck_18)
-
-        fiberlookup_Bi_15.set_in_ref(intersectk_16.out_ref1(), intersectk_16)
-
-        repsiggen_i_13.set_istream(fiberlookup_Bi_15.out_crd(), fiberlookup_Bi_15)
-
-        repeat_Ci_12.set_in_ref(intersectk_16.out_ref2(), intersectk_16)
-        repeat_Ci_12.set_in_repsig(repsiggen_i_13.out_repsig(), repsiggen_i_13)
-
-        fiberlookup_Cj_11.set_in_ref(repeat_Ci_12.out_ref(), repeat_Ci_12)
-
-        arrayvals_C_7.set_load(fiberlookup_Cj_11.out_ref(), fiberlookup_Cj_11)
-
-        crdhold_4.set_outer_crd(fiberlookup_Bi_15.out_crd(), fiberlookup_Bi_15)
-        crdhold_4.set_inner_crd(fiberlookup_Cj_11.out_crd(), fiberlookup_Cj_11)
-        repsiggen_j_9.set_istream(fiberlookup_Cj_11.out_crd(), fiberlookup_Cj_11)
-
-        repeat_Bj_8.set_in_ref(fiberlookup_Bi_15.out_ref(), fiberlookup_Bi_15)
-        repeat_Bj_8.set_in_repsig(repsiggen_j_9.out_repsig(), repsiggen_j_9)
-
-        arrayvals_B_6.set_load(repeat_Bj_8.out_ref(), repeat_Bj_8)
-
-        mul_5.set_in1(arrayvals_B_6.out_val(), arrayvals_B_6)
-        mul_5.set_in2(arrayvals_C_7.out_val(), arrayvals_C_7)
-
-        spaccumulator2_3_drop_crd_outer.set_in_stream(crdhold_4.out_crd_outer(), crdhold_4)
-        spaccumulator2_3_drop_crd_inner.set_in_stream(crdhold_4.out_crd_inner(), crdhold_4)
-        spaccumulator2_3_drop_val.set_in_stream(mul_5.out_val(), mul_5)
-        spaccumulator2_3.set_crd_outer(spaccumulator2_3_drop_crd_outer.out_val(), spaccumulator2_3_drop_crd_outer)
-        spaccumulator2_3.set_crd_inner(spaccumulator2_3_drop_crd_inner.out_val(), spaccumulator2_3_drop_crd_inner)
-        spaccumulator2_3.set_val(spaccumulator2_3_drop_val.out_val(), spaccumulator2_3_drop_val)
-
-        fiberwrite_Xvals_0.set_input(spaccumulator2_3.out_val(), spaccumulator2_3)
-
-        fiberwrite_X1_1.set_input(spaccumulator2_3.out_crd_inner(), spaccumulator2_3)
-
-        fiberwrite_X0_2.set_input(spaccumulator2_3.out_crd_outer(), spaccumulator2_3)
-
-        fiberlookup_Bk_17.update()
-        fiberlookup_Ck_18.update()
-        intersectk_16.update()
-        fiberlookup_Bi_15.update()
-        repsiggen_i_13.update()
-        repeat_Ci_12.update()
-        fiberlookup_Cj_11.update()
-        arrayvals_C_7.update()
-        crdhold_4.update()
-        repsiggen_j_9.update()
-        repeat_Bj_8.update()
-        arrayvals_B_6.update()
-        mul_5.update()
-        spaccumulator2_3_drop_crd_outer.update()
-        spaccumulator2_3_drop_crd_inner.update()
-        spaccumulator2_3_drop_val.update()
-        spaccumulator2_3.update()
-        fiberwrite_Xvals_0.update()
-        fiberwrite_X1_1.update()
-        fiberwrite_X0_2.update()
-
-        done = fiberwrite_X0_2.out_done() and fiberwrite_X1_1.out_done() and fiberwrite_Xvals_0.out_done()
-        time_cnt += 1
+    bindings = {"B_seg0": B_seg0, "B_crd0": B_crd0, "B_seg1": B_seg1, "B_crd1": B_crd1, "B_vals": B_vals,
+                "C_seg0": C_seg0, "C_crd0": C_crd0, "C_seg1": C_seg1, "C_crd1": C_crd1, "C_vals": C_vals,
+                "Bs_seg": Bs_seg, "fill": fill, "in_ref_B": [0, 'D'], "in_ref_C": [0, 'D']}
+    sim = matmul_kij.build(bindings, skip_idle=True, debug=debug_sim, statistics=report_stats, back_en=backpressure,
+                           depth=int(depth))
+    time_cnt = sim.run(TIMEOUT)
 
+    fiberwrite_X0_2 = sim["fiberwrite_X0_2"]
+    fiberwrite_X1_1 = sim["fiberwrite_X1_1"]
+    fiberwrite_Xvals_0 = sim["fiberwrite_Xvals_0"]
     fiberwrite_X0_2.autosize()
     fiberwrite_X1_1.autosize()
     fiberwrite_Xvals_0.autosize()
@@ -184,61 +147,8 @@ def test_matmul_kij_FINAL(samBench, ssname, check_gold, report_stats, debug_sim,
     extra_info["result/vals_size"] = len(out_vals)
     extra_info["result/nnz"] = len([x for x in out_vals if x != 0])
 
-    sample_dict = intersectk_16.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["intersectk_16" + "/" + k] = sample_dict[k]
-
-    sample_dict = spaccumulator2_3.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["spaccumulator2_3" + "/" + k] = sample_dict[k]
-
-    sample_dict = fiberwrite_Xvals_0.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["fiberwrite_Xvals_0" + "/" + k] = sample_dict[k]
-
-    sample_dict = fiberwrite_X1_1.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["fiberwrite_X1_1" + "/" + k] = sample_dict[k]
-
-    sample_dict = fiberwrite_X0_2.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["fiberwrite_X0_2" + "/" + k] = sample_dict[k]
-
-    sample_dict = repeat_Ci_12.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["repeat_Ci_12" + "/" + k] = sample_dict[k]
-
-    sample_dict = repeat_Bj_8.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["repeat_Bj_8" + "/" + k] = sample_dict[k]
-
-    sample_dict = arrayvals_B_6.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["arrayvals_B_6" + "/" + k] = sample_dict[k]
-
-    sample_dict = arrayvals_C_7.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["arrayvals_C_7" + "/" + k] = sample_dict[k]
-
-    sample_dict = mul_5.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["mul_5" + "/" + k] = sample_dict[k]
-
-    sample_dict = fiberlookup_Bk_17.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["fiberlookup_Bk_17" + "/" + k] = sample_dict[k]
-
-    sample_dict = fiberlookup_Ck_18.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["fiberlookup_Ck_18" + "/" + k] = sample_dict[k]
-
-    sample_dict = fiberlookup_Bi_15.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["fiberlookup_Bi_15" + "/" + k] = sample_dict[k]
-
-    sample_dict = fiberlookup_Cj_11.return_statistics()
-    for k in sample_dict.keys():
-        extra_info["fiberlookup_Cj_11" + "/" + k] = sample_dict[k]
+    # Statistics of every node, e.g. "intersectk_16/fifos_ref_1" or "repeat_Bj_8/in_ref_size"
+    extra_info.update(sim.stats_registry().as_dict())
 
     if check_gold:
         print("Checking gold...")
@@ -9,6 +9,8 @@ import numpy as np
 
 from sam.sim.test.test import check_point_tuple, remove_zeros, convert_point_tuple, convert_ndarr_point_tuple, \
     get_point_list, read_inputs
+from sam.sim.src.tensor_cache import input_cache
+from sam.sim.src.tensor_io import read_mtx
 from sam.util import TnsFileLoader, round_sparse, ScipyTensorShifter, \
     SUITESPARSE_FORMATTED_PATH, SUITESPARSE_PATH, FROSTT_PATH, VALIDATION_OUTPUT_PATH
 
@@ -20,6 +22,13 @@ validate_dir = VALIDATION_OUTPUT_PATH
 tiled_output_path = os.getenv('TILED_OUTPUT_PATH', default=os.path.join(cwd, 'mode-formats'))
 
 
+# The matrix ssname as CSR, cast to ints if cast and then transformed, cached for the rest of the test session
+def load_ss(ssname, cast, transform=()):
+    path = os.path.join(ss_dir, ssname + ".mtx")
+    prefix = ("csr", "cast") if cast else ("csr",)
+    return input_cache.get(path, lambda: read_mtx(path), prefix + tuple(transform))
+
+
 def check_gold_matmul_tiled(tile_crd_b, tile_crd_c, ssname, debug_sim, out_crds, out_segs, out_val, out_format="ss01"):
     # CSR
     gold_file_path = "out_" + str(tile_crd_b[0]) + "_" + str(tile_crd_b[1]) + "_" +\
@@ -74,11 +83,8 @@ def check_gold_matmul_tiled(tile_crd_b, tile_crd_c, ssname, debug_sim, out_crds,
 
 def check_gold_matmul(ssname, debug_sim, cast, out_crds, out_segs, out_val, out_format="ss01"):
     # CSR
-    B_tensor = scipy.io.mmread(os.path.join(ss_dir, ssname + ".mtx")).tocsr()
-    shifter = ScipyTensorShifter()
-
-    B_scipy = B_tensor
-    C_scipy = shifter.shiftLastMode(B_scipy).transpose()
+    B_scipy = load_ss(ssname, False)
+    C_scipy = load_ss(ssname, False, ("shift", "transpose"))
 
     gold_nd = (B_scipy * C_scipy).toarray()
     transpose = out_format[-2:] == "10"
@@ -110,14 +116,10 @@ def check_gold_matmul(ssname, debug_sim, cast, out_crds, out_segs, out_val, out_
 
 def check_gold_mat_elemmul(ssname, debug_sim, cast, out_crds, out_segs, out_val, format_str):
     # MTX
-    B_tensor = scipy.io.mmread(os.path.join(ss_dir, ssname + ".mtx")).tocsr()
-    if cast:
-        data = [round_sparse(x) for x in B_tensor.data]
-        B_tensor = scipy.sparse.csr_matrix((data, B_tensor.indices, B_tensor.indptr), dtype=int)
+    B_tensor = load_ss(ssname, cast)
 
-    shifter = ScipyTensorShifter()
     B_scipy = B_tensor
-    C_scipy = shifter.shiftLastMode(B_scipy)
+    C_scipy = load_ss(ssname, cast, ("shift",))
 
     gold_nd = (B_scipy.multiply(C_scipy)).toarray()
     transpose = format_str[-2:] == "10"
@@ -147,10 +149,7 @@ def check_gold_mat_elemmul(ssname, debug_sim, cast, out_crds, out_segs, out_val,
 
 def check_gold_mat_identity(ssname, debug_sim, cast, out_crds, out_segs, out_val, format_str):
     # MTX
-    B_tensor = scipy.io.mmread(os.path.join(ss_dir, ssname + ".mtx")).tocsr()
-    if cast:
-        data = [round_sparse(x) for x in B_tensor.data]
-        B_tensor = scipy.sparse.csr_matrix((data, B_tensor.indices, B_tensor.indptr), dtype=int)
+    B_tensor = load_ss(ssname, cast)
 
     B_scipy = B_tensor
 
@@ -174,14 +173,10 @@ def check_gold_mat_identity(ssname, debug_sim, cast, out_crds, out_segs, out_val
 
 def check_gold_mat_elemadd(ssname, debug_sim, cast, out_crds, out_segs, out_val, format_str):
     # MTX
-    B_tensor = scipy.io.mmread(os.path.join(ss_dir, ssname + ".mtx")).tocsr()
-    if cast:
-        data = [round_sparse(x) for x in B_tensor.data]
-        B_tensor = scipy.sparse.csr_matrix((data, B_tensor.indices, B_tensor.indptr), dtype=int)
+    B_tensor = load_ss(ssname, cast)
 
-    shifter = ScipyTensorShifter()
     B_scipy = B_tensor
-    C_scipy = shifter.shiftLastMode(B_scipy)
+    C_scipy = load_ss(ssname, cast, ("shift",))
 
     gold_nd = (B_scipy + C_scipy).toarray()
     transpose = format_str[-2:] == "10"
@@ -219,10 +214,7 @@ def check_gold_mat_vecmul_ij(ssname, debug_sim, out_crds, out_segs, out_val, for
 
 def check_gold_mat_vecmul(ssname, debug_sim, cast, out_crds, out_segs, out_val, format_str):
     # MTX
-    B_tensor = scipy.io.mmread(os.path.join(ss_dir, ssname + ".mtx")).tocsr()
-    if cast:
-        data = [round_sparse(x) for x in B_tensor.data]
-        B_tensor = scipy.sparse.csr_matrix((data, B_tensor.indices, B_tensor.indptr), dtype=int)
+    B_tensor = load_ss(ssname, cast)
 
     c_dirname = os.path.join(ss_formatted_dir, ssname, "mat_vecmul")
     c_shape = B_tensor.shape[1]
@@ -269,10 +261,7 @@ def check_gold_mat_vecmul(ssname, debug_sim, cast, out_crds, out_segs, out_val,
 
 def check_gold_mat_sddmm(ssname, debug_sim, cast, out_crds, out_segs, out_val, format_str, KDIM=256):
     # MTX
-    B_tensor = scipy.io.mmread(os.path.join(ss_dir, ssname + ".mtx")).tocsr()
-    if cast:
-        data = [round_sparse(x) for x in B_tensor.data]
-        B_tensor = scipy.sparse.csr_matrix((data, B_tensor.indices, B_tensor.indptr), dtype=int)
+    B_tensor = load_ss(ssname, cast)
 
     B_shape = B_tensor.shape
     C_shape = (B_shape[0], KDIM)
@@ -314,10 +303,7 @@ def check_gold_mat_sddmm(ssname, debug_sim, cast, out_crds, out_segs, out_val, f
 
 def check_gold_mat_residual(ssname, debug_sim, cast, out_crds, out_segs, out_val, format_str):
     # MTX
-    C_tensor = scipy.io.mmread(os.path.join(ss_dir, ssname + ".mtx")).tocsr()
-    if cast:
-        data = [round_sparse(x) for x in C_tensor.data]
-        C_tensor = scipy.sparse.csr_matrix((data, C_tensor.indices, C_tensor.indptr), dtype=int)
+    C_tensor = load_ss(ssname, cast)
 
     b_dirname = os.path.join(ss_formatted_dir, ssname, "mat_residual")
     b_shape = C_tensor.shape[0]
@@ -378,10 +364,7 @@ def check_gold_mat_residual(ssname, debug_sim, cast, out_crds, out_segs, out_val
 
 def check_gold_mat_mattransmul(ssname, debug_sim, cast, out_crds, out_segs, out_val, format_str):
     # MTX
-    C_tensor = scipy.io.mmread(os.path.join(ss_dir, ssname + ".mtx")).tocsr()
-    if cast:
-        data = [round_sparse(x) for x in C_tensor.data]
-        C_tensor = scipy.sparse.csr_matrix((data, C_tensor.indices, C_tensor.indptr), dtype=int)
+    C_tensor = load_ss(ssname, cast)
 
     d_dirname = os.path.join(ss_formatted_dir, ssname, "mat_mattransmul")
     d_shape = C_tensor.shape[0]
@@ -445,15 +428,11 @@ def check_gold_mat_mattransmul(ssname, debug_sim, cast, out_crds, out_segs, out_
 
 def check_gold_mat_elemadd3(ssname, debug_sim, cast, out_crds, out_segs, out_val, format_str):
     # MTX
-    B_tensor = scipy.io.mmread(os.path.join(ss_dir, ssname + ".mtx")).tocsr()
-    if cast:
-        data = [round_sparse(x) for x in B_tensor.data]
-        B_tensor = scipy.sparse.csr_matrix((data, B_tensor.indices, B_tensor.indptr), dtype=int)
+    B_tensor = load_ss(ssname, cast)
 
-    shifter = ScipyTensorShifter()
     B_scipy = B_tensor
-    C_scipy = shifter.shiftLastMode(B_scipy)
-    D_scipy = shifter.shiftLastMode(C_scipy)
+    C_scipy = load_ss(ssname, cast, ("shift",))
+    D_scipy = load_ss(ssname, cast, ("shift", "shift"))
 
     gold_nd = (B_scipy + C_scipy + D_scipy).toarray()
     transpose = format_str[-2:] == "10"
@@ -1,6 +1,10 @@
 import pytest
 import random
 import copy
+import os
+import numpy as np
+import yaml
+from sam.sim.src import array
 from sam.sim.src.array import Array
 from sam.sim.test.test import TIMEOUT
 
@@ -114,3 +118,55 @@ def test_arr_load_direct_0tkn(arrs, debug_sim):
 
     # Assert the array stores only the values
     assert (out_val == gold_val)
+
+
+@pytest.mark.parametrize("arrs", [arrs_dict3, arrs_dict6])
+def test_arr_load_mmap(arrs, tmp_path):
+    path = str(tmp_path / "vals.npy")
+    np.save(path, np.array(arrs['arr'], dtype=np.float32))
+
+    arr = Array(init_arr=path)
+    assert isinstance(arr.arr, np.memmap)
+    assert (arr.process_stream({'set_load': arrs['ref']}, ['out_val']) == {'out_val': arrs['gold'], 'out_load': arrs['gold']})
+
+    # Stores go to a private copy
+    arr.store(0, 10.0)
+    assert (arr.get_arr()[0] == 10.0)
+    assert (np.load(path)[0] == arrs['arr'][0])
+
+
+def test_arr_store_grow():
+    arr = Array(size=2, element_size=4)
+    assert (arr.arr.dtype == np.int32)
+    arr.store(0, 0.5)
+    assert (arr.arr.dtype == np.float32)
+    for addr in range(9):
+        arr.store(addr, addr + 0.5)
+    assert (arr.get_arr()[:9] == [addr + 0.5 for addr in range(9)])
+    assert (arr.get_arr()[9:] == [0] * (arr.size - 9))
+
+    arr.resize(4)
+    arr.resize(6)
+    assert (arr.get_arr() == [0.5, 1.5, 2.5, 3.5, 0, 0])
+
+
+# Integers keep an integer type of the config's width, values the width can't hold are an error
+def test_arr_element_size(yaml_name):
+    with open(os.path.join(os.path.dirname(array.__file__), "tiling", yaml_name), "r") as stream:
+        element_size = yaml.safe_load(stream)["Bytes_per_element"]
+
+    vals = [0, 2049, 4097, 30000]
+    arr = Array(init_arr=vals, element_size=element_size)
+    assert (arr.arr.dtype.kind == 'i' and arr.arr.dtype.itemsize == element_size)
+    assert (arr.process_stream({'set_load': [3, 1, 2, 'S0', 'D']})['out_val'] == [30000, 2049, 4097, 'S0', 'D'])
+    arr.store(0, 12345)
+    assert (arr.get_arr() == [12345, 2049, 4097, 30000])
+
+    with pytest.raises(ValueError):
+        arr.store(0, 1 << (8 * element_size))
+    with pytest.raises(ValueError):
+        Array(init_arr=[1 << (8 * element_size)], element_size=element_size)
+    with pytest.raises(ValueError):
+        Array(init_arr=[0.5, 1.5], element_size=1)
+    with pytest.raises(ValueError):
+        Array(init_arr=[70000.0], element_size=2)
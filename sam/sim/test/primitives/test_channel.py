@@ -0,0 +1,57 @@
+import pytest
+
+from sam.sim.src.channel import Channel, TrackedChannel, as_channel
+from sam.sim.src.compute import Add2
+from sam.sim.src.base import remove_emptystr
+from sam.sim.test.test import TIMEOUT
+
+
+def test_channel_fifo():
+    fifo = Channel()
+    for i in range(5):
+        fifo.append(i)
+    assert fifo[0] == 0 and fifo[-1] == 4
+    assert [fifo.popleft() for _ in range(5)] == [0, 1, 2, 3, 4]
+    assert len(fifo) == 0
+    assert fifo.occupancy() == {}
+
+    lst = [1, 2]
+    assert list(as_channel(lst)) == lst
+    assert as_channel(fifo) is fifo
+
+
+def test_tracked_channel():
+    fifo = TrackedChannel()
+    fifo.append(0)
+    fifo.append(1)
+    fifo.popleft()
+    fifo.extend([2, 3])
+    fifo.popleft()
+    fifo.append(4)
+    assert fifo.occupancy() == {"high_water": 3, "histogram": {1: 1, 2: 2, 3: 2}}
+
+
+@pytest.mark.parametrize("stats", [False, True])
+def test_channel_statistics(stats):
+    in1 = [0, 1, 2, 'S0', 'D']
+    in2 = [3, 4, 5, 'S0', 'D']
+    add = Add2(statistics=stats)
+    done = False
+    time = 0
+    out = []
+    # Push all inputs up front so the input FIFOs fill up
+    for a, b in zip(in1, in2):
+        add.set_in1(a)
+        add.set_in2(b)
+    while not done and time < TIMEOUT:
+        add.update()
+        out.append(add.out_val())
+        done = add.out_done()
+        time += 1
+
+    assert remove_emptystr(out) == [3, 5, 7, 'S0', 'D']
+    if stats:
+        assert add.channel_statistics()["in1"]["high_water"] == len(in1)
+        assert add.channel_statistics()["in2"]["histogram"] == {i: 1 for i in range(1, len(in2) + 1)}
+    else:
+        assert add.channel_statistics() == {}
@@ -0,0 +1,51 @@
+import os
+import pytest
+
+from sam.sim.src.array import Array
+from sam.sim.src.formatted import convert_formatted, load_formatted, open_formatted, write_formatted
+from sam.sim.src.rd_scanner import CompressedCrdRdScan
+from sam.sim.test.test import read_inputs
+
+levels = {"mode_shape": [3, 4], "mode_0_seg": [0, 2], "mode_0_crd": [0, 2], "mode_1_seg": [0, 2, 3],
+          "mode_1_crd": [1, 3, 0], "mode_vals": [1.5, 2, -3]}
+
+
+def write_text(dirname, tensor):
+    os.makedirs(dirname, exist_ok=True)
+    for key, arr in levels.items():
+        with open(os.path.join(dirname, "tensor_" + tensor + "_" + key), "w") as f:
+            f.write("\n".join(str(x) for x in arr) + "\n")
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_formatted_convert_load(tmp_path, mmap):
+    dirname = os.path.join(tmp_path, "mat", "matmul_ijk")
+    write_text(dirname, "B")
+    convert_formatted(dirname, "B", "ss01")
+
+    tensor = load_formatted("mat", "matmul_ijk", "ss01", mmap=mmap, path=str(tmp_path))
+    assert tensor.shape == (3, 4)
+    assert tensor.seg(1).tolist() == levels["mode_1_seg"] and tensor.crd(1).tolist() == levels["mode_1_crd"]
+    assert tensor.vals.tolist() == levels["mode_vals"]
+    with pytest.raises(ValueError):
+        load_formatted("mat", "matmul_ijk", "ss10", path=str(tmp_path))
+
+    # The text readers of the tests pick up the container
+    os.remove(os.path.join(dirname, "tensor_B_mode_1_crd"))
+    assert read_inputs(os.path.join(dirname, "tensor_B_mode_1_crd")) == levels["mode_1_crd"]
+    assert read_inputs(os.path.join(dirname, "tensor_B_mode_vals"), float) == levels["mode_vals"]
+
+
+def test_formatted_blocks(tmp_path):
+    filename = os.path.join(tmp_path, "tensor_C.sam")
+    write_formatted(filename, {"mode_0_seg": [0, 3], "mode_0_crd": [1, 4, 6], "mode_vals": [0.5, 1.5, 2.5],
+                               "mode_empty": []}, "C", "s0")
+    tensor = open_formatted(filename)
+    assert len(tensor["mode_empty"]) == 0
+
+    crdscan = CompressedCrdRdScan(seg_arr=tensor.seg(0), crd_arr=tensor.crd(0))
+    out = crdscan.process_stream({'set_in_ref': [0, 'D']}, ['out_crd', 'out_ref'])
+    assert out['out_crd'] == [1, 4, 6, 'S0', 'D']
+
+    vals = Array(init_arr=tensor.vals)
+    assert vals.process_stream({'set_load': out['out_ref']}, ['out_val'])['out_val'] == [0.5, 1.5, 2.5, 'S0', 'D']
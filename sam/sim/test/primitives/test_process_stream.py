@@ -0,0 +1,267 @@
+import pytest
+import random
+
+from sam.sim.src.base import Primitive
+from sam.sim.src.graph import SimGraph
+from sam.sim.src.rd_scanner import CompressedCrdRdScan
+from sam.sim.src.joiner import Intersect2, Union2
+from sam.sim.src.compute import Add2, Multiply2
+from sam.sim.src.repeater import Repeat, RepeatSigGen
+from sam.sim.src.crd_manager import CrdDrop, CrdHold, CrdPtConverter
+from sam.sim.src.accumulator import Reduce, SparseAccumulator1, SparseAccumulator2, SparseAccumulatorN, \
+    SparseCrdPtAccumulator1, SparseCrdPtAccumulator2
+from sam.sim.src.array import Array
+from sam.sim.src.token import StknDrop
+from sam.sim.src.wr_scanner import ValsWrScan, CompressWrScan
+
+
+# Every process_stream() override has to produce the streams of the cycle-by-cycle fallback
+def check_streams(make, in_streams, out_ports=None):
+    blk = make()
+    if out_ports is None:
+        out_ports = [p for p in dir(blk) if p.startswith("out_") and callable(getattr(type(blk), p, None)) and
+                     p not in ("out_done", "out_ready")]
+    batch = blk.process_stream(dict(in_streams), out_ports)
+    cycle = Primitive.process_stream(make(), dict(in_streams), out_ports)
+    assert any(batch.values())
+    for port, stream in batch.items():
+        assert stream == cycle.get(port, []), port
+
+
+# Streams of a block run cycle by cycle in a SimGraph for a fixed number of cycles, well past its last output, as
+# the reference that doesn't depend on how the fallback decides it has finished
+def graph_streams(cls, in_streams, out_ports, **kwargs):
+    graph = SimGraph()
+    graph.add_node("blk", cls, **kwargs)
+    for port in in_streams:
+        graph.add_input("blk", port, port)
+    sim = graph.build({port: list(stream) for port, stream in in_streams.items()})
+    out = {port: [] for port in out_ports}
+    for _ in range(10 * sum(len(stream) for stream in in_streams.values()) + 100):
+        sim.step()
+        for port in out_ports:
+            tkn = getattr(sim["blk"], port)()
+            if tkn != '' and tkn is not None:
+                out[port].append(tkn)
+    return out
+
+
+# The batch streams and the fallback streams are the streams of the graph run
+def check_graph(cls, in_streams, out_ports, **kwargs):
+    gold = graph_streams(cls, in_streams, out_ports, **kwargs)
+    assert any(gold.values())
+    assert Primitive.process_stream(cls(**kwargs), dict(in_streams), out_ports) == gold
+    batch = cls(**kwargs).process_stream(dict(in_streams), out_ports)
+    for port in out_ports:
+        assert batch.get(port, []) == gold[port], port
+
+
+def test_process_stream_rd_scan():
+    check_streams(lambda: CompressedCrdRdScan(seg_arr=[0, 2, 2, 5], crd_arr=[1, 3, 0, 2, 4]),
+                  {"set_in_ref": [0, 1, 'S0', 'N', 2, 'S1', 'D']})
+
+
+@pytest.mark.parametrize("cls", [Intersect2, Union2])
+def test_process_stream_joiner(cls):
+    crd1 = [0, 2, 3, 'S0', 1, 'S1', 'D']
+    crd2 = [2, 3, 5, 'S0', 'S1', 'D']
+    ref1 = [i if isinstance(c, int) else c for i, c in enumerate(crd1)]
+    ref2 = [i if isinstance(c, int) else c for i, c in enumerate(crd2)]
+    check_streams(cls, {"set_in1": (ref1, crd1), "set_in2": (ref2, crd2)})
+
+
+@pytest.mark.parametrize("cls", [Add2, Multiply2])
+def test_process_stream_compute(cls):
+    check_streams(cls, {"set_in1": [1, 2, 'S0', 3, 'S1', 'D'], "set_in2": [4, 5, 'S0', 6, 'S1', 'D']})
+
+
+def test_process_stream_repeat():
+    check_streams(RepeatSigGen, {"set_istream": [0, 1, 'S0', 2, 'S1', 'D']})
+    check_streams(Repeat, {"set_in_ref": [7, 8, 'S0', 'D'], "set_in_repsig": ['R', 'R', 'S', 'R', 'S', 'D']})
+
+
+def test_process_stream_crd_manager():
+    outer = [0, 1, 2, 'S0', 'D']
+    inner = [0, 3, 'S0', 'S0', 1, 'S1', 'D']
+    check_streams(CrdDrop, {"set_outer_crd": outer, "set_inner_crd": inner})
+    check_streams(CrdHold, {"set_outer_crd": outer, "set_inner_crd": inner})
+    check_streams(CrdPtConverter, {"set_outer_crdpt": [0, 0, 1, 2, 'D'], "set_inner_crdpt": [0, 3, 1, 2, 'D']})
+
+
+def test_process_stream_tokens():
+    check_streams(StknDrop, {"set_in_stream": [1, 'S0', 2, 'S1', 'D']})
+    check_streams(Reduce, {"set_in_val": [1, 2, 'S0', 3, 'S1', 'D']})
+
+
+def gen_fibers(num_fibers, max_crd, density):
+    crd = []
+    for f in range(num_fibers):
+        crd += [c for c in range(max_crd) if random.random() < density]
+        crd.append('S0' if f < num_fibers - 1 else 'S1')
+    crd.append('D')
+    ref = [i if isinstance(c, int) else c for i, c in enumerate(crd)]
+    return ref, crd
+
+
+# The vectorized joins give the streams and token statistics of the cycle-by-cycle joiner
+@pytest.mark.parametrize("cls, stat_names", [(Intersect2, ["count", "valid_count", "stop_count"]),
+                                             (Union2, ["one_only_count", "two_only_count"])])
+@pytest.mark.parametrize("seed", range(10))
+def test_process_stream_joiner_vector(cls, stat_names, seed):
+    random.seed(seed)
+    num_fibers = random.randint(1, 6)
+    in_streams = {"set_in1": gen_fibers(num_fibers, 30, random.random()),
+                  "set_in2": gen_fibers(num_fibers, 30, random.random())}
+    check_streams(cls, in_streams)
+
+    batch = cls(statistics=True)
+    batch.process_stream(dict(in_streams), ["out_crd", "out_ref1", "out_ref2"])
+    cycle = cls(statistics=True)
+    Primitive.process_stream(cycle, dict(in_streams), ["out_crd", "out_ref1", "out_ref2"])
+    for stat in stat_names:
+        assert getattr(batch, stat) == getattr(cycle, stat), stat
+    assert batch.return_statistics().get("run_count") == cycle.return_statistics().get("run_count")
+
+
+# Random CSF tensor with order levels, scanned level by level with the cycle-by-cycle read scanner. Returns the
+# (ref, crd) streams of every level and the val stream of the last one. The first level is dense with dense_top
+def gen_csf(order, dim, density, dense_top=False):
+    levels = []
+    refs = [0, 'D']
+    num_fibers = 1
+    for level in range(order):
+        seg, crd = [0], []
+        for _ in range(num_fibers):
+            crd += [c for c in range(dim) if (dense_top and level == 0) or random.random() < density]
+            seg.append(len(crd))
+        out = Primitive.process_stream(CompressedCrdRdScan(seg_arr=seg, crd_arr=crd), {"set_in_ref": refs},
+                                       ["out_ref", "out_crd"])
+        levels.append((out["out_ref"], out["out_crd"]))
+        refs = out["out_ref"]
+        num_fibers = len(crd)
+    vals = [float(random.randint(-9, 9)) if isinstance(ref, int) else ref for ref in refs]
+    return levels, vals
+
+
+def gen_points(num_points, dim, rounds=1):
+    points = [[], [], []]
+    for _ in range(rounds):
+        for _ in range(num_points):
+            points[0].append(random.randrange(dim))
+            points[1].append(random.randrange(dim))
+            points[2].append(float(random.randint(1, 9)))
+        for stream in points:
+            stream.append('D')
+    return points
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_process_stream_fuzz_levels(seed):
+    random.seed(seed)
+    levels, vals = gen_csf(3, 8, random.random())
+    (ref0, crd0), (ref1, crd1), (ref2, crd2) = levels
+
+    seg, crd = [0], []
+    for _ in range(5):
+        crd += [c for c in range(8) if random.random() < 0.5]
+        seg.append(len(crd))
+    refs = [random.choice([0, 1, 2, 3, 4, 'N', 'S0']) for _ in range(20)] + ['S1', 'D']
+    check_streams(lambda: CompressedCrdRdScan(seg_arr=seg, crd_arr=crd), {"set_in_ref": refs})
+
+    check_streams(RepeatSigGen, {"set_istream": crd1})
+    repsig = Primitive.process_stream(RepeatSigGen(), {"set_istream": crd1}, ["out_repsig"])["out_repsig"]
+    check_streams(Repeat, {"set_in_ref": ref0, "set_in_repsig": repsig})
+    check_streams(CrdHold, {"set_outer_crd": crd0, "set_inner_crd": crd1})
+    check_streams(CrdHold, {"set_outer_crd": crd1, "set_inner_crd": crd2})
+    check_graph(CrdHold, {"set_outer_crd": crd1, "set_inner_crd": crd2}, ["out_crd_outer", "out_crd_inner"])
+
+    for stream in [crd0, crd1, crd2, vals]:
+        check_streams(StknDrop, {"set_in_stream": stream})
+    check_streams(Reduce, {"set_in_val": vals})
+
+    other = [float(random.randint(-9, 9)) if isinstance(val, float) else val for val in vals]
+    for cls in [Add2, Multiply2]:
+        check_streams(cls, {"set_in1": vals, "set_in2": other})
+        check_streams(cls, {"set_in1": ref2, "set_in2": ref2})
+
+    for arr in [[float(i) for i in range(512)], list(range(512))]:
+        for refs in [ref0, ref1, ref2]:
+            check_streams(lambda: Array(init_arr=list(arr), size=512), {"set_load": refs})
+
+
+# Drops the empty fibers that an intersection at the inner level leaves
+@pytest.mark.parametrize("seed", range(10))
+def test_process_stream_fuzz_crd_drop(seed):
+    random.seed(seed)
+    (ref0_a, crd0), (ref1_a, crd1_a) = gen_csf(2, 10, random.random(), dense_top=True)[0]
+    (ref0_b, _), (ref1_b, crd1_b) = gen_csf(2, 10, random.random(), dense_top=True)[0]
+    inter = Primitive.process_stream(Intersect2(), {"set_in1": (ref1_a, crd1_a), "set_in2": (ref1_b, crd1_b)},
+                                     ["out_crd"])["out_crd"]
+    check_streams(CrdDrop, {"set_outer_crd": crd0, "set_inner_crd": inter})
+    for cls in [Intersect2, Union2]:
+        check_streams(cls, {"set_in1": (ref1_a, crd1_a), "set_in2": (ref1_b, crd1_b)})
+    union = Primitive.process_stream(Union2(), {"set_in1": (ref1_a, crd1_a), "set_in2": (ref1_b, crd1_b)},
+                                     ["out_ref1"])["out_ref1"]
+    check_streams(lambda: Array(init_arr=[float(i) for i in range(100)], size=100), {"set_load": union})
+    check_streams(lambda: Array(init_arr=list(range(100)), size=100), {"set_load": union})
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_process_stream_fuzz_accumulators(seed):
+    random.seed(seed)
+    outer, inner, vals = gen_points(random.randint(0, 30), 6)
+    points = {"set_outer_crdpt": outer, "set_inner_crdpt": inner, "set_val": vals}
+    for cls in [SparseCrdPtAccumulator1, SparseCrdPtAccumulator2]:
+        check_streams(cls, points)
+    for workspace in ['hash', 'dense']:
+        check_streams(lambda: SparseCrdPtAccumulator1(workspace=workspace), points)
+        for val_stkn in [False, True]:
+            check_streams(lambda: SparseAccumulator1(val_stkn=val_stkn, workspace=workspace), points)
+    for val_stkn in [False, True]:
+        check_streams(lambda: SparseAccumulator2(val_stkn=val_stkn),
+                      {"set_crd_outer": outer, "set_crd_inner": inner, "set_val": vals})
+        check_graph(SparseAccumulator2, {"set_crd_outer": outer, "set_crd_inner": inner, "set_val": vals},
+                    ["out_crd_outer", "out_crd_inner", "out_val"], val_stkn=val_stkn)
+
+    sorted_points = sorted(set(zip(outer[:-1], inner[:-1])))
+    check_streams(CrdPtConverter, {"set_outer_crdpt": [p[0] for p in sorted_points] + ['D'],
+                                   "set_inner_crdpt": [p[1] for p in sorted_points] + ['D']})
+
+    crd2 = [random.randrange(4) for _ in outer[:-1]] + ['D']
+    for val_stkn in [False, True]:
+        check_streams(lambda: SparseAccumulatorN(order=3, val_stkn=val_stkn),
+                      {"set_crd0": inner, "set_crd1": outer, "set_crd2": crd2, "set_val": vals},
+                      ["out_crd0", "out_crd1", "out_crd2", "out_val"])
+
+
+# Streams that go on after a done token run through the cycle-by-cycle fallback, which stops after the last 'D'.
+# SparseAccumulator2 emits the two rounds as one and stops once nothing moves
+@pytest.mark.parametrize("cls, num_done", [(SparseAccumulator1, 2), (SparseAccumulator2, 1)])
+@pytest.mark.parametrize("seed", range(5))
+def test_process_stream_accumulator_rounds(cls, num_done, seed):
+    random.seed(seed)
+    outer, inner, vals = gen_points(random.randint(1, 8), 6, rounds=2)
+    ports = ("set_outer_crdpt", "set_inner_crdpt") if cls is SparseAccumulator1 else ("set_crd_outer", "set_crd_inner")
+    blk = cls(val_stkn=True)
+    out = blk.process_stream({ports[0]: outer, ports[1]: inner, "set_val": vals}, ["out_crd_outer", "out_crd_inner"])
+    assert out["out_crd_outer"].count('D') == num_done and out["out_crd_outer"][-1] == 'D'
+    check_graph(cls, {ports[0]: outer, ports[1]: inner, "set_val": vals},
+                ["out_crd_outer", "out_crd_inner", "out_val"], val_stkn=True)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_process_stream_fuzz_wr_scan(seed):
+    random.seed(seed)
+    levels, vals = gen_csf(2, 8, random.random())
+    for _, crd in levels:
+        batch = CompressWrScan(size=64, seg_size=64, fill=0)
+        batch.process_stream({"set_input": crd})
+        cycle = CompressWrScan(size=64, seg_size=64, fill=0)
+        Primitive.process_stream(cycle, {"set_input": crd})
+        assert batch.get_arr() == cycle.get_arr() and batch.get_seg_arr() == cycle.get_seg_arr()
+        assert batch.out_done() and cycle.out_done()
+    batch = ValsWrScan(size=64, fill=0)
+    batch.process_stream({"set_input": vals})
+    cycle = ValsWrScan(size=64, fill=0)
+    Primitive.process_stream(cycle, {"set_input": vals})
+    assert batch.get_arr() == cycle.get_arr() and batch.out_done() and cycle.out_done()
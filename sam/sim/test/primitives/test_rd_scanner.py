@@ -1,7 +1,11 @@
 import copy
 import pytest
+import random
 
-from sam.sim.src.rd_scanner import UncompressCrdRdScan, CompressedCrdRdScan
+from bisect import bisect_left
+
+from sam.sim.src.rd_scanner import UncompressCrdRdScan, CompressedCrdRdScan, scan_fibers, scan_cycles, \
+    scan_statistics, gallop_left
 from sam.sim.test.test import TIMEOUT
 from sam.sim.src.base import remove_emptystr
 
@@ -317,3 +321,68 @@ def test_rd_scan_direct_c_skip_nd(arrs, debug_sim):
     print(out_ref)
     assert (out_crd == gold_crd)
     assert (out_ref == gold_ref)
+
+
+def gen_scan_inputs(rows):
+    seg_arr = [0]
+    crd_arr = []
+    for _ in range(rows):
+        crd_arr += sorted(random.sample(range(20), random.choice([0, 0, 1, 2, 5])))
+        seg_arr.append(len(crd_arr))
+    in_ref = []
+    for _ in range(random.randint(1, 6)):
+        in_ref.append(random.choice(list(range(rows)) + ['N']))
+        if random.random() < 0.3:
+            in_ref.append(random.choice(['S0', 'S1']))
+    return seg_arr, crd_arr, in_ref + ['D']
+
+
+@pytest.mark.parametrize("preload", [False, True])
+@pytest.mark.parametrize("seed", range(20))
+def test_rd_scan_c_fibers(seed, preload):
+    random.seed(seed)
+    seg_arr, crd_arr, in_ref = gen_scan_inputs(random.randint(1, 8))
+
+    crdscan = CompressedCrdRdScan(seg_arr=seg_arr, crd_arr=crd_arr, statistics=True)
+    if preload:
+        crdscan.set_fifo(in_ref)
+    in_ref_cp = [] if preload else copy.deepcopy(in_ref)
+    done = False
+    time = 0
+    out_crd = []
+    out_ref = []
+    while not done and time < TIMEOUT:
+        if len(in_ref_cp) > 0:
+            crdscan.set_in_ref(in_ref_cp.pop(0))
+        crdscan.update()
+        out_crd.append(crdscan.out_crd())
+        out_ref.append(crdscan.out_ref())
+        done = crdscan.done
+        time += 1
+
+    fiber_ref, fiber_crd = scan_fibers(seg_arr, crd_arr, in_ref)
+    assert fiber_crd.to_list() == remove_emptystr(out_crd)
+    assert fiber_ref.to_list() == remove_emptystr(out_ref)
+    assert scan_cycles(seg_arr, in_ref, [1] * len(in_ref) if preload else None) == time
+
+    stats = scan_statistics(seg_arr, in_ref)
+    assert stats["outputs_by_block"] == crdscan.return_statistics()["outputs_by_block"]
+    assert stats["stop_tokens"] == crdscan.return_statistics()["stop_tokens"]
+    if not preload:
+        assert stats["cycles"] == time
+
+
+def test_rd_scan_c_cycles_stall():
+    # The second coordinate of each fiber waits for the next reference
+    seg_arr = [0, 3, 6]
+    assert scan_cycles(seg_arr, [0, 1, 'D'], [1, 5, 9]) == 12
+    assert scan_cycles(seg_arr, [0, 1]) is None
+    assert scan_fibers(seg_arr, [4, 5, 6, 1, 2, 3], [0, 1])[1].to_list() == [4, 5, 6, 'S0', 1]
+
+
+def test_gallop_left():
+    arr = [1, 3, 3, 4, 8, 9, 12, 20, 21, 40]
+    for lo in range(len(arr)):
+        for hi in range(lo, len(arr) + 1):
+            for x in range(-1, 42):
+                assert gallop_left(arr, x, lo, hi) == bisect_left(arr, x, lo, hi)
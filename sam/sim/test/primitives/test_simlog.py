@@ -0,0 +1,79 @@
+import io
+
+from sam.sim.src import simlog
+from sam.sim.src.channel import memory_block
+from sam.sim.src.rd_scanner import CompressedCrdRdScan
+from sam.sim.src.simlog import RingSink, get_logger, read_dump
+from sam.sim.test.test import TIMEOUT
+
+
+class Formatted:
+    count = 0
+
+    def __str__(self):
+        Formatted.count += 1
+        return "formatted"
+
+
+def test_simlog_level():
+    sink = RingSink()
+    log = get_logger("blk", simlog.INFO, sink)
+    Formatted.count = 0
+    log.debug("dropped", Formatted())
+    log.info("kept", Formatted(), 1)
+    log.error("error")
+    assert Formatted.count == 1
+    assert sink.messages() == [("blk", simlog.INFO, "kept formatted 1"), ("blk", simlog.ERROR, "error")]
+    assert log.enabled(simlog.WARNING) and not log.enabled(simlog.DEBUG)
+
+
+def test_simlog_ring_dump():
+    sink = RingSink(capacity=3)
+    log = get_logger("crdscan", simlog.DEBUG, sink)
+    for i in range(5):
+        log.debug("cycle", i)
+    assert len(sink) == 3
+
+    f = io.BytesIO()
+    sink.dump(f)
+    f.seek(0)
+    assert list(read_dump(f)) == [("crdscan", simlog.DEBUG, "cycle " + str(i)) for i in range(2, 5)]
+
+
+def test_simlog_block():
+    sink = RingSink()
+    simlog.configure(sink=sink)
+    try:
+        for debug in [False, True]:
+            crdscan = CompressedCrdRdScan(crd_arr=[0, 1], seg_arr=[0, 2], debug=debug, name="crdscan")
+            in_ref = [0, 'D']
+            out_crd = []
+            done = False
+            time = 0
+            while not done and time < TIMEOUT:
+                if len(in_ref) > 0:
+                    crdscan.set_in_ref(in_ref.pop(0))
+                crdscan.update()
+                out_crd.append(crdscan.out_crd())
+                done = crdscan.out_done()
+                time += 1
+            assert [crd for crd in out_crd if crd != ''] == [0, 1, 'S0', 'D']
+            assert (len(sink) > 0) == debug
+            assert all(name == "crdscan" for name, _, _ in sink.messages())
+    finally:
+        simlog.configure(sink=simlog.PrintSink())
+
+
+def test_simlog_memory_block():
+    sink = RingSink()
+    simlog.configure(sink=sink)
+    try:
+        for debug in [False, True]:
+            glb = memory_block(name="glb", size=100, element_size=1, latency=2, bandwidth=1, debug=debug)
+            glb.add_tile("tile0", 4)
+            for cycle in range(10):
+                glb.update(cycle)
+            assert (len(sink) > 0) == debug
+            assert all(name == "glb" and level == simlog.DEBUG for name, level, _ in sink.messages())
+    finally:
+        simlog.configure(sink=simlog.PrintSink())
@@ -0,0 +1,29 @@
+import inspect
+import pytest
+
+from sam.sim.src import accumulator, array, bitvector, channel, compression, compute, crd_manager, flatten, joiner, \
+    rd_scanner, repeater, split, token, wr_scanner
+from sam.sim.src.base import Primitive
+from sam.sim.src.channel import Channel
+from sam.sim.src.joiner import Intersect2
+from sam.sim.src.specialize import make_primitive
+
+modules = [accumulator, array, bitvector, channel, compression, compute, crd_manager, flatten, joiner, rd_scanner,
+           repeater, split, token, wr_scanner]
+blocks = [cls for module in modules for cls in vars(module).values()
+          if inspect.isclass(cls) and cls.__module__ == module.__name__ and issubclass(cls, (Primitive, Channel))]
+
+
+@pytest.mark.parametrize("cls", blocks, ids=lambda cls: cls.__name__)
+def test_block_slots(cls):
+    assert "__slots__" in vars(cls)
+    assert cls.__dictoffset__ == 0
+
+
+@pytest.mark.parametrize("stats", [False, True])
+def test_specialized_slots(stats):
+    inter = make_primitive(Intersect2, stats=stats)
+    assert not hasattr(inter, "__dict__")
+    with pytest.raises(AttributeError):
+        inter.not_a_field = 0
+    assert ("in_ref1" in inter.channel_statistics()) == stats
@@ -1,7 +1,7 @@
 import copy
 import pytest
 
-from sam.sim.src.accumulator import SparseAccumulator1, SparseAccumulator2
+from sam.sim.src.accumulator import SparseAccumulator1, SparseAccumulator2, SparseAccumulatorN
 from sam.sim.src.base import remove_emptystr
 from sam.sim.test.test import TIMEOUT
 
@@ -14,7 +14,8 @@ arrs_dict1 = {'ocrd_in': [0, 0, 0, 2, 2, 2, 2, 2, 2, 'D'],
 
 
 @pytest.mark.parametrize("arrs", [arrs_dict1])
-def test_spacc1_direct(arrs, debug_sim):
+@pytest.mark.parametrize("workspace", ["hash", "dense"])
+def test_spacc1_direct(arrs, workspace, debug_sim):
     icrd = copy.deepcopy(arrs['icrd_in'])
     ocrd = copy.deepcopy(arrs['ocrd_in'])
     val = copy.deepcopy(arrs['val_in'])
@@ -23,7 +24,7 @@ def test_spacc1_direct(arrs, debug_sim):
     gold_icrd = copy.deepcopy(arrs['icrd_gold'])
     gold_val = copy.deepcopy(arrs['val_gold'])
 
-    sa = SparseAccumulator1(val_stkn=True, debug=debug_sim)
+    sa = SparseAccumulator1(val_stkn=True, workspace=workspace, debug=debug_sim)
 
     done = False
     time = 0
@@ -79,7 +80,8 @@ arrs_dict2 = {'crd1_in': [0, 0, 0, 1, 1, 1, 1, 0, 0, 'D'],
 
 
 @pytest.mark.parametrize("arrs", [arrs_dict1, arrs_dict2])
-def test_spacc2_direct(arrs, debug_sim):
+@pytest.mark.parametrize("workspace", ["hash", "dense"])
+def test_spacc2_direct(arrs, workspace, debug_sim):
     crd1 = copy.deepcopy(arrs['crd1_in'])
     crd0 = copy.deepcopy(arrs['crd0_in'])
     val = copy.deepcopy(arrs['val_in'])
@@ -88,7 +90,7 @@ def test_spacc2_direct(arrs, debug_sim):
     gold_crd0 = copy.deepcopy(arrs['crd0_gold'])
     gold_val = copy.deepcopy(arrs['val_gold'])
 
-    sa = SparseAccumulator2(val_stkn=True, debug=debug_sim)
+    sa = SparseAccumulator2(val_stkn=True, workspace=workspace, debug=debug_sim)
 
     done = False
     time = 0
@@ -126,3 +128,114 @@ def test_spacc2_direct(arrs, debug_sim):
     assert (out_crd1 == gold_crd1)
     assert (out_crd0 == gold_crd0)
     assert (out_val == gold_val)
+
+
+@pytest.mark.parametrize("arrs", [arrs_dict1, arrs_dict2])
+def test_spaccn_order2(arrs, debug_sim):
+    crd1 = copy.deepcopy(arrs['crd1_in'])
+    crd0 = copy.deepcopy(arrs['crd0_in'])
+    val = copy.deepcopy(arrs['val_in'])
+
+    sa = SparseAccumulatorN(order=2, val_stkn=True, debug=debug_sim)
+
+    done = False
+    time = 0
+    out_crd1 = []
+    out_crd0 = []
+    out_val = []
+    while not done and time < TIMEOUT:
+        if len(crd0) > 0:
+            sa.set_crd0(crd0.pop(0))
+        if len(crd1) > 0:
+            sa.set_crd1(crd1.pop(0))
+        if len(val) > 0:
+            sa.set_val(val.pop(0))
+
+        sa.update()
+
+        out_crd1.append(sa.out_crd1())
+        out_crd0.append(sa.out_crd0())
+        out_val.append(sa.out_val())
+
+        done = sa.out_done()
+        time += 1
+
+    assert (remove_emptystr(out_crd1) == arrs['crd1_gold'])
+    assert (remove_emptystr(out_crd0) == arrs['crd0_gold'])
+    assert (remove_emptystr(out_val) == arrs['val_gold'])
+
+
+arrs_dict3 = {'crd2_in': [0, 0, 0, 2, 0, 'D'],
+              'crd1_in': [1, 1, 3, 0, 1, 'D'],
+              'crd0_in': [2, 2, 0, 1, 5, 'D'],
+              'val_in': [1, 2, 4, 5, 1, 'D'],
+              'crd2_gold': [0, 2, 'S0', 'D'],
+              'crd1_gold': [1, 3, 'S0', 0, 'S1', 'D'],
+              'crd0_gold': [2, 5, 'S0', 0, 'S1', 1, 'S2', 'D'],
+              'val_gold': [3.0, 1.0, 'S0', 4.0, 'S1', 5.0, 'S2', 'D']}
+
+
+@pytest.mark.parametrize("arrs", [arrs_dict3])
+def test_spaccn_order3(arrs, debug_sim):
+    crds = [copy.deepcopy(arrs['crd' + str(level) + '_in']) for level in range(3)]
+    val = copy.deepcopy(arrs['val_in'])
+
+    sa = SparseAccumulatorN(order=3, val_stkn=True, statistics=True, debug=debug_sim)
+
+    done = False
+    time = 0
+    out_crds = [[], [], []]
+    out_val = []
+    while not done and time < TIMEOUT:
+        for level in range(3):
+            if len(crds[level]) > 0:
+                sa.set_crd(level, crds[level].pop(0))
+        if len(val) > 0:
+            sa.set_val(val.pop(0))
+
+        sa.update()
+
+        for level in range(3):
+            out_crds[level].append(sa.out_crd(level))
+        out_val.append(sa.out_val())
+
+        done = sa.out_done()
+        time += 1
+
+    for level in range(3):
+        assert (remove_emptystr(out_crds[level]) == arrs['crd' + str(level) + '_gold'])
+    assert (remove_emptystr(out_val) == arrs['val_gold'])
+    assert sa.return_statistics()["rmw_ops"] == 5
+    assert sa.return_statistics()["hits_gt_one"] == 1
+
+    batch = SparseAccumulatorN(order=3, val_stkn=True).process_stream(
+        {'set_crd2': arrs['crd2_in'], 'set_crd1': arrs['crd1_in'], 'set_crd0': arrs['crd0_in'],
+         'set_val': arrs['val_in']})
+    assert batch == {'out_crd2': arrs['crd2_gold'], 'out_crd1': arrs['crd1_gold'], 'out_crd0': arrs['crd0_gold'],
+                     'out_val': arrs['val_gold']}
+
+
+# The point accumulator and converter are rebuilt on the cycle after the done token, the rebuilt ones keep
+# collecting statistics
+@pytest.mark.parametrize("block", [SparseAccumulator1, SparseAccumulator2])
+@pytest.mark.parametrize("workspace", ["hash", "dense"])
+def test_spacc_restart_stats(block, workspace):
+    crd1 = [0, 0, 1, 'D']
+    crd0 = [0, 2, 0, 'D']
+    val = [1, 2, 3, 'D']
+    sa = block(val_stkn=True, workspace=workspace, statistics=True)
+
+    time = 0
+    while not sa.out_done() and time < TIMEOUT:
+        if len(val) > 0:
+            sa.set_crd_outer(crd1.pop(0))
+            sa.set_crd_inner(crd0.pop(0))
+            sa.set_val(val.pop(0))
+        sa.update()
+        time += 1
+    sa.update()
+
+    assert sa.crdpt_spacc.get_stats and sa.crdpt_converter.get_stats
+    stats = sa.return_statistics()
+    assert stats["workspace"] == workspace and "max_hits" in stats
+    assert ("dense_rows" in stats) == (workspace == "dense")
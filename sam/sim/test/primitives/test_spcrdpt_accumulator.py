@@ -14,7 +14,8 @@ arrs_dict1 = {'ocrd_in': [0, 0, 0, 2, 2, 2, 2, 2, 2, 'D'],
 
 
 @pytest.mark.parametrize("arrs", [arrs_dict1])
-def test_spcrdpt1_accum_direct(arrs, debug_sim):
+@pytest.mark.parametrize("workspace", ["hash", "dense"])
+def test_spcrdpt1_accum_direct(arrs, workspace, debug_sim):
     icrd = copy.deepcopy(arrs['icrd_in'])
     ocrd = copy.deepcopy(arrs['ocrd_in'])
     val = copy.deepcopy(arrs['val_in'])
@@ -23,7 +24,7 @@ def test_spcrdpt1_accum_direct(arrs, debug_sim):
     gold_icrd = copy.deepcopy(arrs['icrd_gold'])
     gold_val = copy.deepcopy(arrs['val_gold'])
 
-    sa = SparseCrdPtAccumulator1(debug=debug_sim)
+    sa = SparseCrdPtAccumulator1(workspace=workspace, debug=debug_sim)
 
     done = False
     time = 0
@@ -82,7 +83,8 @@ arrs_dict2 = {'crd1_in': [0, 0, 0, 1, 1, 1, 1, 0, 0, 'D'],
 
 
 @pytest.mark.parametrize("arrs", [arrs_dict1, arrs_dict2])
-def test_spcrdpt2_accum_direct(arrs, debug_sim):
+@pytest.mark.parametrize("workspace", ["hash", "dense"])
+def test_spcrdpt2_accum_direct(arrs, workspace, debug_sim):
     icrd = copy.deepcopy(arrs['crd0_in'])
     ocrd = copy.deepcopy(arrs['crd1_in'])
     val = copy.deepcopy(arrs['val_in'])
@@ -91,7 +93,7 @@ def test_spcrdpt2_accum_direct(arrs, debug_sim):
     gold_icrd = copy.deepcopy(arrs['crd0_gold'])
     gold_val = copy.deepcopy(arrs['val_gold'])
 
-    sa = SparseCrdPtAccumulator2(debug=debug_sim)
+    sa = SparseCrdPtAccumulator2(workspace=workspace, debug=debug_sim)
 
     done = False
     time = 0
@@ -133,3 +135,58 @@ def test_spcrdpt2_accum_direct(arrs, debug_sim):
     assert (out_ocrd == gold_ocrd)
     assert (out_icrd == gold_icrd)
     assert (out_val == gold_val)
+
+
+# Rows are emitted in coordinate order whatever the input order. (0, 8) arrives while row 0 is being emitted
+# and still comes out in order, row 0 is emitted again when it comes back after row 1
+@pytest.mark.parametrize("workspace", ["hash", "dense"])
+def test_spcrdpt1_accum_emit_order(workspace):
+    icrd = [7, 3, 9, 1, 3, 4, 2, 8, 1, 'D']
+    ocrd = [0, 0, 0, 0, 0, 1, 1, 0, 0, 'D']
+    val = [1, 2, 3, 4, 5, 6, 7, 8, 9, 'D']
+
+    sa = SparseCrdPtAccumulator1(workspace=workspace, statistics=True)
+    done = False
+    time = 0
+    out = []
+    while not done and time < TIMEOUT:
+        if len(icrd) > 0:
+            sa.set_inner_crdpt(icrd.pop(0))
+            sa.set_outer_crdpt(ocrd.pop(0))
+            sa.set_val(val.pop(0))
+        sa.update()
+        out.append((sa.out_outer_crdpt(), sa.out_inner_crdpt(), sa.out_val()))
+        done = sa.out_done()
+        time += 1
+
+    out = [pt for pt in out if pt != ('', '', '')]
+    assert out == [(0, 1, 4.0), (0, 3, 7.0), (0, 7, 1.0), (0, 8, 8.0), (0, 9, 3.0), (1, 2, 7.0), (1, 4, 6.0),
+                   (0, 1, 13.0), (0, 3, 7.0), (0, 7, 1.0), (0, 8, 8.0), (0, 9, 3.0), ('D', 'D', 'D')]
+    assert sa.return_statistics()["workspace"] == workspace
+
+
+def test_spcrdpt1_accum_dense_maxdim():
+    sa = SparseCrdPtAccumulator1(maxdim=4, workspace='dense')
+    sa.set_inner_crdpt(4)
+    sa.set_outer_crdpt(0)
+    sa.set_val(1)
+    with pytest.raises(Exception):
+        sa.update()
+
+
+# The dense workspace holds the first row until that row is emitted, interleaved rows accumulate in the hash
+# workspace meanwhile and no row is moved while accumulating
+def test_spcrdpt2_accum_dense_interleaved():
+    sa = SparseCrdPtAccumulator2(maxdim=16, workspace='dense', statistics=True)
+    sa.process_stream({"set_outer_crdpt": [1, 0, 1, 0, 2], "set_inner_crdpt": [5, 3, 5, 9, 3],
+                       "set_val": [1, 2, 3, 4, 5]})
+    dense_row = sa.storage[1]
+    assert dense_row is sa.dense_workspace.owner and dense_row.touched == [5]
+    assert all(isinstance(sa.storage[crd], dict) for crd in [0, 2])
+    assert sa.dense_workspace.vals[5] == 4.0 and sa.dense_workspace.occupied.sum() == 1
+
+    out = sa.process_stream({"set_outer_crdpt": ['D'], "set_inner_crdpt": ['D'], "set_val": ['D']})
+    assert list(zip(out["out_outer_crdpt"], out["out_inner_crdpt"], out["out_val"])) == \
+        [(0, 3, 2.0), (0, 9, 4.0), (1, 5, 4.0), (2, 3, 5.0), ('D', 'D', 'D')]
+    assert sa.dense_workspace.owner is None and sa.dense_workspace.occupied.sum() == 0
+    assert sa.storage[1] == {5: 4.0} and sa.dense_workspace.rows == 1
@@ -0,0 +1,79 @@
+import pytest
+
+from sam.sim.src.base import Primitive
+from sam.sim.src.joiner import Intersect2
+from sam.sim.src.specialize import make_primitive
+from sam.sim.src.wr_scanner import CompressWrScan
+from sam.sim.test.test import TIMEOUT
+
+
+class FlagProbe(Primitive):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.value = 7
+
+    def update(self):
+        if self.debug:
+            raise Exception("debug branch")
+
+    def debug_or_value(self):
+        return self.debug or self.value
+
+    def stats_and_value(self):
+        return self.get_stats and self.value
+
+    def busy(self):
+        return not (self.debug or self.backpressure_en)
+
+
+@pytest.mark.parametrize("debug", [False, True])
+@pytest.mark.parametrize("stats", [False, True])
+def test_specialize_values(debug, stats):
+    probe = make_primitive("FlagProbe", debug=debug, stats=stats)
+    plain = FlagProbe(debug=debug, statistics=stats)
+    assert type(probe) is not FlagProbe and isinstance(probe, FlagProbe)
+    assert type(probe).__name__ == "FlagProbe"
+    assert type(probe).update is not FlagProbe.update
+    assert probe.debug_or_value() == plain.debug_or_value()
+    assert probe.stats_and_value() == plain.stats_and_value()
+    assert probe.busy() == plain.busy()
+    if debug:
+        with pytest.raises(Exception):
+            probe.update()
+    else:
+        probe.update()
+
+
+def test_specialize_overridden_flag():
+    # CompressWrScan turns backpressure off in its constructor
+    wr = make_primitive(CompressWrScan, back_en=True, size=4, seg_size=4)
+    assert not wr.backpressure_en
+    assert type(wr) is type(make_primitive(CompressWrScan, size=4, seg_size=4))
+
+
+arrs_dict1 = {'ref1': [0, 1, 2, 3, 'S0', 'D'], 'crd1': [0, 2, 3, 5, 'S0', 'D'],
+              'ref2': [0, 1, 2, 'S0', 'D'], 'crd2': [1, 2, 5, 'S0', 'D']}
+arrs_dict2 = {'ref1': [0, 1, 'S0', 2, 'S1', 'D'], 'crd1': [0, 1, 'S0', 4, 'S1', 'D'],
+              'ref2': [0, 'S0', 1, 2, 'S1', 'D'], 'crd2': [1, 'S0', 3, 4, 'S1', 'D']}
+
+
+@pytest.mark.parametrize("arrs", [arrs_dict1, arrs_dict2])
+@pytest.mark.parametrize("stats", [False, True])
+def test_specialize_intersect(arrs, stats):
+    outs = []
+    for inter in [Intersect2(statistics=stats), make_primitive(Intersect2, stats=stats)]:
+        ref1, crd1, ref2, crd2 = [list(arrs[k]) for k in ('ref1', 'crd1', 'ref2', 'crd2')]
+        out = []
+        done = False
+        time = 0
+        while not done and time < TIMEOUT:
+            if len(ref1) > 0:
+                inter.set_in1(ref1.pop(0), crd1.pop(0))
+            if len(ref2) > 0:
+                inter.set_in2(ref2.pop(0), crd2.pop(0))
+            inter.update()
+            out.append((inter.out_crd(), inter.out_ref1(), inter.out_ref2()))
+            done = inter.out_done()
+            time += 1
+        outs.append((out, inter.return_statistics()))
+    assert outs[0] == outs[1]
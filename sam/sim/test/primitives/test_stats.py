@@ -0,0 +1,96 @@
+import random
+import pytest
+
+from sam.sim.src.array import Array
+from sam.sim.src.repeater import RepeatSigGen
+from sam.sim.src.stats import TouchTracker, StatsRegistry, NULL_METRIC
+
+
+def reuse_histogram_gold(addrs):
+    hist = {}
+    cold = 0
+    for t, addr in enumerate(addrs):
+        prev = [i for i in range(t) if addrs[i] == addr]
+        if not prev:
+            cold += 1
+            continue
+        distance = len(set(addrs[prev[-1] + 1:t]))
+        b = 1 << (distance.bit_length() - 1) if distance > 0 else 0
+        hist[b] = hist.get(b, 0) + 1
+    return {"cold": cold, "histogram": dict(sorted(hist.items()))}
+
+
+@pytest.mark.parametrize("num_accesses", [10, 100, 3000])
+def test_touch_tracker_reuse(num_accesses):
+    random.seed(num_accesses)
+    addrs = [random.randint(0, 40) for _ in range(num_accesses)]
+
+    tracker = TouchTracker(16, reuse=True)
+    for addr in addrs:
+        tracker.touch(addr)
+
+    assert len(tracker) == len(set(addrs))
+    assert all(addr in tracker for addr in addrs)
+    assert 41 not in tracker
+    assert tracker.reuse_histogram() == reuse_histogram_gold(addrs)
+
+
+def test_touch_tracker_keys():
+    tracker = TouchTracker(4)
+    tracker.touch_all([3, 1, 3, 9])
+    tracker.touch((0, 1))
+    tracker.touch((0, 1))
+    tracker.touch(1)
+    assert len(tracker) == 4
+    assert (0, 1) in tracker and 9 in tracker and 2 not in tracker
+    assert tracker.reuse_histogram() == {}
+
+
+@pytest.mark.parametrize("reuse_stats", [False, True])
+def test_arr_load_stats(reuse_stats):
+    arr = Array(init_arr=[5, 6, 7, 8], statistics=True, reuse_stats=reuse_stats)
+    out = arr.process_stream({'set_load': [0, 1, 0, 2, 'S0', 1, 'D']}, ['out_val'])
+    assert out['out_val'] == [5, 6, 5, 7, 'S0', 6, 'D']
+
+    stats = arr.return_statistics()
+    assert stats["elements_touched"] == 3
+    assert stats["valid_loads"] == 5
+    assert arr.address_seen.reuse == reuse_stats
+    if reuse_stats:
+        assert stats["reuse_distance"] == {"cold": 3, "histogram": {1: 1, 2: 1}}
+    else:
+        assert "reuse_distance" not in stats
+
+
+def test_stats_registry_metrics():
+    registry = StatsRegistry()
+    count = registry.counter("blk", "count")
+    count.inc()
+    count.inc(2)
+    assert registry.counter("blk", "count") is count
+    registry.max_gauge("blk", "fifo").update(3)
+    registry.max_gauge("blk", "fifo").update(1)
+    hist = registry.histogram("blk", "runs", (1, 4))
+    for run in [0, 1, 2, 4, 9]:
+        hist.observe(run)
+    registry.record("blk", {"count": 100, "occupancy": {"high_water": 2}})
+
+    assert registry.block_metrics("blk") == {"count": 3, "fifo": 3, "runs": {"<=1": 2, "<=4": 2, ">4": 1}}
+    assert registry.as_dict() == {"blk/count": 3, "blk/fifo": 3, "blk/runs/<=1": 2, "blk/runs/<=4": 2,
+                                  "blk/runs/>4": 1, "blk/occupancy/high_water": 2}
+
+    registry.record("blk", {"count": 200, "occupancy": {"high_water": 5}})
+    assert registry.as_dict()["blk/count"] == 3 and registry.as_dict()["blk/occupancy/high_water"] == 5
+
+
+@pytest.mark.parametrize("stats", [False, True])
+def test_repsiggen_repeat_counts(stats):
+    rsg = RepeatSigGen(statistics=stats, name="rsg")
+    out = rsg.process_stream({'set_istream': [0, 1, 2, 'S0', 'S0', 4, 'S1', 'D']}, ['out_repsig'])
+    assert out['out_repsig'] == ['R', 'R', 'R', 'S', 'S', 'R', 'S', 'D']
+    if stats:
+        counts = rsg.return_statistics()["repeat_counts"]
+        assert counts["<=1"] == 2 and counts["<=4"] == 1 and sum(counts.values()) == 3
+    else:
+        assert rsg.repeat_counts is NULL_METRIC
+        assert rsg.return_statistics() == {}
@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+
+from sam.sim.src.stream import TokenStream
+from sam.sim.test.test import gen_stream
+
+
+@pytest.mark.parametrize("stream", [[0, 1, 'S0', 2, 'S1', 'D'], ['N', 'S0', 5, 'S11', '', 'D'],
+                                    [0.5, -2.0, 'S0', 'S1', 'D'], []])
+def test_stream_round_trip(stream):
+    ts = TokenStream.from_list(stream)
+    assert ts.kind.dtype == np.int8
+    assert ts.to_list() == stream
+    assert [type(tkn) for tkn in ts.to_list()] == [type(tkn) for tkn in stream]
+    assert ts == stream
+
+
+@pytest.mark.parametrize("stream", [[1, 2.5, 'S0', 'D'], [0.5, 'S0', 0, 'S1', 'D']])
+def test_stream_mixed(stream):
+    # The payload type follows the first value, the other type has no lossless packed form
+    with pytest.raises(ValueError):
+        TokenStream.from_list(stream)
+    ts = TokenStream.from_list(stream, dtype=np.float64)
+    assert ts.dtype == np.float64 and ts == stream
+    assert TokenStream.from_list(stream[1:2] + ['D']).dtype == (np.float64 if isinstance(stream[1], float) else np.int64)
+    with pytest.raises(ValueError):
+        TokenStream.from_list([0, 'R', 'D'])
+
+
+@pytest.mark.parametrize("n", [1, 2, 3])
+def test_stream_round_trip_gen(n):
+    stream = [tkn for tkn in gen_stream(n=n) if tkn != 'S']
+    assert TokenStream.from_list(stream).to_list() == stream
+
+
+def test_stream_slicing():
+    ts = TokenStream.from_list([3, 4, 'S0', 5, 'S1', 'D'])
+    view = ts[1:4]
+    assert view.to_list() == [4, 'S0', 5]
+    assert np.shares_memory(view.payload, ts.payload) and np.shares_memory(view.kind, ts.kind)
+    assert ts[2] == 'S0' and ts[3] == 5
+    assert ts.data().tolist() == [3, 4, 5]
+
+
+def test_stream_fibers():
+    ts = TokenStream.from_list([0, 1, 'S0', 'S0', 2, 'S1', 3, 'S0', 'S1', 'D'])
+    assert ts.stop_positions().tolist() == [2, 3, 5, 7, 8]
+    assert ts.segments(level=1).tolist() == [0, 6, 9]
+    assert [f.to_list() for f in ts.fibers()] == [[0, 1], [], [2], [3], []]
+    assert [f.to_list() for f in ts.fibers(level=1)] == [[0, 1, 'S0', 'S0', 2], [3, 'S0']]
+    assert all(np.shares_memory(f.payload, ts.payload) for f in ts.fibers() if len(f) > 0)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import scipy.sparse
+
+from sam.sim.src import tensor_cache
+from sam.sim.src.tensor_cache import TensorCache, tensor_nbytes
+
+
+def test_tensor_cache_transforms():
+    cache = TensorCache()
+    loads = []
+    mat = scipy.sparse.random(20, 10, density=0.2, random_state=0, format="coo")
+
+    def load():
+        loads.append(1)
+        return mat
+
+    csr_t = cache.get("mat", load, ("csr", "transpose"))
+    assert (csr_t.toarray() == mat.toarray().T).all()
+    assert cache.get("mat", load, ("csr",)) is cache.get("mat", load, ["csr"])
+    assert cache.get("mat", load) is mat
+    assert len(loads) == 1 and len(cache) == 3
+    assert ("mat", ("csr", "transpose")) in cache
+    assert cache.stats()["misses"] == 3 and cache.stats()["hits"] == 3
+
+
+def test_tensor_cache_custom_transform(monkeypatch):
+    monkeypatch.setitem(tensor_cache.transforms, "double", lambda tensor: tensor * 2)
+    cache = TensorCache()
+    assert cache.get("vec", lambda: np.arange(4), ("double", "double")).tolist() == [0, 4, 8, 12]
+
+
+def test_tensor_cache_lru():
+    arrs = {name: np.zeros(100) for name in "abcd"}
+    nbytes = tensor_nbytes(arrs["a"])
+    cache = TensorCache(budget=3 * nbytes)
+    for name in "abc":
+        cache.get(name, lambda: arrs[name])
+    cache.get("a", lambda: None)
+    cache.get("d", lambda: arrs["d"])
+    assert ("b", ()) not in cache and ("a", ()) in cache and ("d", ()) in cache
+    assert cache.nbytes == 3 * nbytes and cache.evictions == 1
+
+    # Tensors over the budget are not kept
+    cache.get("big", lambda: np.zeros(1000))
+    assert ("big", ()) not in cache and len(cache) == 3
+
+
+def test_tensor_cache_shift():
+    util = pytest.importorskip("sam.util")
+    mat = scipy.sparse.random(20, 10, density=0.2, random_state=0, format="coo")
+    util.ScipyTensorShifter.cache.clear()
+    shifted = TensorCache().get("mat", lambda: mat, ("shift",))
+    # The shifted tensor is only held by the tensor cache, within its byte budget
+    assert len(util.ScipyTensorShifter.cache) == 0
+    assert (shifted.toarray() == util.ScipyTensorShifter().shiftLastMode(mat).toarray()).all()
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pytest
+import scipy.io
+import scipy.sparse
+
+from sam.sim.src import tensor_io
+from sam.sim.src.tensor_io import cache_path, iter_tns, read_mtx, read_tns
+
+points = [(1, 1, 2, "1.5"), (1, 3, 1, "-2"), (2, 2, 4, "3e-3"), (4, 1, 1, "7"), (4, 3, 3, "0")]
+
+
+def write_tns(filename, pts):
+    with open(filename, "w") as f:
+        f.write("".join(" ".join(str(x) for x in pt) + "\n" for pt in pts))
+
+
+@pytest.mark.parametrize("symmetry", ["general", "symmetric"])
+def test_read_mtx(tmp_path, symmetry):
+    filename = os.path.join(tmp_path, "mat.mtx")
+    mat = scipy.sparse.random(12, 12, density=0.2, random_state=0)
+    scipy.io.mmwrite(filename, mat + mat.T if symmetry == "symmetric" else mat, symmetry=symmetry)
+    gold = scipy.io.mmread(filename)
+
+    for _ in range(2):
+        coo = read_mtx(filename)
+        assert os.path.exists(cache_path(filename))
+        assert coo.shape == gold.shape and coo.row.dtype == gold.row.dtype and coo.data.dtype == gold.data.dtype
+        assert coo.row.tolist() == gold.row.tolist() and coo.col.tolist() == gold.col.tolist()
+        assert coo.data.tolist() == gold.data.tolist()
+
+
+def test_read_mtx_dense(tmp_path):
+    filename = os.path.join(tmp_path, "dense.mtx")
+    scipy.io.mmwrite(filename, np.arange(6.).reshape(2, 3))
+    assert (read_mtx(filename) == np.arange(6.).reshape(2, 3)).all()
+    assert not os.path.exists(cache_path(filename))
+
+
+@pytest.mark.parametrize("cache", [False, True])
+@pytest.mark.parametrize("chunk_lines", [2, 1024])
+def test_read_tns(tmp_path, cache, chunk_lines):
+    filename = os.path.join(tmp_path, "ten.tns")
+    write_tns(filename, points)
+
+    for _ in range(2):
+        dims, crds, vals = read_tns(filename, cache=cache, chunk_lines=chunk_lines)
+        assert dims == [4, 3, 4]
+        assert [crd.tolist() for crd in crds] == [[0, 0, 1, 3, 3], [0, 2, 1, 0, 2], [1, 0, 3, 0, 2]]
+        assert vals.tolist() == [1.5, -2.0, 0.003, 7.0, 0.0]
+    assert os.path.exists(cache_path(filename)) == cache
+    assert sum(len(vals) for _, vals in iter_tns(filename, chunk_lines=2)) == len(points)
+
+
+def test_read_tns_stale(tmp_path):
+    filename = os.path.join(tmp_path, "ten.tns")
+    write_tns(filename, points)
+    read_tns(filename, mmap=True)
+
+    write_tns(filename, points + [(5, 5, 5, "9")])
+    os.utime(filename, ns=(0, 0))
+    dims, _, vals = read_tns(filename, mmap=True)
+    assert dims == [5, 5, 5] and vals[-1] == 9.0
+
+
+def test_read_tns_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("SAM_TENSOR_CACHE", os.path.join(tmp_path, "cache"))
+    for subdir in ["a", "b"]:
+        os.mkdir(os.path.join(tmp_path, subdir))
+        write_tns(os.path.join(tmp_path, subdir, "ten.tns"), points if subdir == "a" else points[:2])
+    for _ in range(2):
+        assert len(read_tns(os.path.join(tmp_path, "a", "ten.tns"))[2]) == len(points)
+        assert len(read_tns(os.path.join(tmp_path, "b", "ten.tns"))[2]) == 2
+    assert os.listdir(os.path.join(tmp_path, "a")) == ["ten.tns"]
+    assert len(os.listdir(os.path.join(tmp_path, "cache"))) == 2
+
+
+def test_read_tns_unwritable(tmp_path, monkeypatch):
+    filename = os.path.join(tmp_path, "ten.tns")
+    write_tns(filename, points)
+    monkeypatch.setattr(tensor_io, "cache_path", lambda path: os.path.join(filename, "cache", "ten.tns.sam"))
+    dims, _, vals = read_tns(filename)
+    assert dims == [4, 3, 4] and len(vals) == len(points)
+    assert os.listdir(tmp_path) == ["ten.tns"]
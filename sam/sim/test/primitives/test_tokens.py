@@ -0,0 +1,31 @@
+import pytest
+
+from sam.sim.src.base import is_stkn, stkn_order, increment_stkn, decrement_stkn, is_valid_crd, is_valid_tkn, \
+    encode_tkn, decode_tkn, TKN_DATA, TKN_STOP
+
+
+def test_stkn_predicates():
+    assert is_stkn('S0')
+    assert is_stkn('S12')
+    assert not is_stkn('S')
+    assert not is_stkn('SA')
+    assert not is_stkn('D')
+    assert not is_stkn('')
+    assert not is_stkn(3)
+    assert stkn_order('S12') == 12
+    assert increment_stkn('S9') == 'S10'
+    assert decrement_stkn('S10') == 'S9'
+    assert decrement_stkn('S0') == ''
+    assert is_valid_crd('S15')
+    assert not is_valid_crd('S15', dim=10)
+    assert not is_valid_crd('N')
+    assert is_valid_tkn('N')
+
+
+def test_tkn_encoding():
+    for tkn in [0, -2.5, 'S0', 'S21', 'D', 'N', '']:
+        assert decode_tkn(*encode_tkn(tkn)) == tkn
+    assert encode_tkn(-2.5) == (TKN_DATA, -2.5)
+    assert encode_tkn('S21') == (TKN_STOP, 21)
+    with pytest.raises(ValueError):
+        decode_tkn(9)
@@ -5,6 +5,7 @@ from functools import reduce
 
 from sam.sim.src.wr_scanner import WrScan, CompressWrScan
 from sam.sim.src.array import Array
+from sam.sim.src.formatted import formatted_level
 
 TIMEOUT = 10000000000000
 
@@ -249,6 +250,11 @@ def read_combined_inputs(filename, formatlist):
 
 
 def read_inputs(filename, intype=int, base=10, early_terminate=None):
+    # Tensors converted to a binary container (see sam.sim.src.formatted) skip the text parsing
+    if base == 10 and early_terminate is None and intype in (int, float):
+        arr = formatted_level(filename)
+        if arr is not None:
+            return arr.astype(intype).tolist()
     return_list = []
     with open(filename) as f:
         for line in f:
@@ -0,0 +1,319 @@
+import io
+import json
+import pytest
+import random
+
+from sam.sim.src.rd_scanner import CompressedCrdRdScan
+from sam.sim.src.wr_scanner import ValsWrScan, CompressWrScan
+from sam.sim.src.joiner import Intersect2
+from sam.sim.src.compute import Multiply2
+from sam.sim.src.array import Array
+from sam.sim.src.crd_manager import CrdHold
+from sam.sim.src.repeater import Repeat, RepeatSigGen
+from sam.sim.src.accumulator import SparseAccumulator2
+from sam.sim.src.token import StknDrop
+from sam.sim.src.graph import SimGraph, Bind
+from sam.sim.src.stats import StatsRegistry, MaxGauge
+
+from sam.sim.test.test import TIMEOUT, check_arr, check_seg_arr
+
+
+vec_elemmul = SimGraph("vec_elemmul")
+vec_elemmul.add_node("crdscan1", CompressedCrdRdScan, seg_arr=Bind("seg1"), crd_arr=Bind("crd1"))
+vec_elemmul.add_node("crdscan2", CompressedCrdRdScan, seg_arr=Bind("seg2"), crd_arr=Bind("crd2"))
+vec_elemmul.add_node("inter", Intersect2)
+vec_elemmul.add_node("val1", Array, init_arr=Bind("vals1"))
+vec_elemmul.add_node("val2", Array, init_arr=Bind("vals2"))
+vec_elemmul.add_node("mul", Multiply2)
+vec_elemmul.add_node("oval_wrscan", ValsWrScan, size=Bind("size"), fill=0)
+vec_elemmul.add_node("ocrd_wrscan", CompressWrScan, size=Bind("size"), seg_size=Bind("size"), fill=0)
+vec_elemmul.add_input("crdscan1", "set_in_ref", "in_ref1")
+vec_elemmul.add_input("crdscan2", "set_in_ref", "in_ref2")
+vec_elemmul.add_edge("crdscan1", "inter", "set_in1", ("out_ref", "out_crd"), "crd")
+vec_elemmul.add_edge("crdscan2", "inter", "set_in2", ("out_ref", "out_crd"), "crd")
+vec_elemmul.add_edge("inter", "val1", "set_load", "out_ref1", "ref")
+vec_elemmul.add_edge("inter", "val2", "set_load", "out_ref2", "ref")
+vec_elemmul.add_edge("val1", "mul", "set_in1", "out_load", "val")
+vec_elemmul.add_edge("val2", "mul", "set_in2", "out_load", "val")
+vec_elemmul.add_edge("mul", "oval_wrscan", "set_input", "out_val", "val")
+vec_elemmul.add_edge("inter", "ocrd_wrscan", "set_input", "out_crd", "crd")
+vec_elemmul.set_outputs("ocrd_wrscan", "oval_wrscan")
+
+
+def gen_vec(nnz, max_val):
+    crd_arr = sorted(set([random.randint(0, max_val) for _ in range(nnz)]))
+    return [0, len(crd_arr)], crd_arr, [random.randint(0, max_val) for _ in range(len(crd_arr))]
+
+
+def test_graph_order():
+    # Nodes are updated producers first, regardless of insertion order
+    graph = SimGraph()
+    graph.add_node("wr", ValsWrScan, size=10)
+    graph.add_node("rd", CompressedCrdRdScan, seg_arr=[0, 1], crd_arr=[0])
+    graph.add_node("arr", Array, init_arr=[1])
+    graph.add_edge("arr", "wr", "set_input", "out_load", "val")
+    graph.add_edge("rd", "arr", "set_load", "out_ref", "ref")
+    assert graph.order() == ["rd", "arr", "wr"]
+
+    with pytest.raises(ValueError):
+        graph.add_edge("rd", "arr", "set_load", "out_ref", "data")
+
+
+@pytest.mark.parametrize("specialize", [False, True])
+@pytest.mark.parametrize("skip_idle", [False, True])
+@pytest.mark.parametrize("nnz", [1, 10, 100, 500])
+def test_unit_graph_vec_elemmul(nnz, skip_idle, specialize, debug_sim, backpressure, depth, max_val=1000, size=1001):
+    seg_arr1, crd_arr1, vals_arr1 = gen_vec(nnz, max_val)
+    seg_arr2, crd_arr2, vals_arr2 = gen_vec(nnz, max_val)
+
+    gold_crd = sorted(set(crd_arr1) & set(crd_arr2))
+    gold_seg = [0, len(gold_crd)]
+    gold_vals = [vals_arr1[crd_arr1.index(i)] * vals_arr2[crd_arr2.index(i)] for i in gold_crd]
+
+    bindings = {"seg1": seg_arr1, "crd1": crd_arr1, "vals1": vals_arr1,
+                "seg2": seg_arr2, "crd2": crd_arr2, "vals2": vals_arr2,
+                "size": size, "in_ref1": [0, 'D'], "in_ref2": [0, 'D']}
+    sim = vec_elemmul.build(bindings, skip_idle=skip_idle, specialize=specialize, debug=debug_sim, back_en=backpressure,
+                            depth=int(depth))
+    sim.run(TIMEOUT)
+    assert sim.done
+
+    check_arr(sim["oval_wrscan"], gold_vals)
+    check_arr(sim["ocrd_wrscan"], gold_crd)
+    check_seg_arr(sim["ocrd_wrscan"], gold_seg)
+
+    # The graph must be cycle-exact with the hand-wired loop
+    crdscan1 = CompressedCrdRdScan(seg_arr=seg_arr1, crd_arr=crd_arr1, debug=debug_sim, back_en=backpressure, depth=int(depth))
+    crdscan2 = CompressedCrdRdScan(seg_arr=seg_arr2, crd_arr=crd_arr2, debug=debug_sim, back_en=backpressure, depth=int(depth))
+    inter = Intersect2(debug=debug_sim, back_en=backpressure, depth=int(depth))
+    val1 = Array(init_arr=vals_arr1, debug=debug_sim, back_en=backpressure, depth=int(depth))
+    val2 = Array(init_arr=vals_arr2, debug=debug_sim, back_en=backpressure, depth=int(depth))
+    mul = Multiply2(debug=debug_sim, back_en=backpressure, depth=int(depth))
+    oval_wrscan = ValsWrScan(size=size, fill=0, back_en=backpressure, depth=int(depth))
+    ocrd_wrscan = CompressWrScan(size=size, seg_size=size, fill=0, back_en=backpressure, depth=int(depth))
+
+    in_ref1 = [0, 'D']
+    in_ref2 = [0, 'D']
+    done = False
+    time = 0
+    while not done and time < TIMEOUT:
+        if len(in_ref1) > 0:
+            crdscan1.set_in_ref(in_ref1.pop(0), "")
+        if len(in_ref2) > 0:
+            crdscan2.set_in_ref(in_ref2.pop(0), "")
+        inter.set_in1(crdscan1.out_ref(), crdscan1.out_crd(), crdscan1)
+        inter.set_in2(crdscan2.out_ref(), crdscan2.out_crd(), crdscan2)
+        val1.set_load(inter.out_ref1(), inter)
+        val2.set_load(inter.out_ref2(), inter)
+        mul.set_in1(val1.out_load(), val1)
+        mul.set_in2(val2.out_load(), val2)
+        oval_wrscan.set_input(mul.out_val(), mul)
+        ocrd_wrscan.set_input(inter.out_crd(), inter)
+
+        crdscan1.update()
+        crdscan2.update()
+        inter.update()
+        val1.update()
+        val2.update()
+        mul.update()
+        oval_wrscan.update()
+        ocrd_wrscan.update()
+
+        done = ocrd_wrscan.out_done() and oval_wrscan.out_done()
+        time += 1
+
+    assert sim.cycles == time
+
+
+def test_unit_graph_stats_registry(nnz=50, max_val=1000, size=1001):
+    seg_arr1, crd_arr1, vals_arr1 = gen_vec(nnz, max_val)
+    seg_arr2, crd_arr2, vals_arr2 = gen_vec(nnz, max_val)
+    gold_crd = sorted(set(crd_arr1) & set(crd_arr2))
+
+    bindings = {"seg1": seg_arr1, "crd1": crd_arr1, "vals1": vals_arr1,
+                "seg2": seg_arr2, "crd2": crd_arr2, "vals2": vals_arr2,
+                "size": size, "in_ref1": [0, 'D'], "in_ref2": [0, 'D']}
+    registry = StatsRegistry()
+    sim = vec_elemmul.build(bindings, statistics=True, stats_registry=registry)
+    sim.run(TIMEOUT)
+    assert sim.stats_registry(registry) is registry
+
+    stats = registry.as_dict()
+    assert stats["val1/elements_touched"] == len(gold_crd)
+    assert stats["val1/valid_loads"] == len(gold_crd)
+    assert stats["crdscan1/unique_refs"] == len(crd_arr1)
+    assert stats["mul/total_cycle"] == sim.cycles
+    assert isinstance(registry.metrics[("inter", "fifos_ref_1")], MaxGauge)
+    assert stats["inter/run_count"] == sim["inter"].max_run_count.value
+    assert json.loads(registry.to_json()) == json.loads(json.dumps(stats, default=str))
+
+    out = io.StringIO()
+    registry.to_csv(out)
+    assert len(out.getvalue().splitlines()) == len(stats) + 1
+
+    # Plain values follow the latest record
+    sim["mul"].total_cycles += 1
+    assert sim.stats_registry(registry).as_dict()["mul/total_cycle"] == sim.cycles + 1
+
+
+# X(i,j) = B(i,k) * C(k,j) with a k-i-j dataflow, B is stored k-major
+matmul_kij = SimGraph("matmul_kij")
+matmul_kij.add_node("Bk", CompressedCrdRdScan, seg_arr=Bind("Bk_seg"), crd_arr=Bind("Bk_crd"))
+matmul_kij.add_node("Ck", CompressedCrdRdScan, seg_arr=Bind("Ck_seg"), crd_arr=Bind("Ck_crd"))
+matmul_kij.add_node("intersect_k", Intersect2)
+matmul_kij.add_node("Bi", CompressedCrdRdScan, seg_arr=Bind("Bi_seg"), crd_arr=Bind("Bi_crd"))
+matmul_kij.add_node("repsiggen_i", RepeatSigGen)
+matmul_kij.add_node("repeat_Ci", Repeat)
+matmul_kij.add_node("Cj", CompressedCrdRdScan, seg_arr=Bind("Cj_seg"), crd_arr=Bind("Cj_crd"))
+matmul_kij.add_node("C_vals", Array, init_arr=Bind("C_vals"))
+matmul_kij.add_node("crdhold", CrdHold)
+matmul_kij.add_node("repsiggen_j", RepeatSigGen)
+matmul_kij.add_node("repeat_Bj", Repeat)
+matmul_kij.add_node("B_vals", Array, init_arr=Bind("B_vals"))
+matmul_kij.add_node("mul", Multiply2)
+matmul_kij.add_node("drop_outer", StknDrop)
+matmul_kij.add_node("drop_inner", StknDrop)
+matmul_kij.add_node("drop_val", StknDrop)
+matmul_kij.add_node("spacc", SparseAccumulator2)
+matmul_kij.add_node("X_vals", ValsWrScan, size=Bind("size"))
+matmul_kij.add_node("X1", CompressWrScan, seg_size=Bind("size"), size=Bind("size"))
+matmul_kij.add_node("X0", CompressWrScan, seg_size=2, size=Bind("size"))
+matmul_kij.add_input("Bk", "set_in_ref", "in_ref_B")
+matmul_kij.add_input("Ck", "set_in_ref", "in_ref_C")
+matmul_kij.add_edge("Bk", "intersect_k", "set_in1", ("out_ref", "out_crd"), "crd")
+matmul_kij.add_edge("Ck", "intersect_k", "set_in2", ("out_ref", "out_crd"), "crd")
+matmul_kij.add_edge("intersect_k", "Bi", "set_in_ref", "out_ref1", "ref")
+matmul_kij.add_edge("Bi", "repsiggen_i", "set_istream", "out_crd", "crd")
+matmul_kij.add_edge("intersect_k", "repeat_Ci", "set_in_ref", "out_ref2", "ref")
+matmul_kij.add_edge("repsiggen_i", "repeat_Ci", "set_in_repsig", "out_repsig", "repsig")
+matmul_kij.add_edge("repeat_Ci", "Cj", "set_in_ref", "out_ref", "ref")
+matmul_kij.add_edge("Cj", "C_vals", "set_load", "out_ref", "ref")
+matmul_kij.add_edge("Bi", "crdhold", "set_outer_crd", "out_crd", "crd")
+matmul_kij.add_edge("Cj", "crdhold", "set_inner_crd", "out_crd", "crd")
+matmul_kij.add_edge("Cj", "repsiggen_j", "set_istream", "out_crd", "crd")
+matmul_kij.add_edge("Bi", "repeat_Bj", "set_in_ref", "out_ref", "ref")
+matmul_kij.add_edge("repsiggen_j", "repeat_Bj", "set_in_repsig", "out_repsig", "repsig")
+matmul_kij.add_edge("repeat_Bj", "B_vals", "set_load", "out_ref", "ref")
+matmul_kij.add_edge("B_vals", "mul", "set_in1", "out_val", "val")
+matmul_kij.add_edge("C_vals", "mul", "set_in2", "out_val", "val")
+matmul_kij.add_edge("crdhold", "drop_outer", "set_in_stream", "out_crd_outer", "crd")
+matmul_kij.add_edge("crdhold", "drop_inner", "set_in_stream", "out_crd_inner", "crd")
+matmul_kij.add_edge("mul", "drop_val", "set_in_stream", "out_val", "val")
+matmul_kij.add_edge("drop_outer", "spacc", "set_crd_outer", "out_val", "crd")
+matmul_kij.add_edge("drop_inner", "spacc", "set_crd_inner", "out_val", "crd")
+matmul_kij.add_edge("drop_val", "spacc", "set_val", "out_val", "val")
+matmul_kij.add_edge("spacc", "X_vals", "set_input", "out_val", "val")
+matmul_kij.add_edge("spacc", "X1", "set_input", "out_crd_inner", "crd")
+matmul_kij.add_edge("spacc", "X0", "set_input", "out_crd_outer", "crd")
+matmul_kij.set_outputs("X0", "X1", "X_vals")
+
+
+def gen_csr(rows, cols, density, max_val):
+    seg = [0]
+    crd = []
+    vals = []
+    for _ in range(rows):
+        row = sorted(random.sample(range(cols), int(cols * density)))
+        crd += row
+        vals += [random.randint(1, max_val) for _ in row]
+        seg.append(len(crd))
+    return seg, crd, vals
+
+
+@pytest.mark.parametrize("density", [0.05, 0.2, 0.5])
+def test_unit_graph_skip_idle(density, dim=20, max_val=10):
+    Bk_seg, Bk_crd = [0, dim], list(range(dim))
+    Ck_seg, Ck_crd = [0, dim], list(range(dim))
+    Bi_seg, Bi_crd, B_vals = gen_csr(dim, dim, density, max_val)
+    Cj_seg, Cj_crd, C_vals = gen_csr(dim, dim, density, max_val)
+
+    gold = {}
+    for k in range(dim):
+        for bi in range(Bi_seg[k], Bi_seg[k + 1]):
+            for cj in range(Cj_seg[k], Cj_seg[k + 1]):
+                key = (Bi_crd[bi], Cj_crd[cj])
+                gold[key] = gold.get(key, 0) + B_vals[bi] * C_vals[cj]
+
+    results = []
+    for skip_idle in [False, True]:
+        bindings = {"Bk_seg": Bk_seg, "Bk_crd": Bk_crd, "Ck_seg": Ck_seg, "Ck_crd": Ck_crd,
+                    "Bi_seg": Bi_seg, "Bi_crd": Bi_crd, "B_vals": B_vals,
+                    "Cj_seg": Cj_seg, "Cj_crd": Cj_crd, "C_vals": C_vals,
+                    "size": dim * dim, "in_ref_B": [0, 'D'], "in_ref_C": [0, 'D']}
+        sim = matmul_kij.build(bindings, skip_idle=skip_idle, statistics=True)
+        sim.run(TIMEOUT)
+        assert sim.done
+        for wr in ["X0", "X1", "X_vals"]:
+            sim[wr].autosize()
+        stats = {name: sim[name].return_statistics() for name in matmul_kij.order() if name != "spacc"}
+        results.append((sim.cycles, sim["X0"].get_arr(), sim["X1"].get_seg_arr(), sim["X1"].get_arr(),
+                        sim["X_vals"].get_arr(), stats))
+
+    assert results[0] == results[1]
+
+    _, x0_crd, x1_seg, x1_crd, x_vals, _ = results[0]
+    out = {}
+    for i, icrd in enumerate(x0_crd):
+        for pos in range(x1_seg[i], x1_seg[i + 1]):
+            out[(icrd, x1_crd[pos])] = x_vals[pos]
+    assert out == gold
+
+
+def banded_csr(dim, width, offset):
+    seg = [0]
+    crd = []
+    vals = []
+    for r in range(dim):
+        row = sorted({(r + offset + j) % dim for j in range(width)})
+        crd += row
+        vals += [(r + c) % 7 + 1 for c in row]
+        seg.append(len(crd))
+    return seg, crd, vals
+
+
+# Cycle counts of the per-cycle polled backpressure protocol the credit-based one has to reproduce
+@pytest.mark.parametrize("depth, gold_cycles", [(1, 398), (2, 324), (8, 278)])
+def test_unit_graph_backpressure(depth, gold_cycles, dim=12):
+    Bi_seg, Bi_crd, B_vals = banded_csr(dim, 3, 0)
+    Cj_seg, Cj_crd, C_vals = banded_csr(dim, 4, 5)
+    bindings = {"Bk_seg": [0, dim], "Bk_crd": list(range(dim)), "Ck_seg": [0, dim], "Ck_crd": list(range(dim)),
+                "Bi_seg": Bi_seg, "Bi_crd": Bi_crd, "B_vals": B_vals,
+                "Cj_seg": Cj_seg, "Cj_crd": Cj_crd, "C_vals": C_vals,
+                "size": dim * dim, "in_ref_B": [0, 'D'], "in_ref_C": [0, 'D']}
+    sim = matmul_kij.build(bindings, back_en=True, depth=depth)
+    sim.run(TIMEOUT)
+    assert sim.done
+    assert sim.cycles == gold_cycles
+
+    ref = matmul_kij.build(bindings)
+    ref.run(TIMEOUT)
+    assert sim["X1"].get_arr() == ref["X1"].get_arr()
+    assert sim["X_vals"].get_arr() == ref["X_vals"].get_arr()
+
+
+@pytest.mark.parametrize("density", [0.05, 0.2, 0.5])
+def test_unit_graph_batch(density, dim=20, max_val=10):
+    Bi_seg, Bi_crd, B_vals = gen_csr(dim, dim, density, max_val)
+    Cj_seg, Cj_crd, C_vals = gen_csr(dim, dim, density, max_val)
+    bindings = {"Bk_seg": [0, dim], "Bk_crd": list(range(dim)), "Ck_seg": [0, dim], "Ck_crd": list(range(dim)),
+                "Bi_seg": Bi_seg, "Bi_crd": Bi_crd, "B_vals": B_vals,
+                "Cj_seg": Cj_seg, "Cj_crd": Cj_crd, "C_vals": C_vals,
+                "size": dim * dim, "in_ref_B": [0, 'D'], "in_ref_C": [0, 'D']}
+    ref = matmul_kij.build(bindings)
+    ref.run(TIMEOUT)
+    sim = matmul_kij.build(bindings)
+    streams = sim.run_batch()
+    assert sim.done
+
+    for wr in ["X0", "X1", "X_vals"]:
+        assert sim[wr].get_arr() == ref[wr].get_arr()
+    assert sim["X1"].get_seg_arr() == ref["X1"].get_seg_arr()
+    assert streams["spacc"]["out_val"][-1] == 'D'
+
+
+def test_unit_graph_batch_backpressure():
+    bindings = {"seg1": [0, 1], "crd1": [0], "vals1": [1], "seg2": [0, 1], "crd2": [0], "vals2": [1],
+                "size": 1, "in_ref1": [0, 'D'], "in_ref2": [0, 'D']}
+    sim = vec_elemmul.build(bindings, back_en=True)
+    with pytest.raises(ValueError):
+        sim.run_batch()
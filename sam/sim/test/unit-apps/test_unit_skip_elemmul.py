@@ -214,3 +214,49 @@ def test_vec_elemmul_skip_c_c_c(nnz, debug_sim, backpressure, depth, max_val=100
     check_arr(oval_wrscan, gold_vals)
     check_arr(ocrd_wrscan, gold_crd)
     check_seg_arr(ocrd_wrscan, gold_seg)
+
+
+def run_skip_intersect(crd_arr1, crd_arr2, skip_rate):
+    crdscan1 = CompressedCrdRdScan(seg_arr=[0, len(crd_arr1)], crd_arr=crd_arr1, skip=True, skip_rate=skip_rate)
+    crdscan2 = CompressedCrdRdScan(seg_arr=[0, len(crd_arr2)], crd_arr=crd_arr2, skip=True, skip_rate=skip_rate)
+    inter = Intersect2(skip=True)
+
+    in_ref1 = [0, 'D']
+    in_ref2 = [0, 'D']
+    out_crd = []
+    done = False
+    time = 0
+    while not done and time < TIMEOUT:
+        if len(in_ref1) > 0:
+            crdscan1.set_in_ref(in_ref1.pop(0), "")
+        if len(in_ref2) > 0:
+            crdscan2.set_in_ref(in_ref2.pop(0), "")
+        crdscan2.set_crd_skip(inter.out_crd_skip2(), inter)
+        crdscan1.set_crd_skip(inter.out_crd_skip1(), inter)
+        inter.set_in1(crdscan1.out_ref(), crdscan1.out_crd(), crdscan1)
+        inter.set_in2(crdscan2.out_ref(), crdscan2.out_crd(), crdscan2)
+
+        crdscan1.update()
+        crdscan2.update()
+        inter.update()
+
+        out_crd.append(inter.out_crd())
+        done = inter.out_done()
+        time += 1
+    return remove_emptystr(out_crd), time
+
+
+# A skip advancing skip_rate coordinates per cycle gives the same intersection. Cycles are not monotonic in
+# skip_rate (a stalled scanner sees newer skips), but one coordinate per cycle is the slowest
+def test_vec_skip_rate(max_val=2000):
+    crd_arr1 = sorted(random.sample(range(max_val), 20))
+    crd_arr2 = sorted(random.sample(range(max_val), max_val // 2))
+    gold_crd = sorted(set(crd_arr1) & set(crd_arr2)) + ['S0', 'D']
+
+    cycles = []
+    for skip_rate in [1, 4, 16, max_val, None]:
+        out_crd, time = run_skip_intersect(crd_arr1, crd_arr2, skip_rate)
+        assert out_crd == gold_crd
+        cycles.append(time)
+    assert cycles[0] == max(cycles) and cycles[0] > cycles[-1]
+    assert cycles[-2] == cycles[-1]
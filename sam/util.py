@@ -7,11 +7,15 @@ import itertools
 import shutil
 import numpy as np
 import math
+import weakref
 import pydata
 
 from pathlib import Path
 from dataclasses import dataclass
 
+from sam.sim.src.tensor_cache import add_transform, input_cache
+from sam.sim.src.tensor_io import read_mtx, read_tns
+
 import os
 import math
 import numpy
@@ -28,34 +32,51 @@ VALIDATION_OUTPUT_PATH = os.getenv('VALIDATION_OUTPUT_PATH', default=os.path.joi
 
 
 def safeCastScipyTensorToInts(tensor):
-    data = numpy.zeros(len(tensor.data), dtype='int64')
-    for i in range(len(data)):
-        # If the cast would turn a value into 0, instead write a 1. This preserves
-        # the sparsity pattern of the data.
-        # if int(tensor.data[i]) == 0:
-        #     data[i] = 1
-        # else:
-        #     data[i] = int(tensor.data[i])
-        data[i] = round_sparse(tensor.data[i])
+    # If the cast would turn a value into 0, instead write a 1. This preserves
+    # the sparsity pattern of the data.
+    data = round_sparse_array(tensor.data)
     return scipy.sparse.coo_matrix(tensor.coords, data, tensor.shape)
 
 
+# Uncached version of ScipyTensorShifter.shiftLastMode()
+def shift_last_mode(tensor):
+    # Explicit zeros stay stored and duplicates are summed first, like through a dok_matrix
+    coo = scipy.sparse.coo_matrix(tensor, copy=True)
+    coo.sum_duplicates()
+    # TODO (rohany): Temporarily use a constant as the value.
+    vals = np.full(coo.nnz, 2.0)
+    return scipy.sparse.coo_matrix((vals, (coo.row, (coo.col + 1) % tensor.shape[-1])), shape=tensor.shape)
+
+
 # ScipyTensorShifter shifts all elements in the last mode
 # of the input scipy/sparse tensor by one.
 class ScipyTensorShifter:
+    # The last shifted tensors, shared by all shifters since the formatting and gold checks shift the same tensor
+    # several times. Inputs are held weakly (an entry goes with its input) and must not be modified once shifted
+    cache = dict()
+    cache_size = 8
+
     def __init__(self):
         pass
 
     def shiftLastMode(self, tensor):
-        dok = scipy.sparse.dok_matrix(tensor)
-        result = scipy.sparse.dok_matrix(tensor.shape)
-        for coord, val in dok.items():
-            newCoord = list(coord[:])
-            newCoord[-1] = (newCoord[-1] + 1) % tensor.shape[-1]
-            # result[tuple(newCoord)] = val
-            # TODO (rohany): Temporarily use a constant as the value.
-            result[tuple(newCoord)] = 2
-        return scipy.sparse.coo_matrix(result)
+        key = id(tensor)
+        if key in self.cache:
+            ref, shifted = self.cache[key]
+            if ref() is tensor:
+                return shifted
+
+        shifted = shift_last_mode(tensor)
+        self.cache.pop(key, None)
+        if len(self.cache) >= self.cache_size:
+            del self.cache[next(iter(self.cache))]
+        self.cache[key] = (weakref.ref(tensor), shifted)
+        weakref.finalize(tensor, self.cache.pop, key, None)
+        return shifted
+
+
+# The input cache holds the shifted tensor within its own byte budget, not in the shifter's cache
+add_transform("shift", shift_last_mode)
 
 
 def round_sparse(x):
@@ -69,36 +90,26 @@ def round_sparse(x):
         return math.ceil(x - 0.5)
 
 
+# round_sparse() of every element of an array
+def round_sparse_array(x):
+    x = np.asarray(x, dtype=np.float64)
+    rounded = np.where(x >= 0.0, np.floor(x + 0.5), np.ceil(x - 0.5))
+    rounded[(0.0 <= x) & (x < 1)] = 1
+    rounded[(0.0 > x) & (x > -1)] = -1
+    return rounded.astype(np.int64)
+
+
 # TnsFileLoader loads a tensor stored in .tns format.
 class TnsFileLoader:
     def __init__(self, cast_int=False):
         self.cast = cast_int
 
     def load(self, path):
-        coordinates = []
-        values = []
-        dims = []
-        first = True
-        with open(path, 'r') as f:
-            for line in f:
-                data = line[:-1].split(' ')
-                if first:
-                    first = False
-                    dims = [0] * (len(data) - 1)
-                    for i in range(len(data) - 1):
-                        coordinates.append([])
-                data = [elem for elem in data if elem != '']
-
-                for i in range(len(data) - 1):
-                    coordinates[i].append(int(data[i]) - 1)
-                    dims[i] = max(dims[i], coordinates[i][-1] + 1)
-                # TODO (rohany): What if we want this to be an integer?
-                if self.cast:
-                    val = round_sparse(float(data[-1]))
-                    values.append(val)
-                else:
-                    values.append(float(data[-1]))
-        return dims, coordinates, values
+        dims, coordinates, values = read_tns(path)
+        # TODO (rohany): What if we want this to be an integer?
+        if self.cast:
+            values = round_sparse_array(values)
+        return dims, [crd.tolist() for crd in coordinates], values.tolist()
 
 
 # TnsFileDumper dumps a dictionary of coordinates to values
@@ -187,23 +198,6 @@ class ScipySparseTensorLoader:
 #                 resultCoords[-1][i] = (resultCoords[-1][i] + 1) % tensor.shape[-1]
 #         return sparse.COO(resultCoords, resultValues, tensor.shape)
 
-# ScipyTensorShifter shifts all elements in the last mode
-# of the input scipy/sparse tensor by one.
-class ScipyTensorShifter:
-    def __init__(self):
-        pass
-
-    def shiftLastMode(self, tensor):
-        dok = scipy.sparse.dok_matrix(tensor)
-        result = scipy.sparse.dok_matrix(tensor.shape)
-        for coord, val in dok.items():
-            newCoord = list(coord[:])
-            newCoord[-1] = (newCoord[-1] + 1) % tensor.shape[-1]
-            # result[tuple(newCoord)] = val
-            # TODO (rohany): Temporarily use a constant as the value.
-            result[tuple(newCoord)] = 2
-        return scipy.sparse.coo_matrix(result)
-
 
 @dataclass
 class DoublyCompressedMatrix:
@@ -222,7 +216,7 @@ class ScipyMatrixMarketTensorLoader:
         pass
 
     def load(self, path):
-        coo = scipy.io.mmread(path)
+        coo = read_mtx(path)
         return coo
 
 
@@ -233,38 +227,34 @@ def shape_str(shape):
 # FIXME: This fixed point number of decimals may not be enough
 def array_str(array):
     if isinstance(array[0], float):
-        return ' '.join(['{:5.5f}'.format(item) for item in array])
+        return ' '.join(map('{:5.5f}'.format, _items(array)))
 
-    return ' '.join([str(item) for item in array])
+    return ' '.join(map(str, _items(array)))
 
 
 def array_newline_str(array):
     if isinstance(array[0], float):
-        return '\n'.join(['{:5.5f}'.format(item) for item in array])
+        return '\n'.join(map('{:5.5f}'.format, _items(array)))
+
+    return '\n'.join(map(str, _items(array)))
 
-    return '\n'.join([str(item) for item in array])
+
+# Elements of an array as Python numbers, converted in bulk for the dtypes that print the same either way
+def _items(array):
+    if type(array) is np.ndarray and array.ndim == 1 and (array.dtype.kind in 'iub' or array.dtype == np.float64):
+        return array.tolist()
+    return array
 
 
 # InputCacheSuiteSparse attempts to avoid reading the same tensor from disk multiple
-# times in a benchmark run.
+# times in a benchmark run, through the input cache shared by the whole process.
 class InputCacheSuiteSparse:
-    def __init__(self):
-        self.lastLoaded = None
-        self.lastName = None
-        self.tensor = None
+    def __init__(self, cache=input_cache):
+        self.cache = cache
 
     def load(self, tensor, cast):
-        if self.lastName == str(tensor):
-            return self.tensor
-        else:
-            self.lastLoaded = tensor.load(ScipyMatrixMarketTensorLoader())
-            self.lastName = str(tensor)
-            if cast:
-                self.tensor = self.lastLoaded
-                # self.tensor = safeCastPydataTensorToInts(self.lastLoaded)
-            else:
-                self.tensor = self.lastLoaded
-            return self.tensor
+        # cast is not applied to SuiteSparse matrices
+        return self.cache.get(tensor.path, lambda: tensor.load(ScipyMatrixMarketTensorLoader()))
 
 
 class FormatWriter:
@@ -273,7 +263,7 @@ class FormatWriter:
 
     def convert_format(self, coo, format_str):
         if self.cast:
-            cast_data = np.array([round_sparse(elem) for elem in coo.data])
+            cast_data = round_sparse_array(coo.data)
             coo = scipy.sparse.coo_matrix((cast_data, (coo.row, coo.col)))
 
         if format_str == "csr":
@@ -290,28 +280,19 @@ class FormatWriter:
                 return coo.todense().getT()
             if format_str == "dcsr":
                 csr = scipy.sparse.csr_matrix(coo)
-                has_row = [rc > 0 for rc in csr.getnnz(1)]
-                segend = sum(has_row)
-                seg0 = [0, segend]
-                crd0 = [i for i, r in enumerate(has_row) if r]
-                seg1 = list(itertools.accumulate(map(int, csr.getnnz(1))))
-                seg1 = [item for item, _ in itertools.groupby(seg1)]
-                if seg1[0] != 0:
-                    seg1 = [0] + seg1
+                # The non-empty rows, and the row pointers without the repeats of the empty rows
+                crd0 = np.flatnonzero(np.diff(csr.indptr)).tolist()
+                seg0 = [0, len(crd0)]
+                seg1 = np.unique(csr.indptr).tolist()
                 crd1 = csr.indices
                 data = csr.data
                 dcsr = DoublyCompressedMatrix(csr.shape, seg0, crd0, seg1, crd1, data)
                 return dcsr
             elif format_str == "dcsc":
                 csc = scipy.sparse.csc_matrix(coo)
-                has_col = [rc > 0 for rc in csc.getnnz(0)]
-                segend = sum(has_col)
-                seg0 = [0, segend]
-                crd0 = [i for i, c in enumerate(has_col) if c]
-                seg1 = list(itertools.accumulate(map(int, csc.getnnz(0))))
-                seg1 = [item for item, _ in itertools.groupby(seg1)]
-                if seg1[0] != 0:
-                    seg1 = [0] + seg1
+                crd0 = np.flatnonzero(np.diff(csc.indptr)).tolist()
+                seg0 = [0, len(crd0)]
+                seg1 = np.unique(csc.indptr).tolist()
                 crd1 = csc.indices
                 data = csc.data
                 dcsc = DoublyCompressedMatrix(csc.shape, seg0, crd0, seg1, crd1, data)
@@ -528,22 +509,11 @@ class FormatWriter:
 # UfuncInputCache attempts to avoid reading the same tensor from disk multiple
 # times in a benchmark run.
 class InputCacheTensor:
-    def __init__(self):
-        self.lastLoaded = None
-        self.lastName = None
-        self.tensor = None
+    def __init__(self, cache=input_cache):
+        self.cache = cache
 
     def load(self, tensor, suiteSparse, cast, format_str):
-        if self.lastName == str(tensor):
-            return self.tensor
-        else:
-            self.lastLoaded = tensor.load()
-            self.lastName = str(tensor)
-            if cast:
-                self.tensor = safeCastPydataTensorToInts(self.lastLoaded)
-            else:
-                self.tensor = self.lastLoaded
-            return self.tensor
+        return self.cache.get(str(tensor), tensor.load, ("cast",) if cast else ())
 
 
 # PydataMatrixMarketTensorLoader loads tensors in the matrix market format
@@ -592,18 +562,24 @@ class TensorCollectionSuiteSparse:
 # safeCastPydataTensorToInts casts a floating point tensor to integers
 # in a way that preserves the sparsity pattern.
 def safeCastPydataTensorToInts(tensor):
-    data = numpy.zeros(len(tensor.data), dtype='int64')
-    for i in range(len(data)):
-        # If the cast would turn a value into 0, instead write a 1. This preserves
-        # the sparsity pattern of the data.
-        # if int(tensor.data[i]) == 0:
-        #     data[i] = 1
-        # else:
-        #     data[i] = int(tensor.data[i])
-        data[i] = round_sparse(tensor.data[i])
+    # If the cast would turn a value into 0, instead write a 1. This preserves
+    # the sparsity pattern of the data.
+    data = round_sparse_array(tensor.data)
     return pydata.sparse.COO(tensor.coords, data, tensor.shape)
 
 
+# safeCastPydataTensorToInts() for scipy matrices too, the "cast" of the input cache
+def safeCastTensorToInts(tensor):
+    if not scipy.sparse.issparse(tensor):
+        return safeCastPydataTensorToInts(tensor)
+    cast = tensor.copy()
+    cast.data = round_sparse_array(tensor.data)
+    return cast
+
+
+add_transform("cast", safeCastTensorToInts)
+
+
 def parse_taco_format(infilename, outdir, tensorname, format_str):
     with open(infilename, 'r') as inf:
         level = -1
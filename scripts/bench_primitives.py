@@ -0,0 +1,124 @@
+import argparse
+import importlib
+import random
+import sys
+import time
+import timeit
+import tracemalloc
+
+from sam.sim.src.base import _state_names
+from sam.sim.src.rd_scanner import CompressedCrdRdScan
+from sam.sim.src.repeater import Repeat, RepeatSigGen
+
+# The vec_elemmul graph of the unit tests (the test directory name is not a valid identifier)
+vec_elemmul = importlib.import_module("sam.sim.test.unit-apps.test_unit_graph").vec_elemmul
+
+# Cost of the primitive objects with their __slots__ state, against the same state in a per-instance dict:
+#   python scripts/bench_primitives.py --nnz 5000 --instances 20000
+# The per-cycle times of the vec_elemmul graph and of a lone scanner are printed for reference. The graph time is
+# dominated by the scheduler, the slots don't change it measurably
+
+
+# Object with the attributes of blk in a per-instance dict, like a primitive without __slots__
+class DictState:
+    def __init__(self, blk):
+        for name in _state_names(type(blk)):
+            if hasattr(blk, name):
+                setattr(self, name, getattr(blk, name))
+
+
+def gen_vec(nnz, dim):
+    crd = sorted(random.sample(range(dim), nnz))
+    return [0, len(crd)], crd, [random.randint(0, 1000) for _ in crd]
+
+
+def bench_graph(bindings, rounds, specialize):
+    best = None
+    for _ in range(rounds):
+        sim = vec_elemmul.build(bindings, specialize=specialize)
+        start = time.perf_counter()
+        cycles = sim.run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return cycles, best
+
+
+# update() of a single scanner, without the scheduling overhead of the graph
+def bench_update(crd, rounds):
+    best = None
+    for _ in range(rounds):
+        scan = CompressedCrdRdScan(seg_arr=[0, len(crd)], crd_arr=crd)
+        in_ref = [0, 'D']
+        cycles = 0
+        start = time.perf_counter()
+        while not scan.out_done():
+            if in_ref:
+                scan.set_in_ref(in_ref.pop(0))
+            scan.update()
+            scan.out_crd()
+            scan.out_ref()
+            cycles += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return cycles, best
+
+
+# Scanner/repeater chains like the ones the tiled pipeline instantiates for every tile. Returns the build time and
+# the traced memory per block, and the size of the state of one block with slots and in a dict (the object plus
+# its attribute dict, the attribute values are shared and not counted)
+def bench_instances(instances):
+    tracemalloc.start()
+    start = time.perf_counter()
+    blocks = []
+    for i in range(instances):
+        blocks.append(CompressedCrdRdScan(seg_arr=[0, 2], crd_arr=[0, 1]))
+        blocks.append(Repeat())
+        blocks.append(RepeatSigGen())
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    slots_size = sum(sys.getsizeof(blk) for blk in blocks[:3]) / 3
+    dicts = [DictState(blk) for blk in blocks[:3]]
+    dict_size = sum(sys.getsizeof(state) + sys.getsizeof(vars(state)) for state in dicts) / 3
+    return elapsed, size / len(blocks), slots_size, dict_size
+
+
+# Reads of the attributes the scanner's update() uses most, on the block and on the same state in a dict
+def bench_attrs(rounds, number=200000):
+    scan = CompressedCrdRdScan(seg_arr=[0, 2], crd_arr=[0, 1])
+    code = "blk.backpressure_en; blk.in_ref; blk.curr_ref; blk.curr_crd; blk.end_fiber; blk.curr_addr; blk.done"
+    times = []
+    for blk in (scan, DictState(scan)):
+        best = min(timeit.repeat(code, globals={"blk": blk}, number=number, repeat=rounds))
+        times.append(1e9 * best / (7 * number))
+    return times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-instance and per-cycle cost of the SAM primitives")
+    parser.add_argument("--nnz", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--instances", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    elapsed, traced, slots_size, dict_size = bench_instances(args.instances)
+    print("instances=%d (x3 blocks): %.3fs, %.2fus/block, %.0f traced bytes/block" %
+          (args.instances, elapsed, 1e6 * elapsed / (3 * args.instances), traced))
+    print("block state: %.0f bytes with __slots__, %.0f bytes in a dict" % (slots_size, dict_size))
+    slots_ns, dict_ns = bench_attrs(args.rounds)
+    print("attribute read: %.1fns with __slots__, %.1fns in a dict" % (slots_ns, dict_ns))
+
+    random.seed(args.seed)
+    seg1, crd1, vals1 = gen_vec(args.nnz, 2 * args.nnz)
+    seg2, crd2, vals2 = gen_vec(args.nnz, 2 * args.nnz)
+    bindings = {"seg1": seg1, "crd1": crd1, "vals1": vals1, "seg2": seg2, "crd2": crd2, "vals2": vals2,
+                "size": 2 * args.nnz + 1, "in_ref1": [0, 'D'], "in_ref2": [0, 'D']}
+    for specialize in (False, True):
+        cycles, elapsed = bench_graph(bindings, args.rounds, specialize)
+        print("vec_elemmul nnz=%d specialize=%s: %d cycles, %.3fs, %.2fus/cycle" %
+              (args.nnz, specialize, cycles, elapsed, 1e6 * elapsed / cycles))
+    cycles, elapsed = bench_update(crd1, args.rounds)
+    print("CompressedCrdRdScan nnz=%d: %d cycles, %.3fs, %.2fus/cycle" %
+          (args.nnz, cycles, elapsed, 1e6 * elapsed / cycles))
@@ -0,0 +1,34 @@
+import argparse
+import glob
+import os
+import time
+
+from sam.sim.src.formatted import convert_formatted
+
+# Converts the text files of formatted tensors (tensor_<name>_mode_*) into binary containers that the simulator
+# tests load instead, e.g. for every benchmark of every matrix:
+#   python scripts/convert_formatted.py $SUITESPARSE_FORMATTED_PATH/*/*
+
+
+def tensors(dirname):
+    names = set()
+    for filename in glob.glob(os.path.join(dirname, "tensor_*_mode_*")):
+        basename = os.path.basename(filename)
+        names.add(basename[len("tensor_"):basename.index("_mode_")])
+    return sorted(names)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert formatted text tensors to binary containers")
+    parser.add_argument("dirs", nargs="+", help="Directories with tensor_<name>_mode_* files")
+    parser.add_argument("-t", "--tensors", nargs="*", default=None, help="Only convert these tensors")
+    parser.add_argument("-f", "--format", type=str, default=None, help="Format of the tensors, e.g. ss01")
+    args = parser.parse_args()
+
+    for dirname in args.dirs:
+        for tensor in tensors(dirname):
+            if args.tensors is not None and tensor not in args.tensors:
+                continue
+            start = time.perf_counter()
+            filename = convert_formatted(dirname, tensor, args.format)
+            print("Wrote", filename, "in %.2fs" % (time.perf_counter() - start))
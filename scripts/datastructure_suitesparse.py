@@ -187,95 +187,104 @@ parser.add_argument('--no_gen_other', action='store_true', help="Whether this"
                     "script should generate the randmo 'other' tensors")
 parser.add_argument('--seed', type=int, default=0, help='Random seed needed for gen_other')
 parser.add_argument('--density', type=int, default=0.25, help='If gen_other, used for density of "other" tensor')
-args = parser.parse_args()
-
-np.random.seed(args.seed)
+parser.add_argument('--binary', action='store_true', default=False,
+                    help='Also write each tensor into a binary container (tensor_<name>.sam) for the simulator tests')
+parser.add_argument('--binary_only', action='store_true', default=False,
+                    help='Only write the binary containers, not the text files')
 
+# The writer and input cache of write_datastructure_bench(), which generate_formats.py also drives
 inputCache = InputCacheSuiteSparse()
-formatWriter = FormatWriter(args.cast)
+formatWriter = FormatWriter()
 
-cwd = os.getcwd()
-if args.output_dir_path is None:
-    out_dirname = SUITESPARSE_FORMATTED_PATH
-else:
-    out_dirname = args.output_dir_path
+if __name__ == "__main__":
+    args = parser.parse_args()
 
-out_path = Path(out_dirname)
-out_path.mkdir(parents=True, exist_ok=True, mode=0o777)
+    np.random.seed(args.seed)
 
-if args.name is None:
-    print("Please enter a matrix name")
-    exit()
+    formatWriter = FormatWriter(args.cast, binary=args.binary or args.binary_only, text=not args.binary_only)
 
-if args.input_path is None:
-    SS_PATH = os.getenv('SUITESPARSE_TENSOR_PATH', default=os.path.join(cwd, 'suitesparse'))
+    cwd = os.getcwd()
+    if args.output_dir_path is None:
+        out_dirname = SUITESPARSE_FORMATTED_PATH
+    else:
+        out_dirname = args.output_dir_path
 
-else:
-    SS_PATH = args.input_path
+    out_path = Path(out_dirname)
+    out_path.mkdir(parents=True, exist_ok=True, mode=0o777)
 
-tensor = None
-mtx_files = None
-if args.tiles:
-    # get all mtx tile files from args.input_path
-    mtx_files = [os.path.join(args.input_path, fname) for fname in os.listdir(args.input_path) if fname.endswith(".mtx")]
+    if args.name is None:
+        print("Please enter a matrix name")
+        exit()
 
-    tensor = [SuiteSparseTensor(mtx_file) for mtx_file in mtx_files]
-elif args.input_path is not None:
-    tensor = SuiteSparseTensor(args.input_path)
-else:
-    print(SS_PATH)
-    tensor = SuiteSparseTensor(SS_PATH)
+    if args.input_path is None:
+        SS_PATH = os.getenv('SUITESPARSE_TENSOR_PATH', default=os.path.join(cwd, 'suitesparse'))
 
-if args.format is not None:
-    assert args.format in formats
-    filename = os.path.join(out_path, args.name + "_" + args.format + ".txt")
+    else:
+        SS_PATH = args.input_path
 
-    coo = inputCache.load(tensor, False)
-    formatWriter.writeout(coo, args.format, filename)
-elif args.combined:
-    for format_str in formats:
-        filename = os.path.join(out_path, args.name + "_" + format_str + ".txt")
-        print("Writing " + args.name + " " + format_str + "...")
+    tensor = None
+    mtx_files = None
+    if args.tiles:
+        # get all mtx tile files from args.input_path
+        mtx_files = [os.path.join(args.input_path, fname) for fname in os.listdir(args.input_path) if fname.endswith(".mtx")]
 
-        coo = inputCache.load(tensor, False)
-        formatWriter.writeout(coo, format_str, filename)
+        tensor = [SuiteSparseTensor(mtx_file) for mtx_file in mtx_files]
+    elif args.input_path is not None:
+        tensor = SuiteSparseTensor(args.input_path)
+    else:
+        print(SS_PATH)
+        tensor = SuiteSparseTensor(SS_PATH)
 
-        shifted_filename = os.path.join(out_path, args.name + "_shifted_" + format_str + ".txt")
-        shifted = ScipyTensorShifter().shiftLastMode(coo)
-        formatWriter.writeout(shifted, format_str, shifted_filename)
+    if args.format is not None:
+        assert args.format in formats
+        filename = os.path.join(out_path, args.name + "_" + args.format + ".txt")
 
-        trans_filename = os.path.join(out_path, args.name + "_trans_shifted_" + format_str + ".txt")
-        trans_shifted = shifted.transpose()
-        formatWriter.writeout(trans_shifted, format_str, trans_filename)
-elif args.hw:
-    if args.tiles and tensor is not None:
-        for i, ten in enumerate(tensor):
-            tile_name = os.path.split(mtx_files[i])[1].split(".")[0]
-            write_datastructure_tiles(args, ten, out_path, tile_name)
-    else:
-        write_datastructure_bench(args, tensor, out_path)
+        coo = inputCache.load(tensor, False)
+        formatWriter.writeout(coo, args.format, filename)
+    elif args.combined:
+        for format_str in formats:
+            filename = os.path.join(out_path, args.name + "_" + format_str + ".txt")
+            print("Writing " + args.name + " " + format_str + "...")
+
+            coo = inputCache.load(tensor, False)
+            formatWriter.writeout(coo, format_str, filename)
+
+            shifted_filename = os.path.join(out_path, args.name + "_shifted_" + format_str + ".txt")
+            shifted = ScipyTensorShifter().shiftLastMode(coo)
+            formatWriter.writeout(shifted, format_str, shifted_filename)
+
+            trans_filename = os.path.join(out_path, args.name + "_trans_shifted_" + format_str + ".txt")
+            trans_shifted = shifted.transpose()
+            formatWriter.writeout(trans_shifted, format_str, trans_filename)
+    elif args.hw:
+        if args.tiles and tensor is not None:
+            for i, ten in enumerate(tensor):
+                tile_name = os.path.split(mtx_files[i])[1].split(".")[0]
+                write_datastructure_tiles(args, ten, out_path, tile_name)
+        else:
+            write_datastructure_bench(args, tensor, out_path)
 
-else:
-    print("Writing " + args.name + " original...")
-    dirname = os.path.join(out_path, args.name, "orig")
-    dirpath = Path(dirname)
-    dirpath.mkdir(parents=True, exist_ok=True, mode=0o777)
-    tensorname = "B"
-    coo = inputCache.load(tensor, False)
-    formatWriter.writeout_separate(coo, dirname, tensorname, omit_dense=args.omit_dense)
+    else:
+        print("Writing " + args.name + " original...")
+        dirname = os.path.join(out_path, args.name, "orig")
+        dirpath = Path(dirname)
+        dirpath.mkdir(parents=True, exist_ok=True, mode=0o777)
+        tensorname = "B"
+        coo = inputCache.load(tensor, False)
+        formatWriter.writeout_separate(coo, dirname, tensorname, omit_dense=args.omit_dense)
 
-    print("Writing " + args.name + " shifted...")
-    dirname = os.path.join(out_path, args.name, "shift")
-    dirpath = Path(dirname)
-    dirpath.mkdir(parents=True, exist_ok=True, mode=0o777)
-    tensorname = "C"
-    shifted = ScipyTensorShifter().shiftLastMode(coo)
-    formatWriter.writeout_separate(shifted, dirname, tensorname, omit_dense=args.omit_dense)
+        print("Writing " + args.name + " shifted...")
+        dirname = os.path.join(out_path, args.name, "shift")
+        dirpath = Path(dirname)
+        dirpath.mkdir(parents=True, exist_ok=True, mode=0o777)
+        tensorname = "C"
+        shifted = ScipyTensorShifter().shiftLastMode(coo)
+        formatWriter.writeout_separate(shifted, dirname, tensorname, omit_dense=args.omit_dense)
 
-    print("Writing " + args.name + " shifted and transposed...")
-    dirname = os.path.join(out_path, args.name, "shift-trans")
-    dirpath = Path(dirname)
-    dirpath.mkdir(parents=True, exist_ok=True, mode=0o777)
-    tensorname = "C"
-    trans_shifted = shifted.transpose()
-    formatWriter.writeout_separate(trans_shifted, dirname, tensorname, omit_dense=args.omit_dense)
+        print("Writing " + args.name + " shifted and transposed...")
+        dirname = os.path.join(out_path, args.name, "shift-trans")
+        dirpath = Path(dirname)
+        dirpath.mkdir(parents=True, exist_ok=True, mode=0o777)
+        tensorname = "C"
+        trans_shifted = shifted.transpose()
+        formatWriter.writeout_separate(trans_shifted, dirname, tensorname, omit_dense=args.omit_dense)
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import datastructure_suitesparse
+from util import FormatWriter, SuiteSparseTensor
+from sam.sim.src.tensor_cache import input_cache
+from sam.util import SUITESPARSE_PATH, SUITESPARSE_FORMATTED_PATH
+
+# Generates the per-benchmark formatted inputs of a list of SuiteSparse matrices on a process pool, e.g.
+#   python scripts/generate_formats.py scripts/tensor_names/suitesparse_ci.txt -j 8
+# Every matrix is loaded once (and shifted once, see ScipyTensorShifter) and written out for all benchmarks. A manifest
+# in the output directory records the source and parameters of every <matrix>/<benchmark> output, outputs whose source
+# and parameters are unchanged are skipped.
+
+BENCHMARKS = ["matmul_ikj", "matmul_ijk", "matmul_kij", "mat_elemmul", "mat_elemadd", "mat_elemadd3", "mat_residual",
+              "mat_mattransmul", "mat_identity"]
+MANIFEST = "manifest.json"
+
+
+def matrix_path(sspath, name):
+    for path in [os.path.join(sspath, name + ".mtx"), os.path.join(sspath, name, name + ".mtx")]:
+        if os.path.exists(path):
+            return path
+    return os.path.join(sspath, name)
+
+
+# What an output depends on besides the benchmark: the source file and the options it was written with
+def params(args, path):
+    stat = os.stat(path)
+    return {"source": os.path.abspath(path), "mtime": stat.st_mtime_ns, "size": stat.st_size, "cast": args.cast,
+            "binary": args.binary or args.binary_only, "text": not args.binary_only, "seed": args.seed,
+            "density": args.density, "no_gen_other": args.no_gen_other}
+
+
+def load_manifest(out_path):
+    filename = os.path.join(out_path, MANIFEST)
+    if not os.path.exists(filename):
+        return dict()
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save_manifest(out_path, manifest):
+    filename = os.path.join(out_path, MANIFEST)
+    with open(filename + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(filename + ".tmp", filename)
+
+
+def up_to_date(manifest, out_path, name, bench, entry):
+    return manifest.get(name + "/" + bench) == entry and os.path.isdir(os.path.join(out_path, name, bench))
+
+
+def init_worker(cast, binary, text):
+    datastructure_suitesparse.formatWriter = FormatWriter(cast, binary=binary, text=text)
+
+
+def write_matrix(args, name, path, benches, out_path):
+    tensor = SuiteSparseTensor(path)
+    start = time.perf_counter()
+    # Nothing is shared between matrices, the worker only keeps the one it writes
+    input_cache.clear()
+    datastructure_suitesparse.inputCache.load(tensor, False)
+    for bench in benches:
+        bench_args = argparse.Namespace(name=name, benchname=bench, output_dir_path=None, density=args.density,
+                                        no_gen_other=args.no_gen_other)
+        # Seeded per benchmark like a separate datastructure_suitesparse.py run, so the generated "other" tensors
+        # don't depend on which outputs are skipped or on the worker
+        np.random.seed(args.seed)
+        datastructure_suitesparse.write_datastructure_bench(bench_args, tensor, out_path)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the formatted inputs of SuiteSparse matrices for a list "
+                                                 "of benchmarks in parallel")
+    parser.add_argument('names', type=str, help='File with one matrix name per line')
+    parser.add_argument('-b', '--benchnames', type=str, nargs='+', default=BENCHMARKS)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--input_path', type=str, default=SUITESPARSE_PATH,
+                        help='Directory with the <name>.mtx or <name>/<name>.mtx files')
+    parser.add_argument('--output_dir_path', type=str, default=SUITESPARSE_FORMATTED_PATH)
+    parser.add_argument('--force', action='store_true', default=False, help='Regenerate up to date outputs too')
+    parser.add_argument('-cast', '--cast', action='store_true', default=False,
+                        help='Safe sparsity cast to int for values')
+    parser.add_argument('--no_gen_other', action='store_true', help="Whether this "
+                        "script should generate the random 'other' tensors")
+    parser.add_argument('--seed', type=int, default=0, help='Random seed needed for gen_other')
+    parser.add_argument('--density', type=float, default=0.25, help='If gen_other, used for density of "other" tensor')
+    parser.add_argument('--binary', action='store_true', default=False,
+                        help='Also write each tensor into a binary container (tensor_<name>.sam)')
+    parser.add_argument('--binary_only', action='store_true', default=False,
+                        help='Only write the binary containers, not the text files')
+    args = parser.parse_args()
+
+    out_path = Path(args.output_dir_path)
+    out_path.mkdir(parents=True, exist_ok=True, mode=0o777)
+    manifest = load_manifest(out_path)
+
+    with open(args.names) as f:
+        names = [line.strip() for line in f if line.strip()]
+
+    jobs = dict()
+    for name in names:
+        path = matrix_path(args.input_path, name)
+        if not os.path.exists(path):
+            print("Missing matrix", path, file=sys.stderr)
+            continue
+        entry = params(args, path)
+        benches = [bench for bench in args.benchnames
+                   if args.force or not up_to_date(manifest, out_path, name, bench, entry)]
+        if len(benches) == 0:
+            print("Skipping " + name + ", up to date")
+            continue
+        jobs[name] = (path, benches, entry)
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker,
+                             initargs=(args.cast, args.binary or args.binary_only, not args.binary_only)) as pool:
+        futures = {pool.submit(write_matrix, args, name, path, benches, out_path): name
+                   for name, (path, benches, entry) in jobs.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            path, benches, entry = jobs[name]
+            try:
+                elapsed = future.result()
+            except Exception as e:
+                print("Failed " + name + ":", repr(e), file=sys.stderr)
+                failed.append(name)
+                continue
+            # Only the driver writes the manifest, after every finished matrix, so an interrupted run resumes
+            for bench in benches:
+                manifest[name + "/" + bench] = entry
+            save_manifest(out_path, manifest)
+            print("Wrote " + name + " for " + str(len(benches)) + " benchmarks in %.2fs" % elapsed)
+
+    if failed:
+        print("Failed matrices:", " ".join(failed), file=sys.stderr)
+        exit(1)
@@ -8,6 +8,7 @@ import numpy
 
 from pathlib import Path
 
+from sam.sim.src.tensor_cache import input_cache
 from util import TensorCollectionSuiteSparse, ScipyTensorShifter, \
     ScipyMatrixMarketTensorLoader, SuiteSparseTensor, safeCastPydataTensorToInts
 
@@ -20,27 +21,16 @@ ssMtx = dataclasses.make_dataclass("SS", [("name", str), ("nnz", int),
 
 
 # UfuncInputCache attempts to avoid reading the same tensor from disk multiple
-# times in a benchmark run.
+# times in a benchmark run, through the input cache shared by the whole process.
 class UfuncInputCache:
-    def __init__(self):
-        self.lastLoaded = None
-        self.lastName = None
-        self.tensor = None
+    def __init__(self, cache=input_cache):
+        self.cache = cache
 
     def load(self, tensor, suitesparse, cast):
-        if self.lastName == str(tensor):
-            return self.tensor, self.other
-        else:
-            if suitesparse:
-                self.lastLoaded = tensor.load(ScipyMatrixMarketTensorLoader())
-            else:
-                self.lastLoaded = tensor.load()
-            self.lastName = str(tensor)
-            if cast:
-                self.tensor = safeCastPydataTensorToInts(self.lastLoaded)
-            else:
-                self.tensor = self.lastLoaded
-            return self.tensor
+        if suitesparse:
+            return self.cache.get(tensor.path, lambda: tensor.load(ScipyMatrixMarketTensorLoader()),
+                                  ("cast",) if cast else ())
+        return self.cache.get(str(tensor), tensor.load, ("cast",) if cast else ())
 
 
 inputCache = UfuncInputCache()
@@ -10,7 +10,10 @@ import numpy as np
 from pathlib import Path
 from dataclasses import dataclass
 
-from sam.util import round_sparse, TnsFileLoader, HOSTNAME
+from sam.util import round_sparse, round_sparse_array, TnsFileLoader, HOSTNAME, ScipyTensorShifter, \
+    InputCacheSuiteSparse
+from sam.sim.src.formatted import container_path, write_formatted
+from sam.sim.src.tensor_io import read_mtx
 
 
 # TnsFileDumper dumps a dictionary of coordinates to values
@@ -117,7 +120,7 @@ class ScipyMatrixMarketTensorLoader:
         pass
 
     def load(self, path):
-        coo = scipy.io.mmread(path)
+        coo = read_mtx(path)
         return coo
 
 
@@ -127,50 +130,34 @@ def shape_str(shape):
 
 # FIXME: This fixed point number of decimals may not be enough
 def array_str(array):
-    if isinstance(array[0], float):
-        return ' '.join([str(item) for item in array])
-        # return ' '.join(['{:5.5f}'.format(item) for item in array])
-
-    return ' '.join([str(item) for item in array])
+    return ' '.join(map(str, _items(array)))
+    # return ' '.join(['{:5.5f}'.format(item) for item in array])
 
 
 def array_newline_str(array):
-    if isinstance(array[0], float):
-        return '\n'.join([str(item) for item in array])
-        # return '\n'.join(['{:5.5f}'.format(item) for item in array])
-
-    return '\n'.join([str(item) for item in array])
+    return '\n'.join(map(str, _items(array)))
+    # return '\n'.join(['{:5.5f}'.format(item) for item in array])
 
 
-# InputCacheSuiteSparse attempts to avoid reading the same tensor from disk multiple
-# times in a benchmark run.
-class InputCacheSuiteSparse:
-    def __init__(self):
-        self.lastLoaded = None
-        self.lastName = None
-        self.tensor = None
-
-    def load(self, tensor, cast):
-        if self.lastName == str(tensor):
-            return self.tensor
-        else:
-            self.lastLoaded = tensor.load(ScipyMatrixMarketTensorLoader())
-            self.lastName = str(tensor)
-            if cast:
-                self.tensor = self.lastLoaded
-                # self.tensor = safeCastPydataTensorToInts(self.lastLoaded)
-            else:
-                self.tensor = self.lastLoaded
-            return self.tensor
+# Elements of an array as Python numbers, converted in bulk for the dtypes that print the same either way
+def _items(array):
+    if type(array) is np.ndarray and array.ndim == 1 and (array.dtype.kind in 'iub' or array.dtype == np.float64):
+        return array.tolist()
+    return array
 
 
 class FormatWriter:
-    def __init__(self, cast_int=False):
+    # With binary, the writeout_separate_* methods also write the arrays into a single binary container per tensor
+    # (tensor_<name>.sam, see sam.sim.src.formatted) that the simulator tests load without parsing the text files.
+    # Without text, only the container is written
+    def __init__(self, cast_int=False, binary=False, text=True):
         self.cast = cast_int
+        self.binary = binary
+        self.text = text
 
     def convert_format(self, coo, format_str):
         if self.cast:
-            cast_data = np.array([round_sparse(elem) for elem in coo.data])
+            cast_data = round_sparse_array(coo.data)
             coo = scipy.sparse.coo_matrix((cast_data, (coo.row, coo.col)))
 
         if format_str == "csr":
@@ -187,28 +174,19 @@ class FormatWriter:
                 return coo.todense().getT()
             if format_str == "dcsr":
                 csr = scipy.sparse.csr_matrix(coo)
-                has_row = [rc > 0 for rc in csr.getnnz(1)]
-                segend = sum(has_row)
-                seg0 = [0, segend]
-                crd0 = [i for i, r in enumerate(has_row) if r]
-                seg1 = list(itertools.accumulate(map(int, csr.getnnz(1))))
-                seg1 = [item for item, _ in itertools.groupby(seg1)]
-                if seg1[0] != 0:
-                    seg1 = [0] + seg1
+                # The non-empty rows, and the row pointers without the repeats of the empty rows
+                crd0 = np.flatnonzero(np.diff(csr.indptr)).tolist()
+                seg0 = [0, len(crd0)]
+                seg1 = np.unique(csr.indptr).tolist()
                 crd1 = csr.indices
                 data = csr.data
                 dcsr = DoublyCompressedMatrix(csr.shape, seg0, crd0, seg1, crd1, data)
                 return dcsr
             elif format_str == "dcsc":
                 csc = scipy.sparse.csc_matrix(coo)
-                has_col = [rc > 0 for rc in csc.getnnz(0)]
-                segend = sum(has_col)
-                seg0 = [0, segend]
-                crd0 = [i for i, c in enumerate(has_col) if c]
-                seg1 = list(itertools.accumulate(map(int, csc.getnnz(0))))
-                seg1 = [item for item, _ in itertools.groupby(seg1)]
-                if seg1[0] != 0:
-                    seg1 = [0] + seg1
+                crd0 = np.flatnonzero(np.diff(csc.indptr)).tolist()
+                seg0 = [0, len(crd0)]
+                seg1 = np.unique(csc.indptr).tolist()
                 crd1 = csc.indices
                 data = csc.data
                 dcsc = DoublyCompressedMatrix(csc.shape, seg0, crd0, seg1, crd1, data)
@@ -482,6 +460,11 @@ class FormatWriter:
                     shutil.chown(path, group='sparsity')
                     os.chmod(path, 0o775)
 
+    def write_array(self, filename, array):
+        if self.text:
+            with open(filename, "w") as ofile:
+                ofile.write(array_newline_str(array))
+
     def writeout_separate_vec(self, vec, dir_path, tensorname, format_str="s0", hw=True):
         vec_shape = [len(vec)]
 
@@ -495,44 +478,47 @@ class FormatWriter:
                 filename = os.path.join(vec_dir, tensorname + "0_seg.txt")
             else:
                 filename = os.path.join(vec_dir, "tensor_" + tensorname + "_mode_0_seg")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str([0, len(vec_sp) + 1]))
+            self.write_array(filename, [0, len(vec_sp) + 1])
 
             if not hw:
                 filename = os.path.join(vec_dir, tensorname + "0_crd.txt")
             else:
                 filename = os.path.join(vec_dir, "tensor_" + tensorname + "_mode_0_crd")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(vec_crd))
+            self.write_array(filename, vec_crd)
 
             if not hw:
                 filename = os.path.join(vec_dir, tensorname + "_vals.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_vals")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(vec_sp))
+            self.write_array(filename, vec_sp)
 
             if not hw:
                 filename = os.path.join(vec_dir, tensorname + "_shape.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_shape")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(vec_shape))
+            self.write_array(filename, vec_shape)
+
+            if self.binary:
+                write_formatted(container_path(dir_path, tensorname),
+                                {"mode_0_seg": [0, len(vec_sp) + 1], "mode_0_crd": vec_crd, "mode_vals": vec_sp,
+                                 "mode_shape": vec_shape}, tensorname, format_str)
 
         if format_str == "d0":
             if not hw:
                 filename = os.path.join(vec_dir, tensorname + "_vals.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_vals")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(vec))
+            self.write_array(filename, vec)
 
             if not hw:
                 filename = os.path.join(vec_dir, tensorname + "_shape.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_shape")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(vec_shape))
+            self.write_array(filename, vec_shape)
+
+            if self.binary:
+                write_formatted(container_path(dir_path, tensorname), {"mode_vals": vec, "mode_shape": vec_shape},
+                                tensorname, format_str)
 
     def writeout_separate_sparse_only(self, coo, dir_path, tensorname, format_str="ss01", hw=True):
 
@@ -545,43 +531,43 @@ class FormatWriter:
                 filename = os.path.join(dcsr_dir, tensorname + "0_seg.txt")
             else:
                 filename = os.path.join(dcsr_dir, "tensor_" + tensorname + "_mode_0_seg")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsr.seg0))
+            self.write_array(filename, dcsr.seg0)
 
             if not hw:
                 filename = os.path.join(dcsr_dir, tensorname + "0_crd.txt")
             else:
                 filename = os.path.join(dcsr_dir, "tensor_" + tensorname + "_mode_0_crd")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsr.crd0))
+            self.write_array(filename, dcsr.crd0)
 
             if not hw:
                 filename = os.path.join(dcsr_dir, tensorname + "1_seg.txt")
             else:
                 filename = os.path.join(dcsr_dir, "tensor_" + tensorname + "_mode_1_seg")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsr.seg1))
+            self.write_array(filename, dcsr.seg1)
 
             if not hw:
                 filename = os.path.join(dcsr_dir, tensorname + "1_crd.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_1_crd")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsr.crd1))
+            self.write_array(filename, dcsr.crd1)
 
             if not hw:
                 filename = os.path.join(dcsr_dir, tensorname + "_vals.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_vals")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsr.data))
+            self.write_array(filename, dcsr.data)
 
             if not hw:
                 filename = os.path.join(dcsr_dir, tensorname + "_shape.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_shape")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsr.shape))
+            self.write_array(filename, dcsr.shape)
+
+            if self.binary:
+                write_formatted(container_path(dir_path, tensorname),
+                                {"mode_0_seg": dcsr.seg0, "mode_0_crd": dcsr.crd0, "mode_1_seg": dcsr.seg1,
+                                 "mode_1_crd": dcsr.crd1, "mode_vals": dcsr.data, "mode_shape": dcsr.shape},
+                                tensorname, format_str)
 
         elif format_str == "ss10":
             dcsc_dir = Path(dir_path)
@@ -593,43 +579,43 @@ class FormatWriter:
                 filename = os.path.join(dcsc_dir, tensorname + "_shape.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_shape")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsc.shape))
+            self.write_array(filename, dcsc.shape)
 
             if not hw:
                 filename = os.path.join(dcsc_dir, tensorname + "1_seg.txt")
             else:
                 filename = os.path.join(dcsc_dir, "tensor_" + tensorname + "_mode_1_seg")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsc.seg0))
+            self.write_array(filename, dcsc.seg0)
 
             if not hw:
                 filename = os.path.join(dcsc_dir, tensorname + "1_crd.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_1_crd")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsc.crd0))
+            self.write_array(filename, dcsc.crd0)
 
             if not hw:
                 filename = os.path.join(dcsc_dir, tensorname + "0_seg.txt")
             else:
                 filename = os.path.join(dcsc_dir, "tensor_" + tensorname + "_mode_0_seg")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsc.seg1))
+            self.write_array(filename, dcsc.seg1)
 
             if not hw:
                 filename = os.path.join(dcsc_dir, tensorname + "0_crd.txt")
             else:
                 filename = os.path.join(dcsc_dir, "tensor_" + tensorname + "_mode_0_crd")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsc.crd1))
+            self.write_array(filename, dcsc.crd1)
 
             if not hw:
                 filename = os.path.join(dcsc_dir, tensorname + "_vals.txt")
             else:
                 filename = os.path.join(dir_path, "tensor_" + tensorname + "_mode_vals")
-            with open(filename, "w") as ofile:
-                ofile.write(array_newline_str(dcsc.data))
+            self.write_array(filename, dcsc.data)
+
+            if self.binary:
+                write_formatted(container_path(dir_path, tensorname),
+                                {"mode_1_seg": dcsc.seg0, "mode_1_crd": dcsc.crd0, "mode_0_seg": dcsc.seg1,
+                                 "mode_0_crd": dcsc.crd1, "mode_vals": dcsc.data, "mode_shape": dcsc.shape},
+                                tensorname, format_str)
 
 
 # UfuncInputCache attempts to avoid reading the same tensor from disk multiple